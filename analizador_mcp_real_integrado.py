@@ -8,6 +8,143 @@ import asyncio
 import sys
 from datetime import datetime
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_templates import register_template, run_template, print_template_stats
+from stage_scheduler import StageScheduler
+from cost_guard import BudgetExceededError, print_spend
+
+# Consultas de cada etapa como plantillas parametrizadas (mismo SQL para
+# todos los usuarios; el user_id viaja tipado en el job_config)
+TRANSACCIONES_ATO_DTO = register_template(
+    'integrado.transacciones_ato_dto',
+    """
+    SELECT 
+        COUNT(DISTINCT operation_id) as cantidad_transacciones,
+        ROUND(SUM(op_amt), 2) as monto_total
+    FROM `meli-bi-data.SBOX_PFFINTECHATO.ato_bq`
+    WHERE CAST(GCA_CUST_ID AS STRING) = CAST(@user_id AS STRING)
+        AND status_id = 'A'
+        AND contramarca = 0
+        AND flow_type NOT IN ('PI', 'MF')
+    """,
+    {'user_id': 'INT64'},
+    "Transacciones ATO/DTO confirmadas del usuario en ato_bq")
+
+ANTIGUEDAD_CUENTA = register_template(
+    'integrado.antiguedad_cuenta',
+    """
+    SELECT 
+        CUS_RU_SINCE_DT as fecha_creacion,
+        DATE_DIFF(CURRENT_DATE(), DATE(CUS_RU_SINCE_DT), DAY) as dias_antiguedad
+    FROM `meli-bi-data.WHOWNER.LK_CUS_CUSTOMERS_DATA`
+    WHERE CUS_CUST_ID = @user_id
+    """,
+    {'user_id': 'INT64'},
+    "Fecha de alta y días de antigüedad de la cuenta")
+
+MARCAS_RELEVANTES = register_template(
+    'integrado.marcas_relevantes',
+    """
+    SELECT marcas
+    FROM `meli-bi-data.SBOX_PFFINTECHATO.base_ato_escalabilidad_final`
+    WHERE user_id = @user_id
+    LIMIT 1
+    """,
+    {'user_id': 'INT64'},
+    "Marcas del usuario en base_ato_escalabilidad_final")
+
+VELOCIDAD_RETIRADA = register_template(
+    'integrado.velocidad_retirada',
+    """
+    WITH ingresos AS (
+        SELECT 
+            MOV_CREATED_DATETIME as fecha_ingreso,
+            MOV_DOL_AMOUNT as monto_ingreso
+        FROM `meli-bi-data.WHOWNER.BT_MP_ACC_MOVEMENTS`
+        WHERE CUS_CUST_ID_SEL = @user_id
+            AND MOV_TYPE = 'IN'
+            AND MOV_DOL_AMOUNT > 0
+            AND MOV_CREATED_DATETIME >= '2024-01-01'
+    ),
+    retiros AS (
+        SELECT 
+            pay_move_date as fecha_retiro,
+            PAY_TRANSACTION_DOL_AMT as monto_retiro,
+            PAY_PAYMENT_METHOD_TYPE as metodo
+        FROM `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS`
+        WHERE CUS_CUST_ID_SEL = @user_id
+            AND PAY_TRANSACTION_DOL_AMT > 0
+            AND pay_move_date >= '2024-01-01'
+            AND pay_status_id = 'approved'
+    )
+    SELECT 
+        i.fecha_ingreso,
+        i.monto_ingreso,
+        r.fecha_retiro,
+        r.monto_retiro,
+        r.metodo,
+        DATE_DIFF(DATE(r.fecha_retiro), DATE(i.fecha_ingreso), DAY) as dias_diferencia
+    FROM ingresos i
+    JOIN retiros r ON DATE(r.fecha_retiro) >= DATE(i.fecha_ingreso)
+        AND DATE(r.fecha_retiro) <= DATE_ADD(DATE(i.fecha_ingreso), INTERVAL 30 DAY)
+    ORDER BY i.fecha_ingreso, r.fecha_retiro
+    LIMIT 10
+    """,
+    {'user_id': 'INT64'},
+    "Ingresos y retiros dentro de los 30 días siguientes")
+
+CONTACTO_DESCONOCIMIENTO = register_template(
+    'integrado.contacto_desconocimiento',
+    """
+    SELECT 
+        case_id,
+        fecha_apertura_caso,
+        subtype1,
+        CURRENT_DATE() as fecha_actual
+    FROM `meli-bi-data.SBOX_PFFINTECHATO.CONSULTAS_ATO`
+    WHERE user_id = @user_id
+        AND subtype1 = 'cuenta_de_hacker'
+        AND fecha_apertura_caso >= '2024-01-01'
+    ORDER BY fecha_apertura_caso DESC
+    LIMIT 5
+    """,
+    {'user_id': 'INT64'},
+    "Casos cuenta_de_hacker del usuario en CONSULTAS_ATO")
+
+PORCENTAJE_TRANSACCIONES = register_template(
+    'integrado.porcentaje_transacciones',
+    """
+    WITH ato_transacciones AS (
+        SELECT 
+            COUNT(DISTINCT operation_id) as cant_ato,
+            ROUND(SUM(op_amt), 2) as monto_ato
+        FROM `meli-bi-data.SBOX_PFFINTECHATO.ato_bq`
+        WHERE GCA_CUST_ID = CAST(@user_id AS STRING)
+            AND status_id = 'A'
+            AND contramarca = 0
+            AND flow_type NOT IN ('PI', 'MF')
+    ),
+    total_transacciones AS (
+        SELECT 
+            COUNT(DISTINCT PAY_PAYMENT_ID) as cant_total,
+            ROUND(SUM(PAY_TRANSACTION_DOL_AMT), 2) as monto_total
+        FROM `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS`
+        WHERE CUS_CUST_ID_SEL = @user_id
+            AND pay_status_id NOT IN ('rejected', 'pending')
+            AND tpv_flag = 1
+    )
+    SELECT 
+        a.cant_ato,
+        a.monto_ato,
+        t.cant_total,
+        t.monto_total,
+        ROUND(100.0 * a.cant_ato / NULLIF(t.cant_total, 0), 2) as porcentaje_cantidad,
+        ROUND(100.0 * a.monto_ato / NULLIF(t.monto_total, 0), 2) as porcentaje_monto
+    FROM ato_transacciones a
+    CROSS JOIN total_transacciones t
+    """,
+    {'user_id': 'INT64'},
+    "Transacciones ATO/DTO sobre el total de pagos recibidos")
+
 
 class AnalizadorMCPRealIntegrado:
     """
@@ -27,6 +164,13 @@ class AnalizadorMCPRealIntegrado:
             print(f"❌ Error conectando a BigQuery: {e}")
             return False
 
+    async def _query_rows(self, template, **parameters):
+        """Filas de una plantilla (execute_query devuelve la respuesta MCP completa)"""
+        result = await run_template(self.operations, template, **parameters)
+        if result.get("status") != "success":
+            raise RuntimeError(result.get("error", "Error desconocido"))
+        return result["result"]["rows"]
+
     def procesar_subgraph_mcp(self, subgraph_json):
         """
         Procesar datos del subgrafo MCP y extraer cruces de riesgo
@@ -248,9 +392,19 @@ class AnalizadorMCPRealIntegrado:
             print()
             return None
         
+        # Las etapas corren a la vez y las pendientes se cancelan al decidir
+        async with StageScheduler() as etapas:
+            # Los dos flujos empiezan por la antigüedad: va junto con el prerequisito
+            etapas.add('transacciones', self._verificar_transacciones_ato_dto, user_id)
+            etapas.add('antiguedad', self._verificar_antiguedad_cuenta, user_id)
+            return await self._ejecutar_flujos(user_id, subgraph_data, fraud_hops_data, etapas)
+
+    async def _ejecutar_flujos(self, user_id, subgraph_data, fraud_hops_data, etapas):
+        """Prerequisito y elección de flujo sobre las etapas ya lanzadas"""
+        
         # PREREQUISITO: Verificar transacciones ATO/DTO
         print("🔍 PREREQUISITO: VERIFICAR TRANSACCIONES ATO/DTO")
-        transacciones_ato = await self._verificar_transacciones_ato_dto(user_id)
+        transacciones_ato = await etapas.result('transacciones')
         
         if transacciones_ato['cantidad'] == 0:
             print("⚠️  USUARIO NO DEBERÍA ESTAR EN ANÁLISIS")
@@ -270,13 +424,18 @@ class AnalizadorMCPRealIntegrado:
         
         # FLUJO 1: 1 transacción ATO/DTO
         if cantidad_transacciones == 1:
-            return await self._ejecutar_flujo_1(user_id, transacciones_ato)
+            etapas.add('porcentaje', self._verificar_porcentaje_transacciones, user_id)
+            return await self._ejecutar_flujo_1(user_id, transacciones_ato, etapas)
         
         # FLUJO 2: 2+ transacciones ATO/DTO
         else:
-            return await self._ejecutar_flujo_2_con_mcp(user_id, transacciones_ato, subgraph_data, fraud_hops_data)
+            etapas.add('marcas', self._verificar_marcas_relevantes, user_id)
+            etapas.add('velocidad', self._verificar_velocidad_retirada, user_id)
+            etapas.add('contacto', self._verificar_contacto_desconocimiento, user_id)
+            return await self._ejecutar_flujo_2_con_mcp(user_id, transacciones_ato, subgraph_data, fraud_hops_data,
+                                                        etapas)
 
-    async def _ejecutar_flujo_2_con_mcp(self, user_id, transacciones_ato, subgraph_data, fraud_hops_data):
+    async def _ejecutar_flujo_2_con_mcp(self, user_id, transacciones_ato, subgraph_data, fraud_hops_data, etapas):
         """Ejecutar Flujo 2 con datos MCP reales"""
         
         print("\n📋 FLUJO 2: ANÁLISIS PARA 2+ TRANSACCIONES ATO/DTO")
@@ -284,7 +443,7 @@ class AnalizadorMCPRealIntegrado:
         
         # PASO 1: Verificar antigüedad de cuenta
         print("1️⃣ EVALUANDO ANTIGÜEDAD DE CUENTA...")
-        antiguedad = await self._verificar_antiguedad_cuenta(user_id)
+        antiguedad = await etapas.result('antiguedad')
         
         if not antiguedad['es_antigua']:
             resultado_final = await self._generar_decision_final(
@@ -296,7 +455,7 @@ class AnalizadorMCPRealIntegrado:
         
         # PASO 2: Verificar marcas relevantes
         print("\n2️⃣ EVALUANDO MARCAS RELEVANTES...")
-        marcas = await self._verificar_marcas_relevantes(user_id)
+        marcas = await etapas.result('marcas')
         
         if marcas['tiene_marcas']:
             resultado_final = await self._generar_decision_final(
@@ -343,7 +502,7 @@ class AnalizadorMCPRealIntegrado:
         
         # PASO 4: Verificar velocidad de retirada
         print("\n4️⃣ EVALUANDO VELOCIDAD DE RETIRADA...")
-        velocidad = await self._verificar_velocidad_retirada(user_id)
+        velocidad = await etapas.result('velocidad')
         
         if velocidad['es_rapida']:
             resultado_final = await self._generar_decision_final(
@@ -355,7 +514,7 @@ class AnalizadorMCPRealIntegrado:
         
         # PASO 5: Verificar contacto/desconocimiento
         print("\n5️⃣ EVALUANDO CONTACTO/DESCONOCIMIENTO...")
-        contacto = await self._verificar_contacto_desconocimiento(user_id)
+        contacto = await etapas.result('contacto')
         
         if contacto['tiene_contacto']:
             resultado_final = await self._generar_decision_final(
@@ -376,18 +535,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_transacciones_ato_dto(self, user_id):
         """Verificar transacciones ATO/DTO del usuario"""
         try:
-            query = f"""
-            SELECT 
-                COUNT(DISTINCT operation_id) as cantidad_transacciones,
-                ROUND(SUM(op_amt), 2) as monto_total
-            FROM `meli-bi-data.SBOX_PFFINTECHATO.ato_bq`
-            WHERE CAST(GCA_CUST_ID AS STRING) = '{user_id}'
-                AND status_id = 'A'
-                AND contramarca = 0
-                AND flow_type NOT IN ('PI', 'MF')
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(TRANSACCIONES_ATO_DTO, user_id=user_id)
             
             if result and len(result) > 0:
                 cantidad = result[0].get('cantidad_transacciones', 0)
@@ -400,6 +548,9 @@ class AnalizadorMCPRealIntegrado:
             else:
                 return {'cantidad': 0, 'monto': 0}
                 
+        except BudgetExceededError:
+            # Sin presupuesto no hay decisión posible: no seguir con valores por defecto
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando transacciones: {e}")
             return {'cantidad': 0, 'monto': 0}
@@ -407,15 +558,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_antiguedad_cuenta(self, user_id):
         """Verificar antigüedad de la cuenta"""
         try:
-            query = f"""
-            SELECT 
-                CUS_RU_SINCE_DT as fecha_creacion,
-                DATE_DIFF(CURRENT_DATE(), DATE(CUS_RU_SINCE_DT), DAY) as dias_antiguedad
-            FROM `meli-bi-data.WHOWNER.LK_CUS_CUSTOMERS_DATA`
-            WHERE CUS_CUST_ID = {user_id}
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(ANTIGUEDAD_CUENTA, user_id=user_id)
             
             if result and len(result) > 0:
                 dias_antiguedad = result[0].get('dias_antiguedad', 0)
@@ -436,6 +579,8 @@ class AnalizadorMCPRealIntegrado:
                 print(f"   ❌ No se encontraron datos de antigüedad")
                 return {'es_antigua': False, 'dias_antiguedad': 0, 'fecha_creacion': None}
                 
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando antigüedad: {e}")
             return {'es_antigua': False, 'dias_antiguedad': 0, 'fecha_creacion': None}
@@ -443,14 +588,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_marcas_relevantes(self, user_id):
         """Verificar marcas relevantes del usuario"""
         try:
-            query = f"""
-            SELECT marcas
-            FROM `meli-bi-data.SBOX_PFFINTECHATO.base_ato_escalabilidad_final`
-            WHERE user_id = {user_id}
-            LIMIT 1
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(MARCAS_RELEVANTES, user_id=user_id)
             
             marcas_buscadas = [
                 'big_sellers', 'comerciales', 'key_users', 'referidos', 'legales',
@@ -489,6 +627,8 @@ class AnalizadorMCPRealIntegrado:
                 print(f"   ❌ No se encontraron datos del usuario")
                 return {'tiene_marcas': False, 'marcas_encontradas': [], 'marcas_completas': ''}
                 
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando marcas: {e}")
             return {'tiene_marcas': False, 'marcas_encontradas': [], 'marcas_completas': ''}
@@ -496,43 +636,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_velocidad_retirada(self, user_id):
         """Verificar velocidad de retirada de dinero"""
         try:
-            query = f"""
-            WITH ingresos AS (
-                SELECT 
-                    MOV_CREATED_DATETIME as fecha_ingreso,
-                    MOV_DOL_AMOUNT as monto_ingreso
-                FROM `meli-bi-data.WHOWNER.BT_MP_ACC_MOVEMENTS`
-                WHERE CUS_CUST_ID_SEL = {user_id}
-                    AND MOV_TYPE = 'IN'
-                    AND MOV_DOL_AMOUNT > 0
-                    AND MOV_CREATED_DATETIME >= '2024-01-01'
-            ),
-            retiros AS (
-                SELECT 
-                    pay_move_date as fecha_retiro,
-                    PAY_TRANSACTION_DOL_AMT as monto_retiro,
-                    PAY_PAYMENT_METHOD_TYPE as metodo
-                FROM `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS`
-                WHERE CUS_CUST_ID_SEL = {user_id}
-                    AND PAY_TRANSACTION_DOL_AMT > 0
-                    AND pay_move_date >= '2024-01-01'
-                    AND pay_status_id = 'approved'
-            )
-            SELECT 
-                i.fecha_ingreso,
-                i.monto_ingreso,
-                r.fecha_retiro,
-                r.monto_retiro,
-                r.metodo,
-                DATE_DIFF(DATE(r.fecha_retiro), DATE(i.fecha_ingreso), DAY) as dias_diferencia
-            FROM ingresos i
-            JOIN retiros r ON DATE(r.fecha_retiro) >= DATE(i.fecha_ingreso)
-                AND DATE(r.fecha_retiro) <= DATE_ADD(DATE(i.fecha_ingreso), INTERVAL 30 DAY)
-            ORDER BY i.fecha_ingreso, r.fecha_retiro
-            LIMIT 10
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(VELOCIDAD_RETIRADA, user_id=user_id)
             
             if result and len(result) > 0:
                 retiros_rapidos = [r for r in result if r.get('dias_diferencia', 999) <= 3]
@@ -557,6 +661,8 @@ class AnalizadorMCPRealIntegrado:
                 print(f"   ❌ No se encontraron datos de retiros")
                 return {'es_rapida': False, 'total_retiros': 0, 'retiros_rapidos': 0, 'detalles': []}
                 
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando velocidad: {e}")
             return {'es_rapida': False, 'total_retiros': 0, 'retiros_rapidos': 0, 'detalles': []}
@@ -564,21 +670,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_contacto_desconocimiento(self, user_id):
         """Verificar si el usuario contactó reportando desconocimiento"""
         try:
-            query = f"""
-            SELECT 
-                case_id,
-                fecha_apertura_caso,
-                subtype1,
-                CURRENT_DATE() as fecha_actual
-            FROM `meli-bi-data.SBOX_PFFINTECHATO.CONSULTAS_ATO`
-            WHERE user_id = {user_id}
-                AND subtype1 = 'cuenta_de_hacker'
-                AND fecha_apertura_caso >= '2024-01-01'
-            ORDER BY fecha_apertura_caso DESC
-            LIMIT 5
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(CONTACTO_DESCONOCIMIENTO, user_id=user_id)
             
             if result and len(result) > 0:
                 tiene_contacto = True
@@ -599,18 +691,20 @@ class AnalizadorMCPRealIntegrado:
                 print(f"   ❌ No hay registro de contacto del usuario")
                 return {'tiene_contacto': False, 'casos_contacto': 0, 'detalles': []}
                 
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando contacto: {e}")
             return {'tiene_contacto': False, 'casos_contacto': 0, 'detalles': []}
 
-    async def _ejecutar_flujo_1(self, user_id, transacciones_ato):
+    async def _ejecutar_flujo_1(self, user_id, transacciones_ato, etapas):
         """Ejecutar Flujo 1 para 1 transacción ATO/DTO"""
         print("\n📋 FLUJO 1: ANÁLISIS PARA 1 TRANSACCIÓN ATO/DTO")
         print("-" * 60)
         
         # PASO 1: Verificar antigüedad de cuenta
         print("1️⃣ EVALUANDO ANTIGÜEDAD DE CUENTA...")
-        antiguedad = await self._verificar_antiguedad_cuenta(user_id)
+        antiguedad = await etapas.result('antiguedad')
         
         if not antiguedad['es_antigua']:
             resultado_final = await self._generar_decision_final(
@@ -622,7 +716,7 @@ class AnalizadorMCPRealIntegrado:
         
         # PASO 2: Verificar porcentaje de transacciones ATO/DTO vs total
         print("\n2️⃣ EVALUANDO % TRANSACCIONES ATO/DTO VS TOTAL...")
-        porcentaje = await self._verificar_porcentaje_transacciones(user_id)
+        porcentaje = await etapas.result('porcentaje')
         
         if porcentaje['porcentaje_cantidad'] >= 90 or porcentaje['porcentaje_monto'] >= 90:
             resultado_final = await self._generar_decision_final(
@@ -642,38 +736,7 @@ class AnalizadorMCPRealIntegrado:
     async def _verificar_porcentaje_transacciones(self, user_id):
         """Verificar porcentaje de transacciones ATO/DTO vs total"""
         try:
-            query = f"""
-            WITH ato_transacciones AS (
-                SELECT 
-                    COUNT(DISTINCT operation_id) as cant_ato,
-                    ROUND(SUM(op_amt), 2) as monto_ato
-                FROM `meli-bi-data.SBOX_PFFINTECHATO.ato_bq`
-                WHERE GCA_CUST_ID = '{user_id}'
-                    AND status_id = 'A'
-                    AND contramarca = 0
-                    AND flow_type NOT IN ('PI', 'MF')
-            ),
-            total_transacciones AS (
-                SELECT 
-                    COUNT(DISTINCT PAY_PAYMENT_ID) as cant_total,
-                    ROUND(SUM(PAY_TRANSACTION_DOL_AMT), 2) as monto_total
-                FROM `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS`
-                WHERE CUS_CUST_ID_SEL = {user_id}
-                    AND pay_status_id NOT IN ('rejected', 'pending')
-                    AND tpv_flag = 1
-            )
-            SELECT 
-                a.cant_ato,
-                a.monto_ato,
-                t.cant_total,
-                t.monto_total,
-                ROUND(100.0 * a.cant_ato / NULLIF(t.cant_total, 0), 2) as porcentaje_cantidad,
-                ROUND(100.0 * a.monto_ato / NULLIF(t.monto_total, 0), 2) as porcentaje_monto
-            FROM ato_transacciones a
-            CROSS JOIN total_transacciones t
-            """
-            
-            result = await self.operations.execute_query(query)
+            result = await self._query_rows(PORCENTAJE_TRANSACCIONES, user_id=user_id)
             
             if result and len(result) > 0:
                 row = result[0]
@@ -697,6 +760,8 @@ class AnalizadorMCPRealIntegrado:
                 print(f"   ❌ No se pudieron calcular porcentajes")
                 return {'porcentaje_cantidad': 0, 'porcentaje_monto': 0}
                 
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error calculando porcentajes: {e}")
             return {'porcentaje_cantidad': 0, 'porcentaje_monto': 0}
@@ -868,12 +933,18 @@ async def main():
     }
     
     # Ejecutar análisis con datos MCP reales
-    resultado = await analizador.analizar_usuario_con_mcp_real(user_id, subgraph_data, fraud_hops_data)
+    try:
+        resultado = await analizador.analizar_usuario_con_mcp_real(user_id, subgraph_data, fraud_hops_data)
+    except BudgetExceededError as e:
+        print(f"\n{e}")
+        resultado = None
     
     if resultado:
         print("\n🎯 ANÁLISIS COMPLETADO")
         print(f"   Decisión: {resultado['decision_final']}")
         print(f"   Motivo: {resultado['motivo']}")
+    print_template_stats()
+    print_spend()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
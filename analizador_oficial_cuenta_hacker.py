@@ -5,12 +5,263 @@ Implementa el esquema oficial exacto paso a paso según el flujo definido
 """
 
 import asyncio
+import contextlib
+import io
+import os
 import sys
+import time
 from datetime import datetime
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_cache import print_stats
+from query_templates import register_template, run_template, print_template_stats
+from stage_scheduler import StageScheduler
+from cost_guard import BudgetExceededError, print_spend
 from cruces_conocidos import verificar_cruces_usuario
 from mcp_client_real import MCPAccountRelationsClient
 
+# Etapas del esquema oficial como plantillas parametrizadas: el SQL es el
+# mismo para todos los usuarios y los valores viajan tipados en el job_config
+TRANSACCIONES_ATO_DTO = register_template(
+    'oficial.transacciones_ato_dto',
+    """
+    WITH base_inicial AS (
+        SELECT 
+            res.USER_ID,
+            res.SENTENCE_DATE,
+            cus.CUS_RU_SINCE_DT as fecha_creacion_cuenta,
+            ABS(DATE_DIFF(CAST(CUS_RU_SINCE_DT AS DATE), SENTENCE_DATE, DAY)) as dias_cuenta_activa
+        FROM 
+            `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW` res
+        LEFT JOIN `meli-bi-data.WHOWNER.LK_CUS_CUSTOMERS_DATA` cus 
+            ON res.USER_ID = cus.CUS_CUST_ID
+        WHERE res.USER_ID = @user_id
+            AND res.infraction_type = 'CUENTA_DE_HACKER'
+        ORDER BY res.SENTENCE_DATE DESC
+        LIMIT 1
+    ),
+
+    trxs AS (
+        SELECT 
+            id_contraparte,
+            COUNT(DISTINCT bq.operation_id) AS cant_trans_marcadas, 
+            ROUND(SUM(bq.op_amt),2) as monto_marcado
+        FROM 
+            `SBOX_PFFINTECHATO.resumen_operaciones` a 
+        INNER JOIN base_inicial b 
+            ON CAST(a.id_contraparte AS STRING) = CAST(b.user_id AS STRING)
+        LEFT JOIN `meli-bi-data.SBOX_PFFINTECHATO.ato_bq` bq
+            ON a.id_operacion = bq.operation_id
+            AND bq.status_id = 'A'
+            AND bq.contramarca = 0
+            AND bq.flow_type NOT IN ('PI', 'MF')
+        WHERE id_contraparte NOT IN ('No es pago') 
+        GROUP BY id_contraparte
+    )
+
+    SELECT 
+        COALESCE(b.cant_trans_marcadas, 0) as transacciones_ato_dto,
+        COALESCE(b.monto_marcado, 0) as monto_ato_dto,
+        a.dias_cuenta_activa,
+        a.SENTENCE_DATE
+    FROM base_inicial a 
+    LEFT JOIN trxs b 
+        ON CAST(a.user_id AS STRING) = CAST(b.id_contraparte AS STRING)
+    """,
+    {'user_id': 'INT64'},
+    "Cantidad y monto ATO/DTO de la última sentencia CUENTA_DE_HACKER (query oficial)")
+
+PORCENTAJE_ATO_DTO = register_template(
+    'oficial.porcentaje_ato_dto',
+    """
+    WITH base AS (
+        SELECT 
+            USER_ID,
+            SENTENCE_DATE
+        FROM `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW`
+        WHERE USER_ID = @user_id
+            AND infraction_type = 'CUENTA_DE_HACKER'
+        ORDER BY SENTENCE_DATE DESC
+        LIMIT 1
+    )
+
+    SELECT 
+        COUNT(p.PAY_PAYMENT_ID) as cant_trans_total,
+        ROUND(SUM(PAY_TRANSACTION_DOL_AMT),2) as monto_recibido_total
+    FROM base h
+    INNER JOIN `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS` p
+        ON h.user_id = p.CUS_CUST_ID_SEL
+        AND p.pay_move_date >= DATE_SUB(h.SENTENCE_DATE, INTERVAL 90 DAY)
+        AND p.pay_move_date <= h.SENTENCE_DATE
+    WHERE p.pay_status_id NOT IN ('rejected', 'pending')
+        AND p.tpv_flag = 1
+    """,
+    {'user_id': 'INT64'},
+    "Pagos recibidos en los 90 días previos a la sentencia")
+
+MARCAS_RELEVANTES = register_template(
+    'oficial.marcas_relevantes',
+    """
+    SELECT 
+        marcas
+    FROM `meli-bi-data.SBOX_PFFINTECHATO.base_ato_escalabilidad_final`
+    WHERE CAST(user_id AS STRING) = CAST(@user_id AS STRING)
+        AND marcas IS NOT NULL
+    """,
+    {'user_id': 'INT64'},
+    "Marcas del usuario en base_ato_escalabilidad_final")
+
+DESCONOCIMIENTO = register_template(
+    'oficial.desconocimiento',
+    """
+    SELECT 
+        COUNT(*) as contactos,
+        MIN(fecha_apertura_caso) as primera_consulta,
+        MAX(fecha_apertura_caso) as ultima_consulta
+    FROM `meli-bi-data.SBOX_PFFINTECHATO.CONSULTAS_ATO`
+    WHERE GCA_CUST_ID = CAST(@user_id AS STRING)
+        AND subtype1 = 'cuenta_de_hacker'
+        AND DATE(fecha_apertura_caso) >= @sentence_date
+    """,
+    {'user_id': 'INT64', 'sentence_date': 'DATE'},
+    "Contactos en CONSULTAS_ATO desde la fecha de sentencia")
+
+# Las mismas etapas para una cohorte completa (analizar_cohorte): un job por
+# etapa con UNNEST(@user_ids) y una fila por usuario, identificada por user_id
+COHORTE_TRANSACCIONES_ATO_DTO = register_template(
+    'oficial.cohorte.transacciones_ato_dto',
+    """
+    WITH base_inicial AS (
+        SELECT USER_ID, SENTENCE_DATE, dias_cuenta_activa
+        FROM (
+            SELECT 
+                res.USER_ID,
+                res.SENTENCE_DATE,
+                ABS(DATE_DIFF(CAST(CUS_RU_SINCE_DT AS DATE), SENTENCE_DATE, DAY)) as dias_cuenta_activa,
+                ROW_NUMBER() OVER (PARTITION BY res.USER_ID ORDER BY res.SENTENCE_DATE DESC) as orden
+            FROM 
+                `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW` res
+            LEFT JOIN `meli-bi-data.WHOWNER.LK_CUS_CUSTOMERS_DATA` cus 
+                ON res.USER_ID = cus.CUS_CUST_ID
+            WHERE res.USER_ID IN UNNEST(@user_ids)
+                AND res.infraction_type = 'CUENTA_DE_HACKER'
+        )
+        WHERE orden = 1
+    ),
+
+    trxs AS (
+        SELECT 
+            id_contraparte,
+            COUNT(DISTINCT bq.operation_id) AS cant_trans_marcadas, 
+            ROUND(SUM(bq.op_amt),2) as monto_marcado
+        FROM 
+            `SBOX_PFFINTECHATO.resumen_operaciones` a 
+        INNER JOIN base_inicial b 
+            ON CAST(a.id_contraparte AS STRING) = CAST(b.user_id AS STRING)
+        LEFT JOIN `meli-bi-data.SBOX_PFFINTECHATO.ato_bq` bq
+            ON a.id_operacion = bq.operation_id
+            AND bq.status_id = 'A'
+            AND bq.contramarca = 0
+            AND bq.flow_type NOT IN ('PI', 'MF')
+        WHERE id_contraparte NOT IN ('No es pago') 
+        GROUP BY id_contraparte
+    )
+
+    SELECT 
+        a.USER_ID as user_id,
+        COALESCE(b.cant_trans_marcadas, 0) as transacciones_ato_dto,
+        COALESCE(b.monto_marcado, 0) as monto_ato_dto,
+        a.dias_cuenta_activa,
+        a.SENTENCE_DATE
+    FROM base_inicial a 
+    LEFT JOIN trxs b 
+        ON CAST(a.user_id AS STRING) = CAST(b.id_contraparte AS STRING)
+    """,
+    {'user_ids': 'ARRAY<INT64>'},
+    "Transacciones ATO/DTO de la última sentencia de cada usuario de la cohorte")
+
+COHORTE_PORCENTAJE_ATO_DTO = register_template(
+    'oficial.cohorte.porcentaje_ato_dto',
+    """
+    WITH base AS (
+        SELECT 
+            USER_ID,
+            MAX(SENTENCE_DATE) as SENTENCE_DATE
+        FROM `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW`
+        WHERE USER_ID IN UNNEST(@user_ids)
+            AND infraction_type = 'CUENTA_DE_HACKER'
+        GROUP BY USER_ID
+    )
+
+    SELECT 
+        h.USER_ID as user_id,
+        COUNT(p.PAY_PAYMENT_ID) as cant_trans_total,
+        ROUND(SUM(PAY_TRANSACTION_DOL_AMT),2) as monto_recibido_total
+    FROM base h
+    INNER JOIN `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS` p
+        ON h.user_id = p.CUS_CUST_ID_SEL
+        AND p.pay_move_date >= DATE_SUB(h.SENTENCE_DATE, INTERVAL 90 DAY)
+        AND p.pay_move_date <= h.SENTENCE_DATE
+    WHERE p.pay_status_id NOT IN ('rejected', 'pending')
+        AND p.tpv_flag = 1
+    GROUP BY h.USER_ID
+    """,
+    {'user_ids': 'ARRAY<INT64>'},
+    "Pagos recibidos en los 90 días previos a la sentencia, por usuario")
+
+COHORTE_MARCAS_RELEVANTES = register_template(
+    'oficial.cohorte.marcas_relevantes',
+    """
+    SELECT user_id, marcas
+    FROM (
+        SELECT 
+            CAST(user_id AS STRING) as user_id,
+            marcas,
+            ROW_NUMBER() OVER (PARTITION BY CAST(user_id AS STRING)) as orden
+        FROM `meli-bi-data.SBOX_PFFINTECHATO.base_ato_escalabilidad_final`
+        WHERE CAST(user_id AS STRING) IN UNNEST(@user_ids)
+            AND marcas IS NOT NULL
+    )
+    WHERE orden = 1
+    """,
+    {'user_ids': 'ARRAY<STRING>'},
+    "Marcas de cada usuario de la cohorte en base_ato_escalabilidad_final")
+
+COHORTE_DESCONOCIMIENTO = register_template(
+    'oficial.cohorte.desconocimiento',
+    """
+    WITH sentencias AS (
+        SELECT 
+            USER_ID,
+            MAX(SENTENCE_DATE) as SENTENCE_DATE
+        FROM `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW`
+        WHERE USER_ID IN UNNEST(@user_ids)
+            AND infraction_type = 'CUENTA_DE_HACKER'
+        GROUP BY USER_ID
+    )
+
+    SELECT 
+        s.USER_ID as user_id,
+        COUNT(c.GCA_CUST_ID) as contactos,
+        MIN(c.fecha_apertura_caso) as primera_consulta,
+        MAX(c.fecha_apertura_caso) as ultima_consulta
+    FROM sentencias s
+    LEFT JOIN `meli-bi-data.SBOX_PFFINTECHATO.CONSULTAS_ATO` c
+        ON c.GCA_CUST_ID = CAST(s.USER_ID AS STRING)
+        AND c.subtype1 = 'cuenta_de_hacker'
+        AND DATE(c.fecha_apertura_caso) >= s.SENTENCE_DATE
+    GROUP BY s.USER_ID
+    """,
+    {'user_ids': 'ARRAY<INT64>'},
+    "Contactos en CONSULTAS_ATO desde la última sentencia, por usuario")
+
+# Filas que devuelven las consultas agregadas por usuario cuando no hay datos
+# (COUNT = 0, SUM = NULL): la cohorte las completa para decidir igual
+_FILA_SIN_PAGOS = {'cant_trans_total': 0, 'monto_recibido_total': None}
+_FILA_SIN_CONTACTOS = {'contactos': 0, 'primera_consulta': None, 'ultima_consulta': None}
+# Usuarios por job de cohorte (BIGQUERY_COHORT_SIZE)
+TAMANO_LOTE = int(os.environ.get('BIGQUERY_COHORT_SIZE', 5000))
+
+
 class AnalizadorOficialCuentaHacker:
     """
     Analizador que implementa el esquema oficial MP paso a paso
@@ -19,6 +270,8 @@ class AnalizadorOficialCuentaHacker:
     def __init__(self):
         self.operations = None
         self.mcp_client = None
+        # Filas precargadas por analizar_cohorte: {etapa: {user_id: [filas]}}
+        self._lote = None
         
     async def initialize(self):
         """Inicializar conexiones a BigQuery y MCP"""
@@ -85,59 +338,131 @@ class AnalizadorOficialCuentaHacker:
         
         return resultado
     
-    async def _verificar_transacciones_ato_dto(self, user_id):
-        """Verificar cantidad y monto de transacciones ATO/DTO usando query oficial"""
-        
-        # Query basada en la proporcionada por el usuario
-        query = f"""
-        WITH base_inicial AS (
-            SELECT 
-                res.USER_ID,
-                res.SENTENCE_DATE,
-                cus.CUS_RU_SINCE_DT as fecha_creacion_cuenta,
-                ABS(DATE_DIFF(CAST(CUS_RU_SINCE_DT AS DATE), SENTENCE_DATE, DAY)) as dias_cuenta_activa
-            FROM 
-                `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW` res
-            LEFT JOIN `meli-bi-data.WHOWNER.LK_CUS_CUSTOMERS_DATA` cus 
-                ON res.USER_ID = cus.CUS_CUST_ID
-            WHERE res.USER_ID = {user_id}
-                AND res.infraction_type = 'CUENTA_DE_HACKER'
-            ORDER BY res.SENTENCE_DATE DESC
-            LIMIT 1
-        ),
+    async def analizar_cohorte(self, user_ids, tamano_lote=None, detalle=False):
+        """
+        ANÁLISIS OFICIAL de una cohorte de usuarios
+
+        En lugar de 4-5 consultas por usuario, cada etapa corre una sola vez
+        para toda la cohorte (UNNEST(@user_ids), de a tamano_lote usuarios
+        por job): primero las transacciones ATO/DTO y después, en paralelo,
+        porcentaje, marcas y desconocimiento solo para los usuarios cuyo
+        flujo llega a esa etapa. Las decisiones se toman con los mismos
+        flujos de analizar_usuario sobre las filas precargadas; los cruces
+        de riesgo (MCP Account Relations) siguen siendo por usuario.
+
+        Args:
+            user_ids: IDs de usuario (int o str)
+            tamano_lote: usuarios por job (BIGQUERY_COHORT_SIZE, 5000 por defecto)
+            detalle: imprimir el análisis paso a paso de cada usuario
+
+        Returns:
+            {user_id: resultado} con el mismo formato que analizar_usuario
+        """
+        tamano_lote = tamano_lote or TAMANO_LOTE
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        inicio = time.perf_counter()
         
-        trxs AS (
-            SELECT 
-                id_contraparte,
-                COUNT(DISTINCT bq.operation_id) AS cant_trans_marcadas, 
-                ROUND(SUM(bq.op_amt),2) as monto_marcado
-            FROM 
-                `SBOX_PFFINTECHATO.resumen_operaciones` a 
-            INNER JOIN base_inicial b 
-                ON CAST(a.id_contraparte AS STRING) = CAST(b.user_id AS STRING)
-            LEFT JOIN `meli-bi-data.SBOX_PFFINTECHATO.ato_bq` bq
-                ON a.id_operacion = bq.operation_id
-                AND bq.status_id = 'A'
-                AND bq.contramarca = 0
-                AND bq.flow_type NOT IN ('PI', 'MF')
-            WHERE id_contraparte NOT IN ('No es pago') 
-            GROUP BY id_contraparte
-        )
+        print("🏛️ ANALIZADOR OFICIAL CUENTA_HACKER - COHORTE")
+        print("=" * 80)
+        print(f"👥 USUARIOS: {len(user_ids)} (lotes de {tamano_lote})")
+        print("-" * 80)
         
-        SELECT 
-            COALESCE(b.cant_trans_marcadas, 0) as transacciones_ato_dto,
-            COALESCE(b.monto_marcado, 0) as monto_ato_dto,
-            a.dias_cuenta_activa,
-            a.SENTENCE_DATE
-        FROM base_inicial a 
-        LEFT JOIN trxs b 
-            ON CAST(a.user_id AS STRING) = CAST(b.id_contraparte AS STRING)
+        # ETAPA 1: transacciones ATO/DTO de toda la cohorte
+        transacciones = await self._consultar_cohorte(COHORTE_TRANSACCIONES_ATO_DTO, user_ids, tamano_lote)
+        print(f"🔍 Transacciones ATO/DTO: {sum(1 for filas in transacciones.values() if filas)} usuarios "
+              f"con sentencia CUENTA_DE_HACKER")
+        
+        # ETAPA 2: cada usuario necesita a lo sumo una de estas etapas según su flujo
+        flujo_1, flujo_2, mas_de_dos = [], [], []
+        for user_id in user_ids:
+            filas = transacciones.get(str(user_id))
+            if not filas:
+                continue
+            cantidad = filas[0].get('transacciones_ato_dto') or 0
+            dias = filas[0].get('dias_cuenta_activa')
+            if dias is None or dias <= 30:
+                continue
+            if cantidad == 1:
+                flujo_1.append(user_id)
+            elif cantidad >= 2:
+                flujo_2.append(user_id)
+                if cantidad > 2:
+                    mas_de_dos.append(user_id)
+        
+        porcentaje, marcas, desconocimiento = await asyncio.gather(
+            self._consultar_cohorte(COHORTE_PORCENTAJE_ATO_DTO, flujo_1, tamano_lote, [_FILA_SIN_PAGOS]),
+            self._consultar_cohorte(COHORTE_MARCAS_RELEVANTES, flujo_2, tamano_lote),
+            self._consultar_cohorte(COHORTE_DESCONOCIMIENTO, mas_de_dos, tamano_lote, [_FILA_SIN_CONTACTOS]))
+        print(f"📊 Porcentaje: {len(flujo_1)} | 🏷️ Marcas: {len(flujo_2)} | 📞 Desconocimiento: {len(mas_de_dos)}")
+        
+        # ETAPA 3: decisiones locales con los flujos oficiales
+        self._lote = {
+            'transacciones': transacciones,
+            'porcentaje': porcentaje,
+            'marcas': marcas,
+            'desconocimiento': desconocimiento,
+        }
+        resultados = {}
+        try:
+            for user_id in user_ids:
+                try:
+                    if detalle:
+                        resultados[user_id] = await self.analizar_usuario(user_id)
+                    else:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            resultados[user_id] = await self.analizar_usuario(user_id)
+                except BudgetExceededError:
+                    # Sin presupuesto se corta la cohorte entera
+                    raise
+                except Exception as e:
+                    resultados[user_id] = {'user_id': user_id, 'decision': 'ERROR', 'motivo': str(e)}
+        finally:
+            self._lote = None
+        
+        self._generar_reporte_cohorte(resultados, time.perf_counter() - inicio)
+        return resultados
+    
+    async def _consultar_cohorte(self, template, user_ids, tamano_lote, sin_filas=()):
         """
+        Filas de una plantilla de cohorte agrupadas por user_id (un job por
+        lote, en paralelo). Los usuarios sin filas reciben sin_filas (la
+        fila que devuelve la consulta agregada individual, o ninguna).
+        """
+        if not user_ids:
+            return {}
+        lotes = [user_ids[i:i + tamano_lote] for i in range(0, len(user_ids), tamano_lote)]
+        respuestas = await asyncio.gather(*(
+            run_template(self.operations, template, len(lote), user_ids=lote) for lote in lotes))
+        
+        filas = {}
+        for respuesta in respuestas:
+            if respuesta["status"] != "success":
+                raise RuntimeError(f"{template.name}: {respuesta.get('error', 'Error desconocido')}")
+            for row in respuesta["result"]["rows"]:
+                filas.setdefault(str(row['user_id']), []).append(row)
+        for user_id in user_ids:
+            filas.setdefault(str(user_id), [dict(fila) for fila in sin_filas])
+        return filas
+    
+    async def _filas_etapa(self, etapa, template, clave, **parametros):
+        """
+        Filas de una etapa para un usuario (clave): las precargadas por la
+        cohorte si las hay, si no una consulta individual con la plantilla
+        """
+        if self._lote is not None and str(clave) in self._lote.get(etapa, {}):
+            return self._lote[etapa][str(clave)]
+        result = await run_template(self.operations, template, 5, **parametros)
+        if result["status"] != "success":
+            raise RuntimeError(result.get("error", "Error desconocido"))
+        return result["result"]["rows"]
+    
+    async def _verificar_transacciones_ato_dto(self, user_id):
+        """Verificar cantidad y monto de transacciones ATO/DTO usando query oficial"""
         
         try:
-            result = await self.operations.execute_query(query, 5)
-            if result["status"] == "success" and result["result"]["rows"]:
-                data = result["result"]["rows"][0]
+            rows = await self._filas_etapa('transacciones', TRANSACCIONES_ATO_DTO, user_id, user_id=user_id)
+            if rows:
+                data = rows[0]
                 return {
                     'cantidad': data.get('transacciones_ato_dto', 0),
                     'monto': data.get('monto_ato_dto', 0),
@@ -147,6 +472,9 @@ class AnalizadorOficialCuentaHacker:
             else:
                 print("   ❌ No se encontraron datos del usuario")
                 return {'cantidad': 0, 'monto': 0, 'antiguedad': 0, 'sentence_date': None}
+        except BudgetExceededError:
+            # Sin presupuesto no hay decisión posible: no seguir con valores por defecto
+            raise
         except Exception as e:
             print(f"   ❌ Error en query: {e}")
             return {'cantidad': 0, 'monto': 0, 'antiguedad': 0, 'sentence_date': None}
@@ -240,9 +568,24 @@ class AnalizadorOficialCuentaHacker:
         
         print(f"   ✅ SÍ (>30 días) → Evaluar marcas relevantes")
         
+        # Las verificaciones de los pasos 2-6 no dependen entre sí: corren
+        # todas a la vez y, tomada la decisión, las pendientes se cancelan
+        async with StageScheduler() as etapas:
+            etapas.add('marcas', self._verificar_marcas_relevantes, user_id)
+            etapas.add('subgrafo', self._get_user_subgraph, user_id)
+            etapas.add('fraude', self._get_fraud_connections, user_id)
+            etapas.add('cruces', self._verificar_cruces_riesgo, user_id, depends_on=('subgrafo', 'fraude'))
+            etapas.add('velocidad', self._verificar_velocidad_retirada, user_id, sentence_date)
+            if transacciones_ato['cantidad'] > 2:
+                etapas.add('desconocimiento', self._verificar_desconocimiento, user_id, sentence_date)
+            return await self._decidir_flujo_multiples(user_id, transacciones_ato, etapas)
+    
+    async def _decidir_flujo_multiples(self, user_id, transacciones_ato, etapas):
+        """FLUJO 2, pasos 2-6: lee las etapas en el orden del esquema oficial"""
+        
         # Paso 2: Verificar marcas relevantes
         print(f"\n🏷️  PASO 2: Marcas relevantes")
-        marcas_relevantes = await self._verificar_marcas_relevantes(user_id)
+        marcas_relevantes = await etapas.result('marcas')
         
         if not marcas_relevantes['tiene_marcas']:
             print(f"   ❌ NO tiene marcas relevantes → CONFIRMAR HACKER")
@@ -259,7 +602,9 @@ class AnalizadorOficialCuentaHacker:
         
         # Paso 3: Verificar cruces de riesgo
         print(f"\n🔗 PASO 3: Cruces de riesgo")
-        cruces_riesgo = await self._verificar_cruces_riesgo(user_id)
+        print(f"   🔍 Evaluando cruces de riesgo...")
+        print(f"   📋 Usando Account Relations MCP para analizar conexiones")
+        cruces_riesgo = await etapas.result('cruces')
         
         if cruces_riesgo['tiene_cruces']:
             print(f"   ❌ SÍ tiene cruces de riesgo → CONFIRMAR HACKER")
@@ -276,7 +621,7 @@ class AnalizadorOficialCuentaHacker:
         
         # Paso 4: Verificar velocidad de retirada
         print(f"\n⚡ PASO 4: Velocidad de retirada < 6h")
-        velocidad = await self._verificar_velocidad_retirada(user_id, sentence_date)
+        velocidad = await etapas.result('velocidad')
         
         if velocidad['retirada_rapida']:
             print(f"   ❌ SÍ < 6h → CONFIRMAR HACKER")
@@ -309,7 +654,7 @@ class AnalizadorOficialCuentaHacker:
         
         # Paso 6: ¿Desconoce los pagos?
         print(f"\n📞 PASO 6: ¿Desconoce los pagos?")
-        desconocimiento = await self._verificar_desconocimiento(user_id, sentence_date)
+        desconocimiento = await etapas.result('desconocimiento')
         
         if desconocimiento['desconoce']:
             print(f"   ✅ SÍ desconoce → DESESTIMAR")
@@ -335,35 +680,10 @@ class AnalizadorOficialCuentaHacker:
     async def _calcular_porcentaje_ato_dto(self, user_id, sentence_date):
         """Calcular % de transacciones ATO/DTO vs total usando query oficial"""
         
-        # Query basada en la segunda parte de la query oficial proporcionada
-        query = f"""
-        WITH base AS (
-            SELECT 
-                USER_ID,
-                SENTENCE_DATE
-            FROM `meli-bi-data.WHOWNER.BT_RES_RESTRICTIONS_INFRACTIONS_NW`
-            WHERE USER_ID = {user_id}
-                AND infraction_type = 'CUENTA_DE_HACKER'
-            ORDER BY SENTENCE_DATE DESC
-            LIMIT 1
-        )
-        
-        SELECT 
-            COUNT(p.PAY_PAYMENT_ID) as cant_trans_total,
-            ROUND(SUM(PAY_TRANSACTION_DOL_AMT),2) as monto_recibido_total
-        FROM base h
-        INNER JOIN `meli-bi-data.WHOWNER.BT_MP_PAY_PAYMENTS` p
-            ON h.user_id = p.CUS_CUST_ID_SEL
-            AND p.pay_move_date >= DATE_SUB(h.SENTENCE_DATE, INTERVAL 90 DAY)
-            AND p.pay_move_date <= h.SENTENCE_DATE
-        WHERE p.pay_status_id NOT IN ('rejected', 'pending')
-            AND p.tpv_flag = 1
-        """
-        
         try:
-            result = await self.operations.execute_query(query, 5)
-            if result["status"] == "success" and result["result"]["rows"]:
-                data = result["result"]["rows"][0]
+            rows = await self._filas_etapa('porcentaje', PORCENTAJE_ATO_DTO, user_id, user_id=user_id)
+            if rows:
+                data = rows[0]
                 total_transacciones = data.get('cant_trans_total', 0)
                 monto_total = data.get('monto_recibido_total', 0)
                 
@@ -392,6 +712,8 @@ class AnalizadorOficialCuentaHacker:
                     'porcentaje_cantidad': 100,  # Si no hay transacciones totales, 100% es ATO/DTO
                     'porcentaje_monto': 100
                 }
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error calculando porcentajes: {e}")
             return {
@@ -440,19 +762,10 @@ class AnalizadorOficialCuentaHacker:
         print(f"   🔍 Consultando tabla base_ato_escalabilidad_final...")
         print(f"   📋 Marcas principales: {', '.join(marcas_buscadas[:5])}... (+{len(marcas_buscadas)-5} más)")
         
-        # Query en la nueva tabla
-        query = f"""
-        SELECT 
-            marcas
-        FROM `meli-bi-data.SBOX_PFFINTECHATO.base_ato_escalabilidad_final`
-        WHERE CAST(user_id AS STRING) = '{user_id}'
-            AND marcas IS NOT NULL
-        """
-        
         try:
-            result = await self.operations.execute_query(query, 5)
-            if result["status"] == "success" and result["result"]["rows"]:
-                data = result["result"]["rows"][0]
+            rows = await self._filas_etapa('marcas', MARCAS_RELEVANTES, user_id, user_id=user_id)
+            if rows:
+                data = rows[0]
                 marcas = data.get('marcas', '') or ''
                 
                 print(f"   📄 Marcas encontradas: {marcas}")
@@ -495,6 +808,8 @@ class AnalizadorOficialCuentaHacker:
                     'marcas_encontradas': [],
                     'marcas_completas': ''
                 }
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando marcas: {e}")
             return {
@@ -524,12 +839,16 @@ class AnalizadorOficialCuentaHacker:
     
     async def _get_user_subgraph(self, user_id):
         """Obtener subgrafo de relaciones usando Account Relations MCP"""
+        print(f"   🕸️  Extrayendo subgrafo de relaciones...")
         try:
             # Intentar usar MCP real primero
             if self.mcp_client and self.mcp_client.session_id:
                 print(f"   🔗 Obteniendo subgrafo MCP para usuario {user_id}...")
                 
-                subgraph_result = self.mcp_client.get_subgraph(
+                # El cliente MCP es HTTP bloqueante: en un thread, para que
+                # las demás etapas sigan corriendo
+                subgraph_result = await asyncio.to_thread(
+                    self.mcp_client.get_subgraph,
                     user_id, 
                     depth=2,
                     relations=["uses_device", "uses_card", "validate_phone", "validate_person", "withdrawal_bank_account"]
@@ -563,12 +882,13 @@ class AnalizadorOficialCuentaHacker:
     
     async def _get_fraud_connections(self, user_id):
         """Verificar conexiones con usuarios fraudulentos usando Account Relations MCP"""
+        print(f"   🚨 Verificando conexiones con usuarios fraudulentos...")
         try:
             # Intentar usar MCP real primero
             if self.mcp_client and self.mcp_client.session_id:
                 print(f"   🔗 Verificando conexiones a fraude MCP para usuario {user_id}...")
                 
-                fraud_result = self.mcp_client.get_hops_to_fraud(user_id, max_hops=3)
+                fraud_result = await asyncio.to_thread(self.mcp_client.get_hops_to_fraud, user_id, max_hops=3)
                 
                 if fraud_result and 'result' in fraud_result:
                     print(f"   ✅ Conexiones a fraude MCP obtenidas exitosamente")
@@ -634,20 +954,20 @@ class AnalizadorOficialCuentaHacker:
         
         return cruces_detectados
     
-    async def _verificar_cruces_riesgo(self, user_id):
-        """Verificar cruces de riesgo usando Account Relations MCP"""
-        
-        print(f"   🔍 Evaluando cruces de riesgo...")
-        print(f"   📋 Usando Account Relations MCP para analizar conexiones")
+    async def _verificar_cruces_riesgo(self, user_id, subgrafo=None, fraude=None):
+        """
+        Verificar cruces de riesgo usando Account Relations MCP
+
+        subgrafo y fraude son los resultados de _get_user_subgraph y
+        _get_fraud_connections (etapas previas); si faltan se consultan acá
+        """
         
         try:
             # 1. Obtener subgrafo de relaciones del usuario
-            print(f"   🕸️  Extrayendo subgrafo de relaciones...")
-            subgraph_result = await self._get_user_subgraph(user_id)
+            subgraph_result = subgrafo if subgrafo is not None else await self._get_user_subgraph(user_id)
             
             # 2. Verificar conexiones con usuarios fraudulentos
-            print(f"   🚨 Verificando conexiones con usuarios fraudulentos...")
-            fraud_connections = await self._get_fraud_connections(user_id)
+            fraud_connections = fraude if fraude is not None else await self._get_fraud_connections(user_id)
             
             # 3. Analizar tipos de cruces específicos
             cruces_detectados = self._analizar_tipos_cruces(subgraph_result, fraud_connections)
@@ -708,22 +1028,11 @@ class AnalizadorOficialCuentaHacker:
     async def _verificar_desconocimiento(self, user_id, sentence_date):
         """Verificar si el usuario se contactó desconociendo los pagos"""
         
-        # Query basada en la tabla CONSULTAS_ATO como indicó el usuario
-        query = f"""
-        SELECT 
-            COUNT(*) as contactos,
-            MIN(fecha_apertura_caso) as primera_consulta,
-            MAX(fecha_apertura_caso) as ultima_consulta
-        FROM `meli-bi-data.SBOX_PFFINTECHATO.CONSULTAS_ATO`
-        WHERE GCA_CUST_ID = '{user_id}'
-            AND subtype1 = 'cuenta_de_hacker'
-            AND fecha_apertura_caso > '{sentence_date}'
-        """
-        
         try:
-            result = await self.operations.execute_query(query, 5)
-            if result["status"] == "success" and result["result"]["rows"]:
-                data = result["result"]["rows"][0]
+            rows = await self._filas_etapa('desconocimiento', DESCONOCIMIENTO, user_id, user_id=user_id,
+                                           sentence_date=sentence_date)
+            if rows:
+                data = rows[0]
                 contactos = data.get('contactos', 0)
                 
                 desconoce = contactos > 0
@@ -744,6 +1053,8 @@ class AnalizadorOficialCuentaHacker:
                     'desconoce': False,
                     'contactos': 0
                 }
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"   ❌ Error verificando desconocimiento: {e}")
             return {
@@ -798,19 +1109,62 @@ class AnalizadorOficialCuentaHacker:
         print(f"📅 **FECHA:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 80)
 
+    def _generar_reporte_cohorte(self, resultados, segundos):
+        """Resumen de decisiones de una cohorte"""
+        
+        print("\n" + "=" * 80)
+        print("🏛️ REPORTE OFICIAL CUENTA_HACKER - COHORTE")
+        print("=" * 80)
+        
+        conteo = {}
+        for resultado in resultados.values():
+            conteo[resultado['decision']] = conteo.get(resultado['decision'], 0) + 1
+        for decision, cantidad in sorted(conteo.items(), key=lambda item: -item[1]):
+            print(f"   {decision:<20} {cantidad:>6} ({cantidad / len(resultados):.1%})")
+        
+        print(f"\n👤 {'USUARIO':<14} {'DECISIÓN':<18} {'FLUJO':<22} MOTIVO")
+        for user_id, resultado in resultados.items():
+            print(f"   {user_id:<14} {resultado['decision']:<18} {resultado.get('flujo', 'N/A'):<22} "
+                  f"{resultado['motivo']}")
+        
+        print(f"\n⏱️ {len(resultados)} usuarios en {segundos:.1f}s")
+        print("=" * 80)
+
+
+def leer_user_ids(argumentos):
+    """IDs de usuario de la línea de comandos: números o archivos (.txt uno por línea, .csv/.xlsx con USER_ID)"""
+    user_ids = []
+    for argumento in argumentos:
+        if not os.path.isfile(argumento):
+            user_ids.append(argumento)
+        elif argumento.endswith(('.csv', '.xlsx')):
+            import pandas as pd
+            
+            df = pd.read_csv(argumento) if argumento.endswith('.csv') else pd.read_excel(argumento)
+            columna = next(c for c in df.columns if str(c).upper() in ('USER_ID', 'CUS_CUST_ID', 'GCA_CUST_ID'))
+            user_ids.extend(df[columna].dropna().astype('int64').tolist())
+        else:
+            with open(argumento) as archivo:
+                user_ids.extend(linea.strip() for linea in archivo if linea.strip())
+    return user_ids
+
+
 async def main():
     """Función principal"""
     
-    if len(sys.argv) != 2:
+    if len(sys.argv) < 2:
         print("🏛️ ANALIZADOR OFICIAL CUENTA_HACKER - MERCADO PAGO")
         print("")
         print("📝 USO:")
         print("   python3 analizador_oficial_cuenta_hacker.py <USER_ID>")
+        print("   python3 analizador_oficial_cuenta_hacker.py <USER_ID> <USER_ID> ...   (cohorte)")
+        print("   python3 analizador_oficial_cuenta_hacker.py <archivo.txt|.csv|.xlsx>  (cohorte)")
         print("")
         print("🔍 EJEMPLOS:")
         print("   python3 analizador_oficial_cuenta_hacker.py 1348718991")
         print("   python3 analizador_oficial_cuenta_hacker.py 468290404")
         print("   python3 analizador_oficial_cuenta_hacker.py 375845668")
+        print("   python3 analizador_oficial_cuenta_hacker.py usuarios_se_contactan_COMPLETO.xlsx")
         print("")
         print("⚖️ FLUJOS IMPLEMENTADOS:")
         print("   🔄 FLUJO 1: Una transacción ATO/DTO")
@@ -819,7 +1173,8 @@ async def main():
         print("")
         return
     
-    user_id = sys.argv[1]
+    user_ids = leer_user_ids(sys.argv[1:])
+    user_id = user_ids[0] if user_ids else None
     
     analizador = AnalizadorOficialCuentaHacker()
     
@@ -828,14 +1183,33 @@ async def main():
         print("❌ No se pudo conectar a BigQuery")
         return
     
+    if len(user_ids) > 1 or os.path.isfile(sys.argv[1]):
+        try:
+            await analizador.analizar_cohorte(user_ids)
+            print_template_stats()
+            print_stats()
+        except BudgetExceededError as e:
+            print(f"\n{e}")
+        except Exception as e:
+            print(f"❌ Error en análisis de cohorte: {e}")
+            import traceback
+            traceback.print_exc()
+        print_spend()
+        return
+    
     try:
         resultado = await analizador.analizar_usuario(user_id)
         print(f"\n✅ ANÁLISIS OFICIAL COMPLETADO PARA USUARIO {user_id}")
+        print_template_stats()
+        print_stats()
         
+    except BudgetExceededError as e:
+        print(f"\n{e}")
     except Exception as e:
         print(f"❌ Error en análisis oficial: {e}")
         import traceback
         traceback.print_exc()
+    print_spend()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
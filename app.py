@@ -6,8 +6,11 @@ Procesa y compara fondos de imágenes usando técnicas de visión artificial
 import os
 import base64
 import io
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, url_for
 from flask_cors import CORS
 from PIL import Image, ImageFilter, ImageEnhance
 import cv2
@@ -15,6 +18,9 @@ from skimage import feature, filters, segmentation, measure
 from sklearn.metrics.pairwise import cosine_similarity
 from scipy.spatial.distance import euclidean
 import logging
+import weakref
+from static_assets import FrontendAssets, enable_response_compression
+from memory_admission import MemoryBudgetExceeded, estimate_decoded_bytes, image_memory_budget
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +29,8 @@ logger = logging.getLogger(__name__)
 # Inicializar Flask
 app = Flask(__name__)
 CORS(app)
+# Respuestas JSON comprimidas con gzip/brotli según Accept-Encoding
+enable_response_compression(app)
 
 # Configuración
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB máximo
@@ -36,44 +44,23 @@ os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 class BackgroundComparator:
     """Clase principal para comparar fondos de imágenes"""
     
-    def __init__(self):
+    def __init__(self, segmentation_mode=None):
         self.logger = logging.getLogger(__name__)
+        # 'fast': k-means sobre una versión reducida; 'full': k-means sobre todos los píxeles
+        self.segmentation_mode = segmentation_mode or os.environ.get('BACKGROUND_SEGMENTATION', 'fast')
+        self.fast_max_dimension = int(os.environ.get('BACKGROUND_SEGMENTATION_MAX_DIM', 160))
+        # Caché de máscaras por hash de contenido (LRU acotada)
+        self.mask_cache_size = int(os.environ.get('BACKGROUND_MASK_CACHE_SIZE', 64))
+        self._mask_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def extract_background(self, image_array):
         """
         Extrae el fondo de una imagen usando segmentación
         """
         try:
-            # Convertir a RGB si es necesario
-            if len(image_array.shape) == 3 and image_array.shape[2] == 3:
-                # Convertir RGB a BGR para OpenCV
-                image_bgr = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-            else:
-                image_bgr = image_array
-            
-            # Redimensionar para procesamiento más rápido
-            height, width = image_bgr.shape[:2]
-            max_dimension = 800
-            if max(height, width) > max_dimension:
-                scale = max_dimension / max(height, width)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                image_bgr = cv2.resize(image_bgr, (new_width, new_height))
-            
-            # Método 1: Segmentación por clustering
-            background_mask = self._segment_by_clustering(image_bgr)
-            
-            # Método 2: Detección de bordes para mejorar la máscara
-            edges = cv2.Canny(image_bgr, 50, 150)
-            edges_dilated = cv2.dilate(edges, np.ones((3,3), np.uint8), iterations=1)
-            
-            # Combinar máscaras
-            combined_mask = cv2.bitwise_and(background_mask, cv2.bitwise_not(edges_dilated))
-            
-            # Aplicar filtros morfológicos para limpiar la máscara
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-            combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
-            combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel)
+            image_bgr = self._prepare_image(image_array)
+            combined_mask, _ = self._background_mask(image_bgr)
             
             # Extraer fondo
             background = cv2.bitwise_and(image_bgr, image_bgr, mask=combined_mask)
@@ -85,6 +72,102 @@ class BackgroundComparator:
             # Retornar imagen original como fallback
             return image_array, np.ones(image_array.shape[:2], dtype=np.uint8) * 255
     
+    def extract_backgrounds(self, image1, image2):
+        """
+        Extrae los fondos de un par de imágenes reutilizando los centros
+        de color de la primera como punto de partida de la segunda
+        """
+        try:
+            image1_bgr = self._prepare_image(image1)
+            image2_bgr = self._prepare_image(image2)
+            
+            mask1, clusters = self._background_mask(image1_bgr)
+            mask2, _ = self._background_mask(image2_bgr, reference_clusters=clusters)
+            
+            background1 = cv2.bitwise_and(image1_bgr, image1_bgr, mask=mask1)
+            background2 = cv2.bitwise_and(image2_bgr, image2_bgr, mask=mask2)
+            
+            return (background1, mask1), (background2, mask2)
+            
+        except Exception as e:
+            self.logger.error(f"Error extrayendo fondos del par: {e}")
+            return self.extract_background(image1), self.extract_background(image2)
+    
+    def _prepare_image(self, image_array):
+        """Convierte a BGR y redimensiona para procesamiento más rápido"""
+        # Convertir a RGB si es necesario
+        if len(image_array.shape) == 3 and image_array.shape[2] == 3:
+            # Convertir RGB a BGR para OpenCV
+            image_bgr = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+        else:
+            image_bgr = image_array
+        
+        # Redimensionar para procesamiento más rápido
+        height, width = image_bgr.shape[:2]
+        max_dimension = 800
+        if max(height, width) > max_dimension:
+            scale = max_dimension / max(height, width)
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            image_bgr = cv2.resize(image_bgr, (new_width, new_height))
+        
+        return image_bgr
+    
+    def _background_mask(self, image_bgr, reference_clusters=None):
+        """
+        Máscara de fondo (clustering + bordes + morfología) con caché por contenido
+        
+        En modo rápido los centros de referencia cambian el resultado, así que
+        forman parte de la clave. Lo que sale de la caché es de solo lectura:
+        los mismos arrays se devuelven a todas las requests que la aciertan
+        
+        Returns:
+            (máscara, (centros LAB, compactness por píxel) del k-means o None)
+        """
+        cache_key = None
+        if self.mask_cache_size > 0:
+            digest = hashlib.blake2b(image_bgr.tobytes(), digest_size=16)
+            digest.update(str(image_bgr.shape).encode())
+            if reference_clusters is not None and self.segmentation_mode == 'fast':
+                reference_centers, reference_compactness = reference_clusters
+                digest.update(np.float32(reference_centers).tobytes())
+                digest.update(repr(float(reference_compactness)).encode())
+            cache_key = (self.segmentation_mode, digest.hexdigest())
+            with self._cache_lock:
+                cached = self._mask_cache.get(cache_key)
+                if cached is not None:
+                    self._mask_cache.move_to_end(cache_key)
+                    return cached
+        
+        # Método 1: Segmentación por clustering
+        if self.segmentation_mode == 'fast' and len(image_bgr.shape) == 3:
+            background_mask, clusters = self._segment_by_clustering_fast(image_bgr, reference_clusters)
+        else:
+            background_mask, clusters = self._segment_by_clustering(image_bgr), None
+        
+        # Método 2: Detección de bordes para mejorar la máscara
+        edges = cv2.Canny(image_bgr, 50, 150)
+        edges_dilated = cv2.dilate(edges, np.ones((3,3), np.uint8), iterations=1)
+        
+        # Combinar máscaras
+        combined_mask = cv2.bitwise_and(background_mask, cv2.bitwise_not(edges_dilated))
+        
+        # Aplicar filtros morfológicos para limpiar la máscara
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
+        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel)
+        
+        if cache_key is not None:
+            combined_mask.flags.writeable = False
+            if clusters is not None:
+                clusters[0].flags.writeable = False
+            with self._cache_lock:
+                self._mask_cache[cache_key] = (combined_mask, clusters)
+                while len(self._mask_cache) > self.mask_cache_size:
+                    self._mask_cache.popitem(last=False)
+        
+        return combined_mask, clusters
+    
     def _segment_by_clustering(self, image):
         """Segmentación por clustering K-means"""
         try:
@@ -114,6 +197,83 @@ class BackgroundComparator:
             self.logger.error(f"Error en clustering: {e}")
             return np.ones(image.shape[:2], dtype=np.uint8) * 255
     
+    def _segment_by_clustering_fast(self, image, reference_clusters=None):
+        """
+        Segmentación K-means rápida: agrupa una versión reducida de la imagen
+        y asigna cada píxel de la resolución completa al centro más cercano
+        
+        Si se pasan los clusters de la otra imagen del par, sus centros se
+        refinan con unas pocas iteraciones en lugar de repetir el k-means
+        completo; si el resultado queda mucho menos compacto (fondos de
+        colores distintos) se vuelve al k-means normal.
+        """
+        try:
+            lab_image = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+            height, width = lab_image.shape[:2]
+            
+            # Nivel reducido (equivalente a un nivel de pirámide) para el clustering
+            scale = min(1.0, self.fast_max_dimension / max(height, width))
+            if scale < 1.0:
+                small = cv2.resize(lab_image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            else:
+                small = lab_image
+            sample = np.float32(small.reshape((-1, 3)))
+            
+            k = 4  # Número de clusters
+            centers = None
+            if reference_clusters is not None:
+                reference_centers, reference_compactness = reference_clusters
+                centers = self._refine_centers(sample, np.float32(reference_centers))
+                compactness = self._compactness(sample, centers)
+                if compactness > reference_compactness * 1.5 + 1.0:
+                    centers = None
+            if centers is None:
+                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+                total, _, centers = cv2.kmeans(sample, k, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+                compactness = total / len(sample)
+            
+            # Asignar etiquetas en resolución completa por centro más cercano
+            labels = self._nearest_center(np.float32(lab_image.reshape((-1, 3))), centers)
+            
+            # Crear máscara para el cluster más grande (probablemente el fondo)
+            counts = np.bincount(labels, minlength=k)
+            background_cluster = int(np.argmax(counts))
+            mask = np.where(labels == background_cluster, 255, 0).astype(np.uint8)
+            
+            return mask.reshape(height, width), (centers, compactness)
+            
+        except Exception as e:
+            self.logger.error(f"Error en clustering rápido: {e}")
+            return self._segment_by_clustering(image), None
+    
+    @staticmethod
+    def _nearest_center(data, centers):
+        """Índice del centro más cercano para cada fila de data"""
+        # |x - c|^2 = |x|^2 - 2 x·c + |c|^2; |x|^2 no cambia el argmin
+        distances = (centers ** 2).sum(axis=1) - 2.0 * (data @ centers.T)
+        return np.argmin(distances, axis=1)
+    
+    def _compactness(self, sample, centers):
+        """Distancia cuadrática media de la muestra a su centro más cercano"""
+        labels = self._nearest_center(sample, centers)
+        return float(np.mean(((sample - centers[labels]) ** 2).sum(axis=1)))
+    
+    def _refine_centers(self, sample, centers, iterations=5):
+        """Iteraciones de Lloyd sobre la muestra partiendo de centros dados"""
+        for _ in range(iterations):
+            labels = self._nearest_center(sample, centers)
+            counts = np.bincount(labels, minlength=len(centers))
+            sums = np.stack([np.bincount(labels, weights=sample[:, c], minlength=len(centers))
+                             for c in range(sample.shape[1])], axis=1)
+            occupied = counts > 0
+            updated = centers.copy()
+            updated[occupied] = sums[occupied] / counts[occupied, None]
+            if np.abs(updated - centers).max() < 1.0:
+                return updated
+            centers = updated
+        return centers
+    
     def extract_features(self, image_array):
         """
         Extrae características visuales de una imagen
@@ -334,55 +494,189 @@ class BackgroundComparator:
 # Instancia global del comparador
 comparator = BackgroundComparator()
 
-def load_image_from_upload(file):
-    """Carga una imagen desde un archivo subido"""
+def load_images_from_upload(*files):
+    """Carga las imágenes de los archivos subidos
+    
+    Reserva de una sola vez la memoria estimada de todas antes de decodificar:
+    reservar imagen por imagen dejaría a una request reteniendo la primera
+    mientras espera lugar para la segunda. La parte de cada imagen se libera
+    cuando su array deja de usarse
+    """
     try:
-        # Leer imagen
-        image = Image.open(file.stream)
+        # PIL decodificado + copia RGB (si hace falta) + array numpy
+        estimates = [estimate_decoded_bytes(file.stream, rgb_copies=2)[0] for file in files]
+        image_memory_budget.reserve(sum(estimates))
         
-        # Convertir a RGB si es necesario
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        pending = sum(estimates)
+        try:
+            image_arrays = []
+            for file, estimated_bytes in zip(files, estimates):
+                # Leer imagen
+                image = Image.open(file.stream)
+                
+                # Convertir a RGB si es necesario
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                
+                # Convertir a array numpy
+                image_array = np.array(image)
+                
+                # El array vive durante toda la comparación: se libera al recolectarlo
+                weakref.finalize(image_array, image_memory_budget.release, estimated_bytes)
+                pending -= estimated_bytes
+                image_arrays.append(image_array)
+        except Exception:
+            image_memory_budget.release(pending)
+            raise
         
-        # Convertir a array numpy
-        image_array = np.array(image)
-        
-        return image_array
+        return image_arrays
         
     except Exception as e:
         logger.error(f"Error cargando imagen: {e}")
         raise
 
+def encode_image(image_array, image_format='JPEG'):
+    """Codifica un array numpy como JPEG/PNG"""
+    # Asegurarse de que esté en formato uint8
+    if image_array.dtype != np.uint8:
+        image_array = np.clip(image_array, 0, 255).astype(np.uint8)
+    
+    # Convertir a PIL Image
+    image = Image.fromarray(image_array)
+    
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, format='JPEG', quality=85)
+    else:
+        image.save(buffer, format=image_format)
+    
+    return buffer.getvalue()
+
 def array_to_base64(image_array):
     """Convierte un array numpy a string base64"""
     try:
-        # Asegurarse de que esté en formato uint8
-        if image_array.dtype != np.uint8:
-            image_array = np.clip(image_array, 0, 255).astype(np.uint8)
-        
-        # Convertir a PIL Image
-        image = Image.fromarray(image_array)
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=85)
-        buffer.seek(0)
-        
-        return base64.b64encode(buffer.getvalue()).decode()
+        return base64.b64encode(encode_image(image_array)).decode()
         
     except Exception as e:
         logger.error(f"Error convirtiendo a base64: {e}")
         return None
 
+class ArtifactCache:
+    """
+    Caché acotada de artefactos visuales (fondos, máscaras, mapas de bordes)
+    
+    Al comparar solo se registra el array fuente bajo su hash de contenido;
+    la imagen se codifica recién cuando el cliente la pide y queda guardada
+    para los siguientes pedidos. Se desalojan las entradas menos usadas
+    cuando se supera el presupuesto de bytes; un array compartido por varias
+    entradas (el fondo y sus bordes) se cuenta una sola vez.
+    """
+    
+    # tipo de artefacto -> (formato, mimetype)
+    FORMATS = {
+        'background': ('JPEG', 'image/jpeg'),
+        'mask': ('PNG', 'image/png'),
+        'edges': ('PNG', 'image/png'),
+    }
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # id(array) -> entradas que lo referencian
+        self._array_refs = {}
+        self._lock = threading.Lock()
+    
+    def register(self, kind, image_array):
+        """Registra un artefacto sin codificarlo y devuelve su id"""
+        digest = hashlib.blake2b(image_array.tobytes(), digest_size=16)
+        digest.update(f"{kind}:{image_array.shape}:{image_array.dtype}".encode())
+        artifact_id = f"{kind}-{digest.hexdigest()}"
+        
+        with self._lock:
+            if artifact_id in self._entries:
+                self._entries.move_to_end(artifact_id)
+                return artifact_id
+            self._entries[artifact_id] = {'kind': kind, 'array': image_array, 'encoded': None}
+            references = self._array_refs.get(id(image_array), 0)
+            if references == 0:
+                self._bytes += image_array.nbytes
+            self._array_refs[id(image_array)] = references + 1
+            self._evict()
+        
+        return artifact_id
+    
+    def get(self, artifact_id):
+        """Bytes codificados y mimetype del artefacto (None si fue desalojado)"""
+        with self._lock:
+            entry = self._entries.get(artifact_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(artifact_id)
+            encoded = entry['encoded']
+            array = entry['array']
+        
+        image_format, mimetype = self.FORMATS[entry['kind']]
+        if encoded is None:
+            # Codificar fuera del lock: es lo costoso
+            encoded = encode_image(self._render(entry['kind'], array), image_format)
+            with self._lock:
+                if artifact_id in self._entries and self._entries[artifact_id]['encoded'] is None:
+                    self._entries[artifact_id]['encoded'] = encoded
+                    self._bytes += len(encoded)
+                    self._evict()
+        
+        return encoded, mimetype
+    
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+    
+    @staticmethod
+    def _render(kind, image_array):
+        """Array a codificar según el tipo de artefacto"""
+        if kind == 'edges':
+            gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY) if len(image_array.shape) == 3 else image_array
+            return cv2.Canny(gray, 50, 150)
+        return image_array
+    
+    def _evict(self):
+        # Siempre se conserva la última entrada aunque sola supere el presupuesto
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            array = entry['array']
+            references = self._array_refs.pop(id(array)) - 1
+            if references:
+                self._array_refs[id(array)] = references
+            else:
+                self._bytes -= array.nbytes
+            if entry['encoded'] is not None:
+                self._bytes -= len(entry['encoded'])
+
+# Artefactos de visualización generados bajo demanda
+artifacts = ArtifactCache(int(os.environ.get('ARTIFACT_CACHE_BYTES', 64 * 1024 * 1024)))
+
+def artifact_urls(background, mask):
+    """Registra los artefactos de una imagen y devuelve sus URLs"""
+    return {
+        kind: url_for('get_artifact', artifact_id=artifacts.register(kind, array))
+        for kind, array in (('background', background), ('mask', mask), ('edges', background))
+    }
+
+# main.html, main.css y main.js se construyen una sola vez con hash de contenido
+frontend = FrontendAssets('.', 'main.html')
+
 @app.route('/')
 def index():
     """Servir la página principal"""
-    return send_from_directory('.', 'main.html')
+    if frontend.page is None:
+        return send_from_directory('.', 'main.html')
+    return frontend.page_response()
 
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Servir archivos estáticos"""
-    return send_from_directory('.', filename)
+    return frontend.serve(filename)
 
 @app.route('/api/compare-backgrounds', methods=['POST'])
 def compare_backgrounds():
@@ -401,14 +695,12 @@ def compare_backgrounds():
         logger.info("Iniciando comparación de fondos...")
         
         # Cargar imágenes
-        image1 = load_image_from_upload(file1)
-        image2 = load_image_from_upload(file2)
+        image1, image2 = load_images_from_upload(file1, file2)
         
         logger.info(f"Imágenes cargadas: {image1.shape}, {image2.shape}")
         
-        # Extraer fondos
-        background1, mask1 = comparator.extract_background(image1)
-        background2, mask2 = comparator.extract_background(image2)
+        # Extraer fondos (el par comparte los centros del clustering)
+        (background1, mask1), (background2, mask2) = comparator.extract_backgrounds(image1, image2)
         
         logger.info("Fondos extraídos")
         
@@ -423,29 +715,58 @@ def compare_backgrounds():
         
         logger.info(f"Similitudes calculadas: {similarities}")
         
-        # Convertir fondos procesados a base64
-        processed_img1_b64 = array_to_base64(background1)
-        processed_img2_b64 = array_to_base64(background2)
+        # Los fondos procesados se codifican recién cuando el cliente los pide
+        artifacts1 = artifact_urls(background1, mask1)
+        artifacts2 = artifact_urls(background2, mask2)
         
         # Preparar respuesta
         response = {
-            'overall_similarity': similarities['overall'],
-            'color_similarity': similarities['color'],
-            'texture_similarity': similarities['texture'],
-            'structural_similarity': similarities['structural'],
-            'shape_similarity': similarities['shape'],
-            'processed_image1': processed_img1_b64,
-            'processed_image2': processed_img2_b64,
+            'overall_similarity': float(similarities['overall']),
+            'color_similarity': float(similarities['color']),
+            'texture_similarity': float(similarities['texture']),
+            'structural_similarity': float(similarities['structural']),
+            'shape_similarity': float(similarities['shape']),
+            'processed_image1_url': artifacts1['background'],
+            'processed_image2_url': artifacts2['background'],
+            'artifacts': {'image1': artifacts1, 'image2': artifacts2},
             'message': 'Comparación completada exitosamente'
         }
         
         logger.info("Comparación completada")
         return jsonify(response)
         
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"Imagen rechazada por memoria: {e}")
+        response = jsonify({'error': str(e)})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503 if e.retry_after else 413
+        
     except Exception as e:
         logger.error(f"Error en comparación: {e}")
         return jsonify({'error': f'Error procesando imágenes: {str(e)}'}), 500
 
+@app.route('/api/artifacts/<artifact_id>', methods=['GET'])
+def get_artifact(artifact_id):
+    """Sirve un artefacto visual (ETag = hash de contenido, soporta Range)"""
+    try:
+        artifact = artifacts.get(artifact_id)
+        if artifact is None:
+            return jsonify({'error': 'Artefacto no encontrado o expirado'}), 404
+        
+        data, mimetype = artifact
+        return send_file(io.BytesIO(data), mimetype=mimetype, etag=artifact_id,
+                         conditional=True, max_age=3600)
+        
+    except Exception as e:
+        logger.error(f"Error generando artefacto {artifact_id}: {e}")
+        return jsonify({'error': 'Error generando artefacto'}), 500
+
+@app.route('/api/metrics/memory', methods=['GET'])
+def memory_metrics():
+    """Bytes reservados (actual y pico) del presupuesto de decodificación"""
+    return jsonify(image_memory_budget.metrics())
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint de verificación de salud"""
@@ -13,8 +13,10 @@ from collections import Counter
 import math
 
 try:
-    from flask import Flask, send_from_directory, jsonify, request
+    from flask import Flask, jsonify, request
     from flask_cors import CORS
+    from static_assets import FrontendAssets, enable_response_compression
+    from service_lifecycle import ServiceLifecycle, synthetic_image
     from PIL import Image, ImageStat, ImageFilter, ImageChops
 except ImportError:
     print("❌ Dependencias no instaladas")
@@ -23,6 +25,8 @@ except ImportError:
 
 app = Flask(__name__)
 CORS(app)
+# Respuestas JSON comprimidas con gzip/brotli según Accept-Encoding
+enable_response_compression(app)
 
 class FastImageComparator:
     """Comparador rápido de imágenes sin extracción de fondos"""
@@ -236,14 +240,18 @@ class FastImageComparator:
 # Instancia global del comparador
 comparator = FastImageComparator()
 
-@app.route('/')
-def index():
-    """Servir la página principal"""
-    if os.path.exists('main.html'):
-        return send_from_directory('.', 'main.html')
-    else:
-        # HTML optimizado sin fondos extraídos
-        return """
+def warm_up_comparator():
+    """Par distinto e idéntico por compare_images_fast (todas las ramas)"""
+    image1, image2 = synthetic_image(1), synthetic_image(2)
+    comparator.compare_images_fast(image1, image2)
+    comparator.compare_images_fast(image1, image1.copy())
+
+# /api/health/live y /api/health/ready (listo recién después del warm-up)
+lifecycle = ServiceLifecycle('app_rapido')
+lifecycle.add_step('comparison', warm_up_comparator)
+lifecycle.register(app)
+
+FALLBACK_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -441,10 +449,19 @@ def index():
 </html>
         """
 
+# UI construida una sola vez: main.html (o el HTML integrado) y sus assets
+# con hash de contenido, precomprimidos y con ETag
+frontend = FrontendAssets('.', 'main.html', fallback_html=FALLBACK_HTML)
+
+@app.route('/')
+def index():
+    """Servir la página principal"""
+    return frontend.page_response()
+
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Servir archivos estáticos"""
-    return send_from_directory('.', filename)
+    return frontend.serve(filename)
 
 @app.route('/api/compare-backgrounds', methods=['POST'])
 def compare_backgrounds():
@@ -495,9 +512,10 @@ def compare_backgrounds():
 
 @app.route('/api/health')
 def health():
-    """Verificación de salud"""
+    """Verificación de salud (ver /api/health/ready para el estado de warm-up)"""
     return jsonify({
         'status': 'ok', 
+        'ready': lifecycle.ready,
         'port': 8080, 
         'version': 'rapido',
         'message': 'Comparación ultra-rápida sin extracción de fondos'
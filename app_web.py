@@ -4,635 +4,46 @@ Comparador de Imágenes Web con Machine Learning
 Versión optimizada para despliegue en producción
 """
 
+import io
 import os
 import time
 import logging
+import threading
+import tempfile
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from PIL import Image, ImageStat, ImageChops
+from PIL import Image
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 import joblib
+from image_kernels import kernels, warm_up as warm_up_kernels
+from static_assets import StaticAsset, asset_response, enable_response_compression
+from memory_admission import MemoryBudgetExceeded, image_memory_budget
+from streaming_upload import StreamingUploadRequest, upload_digest
+from video_comparison import VideoBackgroundComparator, open_frame_source, video_comparison_settings
+from exif_thumbnail import screening_image, screening_hashes, compare_screening_hashes
+from fast_comparator import FastImageComparator
+from comparison_engine import build_engine, UnknownProfile
+from service_lifecycle import ServiceLifecycle, synthetic_image, synthetic_jpeg
+from werkzeug.exceptions import HTTPException
+from medical_feedback import (FeedbackStore, ModelRegistry, BackgroundRetrainer,
+                              retraining_settings, BASE_MODEL_VERSION)
 
 # Configurar logging para producción
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class WebUploadRequest(StreamingUploadRequest):
+    """Uploads de la app: solo imágenes, salvo en la comparación de videos"""
+    video_paths = frozenset({'/api/compare-video'})
+
 app = Flask(__name__)
+# Uploads directo a memoria (con límites, hash y verificación de firma), sin archivos temporales
+app.request_class = WebUploadRequest
 CORS(app)
-
-class FastImageComparator:
-    """Comparador rápido de imágenes optimizado para web"""
-    
-    def load_image(self, file_stream):
-        """Carga y normaliza una imagen rápidamente"""
-        try:
-            image = Image.open(file_stream)
-            
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Redimensionar para comparación rápida
-            max_size = 600
-            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            return image
-        except Exception as e:
-            logger.error(f"Error cargando imagen: {e}")
-            return None
-    
-    def compare_images_fast(self, image1, image2):
-        """Comparación específica de fondos, ignorando personas centrales"""
-        try:
-            results = {}
-            
-            # 1. Comparación de BORDES (donde está el fondo)
-            results['edge_similarity'] = self._compare_background_edges(image1, image2)
-            
-            # 2. Comparación de TEXTURAS (ladrillos, superficies)
-            results['texture_similarity'] = self._compare_background_textures(image1, image2)
-            
-            # 3. Comparación de COLORES dominantes del fondo
-            results['color_similarity'] = self._compare_background_colors(image1, image2)
-            
-            # 4. Hash perceptual de áreas NO centrales
-            results['background_hash'] = self._compare_background_hash(image1, image2)
-            
-            # 5. Análisis estructural de elementos fijos (puertas, ventanas)
-            results['structural_similarity'] = self._compare_fixed_elements(image1, image2)
-            
-            # Cálculo especializado para fondos
-            overall = self._calculate_background_similarity(results)
-            results['overall_similarity'] = overall
-            
-            # Generar conclusión descriptiva
-            results['conclusion'] = self._generate_background_conclusion(overall)
-            
-            # Mantener compatibilidad con frontend
-            results['pixel_similarity'] = results['edge_similarity']
-            results['hash_similarity'] = results['background_hash']
-            results['stats_similarity'] = results['texture_similarity']
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Error comparando fondos: {e}")
-            return self._default_results()
-    
-    def _generate_background_conclusion(self, similarity_percentage):
-        """Genera conclusión descriptiva basada en el porcentaje de similitud"""
-        # Convertir a porcentaje si está en decimal
-        if similarity_percentage <= 1.0:
-            percentage = similarity_percentage * 100
-        else:
-            percentage = similarity_percentage
-        
-        if percentage >= 85:
-            return {
-                'category': 'iguales',
-                'description': '🟢 Fondos prácticamente iguales',
-                'detail': f'Los fondos son muy similares ({percentage:.1f}%). Misma ubicación o condiciones muy parecidas.'
-            }
-        elif percentage >= 60:
-            return {
-                'category': 'similares',
-                'description': '🟡 Fondos similares',
-                'detail': f'Los fondos comparten características importantes ({percentage:.1f}%). Posiblemente misma zona o tipo de ambiente.'
-            }
-        elif percentage >= 35:
-            return {
-                'category': 'parcialmente_similares',
-                'description': '🟠 Fondos parcialmente similares',
-                'detail': f'Los fondos tienen algunas similitudes ({percentage:.1f}%). Algunos elementos en común pero diferencias notables.'
-            }
-        elif percentage >= 15:
-            return {
-                'category': 'diferentes',
-                'description': '🔴 Fondos diferentes',
-                'detail': f'Los fondos son claramente diferentes ({percentage:.1f}%). Ubicaciones o ambientes distintos.'
-            }
-        else:
-            return {
-                'category': 'muy_diferentes',
-                'description': '🔴 Fondos muy diferentes',
-                'detail': f'Los fondos son completamente diferentes ({percentage:.1f}%). Ubicaciones totalmente distintas.'
-            }
-    
-    def _compare_background_edges(self, img1, img2):
-        """Compara los bordes de las imágenes donde está el fondo"""
-        try:
-            # Redimensionar para análisis
-            size = (300, 200)
-            img1_resized = img1.resize(size, Image.Resampling.LANCZOS)
-            img2_resized = img2.resize(size, Image.Resampling.LANCZOS)
-            
-            # Extraer bordes (donde normalmente está el fondo)
-            w, h = size
-            border_size = 50  # Ancho del borde a analizar
-            
-            # Extraer regiones de borde
-            def extract_borders(img):
-                borders = []
-                # Borde superior
-                borders.append(img.crop((0, 0, w, border_size)))
-                # Borde inferior  
-                borders.append(img.crop((0, h-border_size, w, h)))
-                # Borde izquierdo
-                borders.append(img.crop((0, 0, border_size, h)))
-                # Borde derecho
-                borders.append(img.crop((w-border_size, 0, w, h)))
-                return borders
-            
-            borders1 = extract_borders(img1_resized)
-            borders2 = extract_borders(img2_resized)
-            
-            # Comparar cada borde
-            total_similarity = 0
-            for b1, b2 in zip(borders1, borders2):
-                # Comparar histogramas de cada borde
-                hist1 = b1.histogram()
-                hist2 = b2.histogram()
-                
-                # Correlación de histogramas
-                correlation = 0
-                total1 = sum(hist1) or 1
-                total2 = sum(hist2) or 1
-                
-                for h1, h2 in zip(hist1, hist2):
-                    correlation += min(h1/total1, h2/total2)
-                
-                total_similarity += correlation
-            
-            # Promedio de todos los bordes
-            edge_similarity = total_similarity / len(borders1)
-            
-            # BOOST CONSERVADOR solo para bordes realmente similares
-            if edge_similarity > 0.6:  # Umbral más alto
-                edge_similarity = min(1.0, edge_similarity * 1.15)  # Menos boost
-            
-            return min(1.0, edge_similarity)
-            
-        except Exception as e:
-            logger.error(f"Error en bordes: {e}")
-            return 0.0
-
-    def _compare_background_textures(self, img1, img2):
-        """Compara texturas del fondo (ladrillos, superficies)"""
-        try:
-            # Convertir a escala de grises para análisis de textura
-            gray1 = img1.convert('L').resize((200, 150), Image.Resampling.LANCZOS)
-            gray2 = img2.convert('L').resize((200, 150), Image.Resampling.LANCZOS)
-            
-            # Aplicar filtro para detectar texturas
-            from PIL import ImageFilter
-            edge1 = gray1.filter(ImageFilter.FIND_EDGES)
-            edge2 = gray2.filter(ImageFilter.FIND_EDGES)
-            
-            # Comparar patrones de bordes/texturas
-            pixels1 = list(edge1.getdata())
-            pixels2 = list(edge2.getdata())
-            
-            # Calcular similitud de patrones (MÁS TOLERANTE para mismo lugar)
-            similar_pixels = 0
-            tolerance = 50  # Más tolerante para variaciones de iluminación
-            
-            for p1, p2 in zip(pixels1, pixels2):
-                if abs(p1 - p2) < tolerance:
-                    similar_pixels += 1
-            
-            texture_similarity = similar_pixels / len(pixels1)
-            
-            # DETECCIÓN DE TEXTURAS COMPLETAMENTE DIFERENTES
-            # Comparar distribución de intensidades de bordes
-            edge1_intensity = sum(pixels1) / len(pixels1) if pixels1 else 0
-            edge2_intensity = sum(pixels2) / len(pixels2) if pixels2 else 0
-            
-            # Si una imagen tiene muchos bordes y otra pocos (uniforme vs compleja)
-            intensity_diff = abs(edge1_intensity - edge2_intensity)
-            
-            if intensity_diff > 40:  # Una muy uniforme, otra muy texturizada
-                texture_similarity *= 0.5  # PENALTY del 50%
-            
-            # BOOST CONSERVADOR solo para texturas genuinamente altas
-            if texture_similarity > 0.6:  # Umbral más alto
-                texture_similarity = min(1.0, texture_similarity * 1.2)  # Menos boost
-            elif texture_similarity > 0.4:
-                texture_similarity = min(1.0, texture_similarity * 1.1)  # Boost mínimo
-            
-            return texture_similarity
-            
-        except Exception as e:
-            logger.error(f"Error en texturas: {e}")
-            return 0.0
-
-    def _compare_background_colors(self, img1, img2):
-        """Compara colores dominantes del fondo MEJORADO"""
-        try:
-            # Redimensionar para análisis
-            size = (200, 150)
-            img1_small = img1.resize(size, Image.Resampling.LANCZOS)
-            img2_small = img2.resize(size, Image.Resampling.LANCZOS)
-            
-            w, h = size
-            # Área central más pequeña para excluir solo personas
-            center_w = w // 3  # Solo el tercio central horizontal
-            center_h = h // 3  # Solo el tercio central vertical
-            
-            def extract_background_regions(img):
-                """Extrae múltiples regiones de fondo"""
-                regions = []
-                
-                # Región superior (toda)
-                regions.append(img.crop((0, 0, w, h//4)))
-                
-                # Región inferior (toda)  
-                regions.append(img.crop((0, 3*h//4, w, h)))
-                
-                # Regiones laterales (excluyendo centro)
-                regions.append(img.crop((0, h//4, w//4, 3*h//4)))  # Izquierda
-                regions.append(img.crop((3*w//4, h//4, w, 3*h//4)))  # Derecha
-                
-                return regions
-            
-            regions1 = extract_background_regions(img1_small)
-            regions2 = extract_background_regions(img2_small)
-            
-            total_similarity = 0
-            
-            for reg1, reg2 in zip(regions1, regions2):
-                # Obtener histogramas de cada región
-                hist1 = reg1.histogram()
-                hist2 = reg2.histogram()
-                
-                # Simplificar histogramas agrupando colores similares
-                def simplify_histogram(hist, bins=32):
-                    """Agrupa colores similares para mejor comparación"""
-                    simplified = [0] * bins
-                    group_size = 256 // bins
-                    
-                    for i, count in enumerate(hist):
-                        group = min(i // group_size, bins - 1)
-                        simplified[group] += count
-                    
-                    return simplified
-                
-                # Simplificar para R, G, B por separado
-                simple_hist1 = []
-                simple_hist2 = []
-                
-                # Procesar cada canal (R, G, B)
-                for channel in range(3):
-                    start = channel * 256
-                    end = start + 256
-                    channel_hist1 = hist1[start:end]
-                    channel_hist2 = hist2[start:end]
-                    
-                    simple_hist1.extend(simplify_histogram(channel_hist1))
-                    simple_hist2.extend(simplify_histogram(channel_hist2))
-                
-                # Comparar histogramas simplificados
-                total1 = sum(simple_hist1) or 1
-                total2 = sum(simple_hist2) or 1
-                
-                region_similarity = 0
-                for h1, h2 in zip(simple_hist1, simple_hist2):
-                    freq1 = h1 / total1
-                    freq2 = h2 / total2
-                    region_similarity += min(freq1, freq2)
-                
-                total_similarity += region_similarity
-            
-            # Promedio de todas las regiones
-            final_similarity = total_similarity / len(regions1)
-            
-            # DETECCIÓN DE FONDOS COMPLETAMENTE DIFERENTES
-            # Verificar si son fondos muy diferentes (ej: azul vs bokeh dorado)
-            
-            # Analizar varianza de colores en cada región
-            region_variances = []
-            for reg1, reg2 in zip(regions1, regions2):
-                # Convertir a arrays para análisis estadístico
-                pixels1 = list(reg1.getdata())
-                pixels2 = list(reg2.getdata())
-                
-                # Calcular varianza de cada región
-                if pixels1 and pixels2:
-                    # Promedio de varianza RGB de cada región
-                    var1 = sum(abs(p[0] - p[1]) + abs(p[1] - p[2]) + abs(p[0] - p[2]) for p in pixels1) / len(pixels1)
-                    var2 = sum(abs(p[0] - p[1]) + abs(p[1] - p[2]) + abs(p[0] - p[2]) for p in pixels2) / len(pixels2)
-                    region_variances.append(abs(var1 - var2))
-            
-            avg_variance_diff = sum(region_variances) / len(region_variances) if region_variances else 0
-            
-            # Si una imagen es muy uniforme y otra muy variada (azul vs bokeh)
-            if avg_variance_diff > 30:  # Umbral para fondos muy diferentes
-                final_similarity *= 0.4  # PENALTY SEVERA del 60%
-            
-            # Si la similitud es muy baja, no aplicar boost
-            if final_similarity < 0.4:
-                # NO aplicar boost para fondos diferentes
-                return final_similarity
-            else:
-                # Solo aplicar boost moderado para fondos genuinamente similares
-                final_similarity = min(1.0, final_similarity * 1.1)  # Menos boost
-            
-            return final_similarity
-            
-        except Exception as e:
-            logger.error(f"Error en colores de fondo: {e}")
-            return 0.0
-
-    def _compare_background_hash(self, img1, img2):
-        """Hash perceptual ESTRICTO enfocado SOLO en áreas de fondo"""
-        try:
-            # Crear máscaras que excluyan MÁS del centro
-            size = (20, 20)  # Más resolución para mejor precisión
-            gray1 = img1.convert('L').resize(size, Image.Resampling.LANCZOS)
-            gray2 = img2.convert('L').resize(size, Image.Resampling.LANCZOS)
-            
-            def strict_background_hash(img):
-                pixels = list(img.getdata())
-                w, h = size
-                
-                # Solo considerar ESQUINAS EXTREMAS (excluir mucho más del centro)
-                bg_pixels = []
-                corner_size = 6  # Más área central excluida
-                
-                for y in range(h):
-                    for x in range(w):
-                        # Solo esquinas y bordes extremos
-                        if (x < corner_size or x >= w - corner_size or 
-                            y < corner_size or y >= h - corner_size):
-                            # Excluir también área intermedia del centro
-                            center_x = w // 2
-                            center_y = h // 2
-                            distance_from_center = abs(x - center_x) + abs(y - center_y)
-                            
-                            # Solo incluir si está lejos del centro
-                            if distance_from_center > 6:
-                                bg_pixels.append(pixels[y * w + x])
-                
-                if len(bg_pixels) < 10:  # Si muy pocos píxeles, hash genérico
-                    return "0" * 32
-                
-                # Hash más corto pero más específico
-                avg = sum(bg_pixels) / len(bg_pixels)
-                std_dev = (sum((p - avg) ** 2 for p in bg_pixels) / len(bg_pixels)) ** 0.5
-                
-                # Considerar varianza para fondos más complejos
-                hash_bits = []
-                for p in bg_pixels:
-                    if std_dev > 10:  # Si hay variación significativa
-                        hash_bits.append('1' if p > avg + std_dev/2 else '0')
-                    else:  # Fondo uniforme
-                        hash_bits.append('1' if p > avg else '0')
-                
-                return ''.join(hash_bits[:32])  # Limitar tamaño
-            
-            hash1 = strict_background_hash(gray1)
-            hash2 = strict_background_hash(gray2)
-            
-            # Comparar hashes con más estrictez
-            if len(hash1) == len(hash2) and len(hash1) > 10:
-                matches = sum(h1 == h2 for h1, h2 in zip(hash1, hash2))
-                similarity = matches / len(hash1)
-                
-                # Penalty si la similitud es solo mediana (posible coincidencia)
-                if 0.4 < similarity < 0.8:
-                    similarity *= 0.7  # Reducir similitudes mediocres
-                    
-            else:
-                similarity = 0.0
-            
-            return similarity
-            
-        except Exception as e:
-            logger.error(f"Error en hash de fondo: {e}")
-            return 0.0
-
-    def _compare_fixed_elements(self, img1, img2):
-        """Detecta elementos fijos como puertas, ventanas, estructuras (MEJORADO)"""
-        try:
-            # Usar detección de bordes para encontrar elementos estructurales
-            from PIL import ImageFilter
-            
-            gray1 = img1.convert('L').resize((150, 100), Image.Resampling.LANCZOS)
-            gray2 = img2.convert('L').resize((150, 100), Image.Resampling.LANCZOS)
-            
-            # Aplicar múltiples filtros para mejor detección
-            edges1 = gray1.filter(ImageFilter.FIND_EDGES)
-            edges2 = gray2.filter(ImageFilter.FIND_EDGES)
-            
-            # También detectar contornos más suaves
-            contour1 = gray1.filter(ImageFilter.CONTOUR)
-            contour2 = gray2.filter(ImageFilter.CONTOUR)
-            
-            # Combinar detecciones
-            combined1 = ImageChops.add(edges1, contour1)
-            combined2 = ImageChops.add(edges2, contour2)
-            
-            # Comparar patrones estructurales con más tolerancia
-            diff = ImageChops.difference(combined1, combined2)
-            from PIL import ImageStat
-            stat = ImageStat.Stat(diff)
-            mean_diff = stat.mean[0]
-            
-            # Convertir a similitud (MÁS TOLERANTE)
-            similarity = max(0, 1 - mean_diff / 160)  # Antes era /128, ahora más tolerante
-            
-            # BOOST para elementos estructurales detectados
-            if similarity > 0.4:  # Si hay cierta similitud estructural
-                similarity = min(1.0, similarity * 1.4)  # +40% boost para elementos únicos
-            
-            return similarity
-            
-        except Exception as e:
-            logger.error(f"Error en elementos fijos: {e}")
-            return 0.0
-
-    def _calculate_background_similarity(self, results):
-        """Calcula similitud ULTRA-ESTRICTA - Fondos diferentes deben dar <30%"""
-        try:
-            # Obtener métricas individuales
-            edge_score = results.get('edge_similarity', 0)
-            color_score = results.get('color_similarity', 0) 
-            texture_score = results.get('texture_similarity', 0)
-            structural_score = results.get('structural_similarity', 0)
-            hash_score = results.get('background_hash', 0)
-            
-            # DETECCIÓN DE FONDOS COMPLETAMENTE DIFERENTES
-            # Si CUALQUIER métrica principal es muy baja, es sospechoso
-            main_scores = [edge_score, color_score, texture_score]
-            very_low_scores = sum(1 for score in main_scores if score < 0.4)
-            
-            # DETECCIÓN INTELIGENTE: ¿Fondos diferentes VS mismo lugar?
-            if very_low_scores >= 1:  # Si CUALQUIER métrica principal es muy baja
-                
-                # VERIFICACIÓN ANTI-FALSOS POSITIVOS ULTRA-AGRESIVA
-                # Detectar fondos obviamente diferentes (azul vs bokeh)
-                definitely_different = False
-                
-                # 1. Si colores bajos + texturas bajas = fondos diferentes (más permisivo)
-                if color_score < 0.4 and texture_score < 0.4:  # Antes <0.3
-                    definitely_different = True
-                
-                # 2. Si bordes bajos + colores bajos = arquitectura diferente (más permisivo)
-                if edge_score < 0.4 and color_score < 0.4:  # Antes <0.3
-                    definitely_different = True
-                
-                # 3. Si TODAS las métricas son mediocres (más permisivo)
-                if all(score < 0.55 for score in [edge_score, color_score, texture_score, structural_score]):  # Antes <0.5
-                    definitely_different = True
-                
-                # 4. NUEVA: Si promedio general es bajo (fondos diferentes)
-                avg_all = (edge_score + color_score + texture_score + structural_score) / 4
-                if avg_all < 0.45:  # Promedio bajo = fondos diferentes
-                    definitely_different = True
-                
-                # 5. NUEVA: Si solo 1 métrica es decente y el resto bajas
-                decent_metrics = sum(1 for score in [edge_score, color_score, texture_score, structural_score] if score > 0.5)
-                if decent_metrics <= 1:  # Solo 1 o ninguna métrica decente
-                    definitely_different = True
-                
-                # 6. NUEVA: Si texturas + bordes muy bajos (no hay elementos únicos)
-                if texture_score < 0.4 and edge_score < 0.4:
-                    definitely_different = True
-                
-                # Si es definitivamente diferente, aplicar penalty máximo
-                if definitely_different:
-                    overall = (edge_score * 0.4 + color_score * 0.4 + 
-                              texture_score * 0.15 + structural_score * 0.05)
-                    overall *= 0.3  # PENALTY MÁS SEVERA del 70% (antes 50%)
-                    return min(overall, 0.2)  # MÁXIMO 20% para fondos obviamente diferentes (antes 25%)
-                
-                # VERIFICAR si es MISMO LUGAR con elementos únicos (REBALANCEADO)
-                same_place_indicators = 0
-                
-                # 1. Elementos fijos únicos = ladrillos + puerta (más permisivo)
-                if texture_score > 0.45 and structural_score > 0.45:  # Antes >0.5
-                    same_place_indicators += 2  # Elementos fijos únicos detectados
-                
-                # 2. Arquitectura similar (más permisivo)
-                if edge_score > 0.35 and color_score > 0.35:  # Antes >0.4
-                    same_place_indicators += 1  # Arquitectura similar
-                
-                # 3. Elemento único claro (puerta, ventana) - más permisivo
-                if structural_score > 0.5:  # Antes >0.6
-                    same_place_indicators += 1  # Elemento fijo detectado
-                
-                # 4. Superficie única clara (ladrillos) - más permisivo  
-                if texture_score > 0.5:  # Antes >0.6
-                    same_place_indicators += 1  # Superficie característica
-                
-                # 5. NUEVO: Combinación decente de bordes + texturas
-                if edge_score > 0.4 and texture_score > 0.4:
-                    same_place_indicators += 1  # Estructura + superficie detectada
-                
-                # 6. NUEVO: Si 3+ métricas son decentes (lugar con variaciones)
-                decent_scores = sum(1 for score in [edge_score, color_score, texture_score, structural_score] if score > 0.4)
-                if decent_scores >= 3:
-                    same_place_indicators += 1  # Múltiples características detectadas
-                
-                # DECISIÓN INTELIGENTE (BONIFICACIONES MEJORADAS)
-                if same_place_indicators >= 5:  # MISMO LUGAR muy claro (5+ indicadores)
-                    # Es mismo lugar con evidencia muy fuerte
-                    overall = (edge_score * 0.35 + color_score * 0.35 + 
-                              texture_score * 0.20 + structural_score * 0.10)
-                    
-                    # BONUS AGRESIVO para evidencia muy fuerte
-                    overall = min(1.0, overall * 1.5)  # +50% bonus para casos muy claros
-                    return overall
-                
-                elif same_place_indicators >= 4:  # MISMO LUGAR probable
-                    # Mismo lugar con evidencia fuerte
-                    overall = (edge_score * 0.35 + color_score * 0.35 + 
-                              texture_score * 0.20 + structural_score * 0.10)
-                    
-                    # BONUS FUERTE para evidencia fuerte
-                    overall = min(1.0, overall * 1.35)  # +35% bonus (antes 30%)
-                    return overall
-                
-                elif same_place_indicators >= 3:  # MISMO LUGAR posible
-                    # Mismo lugar con evidencia decente
-                    overall = (edge_score * 0.35 + color_score * 0.35 + 
-                              texture_score * 0.20 + structural_score * 0.10)
-                    
-                    # Bonus moderado mejorado
-                    overall = min(1.0, overall * 1.25)  # +25% bonus (antes 15%)
-                    return min(overall, 0.95)  # Máximo 95% (antes 90%)
-                
-                elif same_place_indicators >= 2:  # Posible mismo lugar
-                    # Cálculo conservador  
-                    overall = (edge_score * 0.4 + color_score * 0.4 + 
-                              texture_score * 0.15 + structural_score * 0.05)
-                    
-                    # Bonus mínimo mejorado
-                    overall = min(1.0, overall * 1.1)  # +10% bonus (antes 5%)
-                    return min(overall, 0.7)  # Máximo 70% (antes 60%)
-                
-                else:  # FONDOS DIFERENTES confirmado
-                    # Usar cálculo ultra-conservador
-                    overall = (edge_score * 0.4 + color_score * 0.4 + 
-                              texture_score * 0.15 + structural_score * 0.05)
-                    
-                    # PENALTY AGRESIVA para fondos diferentes
-                    if very_low_scores >= 2:  # Si 2+ métricas son muy bajas
-                        overall *= 0.6  # PENALTY del 40%
-                    elif very_low_scores >= 1:  # Si 1+ métrica es muy baja
-                        overall *= 0.75  # PENALTY del 25%
-                    
-                    # LÍMITE MÁXIMO para fondos diferentes
-                    return min(overall, 0.4)  # MÁXIMO 40% para fondos diferentes
-            
-            # CÁLCULO NORMAL solo para fondos genuinamente similares
-            weights = {
-                'edge_similarity': 0.35,      # Estructura más importante
-                'color_similarity': 0.35,     # Colores críticos  
-                'texture_similarity': 0.20,   # Texturas
-                'structural_similarity': 0.07, # Elementos fijos
-                'background_hash': 0.03       # Patrones (muy poco peso)
-            }
-            
-            overall = 0
-            for metric, weight in weights.items():
-                if metric in results:
-                    overall += results[metric] * weight
-            
-            # Bonificaciones SOLO para casos EXCEPCIONALES
-            exceptional_metrics = sum(1 for score in main_scores if score > 0.8)
-            
-            if exceptional_metrics >= 3:  # Todas las métricas principales > 80%
-                overall = min(1.0, overall * 1.15)  # +15% solo en casos excepcionales
-            elif exceptional_metrics >= 2:  # 2+ métricas > 80%
-                overall = min(1.0, overall * 1.05)  # +5% muy conservador
-            
-            # LÍMITES FINALES según promedio
-            avg_main = sum(main_scores) / len(main_scores)
-            
-            if avg_main < 0.45:  # Promedio bajo
-                overall = min(overall, 0.3)  # Máximo 30%
-            elif avg_main < 0.55:  # Promedio medio-bajo
-                overall = min(overall, 0.5)  # Máximo 50%
-            elif avg_main < 0.65:  # Promedio medio
-                overall = min(overall, 0.7)  # Máximo 70%
-            
-            return overall
-            
-        except Exception as e:
-            logger.error(f"Error calculando similitud: {e}")
-            return 0.0
-
-    def _default_results(self):
-        """Resultados por defecto"""
-        return {
-            'pixel_similarity': 0.0,
-            'color_similarity': 0.0,
-            'stats_similarity': 0.0,
-            'structural_similarity': 0.0,
-            'hash_similarity': 0.0,
-            'overall_similarity': 0.0
-        }
+# Respuestas JSON comprimidas con gzip/brotli según Accept-Encoding
+enable_response_compression(app)
 
 class MedicalImageComparator:
     """Comparador médico usando Machine Learning para mayor precisión"""
@@ -643,13 +54,26 @@ class MedicalImageComparator:
         self.scaler = StandardScaler()
         self.model_path = 'medical_model.joblib'
         self.scaler_path = 'medical_scaler.joblib'
+        self.model_version = BASE_MODEL_VERSION
+        
+        # Feedback etiquetado y versiones reentrenadas del modelo
+        self.feedback_store = FeedbackStore(os.environ.get('MEDICAL_FEEDBACK_PATH', 'medical_feedback.jsonl'))
+        self.registry = ModelRegistry(os.environ.get('MEDICAL_MODEL_STORE', 'model_store'))
+        self._manifest_mtime = 0.0
+        self._swap_lock = threading.Lock()
+        self.retrainer = BackgroundRetrainer(self, self.feedback_store, self.registry, **retraining_settings())
         
         # Cargar modelo pre-entrenado si existe
         self._load_model()
+        # El reentrenamiento periódico corre aunque este worker nunca reciba
+        # feedback (las etiquetas pueden llegar por otro worker)
+        self.retrainer.start()
     
     def _load_model(self):
         """Carga el modelo pre-entrenado"""
         try:
+            if self.refresh_model():
+                return
             if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
                 self.model = joblib.load(self.model_path)
                 self.scaler = joblib.load(self.scaler_path)
@@ -661,10 +85,38 @@ class MedicalImageComparator:
             logger.error(f"Error cargando modelo: {e}")
             self._create_initial_model()
     
-    def _create_initial_model(self):
-        """Crea un modelo inicial con características MÉDICAS ESPECIALIZADAS"""
-        # Dataset con 8 características médicas especializadas
+    def current_model(self):
+        """Devuelve (modelo, scaler, versión) vigentes como una sola referencia"""
+        with self._swap_lock:
+            return self.model, self.scaler, self.model_version
+    
+    def refresh_model(self):
+        """Adopta la última versión publicada por el reentrenamiento (si cambió)"""
+        mtime = self.registry.manifest_mtime()
+        if not mtime or mtime == self._manifest_mtime:
+            return False
+        
+        manifest = self.registry.read_manifest()
+        if not manifest:
+            return False
         
+        try:
+            model, scaler = self.registry.load(manifest)
+        except Exception as e:
+            logger.error(f"Error cargando versión {manifest.get('version')}: {e}")
+            return False
+        
+        # Swap atómico: las requests en curso conservan su snapshot
+        with self._swap_lock:
+            self.model = model
+            self.scaler = scaler
+            self.model_version = manifest['version']
+            self._manifest_mtime = mtime
+        logger.info(f"🔄 Modelo ML actualizado a {manifest['version']}")
+        return True
+    
+    def _initial_training_data(self):
+        """Dataset semilla con 8 características médicas especializadas"""
         # Características: [uniformidad_patológica, píxeles_oscuros, densidad_gradientes, textura_facial, 
         #                  contraste_local, patrones_luz, variabilidad_regional, densidad_espectral]
         
@@ -701,12 +153,11 @@ class MedicalImageComparator:
         # Combinar datos
         X = np.array(normal_cases + pathology_cases)
         y = np.array([0]*len(normal_cases) + [1]*len(pathology_cases))
-        
-        # Entrenar modelo con parámetros ULTRA-OPTIMIZADOS
-        self.scaler.fit(X)
-        X_scaled = self.scaler.transform(X)
-        
-        self.model = RandomForestClassifier(
+        return X, y
+    
+    def _build_model(self):
+        """RandomForest con parámetros ULTRA-OPTIMIZADOS (sin entrenar)"""
+        return RandomForestClassifier(
             n_estimators=300,           # Más árboles para máxima precisión
             max_depth=6,               # Profundidad controlada
             min_samples_split=2,       # Mínimo para dividir nodos
@@ -714,7 +165,18 @@ class MedicalImageComparator:
             random_state=42,
             class_weight={0: 0.3, 1: 0.7}  # Dar mucho más peso a casos patológicos
         )
+    
+    def _create_initial_model(self):
+        """Crea un modelo inicial con características MÉDICAS ESPECIALIZADAS"""
+        X, y = self._initial_training_data()
+        
+        # Entrenar modelo con parámetros ULTRA-OPTIMIZADOS
+        self.scaler.fit(X)
+        X_scaled = self.scaler.transform(X)
+        
+        self.model = self._build_model()
         self.model.fit(X_scaled, y)
+        self.model_version = BASE_MODEL_VERSION
         
         # Guardar modelo
         joblib.dump(self.model, self.model_path)
@@ -827,18 +289,10 @@ class MedicalImageComparator:
     
     def _calculate_local_contrast_variation(self, gray_array):
         """Calcula variación de contraste local - ceguera = contraste muy uniforme"""
-        # Dividir imagen en regiones 4x4
-        h, w = gray_array.shape
-        region_contrasts = []
+        # Contraste (max - min) de cada región de 20x20
+        region_contrasts = kernels.block_contrasts(gray_array, 20)
         
-        for i in range(0, h-20, 20):
-            for j in range(0, w-20, 20):
-                region = gray_array[i:i+20, j:j+20]
-                if region.size > 0:
-                    region_contrast = np.max(region) - np.min(region)
-                    region_contrasts.append(region_contrast)
-        
-        if not region_contrasts:
+        if region_contrasts.size == 0:
             return 0.5
         
         # Calcular variabilidad del contraste entre regiones
@@ -911,7 +365,10 @@ class MedicalImageComparator:
     def analyze_medical_condition(self, image1_path, image2_path):
         """Analiza condición médica usando ML con POST-PROCESAMIENTO INTELIGENTE"""
         try:
-            if not self.model:
+            self.refresh_model()
+            model, scaler, model_version = self.current_model()
+            
+            if not model:
                 logger.error("Modelo ML no disponible")
                 return self._fallback_analysis(image1_path, image2_path)
             
@@ -920,12 +377,12 @@ class MedicalImageComparator:
             features2 = self._extract_features(image2_path)
             
             # Escalar características
-            features1_scaled = self.scaler.transform(features1)
-            features2_scaled = self.scaler.transform(features2)
+            features1_scaled = scaler.transform(features1)
+            features2_scaled = scaler.transform(features2)
             
             # Predecir probabilidades RAW del modelo
-            prob1 = self.model.predict_proba(features1_scaled)[0]
-            prob2 = self.model.predict_proba(features2_scaled)[0]
+            prob1 = model.predict_proba(features1_scaled)[0]
+            prob2 = model.predict_proba(features2_scaled)[0]
             
             # prob[0] = probabilidad normal, prob[1] = probabilidad patológica
             raw_pathology_prob1 = prob1[1] * 100
@@ -963,7 +420,8 @@ class MedicalImageComparator:
                 'image2_diagnosis': diagnosis2,
                 'confidence_level': confidence_level,
                 'confidence_percentage': confidence_percentage,
-                'method': 'Machine Learning + Post-procesamiento'
+                'method': 'Machine Learning + Post-procesamiento',
+                'model_version': model_version
             }
             
             logger.info(f"🤖 ML Analysis - Raw: Img1: {raw_pathology_prob1:.1f}%, Img2: {raw_pathology_prob2:.1f}%")
@@ -1236,33 +694,84 @@ class MedicalImageComparator:
             'image2_diagnosis': "Análisis no disponible",
             'confidence_level': 'Muy Baja',
             'confidence_percentage': 30,
-            'method': 'Fallback'
+            'method': 'Fallback',
+            'model_version': self.model_version
         }
     
     def update_model_with_feedback(self, image_path, is_pathological):
-        """Actualiza el modelo con feedback del usuario"""
+        """Registra feedback del usuario; el reentrenamiento corre en segundo plano"""
         try:
             features = self._extract_features(image_path)
-            features_scaled = self.scaler.transform(features)
             
-            # Aquí se podría implementar aprendizaje incremental
-            # Por ahora, solo registramos el feedback
+            # Solo se guarda el vector de características, nunca la imagen
             label = 1 if is_pathological else 0
+            self.feedback_store.append(features, label, source=os.path.basename(image_path))
             logger.info(f"📝 Feedback recibido: {image_path} -> {label}")
             
-            # TODO: Implementar reentrenamiento incremental
+            self.retrainer.notify()
+            return True
             
         except Exception as e:
             logger.error(f"Error actualizando modelo: {e}")
+            return False
 
 # Instancias globales de los comparadores
 background_comparator = FastImageComparator()
 medical_comparator = MedicalImageComparator()
+video_comparator = VideoBackgroundComparator(background_comparator, **video_comparison_settings())
+# Motor de perfiles (instant/fast/balanced/thorough) sobre las mismas métricas
+comparison_engine = build_engine(background_comparator)
 
-@app.route('/')
-def index():
-    """Página principal con interfaz integrada"""
-    return """
+# Compilar/cargar los kernels JIT al arrancar (con --preload, una vez por deploy)
+warm_up_kernels()
+
+def _warm_up_background_profiles():
+    """Cada perfil del motor sobre un par distinto y uno idéntico"""
+    image1, image2 = synthetic_image(1), synthetic_image(2)
+    for profile in comparison_engine.profiles:
+        comparison_engine.compare(image1, image2, profile)
+        comparison_engine.compare(image1, image1.copy(), profile)
+
+def _warm_up_screening():
+    """Carga con admisión por memoria + hashes de screening"""
+    hashes = []
+    for seed in (1, 2):
+        image, _, _ = screening_image(synthetic_jpeg(seed), background_comparator.load_image)
+        hashes.append(screening_hashes(image))
+    compare_screening_hashes(*hashes)
+
+def _warm_up_medical():
+    """Modelo médico (imports de scipy diferidos, primera predicción)"""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for seed in (1, 2):
+            path = os.path.join(directory, f'warm_up_{seed}.jpg')
+            synthetic_image(seed).save(path)
+            paths.append(path)
+        medical_comparator.analyze_medical_condition(*paths)
+
+def _warm_up_video():
+    """Timeline de video sobre un GIF sintético de tres frames"""
+    buffer = io.BytesIO()
+    frames = [synthetic_image(seed, (160, 120)) for seed in (1, 1, 2)]
+    frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:], duration=500)
+    buffer.seek(0)
+    source = open_frame_source(buffer, 'warm_up.gif')
+    try:
+        video_comparator.compare(source)
+    finally:
+        source.close()
+
+# Readiness: /api/health/ready da 200 solo después de pasar imágenes sintéticas
+# por todos los caminos de comparación (WARM_UP_MODE: lazy | sync | off)
+lifecycle = ServiceLifecycle('app_web')
+lifecycle.add_step('background_profiles', _warm_up_background_profiles)
+lifecycle.add_step('screening', _warm_up_screening)
+lifecycle.add_step('medical', _warm_up_medical)
+lifecycle.add_step('video', _warm_up_video)
+lifecycle.register(app)
+
+INDEX_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -1884,6 +1393,14 @@ def index():
 </html>
     """
 
+# La página se construye y comprime una sola vez al importar el módulo
+INDEX_PAGE = StaticAsset.from_text(INDEX_HTML)
+
+@app.route('/')
+def index():
+    """Página principal con interfaz integrada (precomprimida, con ETag)"""
+    return asset_response(INDEX_PAGE)
+
 @app.route('/api/compare-images', methods=['POST'])
 def compare_images():
     """API endpoint para comparar imágenes"""
@@ -1895,6 +1412,13 @@ def compare_images():
             return jsonify({'error': 'Faltan archivos de imagen'}), 400
         
         comparison_mode = request.form.get('comparison_mode', 'background')
+        profile = request.form.get('profile') or request.args.get('profile')
+        
+        if comparison_mode != 'disease':
+            try:
+                comparison_engine.get_profile(profile)
+            except UnknownProfile as e:
+                return jsonify({'error': str(e)}), 400
         
         file1 = request.files['image1']
         file2 = request.files['image2']
@@ -1902,9 +1426,16 @@ def compare_images():
         if file1.filename == '' or file2.filename == '':
             return jsonify({'error': 'Archivos de imagen vacíos'}), 400
         
-        # Cargar imágenes
-        img1 = background_comparator.load_image(file1.stream)
-        img2 = background_comparator.load_image(file2.stream)
+        # Cargar imágenes (con admisión por memoria)
+        try:
+            img1 = background_comparator.load_image(file1.stream)
+            img2 = background_comparator.load_image(file2.stream)
+        except MemoryBudgetExceeded as e:
+            logger.warning(f"⛔ Imagen rechazada por memoria: {e}")
+            response = jsonify({'error': str(e)})
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503 if e.retry_after else 413
         
         if not img1 or not img2:
             return jsonify({'error': 'Error cargando imágenes'}), 400
@@ -1921,11 +1452,12 @@ def compare_images():
             if comparison_mode == 'disease':
                 results = medical_comparator.analyze_medical_condition(temp_path1, temp_path2)
             else:
-                results = background_comparator.compare_images_fast(img1, img2)
+                results = comparison_engine.compare(img1, img2, profile)
             
             processing_time = round(time.time() - start_time, 3)
             
             logger.info(f"Comparando ({comparison_mode}): {file1.filename} vs {file2.filename}")
+            logger.debug(f"Hashes: {upload_digest(file1)} vs {upload_digest(file2)}")
             
             if comparison_mode == 'disease':
                 img1_prob = results.get('image1_medical_probability', 0)
@@ -1935,8 +1467,10 @@ def compare_images():
             else:
                 logger.info(f"Resultado: {results.get('overall_similarity', 0)*100:.1f}% en {processing_time}s")
             
-            # Agregar tiempo de procesamiento
+            # Agregar tiempo de procesamiento y versión del modelo vigente (el
+            # análisis médico ya trae la versión con la que predijo)
             results['processing_time'] = processing_time
+            results.setdefault('model_version', medical_comparator.model_version)
             
             return jsonify(results)
             
@@ -1949,10 +1483,154 @@ def compare_images():
                 except:
                     pass
         
+    except HTTPException as e:
+        # Upload cortado al leerlo (demasiado grande o no es imagen)
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         logger.error(f"Error en comparación: {e}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+@app.route('/api/screen-images', methods=['POST'])
+def screen_images():
+    """API endpoint: screening rápido por hashes desde la miniatura EXIF"""
+    try:
+        start_time = time.time()
+        
+        if 'image1' not in request.files or 'image2' not in request.files:
+            return jsonify({'error': 'Faltan archivos de imagen'}), 400
+        
+        # verify=true también contrasta la miniatura con la imagen a 1/8 de resolución
+        verify = request.form.get('verify', '').lower() in ('1', 'true')
+        
+        results = {}
+        hashes = []
+        for key in ('image1', 'image2'):
+            image, source, reason = screening_image(request.files[key].stream,
+                                                    background_comparator.load_image, verify=verify)
+            if not image:
+                return jsonify({'error': 'Error cargando imágenes'}), 400
+            image_hashes = screening_hashes(image)
+            hashes.append(image_hashes)
+            results[key] = {'source': source, 'reason': reason, 'hashes': image_hashes}
+        
+        results['similarities'] = compare_screening_hashes(*hashes)
+        results['processing_time'] = round(time.time() - start_time, 4)
+        results['model_version'] = medical_comparator.model_version
+        
+        return jsonify(results)
+        
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"⛔ Imagen rechazada por memoria: {e}")
+        response = jsonify({'error': str(e)})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503 if e.retry_after else 413
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        logger.error(f"Error en screening: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@app.route('/api/compare-video', methods=['POST'])
+def compare_video():
+    """API endpoint: timeline de similitud de fondo de un video o imagen animada"""
+    try:
+        start_time = time.time()
+        
+        if 'video' not in request.files or request.files['video'].filename == '':
+            return jsonify({'error': 'Falta archivo de video'}), 400
+        video = request.files['video']
+        
+        # Imagen de referencia opcional; sin ella se compara contra el primer segmento
+        reference = None
+        if 'image' in request.files and request.files['image'].filename:
+            reference = background_comparator.load_image(request.files['image'].stream)
+            if not reference:
+                return jsonify({'error': 'Error cargando imagen de referencia'}), 400
+        
+        try:
+            source = open_frame_source(video.stream, video.filename)
+        except Exception as e:
+            logger.error(f"Error abriendo video: {e}")
+            return jsonify({'error': 'Formato de video no soportado'}), 400
+        
+        try:
+            # Se decodifica de a un frame: se reserva el frame actual y el representativo
+            width, height = source.frame_size
+            with image_memory_budget.reservation(width * height * 3 * 2):
+                results = video_comparator.compare(source, reference)
+        finally:
+            source.close()
+        
+        results['processing_time'] = round(time.time() - start_time, 3)
+        results['model_version'] = medical_comparator.model_version
+        logger.info(f"🎞️ Video {video.filename}: {results['segments_compared']} segmentos, "
+                    f"{results['frames_decoded']} frames decodificados en {results['processing_time']}s")
+        
+        return jsonify(results)
+        
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"⛔ Video rechazado por memoria: {e}")
+        response = jsonify({'error': str(e)})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503 if e.retry_after else 413
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        logger.error(f"Error en comparación de video: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@app.route('/api/medical-feedback', methods=['POST'])
+def medical_feedback():
+    """API endpoint para etiquetar una imagen (alimenta el reentrenamiento)"""
+    try:
+        if 'image' not in request.files:
+            return jsonify({'error': 'Falta archivo de imagen'}), 400
+        
+        label = request.form.get('is_pathological', '').lower()
+        if label not in ('1', '0', 'true', 'false'):
+            return jsonify({'error': 'is_pathological debe ser true/false'}), 400
+        
+        img = background_comparator.load_image(request.files['image'].stream)
+        if not img:
+            return jsonify({'error': 'Error cargando imagen'}), 400
+        
+        temp_path = f"temp_feedback_{int(time.time() * 1000)}.jpg"
+        try:
+            img.save(temp_path)
+            stored = medical_comparator.update_model_with_feedback(temp_path, label in ('1', 'true'))
+        finally:
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            except:
+                pass
+        
+        if not stored:
+            return jsonify({'error': 'No se pudo registrar el feedback'}), 500
+        
+        return jsonify({
+            'status': 'ok',
+            'model_version': medical_comparator.model_version
+        })
+        
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        logger.error(f"Error registrando feedback: {e}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@app.route('/api/profiles', methods=['GET'])
+def comparison_profiles():
+    """Perfiles de comparación disponibles con métricas y presupuesto de latencia"""
+    return jsonify(comparison_engine.describe())
+
+@app.route('/api/metrics/memory', methods=['GET'])
+def memory_metrics():
+    """Bytes reservados (actual y pico) del presupuesto de decodificación"""
+    return jsonify(image_memory_budget.metrics())
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 3000))
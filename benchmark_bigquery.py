@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+⏱️ BENCHMARK DE MCPBigQueryBasicOperations CONTRA EL STAND-IN LOCAL
+Mide N consultas independientes: en serie deben tardar ~suma de latencias y
+con asyncio.gather ~latencia máxima (acotado por el semáforo de concurrencia).
+Con --rows compara además el resultado en dicts por fila contra Arrow.
+"""
+
+import time
+import asyncio
+import argparse
+import datetime
+import decimal
+import tracemalloc
+
+from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from bigquery_standin import LatencyStandInClient
+from query_results import QueryResult, rows_to_dicts
+
+
+async def benchmark_concurrency(queries: int, latency: float, max_concurrent: int):
+    # Latencias distintas por consulta (de latency/2 a latency)
+    latencies = [latency * (0.5 + 0.5 * i / max(1, queries - 1)) for i in range(queries)]
+    by_query = {f"SELECT {i} AS value LIMIT 1": latencies[i] for i in range(queries)}
+    client = LatencyStandInClient(latency=lambda query: by_query[query])
+    operations = MCPBigQueryBasicOperations("standin", client=client, max_concurrent_queries=max_concurrent)
+    await operations.initialize()
+
+    start = time.perf_counter()
+    for query in by_query:
+        await operations.execute_query(query)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(operations.execute_query(query) for query in by_query))
+    concurrent = time.perf_counter() - start
+    assert all(result["status"] == "success" for result in results)
+
+    print(f"🔢 {queries} consultas, latencia {min(latencies):.2f}-{max(latencies):.2f}s, "
+          f"concurrencia máxima {max_concurrent}")
+    print(f"   suma de latencias: {sum(latencies):.2f}s | máxima: {max(latencies):.2f}s")
+    print(f"   en serie:          {sequential:.2f}s")
+    print(f"   asyncio.gather:    {concurrent:.2f}s ({sequential / concurrent:.1f}x)")
+
+
+def _synthetic_table(rows: int):
+    """Tabla con la forma de los movimientos (ids, montos NUMERIC, fechas, strings)"""
+    import pyarrow as pa
+
+    base = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    return pa.table({
+        'USER_ID': pa.array(range(rows), pa.int64()),
+        'monto_usd': pa.array([decimal.Decimal(i % 10000) / 100 for i in range(rows)], pa.decimal128(38, 9)),
+        'fecha': pa.array([base + datetime.timedelta(seconds=i) for i in range(rows)], pa.timestamp('us', tz='UTC')),
+        'tipo_movimiento': pa.array([('INGRESO', 'RETIRO', 'PAGO')[i % 3] for i in range(rows)]),
+        'score': pa.array([i / rows for i in range(rows)], pa.float64()),
+    })
+
+
+def _measure(function):
+    """(resultado, segundos, pico de memoria Python en MB, memoria en el pool de Arrow en MB)"""
+    import pyarrow as pa
+
+    # Tiempo sin tracemalloc (lo ralentiza) y memoria en una segunda corrida
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    tracemalloc.start()
+    result = function()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_used = pool.bytes_allocated() - arrow_before
+    return result, elapsed, python_peak / 1e6, max(0, arrow_used) / 1e6
+
+
+def benchmark_result_format(rows: int):
+    """Camino anterior (Row -> dict por celda -> DataFrame) contra QueryResult en Arrow"""
+    import pandas as pd
+    from google.cloud.bigquery import Row
+
+    table = _synthetic_table(rows)
+    # Las filas tal como las entrega job.result() por la API REST
+    columns = table.column_names
+    field_to_index = {name: i for i, name in enumerate(columns)}
+    bq_rows = [Row(tuple(row.values()), field_to_index) for row in table.to_pylist()]
+
+    _, dict_seconds, dict_python, dict_arrow = _measure(lambda: pd.DataFrame(rows_to_dicts(bq_rows)))
+    result = QueryResult(table=table)
+    frame, arrow_seconds, arrow_python, arrow_pool = _measure(result.to_pandas)
+    _, lazy_seconds, _, _ = _measure(lambda: len(result.rows))
+    assert len(frame) == rows
+
+    print(f"📦 {rows:,} filas x {len(columns)} columnas")
+    print(f"   dicts por fila + DataFrame: {dict_seconds * 1000:8.1f} ms | "
+          f"pico Python {dict_python:7.1f} MB | Arrow {dict_arrow:6.1f} MB")
+    print(f"   Arrow + to_pandas:          {arrow_seconds * 1000:8.1f} ms | "
+          f"pico Python {arrow_python:7.1f} MB | Arrow {arrow_pool:6.1f} MB "
+          f"({dict_seconds / arrow_seconds:.0f}x)")
+    print(f"   len(result.rows) sin materializar: {lazy_seconds * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de execute_query contra el stand-in local')
+    parser.add_argument('--queries', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.5, help='latencia máxima por consulta (s)')
+    parser.add_argument('--max-concurrent', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=0,
+                        help='filas para comparar dicts por fila contra Arrow (0 = omitir)')
+    args = parser.parse_args()
+    asyncio.run(benchmark_concurrency(args.queries, args.latency, args.max_concurrent))
+    if args.rows:
+        benchmark_result_format(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,10 @@ from google.oauth2 import service_account
 import pandas_gbq
 from google.auth import default
 
+from bigquery_standin import client_from_env
+from query_cache import client_scope, default_cache
+from cost_guard import DEFAULT_LABEL, default_guard
+
 
 class BigQueryConfig:
     """Configuración central para BigQuery"""
@@ -60,6 +64,11 @@ class BigQueryConfig:
         """Obtiene el cliente de BigQuery configurado"""
         if self._client:
             return self._client
+        
+        # BIGQUERY_BACKEND=duckdb: stand-in local, sin credenciales
+        self._client = client_from_env(self.project_id)
+        if self._client:
+            return self._client
             
         credentials = self.get_credentials()
         self._client = bigquery.Client(
@@ -73,9 +82,11 @@ class BigQueryConfig:
 class BigQueryConnection:
     """Clase principal para manejar conexiones y operaciones de BigQuery"""
     
-    def __init__(self, config: BigQueryConfig):
+    def __init__(self, config: BigQueryConfig, cache: Any = None, cost_guard: Any = None):
         self.config = config
         self.client = config.get_client()
+        self.cache = cache or default_cache()
+        self.cost_guard = cost_guard or default_guard()
         
     def test_connection(self) -> Dict[str, Any]:
         """Prueba la conexión a BigQuery"""
@@ -118,26 +129,69 @@ class BigQueryConnection:
             print(f"Error al listar tablas: {e}")
             return []
     
-    def execute_query(self, query: str, to_dataframe: bool = True):
-        """Ejecuta una consulta SQL en BigQuery"""
+    def execute_query(self, query: str, to_dataframe: bool = True, use_cache: bool = True,
+                      job_config: Any = None, label: str = DEFAULT_LABEL):
+        """
+        Ejecuta una consulta SQL en BigQuery
+
+        Con to_dataframe=True el DataFrame pasa por la caché local de
+        resultados (query_cache); use_cache=False fuerza la consulta.
+        job_config lleva los parámetros @nombre tipados (query_templates).
+        Cada job pasa por el presupuesto de bytes (cost_guard) bajo label;
+        si lo superaría, no se ejecuta y se devuelve None.
+        """
         try:
             if to_dataframe:
-                # Usar pandas-gbq para obtener directamente un DataFrame
-                df = pandas_gbq.read_gbq(
-                    query,
-                    project_id=self.config.project_id,
-                    credentials=self.config.get_credentials(),
-                    location=self.config.location
-                )
+                scope = client_scope(self.client)
+                use_cache = use_cache and scope is not None
+                parameters = getattr(job_config, 'query_parameters', None)
+                if use_cache:
+                    cached = self.cache.get(query, parameters, scope=scope)
+                    if cached is not None:
+                        return cached[0].to_pandas()
+                # El job (y no pandas-gbq) informa los bytes facturados que
+                # la caché ahorra en las próximas corridas
+                query_job = self._run_guarded(query, job_config, label)
+                df = query_job.to_dataframe(create_bqstorage_client=True)
+                if use_cache:
+                    self._cache_dataframe(query, df, query_job, scope, parameters)
                 return df
             else:
                 # Usar el cliente de BigQuery directamente
-                query_job = self.client.query(query)
-                return query_job.result()
+                return self._run_guarded(query, job_config, label).result()
         except Exception as e:
             print(f"Error al ejecutar consulta: {e}")
             return None
     
+    def _run_guarded(self, query: str, job_config: Any, label: str):
+        """Job con dry-run previo y maximum_bytes_billed (cost_guard), esperado hasta terminar"""
+        job_config, reserved = self.cost_guard.check(self.client, query, job_config, label)
+        query_job = None
+        try:
+            query_job = self.client.query(query, job_config=job_config)
+            query_job.result()
+            return query_job
+        except Exception as e:
+            budget_error = self.cost_guard.limit_error(e, label, job_config)
+            if budget_error is None:
+                raise
+            raise budget_error from e
+        finally:
+            self.cost_guard.record(label, query_job, reserved)
+    
+    def _cache_dataframe(self, query: str, df: pd.DataFrame, query_job: Any, scope: str,
+                         parameters: Any = None):
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except Exception as e:
+            # Columnas object con tipos mezclados, sin pyarrow, etc.: sin caché
+            print(f"Resultado no cacheable: {e}")
+            return
+        self.cache.put(query, table, parameters, scope=scope,
+                       bytes_processed=query_job.total_bytes_processed,
+                       bytes_billed=query_job.total_bytes_billed)
+    
     def get_table_schema(self, dataset_id: str, table_id: str) -> List[Dict]:
         """Obtiene el esquema de una tabla"""
         try:
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Traducción de SQL de BigQuery (GoogleSQL) al dialecto de DuckDB
+Cubre lo que usan los analizadores y scripts de métricas: nombres de tabla
+entre backticks, DATE_DIFF / DATE_SUB / DATE_ADD y variantes de TIMESTAMP y
+DATETIME, SAFE_CAST, SAFE_DIVIDE, COUNTIF, DATE_TRUNC, FORMAT_DATE,
+EXTRACT(DAYOFWEEK ...), UNNEST, tipos (INT64, FLOAT64, NUMERIC, STRING) y
+parámetros @nombre. No es un traductor completo: lo que no reconoce pasa sin
+cambios.
+"""
+
+import re
+from typing import Callable, Dict, List, Set, Tuple
+
+# `proyecto.DATASET.TABLA` -> "DATASET"."TABLA" (el proyecto no existe en DuckDB)
+_BACKTICK = re.compile(r'`([^`]+)`')
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_PARAMETER = re.compile(r'@([A-Za-z_][A-Za-z0-9_]*)')
+_UNNEST_ALIAS = re.compile(r'\s+AS\s+([A-Za-z_][A-Za-z0-9_]*)\b(?!\s*\()', re.IGNORECASE)
+_EXTRACT_DAYOFWEEK = re.compile(r'DAYOFWEEK\s+FROM\s+(.*)$', re.IGNORECASE | re.DOTALL)
+
+_TYPES = {
+    'INT64': 'BIGINT',
+    'FLOAT64': 'DOUBLE',
+    'NUMERIC': 'DECIMAL(38, 9)',
+    'BIGNUMERIC': 'DECIMAL(38, 9)',
+    'STRING': 'VARCHAR',
+    'BOOL': 'BOOLEAN',
+    'BYTES': 'BLOB',
+    'DATETIME': 'TIMESTAMP',
+    'TIMESTAMP': 'TIMESTAMPTZ',
+}
+_CAST_TYPE = re.compile(r'\bAS\s+(' + '|'.join(_TYPES) + r')\s*$', re.IGNORECASE)
+
+
+def _string_end(sql: str, start: int) -> int:
+    """Posición siguiente al cierre del literal que abre en start"""
+    quote = sql[start]
+    i = start + 1
+    while i < len(sql):
+        if sql[i] == '\\':
+            i += 2
+            continue
+        if sql[i] == quote:
+            if i + 1 < len(sql) and sql[i + 1] == quote:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return len(sql)
+
+
+def _comment_end(sql: str, start: int) -> int:
+    """Fin de línea del comentario -- que abre en start"""
+    end = sql.find('\n', start)
+    return len(sql) if end < 0 else end
+
+
+def _split_arguments(sql: str, start: int) -> Tuple[List[str], int]:
+    """
+    Argumentos de nivel superior de la llamada cuyo '(' está antes de start
+    (las comas dentro de paréntesis o de arreglos [...] no separan)
+    """
+    arguments, depth, current, i = [], 0, start, start
+    while i < len(sql):
+        char = sql[i]
+        if char in "'\"":
+            i = _string_end(sql, i)
+            continue
+        if char in '([':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == ')':
+            if depth == 0:
+                arguments.append(sql[current:i].strip())
+                return [a for a in arguments if a], i + 1
+            depth -= 1
+        elif char == ',' and depth == 0:
+            arguments.append(sql[current:i].strip())
+            current = i + 1
+        i += 1
+    raise ValueError("Paréntesis sin cerrar en la consulta")
+
+
+def _interval(argument: str) -> str:
+    return argument if argument.upper().startswith('INTERVAL') else f"INTERVAL ({argument})"
+
+
+def _part(argument: str) -> str:
+    return f"'{argument.strip().lower()}'"
+
+
+def _cast(arguments: List[str], function: str = 'CAST') -> str:
+    expression = arguments[0]
+    match = _CAST_TYPE.search(expression)
+    if match:
+        expression = expression[:match.start()] + f"AS {_TYPES[match.group(1).upper()]}"
+    return f"{function}({expression})"
+
+
+_FUNCTIONS: Dict[str, Callable[[List[str]], str]] = {
+    # BigQuery: DATE_DIFF(fin, inicio, PARTE); DuckDB: date_diff('parte', inicio, fin)
+    'DATE_DIFF': lambda a: f"date_diff({_part(a[2])}, CAST({a[1]} AS DATE), CAST({a[0]} AS DATE))",
+    # TIMESTAMP_DIFF cuenta unidades completas (date_sub), no bordes cruzados
+    'DATETIME_DIFF': lambda a: f"date_sub({_part(a[2])}, {a[1]}, {a[0]})",
+    'TIMESTAMP_DIFF': lambda a: f"date_sub({_part(a[2])}, {a[1]}, {a[0]})",
+    # DATE_SUB/DATE_ADD devuelven DATE; en DuckDB fecha ± intervalo es TIMESTAMP
+    'DATE_SUB': lambda a: f"CAST(({a[0]}) - {_interval(a[1])} AS DATE)",
+    'DATE_ADD': lambda a: f"CAST(({a[0]}) + {_interval(a[1])} AS DATE)",
+    'DATETIME_SUB': lambda a: f"(({a[0]}) - {_interval(a[1])})",
+    'DATETIME_ADD': lambda a: f"(({a[0]}) + {_interval(a[1])})",
+    'TIMESTAMP_SUB': lambda a: f"(({a[0]}) - {_interval(a[1])})",
+    'TIMESTAMP_ADD': lambda a: f"(({a[0]}) + {_interval(a[1])})",
+    'DATE_TRUNC': lambda a: f"CAST(date_trunc({_part(a[1])}, {a[0]}) AS DATE)",
+    'DATETIME_TRUNC': lambda a: f"date_trunc({_part(a[1])}, {a[0]})",
+    'TIMESTAMP_TRUNC': lambda a: f"date_trunc({_part(a[1])}, {a[0]})",
+    'DATE': lambda a: (f"make_date({a[0]}, {a[1]}, {a[2]})" if len(a) == 3
+                       else f"CAST({a[0]} AS DATE)"),
+    'DATETIME': lambda a: f"CAST({a[0]} AS TIMESTAMP)",
+    'TIMESTAMP': lambda a: f"CAST({a[0]} AS TIMESTAMPTZ)",
+    'CURRENT_TIMESTAMP': lambda a: "CURRENT_TIMESTAMP",
+    'CURRENT_DATETIME': lambda a: "CAST(CURRENT_TIMESTAMP AS TIMESTAMP)",
+    'FORMAT_DATE': lambda a: f"strftime({a[1]}, {a[0]})",
+    'FORMAT_DATETIME': lambda a: f"strftime({a[1]}, {a[0]})",
+    'FORMAT_TIMESTAMP': lambda a: f"strftime({a[1]}, {a[0]})",
+    'PARSE_DATE': lambda a: f"CAST(strptime({a[1]}, {a[0]}) AS DATE)",
+    'PARSE_DATETIME': lambda a: f"strptime({a[1]}, {a[0]})",
+    'PARSE_TIMESTAMP': lambda a: f"strptime({a[1]}, {a[0]})",
+    'CAST': _cast,
+    'SAFE_CAST': lambda a: _cast(a, 'TRY_CAST'),
+    'SAFE_DIVIDE': lambda a: f"(CASE WHEN ({a[1]}) = 0 THEN NULL ELSE ({a[0]}) / ({a[1]}) END)",
+    'COUNTIF': lambda a: f"count_if({a[0]})",
+    'REGEXP_CONTAINS': lambda a: f"regexp_matches({a[0]}, {a[1]})",
+    'CONTAINS_SUBSTR': lambda a: f"contains(lower(CAST({a[0]} AS VARCHAR)), lower({a[1]}))",
+    'ARRAY_LENGTH': lambda a: f"len({a[0]})",
+    'RAND': lambda a: "random()",
+}
+
+
+def _rewrite_calls(sql: str) -> str:
+    """Reescribe las llamadas de _FUNCTIONS (anidadas incluidas), respetando literales y comentarios"""
+    out, i = [], 0
+    while i < len(sql):
+        char = sql[i]
+        if char in "'\"":
+            end = _string_end(sql, i)
+            out.append(sql[i:end])
+            i = end
+            continue
+        if sql.startswith('--', i):
+            end = _comment_end(sql, i)
+            out.append(sql[i:end])
+            i = end
+            continue
+        word = _WORD.match(sql, i) if (char.isalpha() or char == '_') else None
+        if word:
+            name = word.group(0)
+            after = word.end()
+            while after < len(sql) and sql[after] in ' \t\n':
+                after += 1
+            previous = sql[i - 1] if i else ''
+            if (name.upper() in _FUNCTIONS and after < len(sql) and sql[after] == '('
+                    and previous != '.'):
+                arguments, end = _split_arguments(sql, after + 1)
+                out.append(_FUNCTIONS[name.upper()]([_rewrite_calls(a) for a in arguments]))
+                i = end
+                continue
+            if (name.upper() == 'UNNEST' and after < len(sql) and sql[after] == '('
+                    and ''.join(out).rstrip().upper().endswith('IN')):
+                # x IN UNNEST(arreglo) -> x IN (SELECT unnest(arreglo))
+                arguments, end = _split_arguments(sql, after + 1)
+                out.append(f"(SELECT unnest({_rewrite_calls(arguments[0])}))")
+                i = end
+                continue
+            if name.upper() == 'UNNEST' and after < len(sql) and sql[after] == '(':
+                arguments, end = _split_arguments(sql, after + 1)
+                alias = _UNNEST_ALIAS.match(sql, end)
+                if alias:
+                    # FROM UNNEST(arreglo) AS x: en BigQuery x es el valor, no la tabla
+                    out.append(f"unnest({_rewrite_calls(arguments[0])}) AS {alias.group(1)}({alias.group(1)})")
+                    i = alias.end()
+                    continue
+            if name.upper() == 'EXTRACT' and after < len(sql) and sql[after] == '(':
+                arguments, end = _split_arguments(sql, after + 1)
+                dayofweek = _EXTRACT_DAYOFWEEK.match(arguments[0]) if len(arguments) == 1 else None
+                if dayofweek:
+                    # BigQuery numera de 1 (domingo) a 7; DuckDB de 0 a 6
+                    out.append(f"(dayofweek({_rewrite_calls(dayofweek.group(1))}) + 1)")
+                    i = end
+                    continue
+            out.append(name)
+            i = word.end()
+            continue
+        out.append(char)
+        i += 1
+    return ''.join(out)
+
+
+def table_path(reference: str) -> Tuple[str, str]:
+    """('DATASET', 'TABLA') de `proyecto.DATASET.TABLA` o `DATASET.TABLA`"""
+    parts = reference.split('.')
+    if len(parts) >= 2:
+        return parts[-2], parts[-1]
+    return '', parts[-1]
+
+
+def referenced_tables(sql: str) -> Set[Tuple[str, str]]:
+    """Tablas entre backticks que lee la consulta (dataset, tabla)"""
+    tables = set()
+    for match in _BACKTICK.finditer(sql):
+        if 'INFORMATION_SCHEMA' in match.group(1).upper():
+            continue
+        dataset, table = table_path(match.group(1))
+        if dataset:
+            tables.add((dataset, table))
+    return tables
+
+
+def _replace_table(match: re.Match) -> str:
+    reference = match.group(1)
+    parts = reference.split('.')
+    upper = [part.upper() for part in parts]
+    if 'INFORMATION_SCHEMA' in upper:
+        dataset = parts[upper.index('INFORMATION_SCHEMA') - 1]
+        view = parts[-1].lower()
+        return (f"(SELECT *, NULL AS description FROM information_schema.{view} "
+                f"WHERE table_schema = '{dataset}')")
+    dataset, table = table_path(reference)
+    if not dataset:
+        return f'"{table}"'
+    return f'"{dataset}"."{table}"'
+
+
+def _outside_literals(sql: str, pattern: re.Pattern, replacement) -> str:
+    """Aplica pattern.sub solo fuera de literales de texto"""
+    out, i, start = [], 0, 0
+    while i < len(sql):
+        if sql[i] in "'\"" or sql.startswith('--', i):
+            out.append(pattern.sub(replacement, sql[start:i]))
+            end = _string_end(sql, i) if sql[i] != '-' else _comment_end(sql, i)
+            out.append(sql[i:end])
+            i = start = end
+            continue
+        i += 1
+    out.append(pattern.sub(replacement, sql[start:]))
+    return ''.join(out)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Texto canónico de una consulta: sin comentarios (--, # y /* */), con los
+    espacios colapsados y sin ';' final. Literales y nombres entre backticks
+    quedan intactos, así que dos consultas con el mismo texto canónico leen
+    lo mismo.
+    """
+    out, i, space = [], 0, False
+    while i < len(sql):
+        char = sql[i]
+        if char in "'\"`":
+            end = _string_end(sql, i)
+            chunk = sql[i:end]
+        elif sql.startswith('--', i) or char == '#':
+            i = _comment_end(sql, i)
+            space = True
+            continue
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = len(sql) if end < 0 else end + 2
+            space = True
+            continue
+        elif char.isspace():
+            i += 1
+            space = True
+            continue
+        else:
+            end, chunk = i + 1, char
+        if space and out:
+            out.append(' ')
+        space = False
+        out.append(chunk)
+        i = end
+    return ''.join(out).rstrip(' ;')
+
+
+def translate(sql: str) -> str:
+    """SQL de BigQuery -> SQL de DuckDB"""
+    sql = _BACKTICK.sub(_replace_table, sql)
+    sql = _rewrite_calls(sql)
+    # Parámetros con nombre: @user_ids -> $user_ids
+    return _outside_literals(sql, _PARAMETER, r'$\1')
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Stand-in local de BigQuery para medir y probar sin acceso a meli-bi-data
+Implementa el subconjunto de la API de google.cloud.bigquery que usan
+MCPBigQueryBasicOperations, BigQueryConnection y los analizadores:
+client.query() -> job con done(), result(), to_arrow(), job_id y bytes
+procesados/facturados.
+
+Dos backends:
+    LatencyStandInClient - filas fijas con latencia simulada (benchmarks)
+    DuckDBStandInClient  - ejecuta el SQL de verdad sobre una base DuckDB con
+                           datos sintéticos (datos_sinteticos.py), traducido
+                           con bigquery_dialect
+
+BIGQUERY_BACKEND=duckdb hace que MCPBigQueryBasicOperations y BigQueryConfig
+usen DuckDBStandInClient sobre BIGQUERY_STANDIN_DB (standin.duckdb).
+"""
+
+import os
+import re
+import math
+import time
+import uuid
+import datetime
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from bigquery_dialect import referenced_tables, table_path, translate
+
+# BigQuery factura por MB con un mínimo de 10 MB por tabla leída
+_MB = 1024 * 1024
+_MIN_BILLED_PER_TABLE = 10 * _MB
+
+
+def _check_maximum_bytes_billed(job_config: Any, bytes_billed: int):
+    """Rechaza el job como BigQuery si factura más que job_config.maximum_bytes_billed"""
+    maximum = getattr(job_config, 'maximum_bytes_billed', None)
+    if maximum and bytes_billed > int(maximum):
+        raise RuntimeError(f"Query exceeded limit for bytes billed: {maximum}. "
+                           f"{bytes_billed} or higher required.")
+
+
+class StandInRow(dict):
+    """Fila con acceso por clave y por atributo (como bigquery.Row)"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class StandInRowIterator:
+    """Iterador de filas paginado (como RowIterator de job.result())"""
+
+    def __init__(self, rows: Any, page_size: Optional[int] = None):
+        self._rows = rows
+        self.page_size = page_size
+        self.total_rows = rows.num_rows if hasattr(rows, 'num_rows') else len(rows)
+
+    def __iter__(self):
+        if hasattr(self._rows, 'to_batches'):
+            # Página por página, como el RowIterator real
+            for batch in self.to_arrow_iterable():
+                for row in batch.to_pylist():
+                    yield StandInRow(row)
+        else:
+            for row in self._rows:
+                yield StandInRow(row)
+
+    def to_arrow_iterable(self, bqstorage_client: Any = None, max_queue_size: Any = None):
+        """Record batches de page_size filas (una página de la API REST cada uno)"""
+        import pyarrow as pa
+
+        table = self._rows if hasattr(self._rows, 'to_batches') else pa.Table.from_pylist(self._rows)
+        return iter(table.to_batches(max_chunksize=self.page_size or max(1, table.num_rows)))
+
+
+class StandInQueryJob:
+    """Job que termina `latency` segundos después de crearse"""
+
+    def __init__(self, query: str, rows: Any, latency: float, bytes_processed: int = 0):
+        self.query = query
+        self.job_id = f"standin_{uuid.uuid4().hex[:12]}"
+        self.total_bytes_processed = bytes_processed
+        self.total_bytes_billed = bytes_processed
+        self.cache_hit = False
+        self._rows = rows
+        self._finish_at = time.monotonic() + latency
+
+    def done(self) -> bool:
+        return time.monotonic() >= self._finish_at
+
+    def _wait(self):
+        remaining = self._finish_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def cancel(self) -> bool:
+        """Termina la espera (como QueryJob.cancel)"""
+        self._finish_at = time.monotonic()
+        return True
+
+    def result(self, timeout: Optional[float] = None, page_size: Optional[int] = None):
+        """Bloquea hasta que el job termina (como QueryJob.result)"""
+        self._wait()
+        return StandInRowIterator(self._rows, page_size)
+
+    def to_arrow(self, create_bqstorage_client: bool = True, progress_bar_type: Any = None):
+        """Resultado como tabla Arrow (como QueryJob.to_arrow)"""
+        import pyarrow as pa
+
+        self._wait()
+        if hasattr(self._rows, 'to_pylist'):
+            return self._rows
+        return pa.Table.from_pylist(self._rows)
+
+
+class LatencyStandInClient:
+    """Cliente que simula la latencia de BigQuery con filas generadas localmente"""
+
+    def __init__(self, latency: float = 0.5, rows: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                 bytes_per_query: int = 10 * 1024 * 1024):
+        """
+        Args:
+            latency: segundos que tarda cada job (o callable(query) -> segundos)
+            rows: callable(query) -> filas del resultado (lista de dicts o
+                  tabla Arrow; por defecto una fila)
+            bytes_per_query: bytes procesados informados por cada job
+        """
+        self.latency = latency
+        self.rows = rows or (lambda query: [{"value": 1}])
+        self.bytes_per_query = bytes_per_query
+        # Filas generadas por llamada: nada que cachear (ver query_cache.client_scope)
+        self.cache_scope = None
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def query(self, query: str, job_config: Any = None) -> StandInQueryJob:
+        if getattr(job_config, 'dry_run', False):
+            # Como en BigQuery: la estimación vuelve enseguida y sin filas
+            return StandInQueryJob(query, [], 0, self.bytes_per_query)
+        _check_maximum_bytes_billed(job_config, self.bytes_per_query)
+        with self._lock:
+            self.queries.append(query)
+        latency = self.latency(query) if callable(self.latency) else self.latency
+        return StandInQueryJob(query, self.rows(query), latency, self.bytes_per_query)
+
+
+# Tipos de DuckDB -> tipos de BigQuery (get_table().schema)
+_BIGQUERY_TYPES = {
+    'BIGINT': 'INTEGER', 'INTEGER': 'INTEGER', 'HUGEINT': 'INTEGER', 'SMALLINT': 'INTEGER',
+    'DOUBLE': 'FLOAT', 'FLOAT': 'FLOAT', 'VARCHAR': 'STRING', 'BOOLEAN': 'BOOLEAN',
+    'DATE': 'DATE', 'TIMESTAMP': 'DATETIME', 'TIMESTAMP WITH TIME ZONE': 'TIMESTAMP',
+    'BLOB': 'BYTES',
+}
+# Bytes por valor que usa BigQuery para facturar (STRING: 2 + largo)
+_BIGQUERY_WIDTHS = {'INTEGER': 8, 'FLOAT': 8, 'BOOLEAN': 1, 'DATE': 8, 'DATETIME': 8,
+                    'TIMESTAMP': 8, 'NUMERIC': 16}
+
+
+def _bigquery_type(duckdb_type: str) -> str:
+    if duckdb_type.startswith('DECIMAL'):
+        return 'NUMERIC'
+    return _BIGQUERY_TYPES.get(duckdb_type, 'STRING')
+
+
+def _query_parameters(job_config: Any) -> Dict[str, Any]:
+    """ScalarQueryParameter / ArrayQueryParameter de job_config -> {nombre: valor}"""
+    parameters = {}
+    for parameter in getattr(job_config, 'query_parameters', None) or []:
+        if hasattr(parameter, 'values'):
+            parameters[parameter.name] = list(parameter.values)
+        else:
+            parameters[parameter.name] = parameter.value
+    return parameters
+
+
+class DuckDBRowIterator(StandInRowIterator):
+    """RowIterator que lee el resultado de DuckDB de a page_size filas"""
+
+    def __init__(self, reader_factory: Callable[[int], Any], page_size: Optional[int] = None):
+        self._reader_factory = reader_factory
+        self._rows = None
+        self.page_size = page_size
+        self.total_rows = None
+
+    def __iter__(self):
+        for batch in self.to_arrow_iterable():
+            for row in batch.to_pylist():
+                yield StandInRow(row)
+
+    def to_arrow_iterable(self, bqstorage_client: Any = None, max_queue_size: Any = None):
+        reader = self._reader_factory(self.page_size or 10000)
+        for batch in reader:
+            yield batch
+
+
+class DuckDBQueryJob:
+    """Job sobre DuckDB: la consulta corre al crearlo y el resultado se lee al pedirlo"""
+
+    def __init__(self, client: 'DuckDBStandInClient', query: str, job_config: Any = None):
+        self.query = query
+        self.job_id = f"duckdb_{uuid.uuid4().hex[:12]}"
+        self.sql = translate(query)
+        self.parameters = _query_parameters(job_config)
+        self.dry_run = bool(getattr(job_config, 'dry_run', False))
+        self.cache_hit = False
+        self.total_bytes_processed, self.total_bytes_billed = client.estimate_bytes(query, self.sql)
+        if not self.dry_run:
+            _check_maximum_bytes_billed(job_config, self.total_bytes_billed)
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._client = client
+        self._table = None
+        self._cursor = None
+        if not self.dry_run:
+            # Los errores de SQL salen acá, como en client.query()
+            self._cursor = self._execute()
+        self.ended = datetime.datetime.now(datetime.timezone.utc)
+
+    def _execute(self):
+        cursor = self._client.cursor()
+        cursor.execute(self.sql, self.parameters or None)
+        return cursor
+
+    def _take_cursor(self):
+        """El cursor de la primera ejecución; las lecturas siguientes re-ejecutan"""
+        cursor, self._cursor = self._cursor, None
+        return cursor or self._execute()
+
+    def done(self) -> bool:
+        return True
+
+    def cancel(self) -> bool:
+        # La consulta ya corrió al crear el job: no queda nada por cancelar
+        return False
+
+    def result(self, timeout: Optional[float] = None, page_size: Optional[int] = None,
+               max_results: Optional[int] = None):
+        if self.dry_run:
+            return StandInRowIterator([], page_size)
+        if self._table is not None:
+            return StandInRowIterator(self._table, page_size)
+        return DuckDBRowIterator(lambda size: self._take_cursor().fetch_record_batch(size), page_size)
+
+    def to_arrow(self, create_bqstorage_client: bool = True, progress_bar_type: Any = None):
+        if self._table is None:
+            if self.dry_run:
+                import pyarrow as pa
+                return pa.table({})
+            self._table = self._take_cursor().fetch_arrow_table()
+        return self._table
+
+    def to_dataframe(self, create_bqstorage_client: bool = True, progress_bar_type: Any = None):
+        return self.to_arrow().to_pandas()
+
+
+class DuckDBStandInClient:
+    """Cliente BigQuery que ejecuta el SQL (traducido) sobre una base DuckDB local"""
+
+    def __init__(self, database: Optional[str] = None, project: str = 'meli-bi-data',
+                 read_only: bool = True):
+        """
+        Args:
+            database: archivo .duckdb generado por datos_sinteticos.py
+                      (BIGQUERY_STANDIN_DB, standin.duckdb por defecto)
+            project: proyecto informado en list_datasets / get_table
+            read_only: abrir sin bloquear la base para otros procesos
+        """
+        import duckdb
+
+        self.database = database or os.environ.get('BIGQUERY_STANDIN_DB', 'standin.duckdb')
+        if not os.path.exists(self.database):
+            raise FileNotFoundError(
+                f"No existe {self.database}: generarla con python datos_sinteticos.py --database {self.database}")
+        self.project = project
+        # Resultados cacheados solo valen para esta base tal como está generada
+        self.cache_scope = (f"duckdb:{os.path.abspath(self.database)}:"
+                            f"{int(os.path.getmtime(self.database))}")
+        self._connection = duckdb.connect(self.database, read_only=read_only)
+        self._column_bytes = {}
+        self._lock = threading.Lock()
+        self.queries = []
+
+    def cursor(self):
+        """Cursor nuevo por job: el resultado de uno se puede leer mientras corren otros"""
+        return self._connection.cursor()
+
+    def query(self, query: str, job_config: Any = None) -> DuckDBQueryJob:
+        with self._lock:
+            self.queries.append(query)
+        return DuckDBQueryJob(self, query, job_config)
+
+    def _table_column_bytes(self, dataset: str, table: str) -> Dict[str, int]:
+        """Bytes por columna de una tabla, como los cuenta BigQuery (cacheado)"""
+        key = (dataset.lower(), table.lower())
+        if key not in self._column_bytes:
+            cursor = self._connection.cursor()
+            columns = cursor.execute(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE lower(table_schema) = ? AND lower(table_name) = ?", list(key)).fetchall()
+            sizes = {}
+            if columns:
+                rows = cursor.execute(f'SELECT count(*) FROM "{dataset}"."{table}"').fetchone()[0]
+                for name, duckdb_type in columns:
+                    bigquery_type = _bigquery_type(duckdb_type)
+                    width = _BIGQUERY_WIDTHS.get(bigquery_type)
+                    if width is None:
+                        sample = cursor.execute(
+                            f'SELECT avg(strlen(CAST("{name}" AS VARCHAR))) FROM '
+                            f'(SELECT "{name}" FROM "{dataset}"."{table}" LIMIT 10000)').fetchone()[0]
+                        width = 2 + (sample or 0)
+                    sizes[name.lower()] = int(rows * width)
+            with self._lock:
+                self._column_bytes[key] = sizes
+        return self._column_bytes[key]
+
+    def estimate_bytes(self, query: str, sql: str):
+        """
+        (bytes procesados, bytes facturados) como los calcularía BigQuery sin
+        particiones: columnas referenciadas completas de cada tabla leída
+        """
+        words = {word.lower() for word in re.findall(r'[A-Za-z_][A-Za-z0-9_]*', sql)}
+        select_all = '*' in sql
+        processed = billed = 0
+        for dataset, table in referenced_tables(query):
+            sizes = self._table_column_bytes(dataset, table)
+            table_bytes = sum(size for column, size in sizes.items() if select_all or column in words)
+            processed += table_bytes
+            billed += max(_MIN_BILLED_PER_TABLE, math.ceil(table_bytes / _MB) * _MB)
+        return processed, billed
+
+    # --- Metadatos (list_datasets / list_tables / get_table) ---
+
+    def dataset(self, dataset_id: str):
+        return SimpleNamespace(dataset_id=dataset_id, project=self.project,
+                               table=lambda table_id: SimpleNamespace(dataset_id=dataset_id, table_id=table_id))
+
+    def list_datasets(self):
+        rows = self._connection.cursor().execute(
+            "SELECT DISTINCT schema_name FROM information_schema.schemata "
+            "WHERE catalog_name = current_database() AND schema_name NOT IN ('main', 'information_schema', 'pg_catalog') "
+            "ORDER BY 1").fetchall()
+        return [SimpleNamespace(dataset_id=name, project=self.project, location='US') for (name,) in rows]
+
+    def list_tables(self, dataset_ref: Any):
+        dataset_id = getattr(dataset_ref, 'dataset_id', dataset_ref)
+        rows = self._connection.cursor().execute(
+            "SELECT table_name, table_type FROM information_schema.tables WHERE table_schema = ? ORDER BY 1",
+            [dataset_id]).fetchall()
+        return [SimpleNamespace(table_id=name, dataset_id=dataset_id, project=self.project,
+                                table_type='TABLE' if kind == 'BASE TABLE' else kind)
+                for name, kind in rows]
+
+    def get_table(self, table_ref: Any):
+        if isinstance(table_ref, str):
+            dataset_id, table_id = table_path(table_ref)
+        else:
+            dataset_id, table_id = table_ref.dataset_id, table_ref.table_id
+        cursor = self._connection.cursor()
+        columns = cursor.execute(
+            "SELECT column_name, data_type, is_nullable FROM information_schema.columns "
+            "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position",
+            [dataset_id, table_id]).fetchall()
+        if not columns:
+            raise KeyError(f"Tabla no encontrada: {dataset_id}.{table_id}")
+        num_rows = cursor.execute(f'SELECT count(*) FROM "{dataset_id}"."{table_id}"').fetchone()[0]
+        schema = [SimpleNamespace(name=name, field_type=_bigquery_type(kind),
+                                  mode='NULLABLE' if nullable == 'YES' else 'REQUIRED', description=None)
+                  for name, kind, nullable in columns]
+        modified = datetime.datetime.fromtimestamp(os.path.getmtime(self.database), datetime.timezone.utc)
+        return SimpleNamespace(project=self.project, dataset_id=dataset_id, table_id=table_id,
+                               schema=schema, num_rows=num_rows,
+                               num_bytes=sum(self._table_column_bytes(dataset_id, table_id).values()),
+                               created=modified, modified=modified, table_type='TABLE')
+
+
+def client_from_env(project_id: Optional[str] = None):
+    """Cliente stand-in si BIGQUERY_BACKEND=duckdb; None para usar BigQuery real"""
+    if os.environ.get('BIGQUERY_BACKEND', 'bigquery').lower() != 'duckdb':
+        return None
+    return DuckDBStandInClient(project=project_id or 'meli-bi-data')
@@ -7,6 +7,7 @@ Buscar directamente en tablas conocidas de pagos/transferencias
 import asyncio
 import pandas as pd
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_results import result_dataframe
 
 # Usuarios objetivo
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -47,7 +48,7 @@ async def buscar_en_bt_mp_pay_payments():
     if result["status"] == "success" and result["result"]["rows"]:
         print(f"✅ {len(result['result']['rows'])} usuarios encontrados en BT_MP_PAY_PAYMENTS:")
         
-        usuarios_df = pd.DataFrame(result["result"]["rows"])
+        usuarios_df = result_dataframe(result)
         
         for _, row in usuarios_df.iterrows():
             user_id = row['user_id']
@@ -120,7 +121,7 @@ async def buscar_movimientos_periodo_especifico():
         result = await operations.execute_query(query_movimientos, 50)
         
         if result["status"] == "success" and result["result"]["rows"]:
-            movimientos = pd.DataFrame(result["result"]["rows"])
+            movimientos = result_dataframe(result)
             
             print(f"   💰 {len(movimientos)} movimientos encontrados")
             
@@ -13,6 +13,8 @@ import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_cache import print_stats
+from query_results import result_dataframe
 
 # Usuarios objetivo
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -174,7 +176,7 @@ async def analisis_detallado_operaciones():
     result = await operations.execute_query(query_detallada, 100)
     
     if result["status"] == "success" and result["result"]["rows"]:
-        operaciones_df = pd.DataFrame(result["result"]["rows"])
+        operaciones_df = result_dataframe(result)
         
         print(f"✅ {len(operaciones_df)} operaciones encontradas")
         
@@ -280,7 +282,7 @@ async def analizar_velocidades_usuario(user_id, ingresos_ato, operations):
         result = await operations.execute_query(query_egresos, 15)
         
         if result["status"] == "success" and result["result"]["rows"]:
-            egresos = pd.DataFrame(result["result"]["rows"])
+            egresos = result_dataframe(result)
             
             if len(egresos) > 0:
                 primer_egreso = egresos.iloc[0]
@@ -364,6 +366,8 @@ async def main():
             print("💡 Los usuarios podrían no estar involucrados en operaciones ATO/DTO")
             print("🔍 Verificar si están en otras tablas o períodos diferentes")
         
+        print_stats()
+        
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
@@ -0,0 +1,378 @@
+"""
+Motor único de comparación con métricas como plugins y perfiles con nombre
+Reúne en un solo deploy los algoritmos de las distintas apps (hashes 8x8 de
+app_rapido, corte por identidad de app_optimizado, histogramas completos de
+app_mejorado y métricas de fondo de app_web) y deja elegir por request el
+compromiso velocidad/precisión:
+
+    instant   10 ms   identidad + hash 8x8 + medias
+    fast      30 ms   métricas de app_rapido
+    balanced  80 ms   métricas de fondo de app_web (comportamiento por defecto)
+    thorough  120 ms  fondo + identidad, hash 16x16 e histogramas completos
+
+Los presupuestos son para imágenes normalizadas a 600 px en un core; cada
+respuesta informa la latencia medida y si se mantuvo dentro del presupuesto.
+"""
+
+import os
+import time
+import logging
+
+import numpy as np
+from PIL import Image, ImageChops, ImageStat
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownProfile(ValueError):
+    """Perfil de comparación no registrado"""
+
+
+class ComparisonContext:
+    """Par de imágenes de una comparación con versiones reducidas compartidas"""
+
+    def __init__(self, image1, image2):
+        self.image1 = image1
+        self.image2 = image2
+        self._resized = {}
+
+    def resized(self, size, mode='RGB'):
+        """(array1, array2) de las imágenes a `size` con LANCZOS; se calcula una vez"""
+        key = (size, mode)
+        if key not in self._resized:
+            self._resized[key] = tuple(
+                np.asarray(image.resize(size, Image.Resampling.LANCZOS).convert(mode))
+                for image in (self.image1, self.image2)
+            )
+        return self._resized[key]
+
+
+class MetricPlugin:
+    """Métrica registrada: función(contexto) -> similitud en [0, 1]"""
+
+    def __init__(self, name, function, cost_ms, description=''):
+        self.name = name
+        self.function = function
+        self.cost_ms = cost_ms
+        self.description = description
+
+
+class ComparisonProfile:
+    """Conjunto de métricas + agregación + presupuesto de latencia"""
+
+    def __init__(self, name, metrics, aggregate, latency_budget_ms, description='', short_circuit=None):
+        """
+        Args:
+            metrics: nombres de métricas a correr, en orden
+            aggregate: función(resultados) -> similitud general
+            latency_budget_ms: latencia objetivo documentada del perfil
+            short_circuit: métrica que, si da 1.0, corta la comparación
+                           (imágenes idénticas)
+        """
+        self.name = name
+        self.metrics = tuple(metrics)
+        self.aggregate = aggregate
+        self.latency_budget_ms = latency_budget_ms
+        self.description = description
+        self.short_circuit = short_circuit
+
+
+class ComparatorEngine:
+    """Registro de métricas/perfiles y ejecución de una comparación"""
+
+    def __init__(self, conclusion=None, default_profile='balanced'):
+        """
+        Args:
+            conclusion: función(similitud) -> dict de conclusión descriptiva
+            default_profile: perfil usado cuando la request no indica uno
+        """
+        self.metrics = {}
+        self.profiles = {}
+        self.conclusion = conclusion
+        self.default_profile = default_profile
+
+    def register_metric(self, name, function, cost_ms, description=''):
+        self.metrics[name] = MetricPlugin(name, function, cost_ms, description)
+
+    def register_profile(self, profile):
+        missing = [name for name in profile.metrics if name not in self.metrics]
+        if profile.short_circuit and profile.short_circuit not in self.metrics:
+            missing.append(profile.short_circuit)
+        if missing:
+            raise ValueError(f"Perfil {profile.name}: métricas no registradas {missing}")
+        self.profiles[profile.name] = profile
+
+    def get_profile(self, name=None):
+        name = name or self.default_profile
+        if name not in self.profiles:
+            raise UnknownProfile(f"Perfil desconocido: {name} (disponibles: {', '.join(self.profiles)})")
+        return self.profiles[name]
+
+    def compare(self, image1, image2, profile=None):
+        """Corre las métricas del perfil y devuelve el dict de resultados"""
+        profile = self.get_profile(profile)
+        start = time.perf_counter()
+        context = ComparisonContext(image1, image2)
+        results = {}
+        timings = {}
+
+        def run(name):
+            metric_start = time.perf_counter()
+            try:
+                results[name] = float(self.metrics[name].function(context))
+            except Exception as e:
+                logger.error(f"Error en métrica {name}: {e}")
+                results[name] = 0.0
+            timings[name] = round((time.perf_counter() - metric_start) * 1000, 2)
+
+        if profile.short_circuit:
+            run(profile.short_circuit)
+
+        if profile.short_circuit and results[profile.short_circuit] >= 1.0:
+            # Imágenes idénticas: el resto de las métricas no cambia el veredicto
+            overall = 1.0
+            results['short_circuit'] = True
+        else:
+            for name in profile.metrics:
+                if name not in results:
+                    run(name)
+            overall = float(profile.aggregate(results))
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        if latency_ms > profile.latency_budget_ms:
+            logger.warning(f"⏱️ Perfil {profile.name} fuera de presupuesto: "
+                           f"{latency_ms:.1f} ms > {profile.latency_budget_ms} ms")
+
+        results['overall_similarity'] = overall
+        if self.conclusion is not None:
+            results['conclusion'] = self.conclusion(overall)
+        _add_compat_keys(results)
+        results['profile'] = profile.name
+        results['metric_timings_ms'] = timings
+        results['latency_ms'] = round(latency_ms, 2)
+        results['latency_budget_ms'] = profile.latency_budget_ms
+        results['within_budget'] = latency_ms <= profile.latency_budget_ms
+        return results
+
+    def describe(self):
+        """Perfiles disponibles con sus métricas y presupuestos"""
+        return {
+            'default': self.default_profile,
+            'profiles': [{
+                'name': profile.name,
+                'description': profile.description,
+                'latency_budget_ms': profile.latency_budget_ms,
+                'metrics': list(profile.metrics),
+                'short_circuit': profile.short_circuit,
+            } for profile in self.profiles.values()],
+        }
+
+
+def _add_compat_keys(results):
+    """Claves que espera el frontend aunque el perfil no corra esas métricas"""
+    aliases = {
+        'pixel_similarity': ('edge_similarity', 'pixels_fast', 'pixels_precise', 'overall_similarity'),
+        'hash_similarity': ('background_hash', 'hash_16', 'hash_8', 'overall_similarity'),
+        'color_similarity': ('histogram_full', 'histogram_fast', 'overall_similarity'),
+        'stats_similarity': ('texture_similarity', 'stats_full', 'stats_means', 'overall_similarity'),
+        'structural_similarity': ('structure', 'overall_similarity'),
+    }
+    for key, sources in aliases.items():
+        if key not in results:
+            results[key] = next(results[source] for source in sources if source in results)
+
+
+# ==================== MÉTRICAS GENÉRICAS ====================
+# Versiones vectorizadas de las métricas de app_rapido / app_optimizado /
+# app_mejorado (mismos tamaños, tolerancias y bonificaciones)
+
+def pixel_identity(context):
+    """Corte de app_optimizado: mismo tamaño y diferencia media < 2 => 1.0"""
+    if context.image1.size != context.image2.size:
+        return 0.0
+    stat = ImageStat.Stat(ImageChops.difference(context.image1, context.image2))
+    return 1.0 if sum(stat.mean) / len(stat.mean) < 2.0 else 0.0
+
+
+def _tolerance_fraction(array1, array2, tolerance):
+    distance = np.abs(array1.astype(np.int16) - array2.astype(np.int16)).sum(axis=2)
+    return float(np.count_nonzero(distance < tolerance)) / distance.size
+
+
+def pixels_fast(context):
+    """Píxeles 150x100 con tolerancia L1 15 (app_rapido)"""
+    similarity = _tolerance_fraction(*context.resized((150, 100)), 15)
+    if similarity > 0.98:
+        similarity = min(1.0, similarity * 1.02)
+    elif similarity > 0.95:
+        similarity = min(1.0, similarity * 1.01)
+    return similarity
+
+
+def pixels_precise(context):
+    """Píxeles 200x150 con tolerancia L1 8 (app_optimizado)"""
+    similarity = _tolerance_fraction(*context.resized((200, 150)), 8)
+    if similarity > 0.99:
+        similarity = 1.0
+    elif similarity > 0.97:
+        similarity = min(1.0, similarity * 1.03)
+    elif similarity > 0.94:
+        similarity = min(1.0, similarity * 1.02)
+    return similarity
+
+
+def _average_hash_similarity(context, size):
+    gray1, gray2 = context.resized((size, size), mode='L')
+    bits1 = gray1 > gray1.mean()
+    bits2 = gray2 > gray2.mean()
+    return float(np.mean(bits1 == bits2))
+
+
+def hash_8(context):
+    """Average hash 8x8 (app_rapido / app_mejorado)"""
+    return _average_hash_similarity(context, 8)
+
+
+def hash_16(context):
+    """Average hash 16x16 con bonificación (app_optimizado)"""
+    similarity = _average_hash_similarity(context, 16)
+    if similarity > 0.98:
+        similarity = 1.0
+    elif similarity > 0.95:
+        similarity = min(1.0, similarity * 1.02)
+    return similarity
+
+
+def _histogram_intersection(image1, image2):
+    hist1 = np.asarray(image1.histogram(), dtype=np.float64)
+    hist2 = np.asarray(image2.histogram(), dtype=np.float64)
+    if not hist1.sum() or not hist2.sum():
+        return 0.0
+    return float(np.minimum(hist1 / hist1.sum(), hist2 / hist2.sum()).sum())
+
+
+def histogram_fast(context):
+    """Intersección de histogramas RGB a 100x75 (app_rapido)"""
+    small1, small2 = (Image.fromarray(array) for array in context.resized((100, 75)))
+    return _histogram_intersection(small1, small2)
+
+
+def histogram_full(context):
+    """Intersección de histogramas RGB a resolución completa (app_mejorado)"""
+    return _histogram_intersection(context.image1, context.image2)
+
+
+def stats_means(context):
+    """Diferencia de medias por canal (app_rapido)"""
+    mean1 = ImageStat.Stat(context.image1).mean
+    mean2 = ImageStat.Stat(context.image2).mean
+    return max(0.0, 1 - sum(abs(m1 - m2) for m1, m2 in zip(mean1, mean2)) / len(mean1) / 255)
+
+
+def stats_full(context):
+    """Medias y desviaciones por canal (app_mejorado)"""
+    stat1 = ImageStat.Stat(context.image1)
+    stat2 = ImageStat.Stat(context.image2)
+    mean_diff = sum(abs(m1 - m2) for m1, m2 in zip(stat1.mean, stat2.mean)) / len(stat1.mean)
+    std_diff = sum(abs(s1 - s2) for s1, s2 in zip(stat1.stddev, stat2.stddev)) / len(stat1.stddev)
+    return (max(0.0, 1 - mean_diff / 255) + max(0.0, 1 - std_diff / 255)) / 2
+
+
+def structure(context):
+    """Diferencia media a 50x40 (app_rapido / app_optimizado)"""
+    tiny1, tiny2 = context.resized((50, 40))
+    mean_diff = float(np.abs(tiny1.astype(np.int16) - tiny2.astype(np.int16)).mean())
+    return max(0.0, 1 - mean_diff / 128)
+
+
+# ==================== AGREGACIONES ====================
+
+def _weighted(results, weights):
+    total = sum(weights.values())
+    return sum(results[name] * weight for name, weight in weights.items()) / total
+
+
+def aggregate_instant(results):
+    # Pesos relativos de hash y medias en app_rapido (0.15 / 0.06)
+    return _weighted(results, {'hash_8': 0.15, 'stats_means': 0.06})
+
+
+def aggregate_fast(results):
+    """Misma fórmula que app_rapido.compare_images_fast"""
+    if results['pixels_fast'] > 0.95:
+        return results['pixels_fast'] * 0.9 + results['hash_8'] * 0.1
+    return _weighted(results, {'pixels_fast': 0.5, 'histogram_fast': 0.25, 'hash_8': 0.15,
+                               'stats_means': 0.06, 'structure': 0.04})
+
+
+def _aggregate_generic_full(results):
+    """Pesos de app_mejorado.compare_images"""
+    return _weighted(results, {'pixels_precise': 0.4, 'histogram_full': 0.25, 'hash_16': 0.2,
+                               'stats_full': 0.1, 'structure': 0.05})
+
+
+# ==================== CONSTRUCCIÓN ====================
+
+BACKGROUND_METRICS = (
+    ('edge_similarity', '_compare_background_edges', 8, 'Bordes 300x200 (zona de fondo)'),
+    ('texture_similarity', '_compare_background_textures', 10, 'Texturas de bloques del fondo'),
+    ('color_similarity', '_compare_background_colors', 15, 'Histogramas de regiones de fondo'),
+    ('background_hash', '_compare_background_hash', 3, 'Hash de esquinas 20x20'),
+    ('structural_similarity', '_compare_fixed_elements', 5, 'Elementos fijos (puertas, ventanas)'),
+    ('ssim_similarity', '_compare_background_ssim', 4, 'MS-SSIM de las franjas de borde'),
+)
+
+
+def build_engine(background_comparator, default_profile=None):
+    """
+    Motor con todas las métricas registradas y los cuatro perfiles
+
+    Args:
+        background_comparator: FastImageComparator de fast_comparator
+                               (métricas de fondo, agregación y conclusión)
+        default_profile: perfil por defecto (COMPARISON_PROFILE o 'balanced')
+    """
+    engine = ComparatorEngine(
+        conclusion=background_comparator._generate_background_conclusion,
+        default_profile=default_profile or os.environ.get('COMPARISON_PROFILE', 'balanced'),
+    )
+
+    generic = (
+        ('pixel_identity', pixel_identity, 1, 'Corte por imágenes idénticas'),
+        ('pixels_fast', pixels_fast, 3, 'Píxeles 150x100, tolerancia 15'),
+        ('pixels_precise', pixels_precise, 4, 'Píxeles 200x150, tolerancia 8'),
+        ('hash_8', hash_8, 1, 'Average hash 8x8'),
+        ('hash_16', hash_16, 1, 'Average hash 16x16'),
+        ('histogram_fast', histogram_fast, 1, 'Histogramas a 100x75'),
+        ('histogram_full', histogram_full, 3, 'Histogramas a resolución completa'),
+        ('stats_means', stats_means, 2, 'Medias por canal'),
+        ('stats_full', stats_full, 3, 'Medias y desviaciones por canal'),
+        ('structure', structure, 1, 'Diferencia media a 50x40'),
+    )
+    for name, function, cost_ms, description in generic:
+        engine.register_metric(name, function, cost_ms, description)
+
+    for name, method, cost_ms, description in BACKGROUND_METRICS:
+        comparator_method = getattr(background_comparator, method)
+        engine.register_metric(name, lambda context, m=comparator_method: m(context.image1, context.image2),
+                               cost_ms, description)
+
+    background_names = [name for name, _, _, _ in BACKGROUND_METRICS]
+    background_aggregate = background_comparator._calculate_background_similarity
+
+    engine.register_profile(ComparisonProfile(
+        'instant', ['hash_8', 'stats_means'], aggregate_instant, 10,
+        'Identidad + hash 8x8 + medias: descarte inmediato', short_circuit='pixel_identity'))
+    engine.register_profile(ComparisonProfile(
+        'fast', ['pixels_fast', 'hash_8', 'histogram_fast', 'stats_means', 'structure'],
+        aggregate_fast, 30, 'Métricas de app_rapido (imagen completa)'))
+    engine.register_profile(ComparisonProfile(
+        'balanced', background_names, background_aggregate, 80,
+        'Métricas de fondo de app_web (ignora a la persona central)'))
+    engine.register_profile(ComparisonProfile(
+        'thorough', background_names + ['pixels_precise', 'hash_16', 'histogram_full', 'stats_full', 'structure'],
+        lambda results: 0.8 * background_aggregate(results) + 0.2 * _aggregate_generic_full(results), 120,
+        'Fondo + métricas completas de app_mejorado/app_optimizado', short_circuit='pixel_identity'))
+
+    engine.get_profile()
+    return engine
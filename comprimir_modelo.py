@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+🗜️ COMPRESOR DEL MODELO MÉDICO
+Genera versiones más chicas de medical_model.joblib (menos árboles, árboles
+podados, modelo destilado y tabla de lookup), mide latencia y memoria, y
+reporta el acuerdo de decisiones contra el modelo original
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import pickle
+import tracemalloc
+
+import numpy as np
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeRegressor
+
+N_FEATURES = 8
+
+
+class LookupTableModel:
+    """Tabla de probabilidades sobre una grilla cuantizada de características escaladas"""
+
+    def __init__(self, edges, table, classes):
+        self.edges = edges          # (n_features, bins - 1) cortes por característica
+        self.table = table          # probabilidad patológica por celda (float16)
+        self.classes_ = classes
+        self.n_features_in_ = edges.shape[0]
+
+    def _cell_index(self, X):
+        X = np.asarray(X, dtype=float)
+        bins = self.edges.shape[1] + 1
+        index = np.zeros(X.shape[0], dtype=np.int64)
+        for feature in range(self.n_features_in_):
+            index = index * bins + np.searchsorted(self.edges[feature], X[:, feature])
+        return index
+
+    def predict_proba(self, X):
+        positive = self.table[self._cell_index(X)].astype(float)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+class DistilledTreeModel:
+    """Árbol de regresión que imita la probabilidad patológica del bosque"""
+
+    def __init__(self, tree, classes):
+        self.tree = tree
+        self.classes_ = classes
+        self.n_features_in_ = tree.n_features_in_
+
+    def predict_proba(self, X):
+        positive = np.clip(self.tree.predict(np.asarray(X, dtype=float)), 0.0, 1.0)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+def synthetic_feature_sample(n_samples, seed=42):
+    """Muestra sintética de características crudas en [0, 1]
+
+    Mitad uniforme sobre todo el espacio y mitad concentrada alrededor de los
+    perfiles normal/patológico del dataset semilla, donde vive el tráfico real.
+    """
+    rng = np.random.default_rng(seed)
+    uniform = rng.random((n_samples // 2, N_FEATURES))
+
+    normal_center = np.array([0.27, 0.17, 0.37, 0.42, 0.32, 0.47, 0.37, 0.42])
+    pathology_center = np.array([0.80, 0.84, 0.10, 0.13, 0.80, 0.83, 0.77, 0.80])
+    n_rest = n_samples - len(uniform)
+    centers = np.where(rng.random((n_rest, 1)) < 0.5, normal_center, pathology_center)
+    # Interpolar entre perfiles para cubrir la frontera de decisión
+    blend = rng.random((n_rest, 1)) * 0.5
+    other = np.where(centers == normal_center, pathology_center, normal_center)
+    focused = centers + (other - centers) * blend + rng.normal(0, 0.08, (n_rest, N_FEATURES))
+
+    return np.clip(np.vstack([uniform, focused]), 0.0, 1.0)
+
+
+def fewer_trees(model, n_trees):
+    """Subconjunto de los primeros n árboles del bosque original"""
+    small = RandomForestClassifier(n_estimators=n_trees, **{
+        key: value for key, value in model.get_params().items() if key != 'n_estimators'
+    })
+    small.estimators_ = model.estimators_[:n_trees]
+    for attribute in ('classes_', 'n_classes_', 'n_outputs_', 'n_features_in_', 'estimator_'):
+        if hasattr(model, attribute):
+            setattr(small, attribute, getattr(model, attribute))
+    return small
+
+
+def pruned_forest(model, X_scaled, max_depth, n_trees):
+    """Bosque chico y poco profundo entrenado sobre las probabilidades del original"""
+    soft_labels = model.predict_proba(X_scaled)[:, 1]
+    forest = RandomForestClassifier(
+        n_estimators=n_trees, max_depth=max_depth, random_state=42, n_jobs=1
+    )
+    forest.fit(X_scaled, (soft_labels > 0.5).astype(int))
+    return forest
+
+
+def distilled_tree(model, X_scaled, max_depth):
+    """Árbol único destilado del bosque (regresión sobre sus probabilidades)"""
+    soft_labels = model.predict_proba(X_scaled)[:, 1]
+    tree = DecisionTreeRegressor(max_depth=max_depth, random_state=42)
+    tree.fit(X_scaled, soft_labels)
+    return DistilledTreeModel(tree, model.classes_)
+
+
+def lookup_table(model, X_scaled, bins):
+    """Tabla de lookup con `bins` niveles por característica (cuantiles de la muestra)"""
+    quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+    edges = np.quantile(X_scaled, quantiles, axis=0).T
+    lookup = LookupTableModel(edges, None, model.classes_)
+
+    # Celdas sin muestras: evaluar el modelo original en el centro de la celda
+    centers = []
+    for feature in range(N_FEATURES):
+        cuts = np.concatenate([[X_scaled[:, feature].min()], edges[feature], [X_scaled[:, feature].max()]])
+        centers.append((cuts[:-1] + cuts[1:]) / 2)
+    grid = np.stack(np.meshgrid(*centers, indexing='ij'), axis=-1).reshape(-1, N_FEATURES)
+    table = model.predict_proba(grid)[:, 1]
+
+    # Celdas con muestras: probabilidad media del original dentro de la celda
+    cells = lookup._cell_index(X_scaled)
+    counts = np.bincount(cells, minlength=len(table))
+    sums = np.bincount(cells, weights=model.predict_proba(X_scaled)[:, 1], minlength=len(table))
+    observed = counts > 0
+    table[observed] = sums[observed] / counts[observed]
+
+    lookup.table = table.astype(np.float16)
+    return lookup
+
+
+def serialized_size(model):
+    """Tamaño en bytes del artefacto joblib"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+def benchmark(name, model, original, X_scaled, single_rows, repeats):
+    """Latencia (1 fila, como en producción, y batch), memoria y acuerdo"""
+    # Latencia por request: predict_proba de una fila
+    start = time.perf_counter()
+    for row in single_rows:
+        model.predict_proba(row)
+    single_ms = (time.perf_counter() - start) * 1000 / len(single_rows)
+
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        candidate_proba = model.predict_proba(X_scaled)[:, 1]
+        batch_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    pickle.loads(pickle.dumps(model))
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    original_proba = original.predict_proba(X_scaled)[:, 1]
+    same_decision = (candidate_proba > 0.5) == (original_proba > 0.5)
+    agreement = float(np.mean(same_decision))
+    # Acuerdo donde el original es claro (fuera de la zona ambigua 0.4-0.6)
+    confident = np.abs(original_proba - 0.5) > 0.1
+    confident_agreement = float(np.mean(same_decision[confident])) if confident.any() else 1.0
+    proba_error = np.abs(candidate_proba - original_proba)
+
+    return {
+        'candidate': name,
+        'size_bytes': serialized_size(model),
+        'memory_peak_bytes': int(peak_memory),
+        'latency_single_ms': round(single_ms, 4),
+        'latency_batch_ms': round(min(batch_times) * 1000, 3),
+        'decision_agreement': round(agreement, 5),
+        'decision_agreement_confident': round(confident_agreement, 5),
+        'proba_mae': round(float(proba_error.mean()), 5),
+        'proba_max_error': round(float(proba_error.max()), 5),
+    }
+
+
+def build_candidates(model, X_scaled):
+    candidates = {}
+    for n_trees in (100, 50, 25, 10):
+        if n_trees < len(model.estimators_):
+            candidates[f'forest_{n_trees}_trees'] = fewer_trees(model, n_trees)
+    candidates['forest_20x_depth3'] = pruned_forest(model, X_scaled, max_depth=3, n_trees=20)
+    for depth in (6, 8, 10):
+        candidates[f'distilled_tree_depth{depth}'] = distilled_tree(model, X_scaled, depth)
+    candidates['lookup_table_4bins'] = lookup_table(model, X_scaled, bins=4)
+    return candidates
+
+
+def load_source(registry, model_path, scaler_path):
+    """
+    (modelo, scaler, origen) a comprimir: la versión vigente del registro si
+    hay manifiesto (la que está sirviendo MedicalImageComparator), si no los
+    archivos base. Si la vigente ya es comprimida se vuelve a su origen, así
+    nunca se comprime un modelo comprimido.
+    """
+    manifest = registry.read_manifest()
+    if not manifest:
+        source = {'source_model': os.path.abspath(model_path), 'source_scaler': os.path.abspath(scaler_path),
+                  'source_version': None, 'trained_on': 0}
+    elif manifest.get('compressed_from'):
+        source = {key: manifest.get(key) for key in ('source_model', 'source_scaler', 'source_version', 'trained_on')}
+    else:
+        source = {'source_model': os.path.join(registry.directory, manifest['model']),
+                  'source_scaler': os.path.join(registry.directory, manifest['scaler']),
+                  'source_version': manifest['version'], 'trained_on': manifest.get('trained_on', 0)}
+
+    model = joblib.load(source['source_model'])
+    scaler = joblib.load(source['source_scaler'])
+    print(f"📦 Origen: {source['source_version'] or source['source_model']}")
+    return model, scaler, source
+
+
+def deploy(registry, model, scaler, name, source, report_row):
+    """
+    Publica el candidato como versión nueva del registro para que lo tome
+    MedicalImageComparator.refresh_model; los archivos de origen no se tocan
+    """
+    manifest = registry.publish(model, scaler, dict(report_row, compressed_from=name, **source))
+    print(f"🚀 {name} publicado como {manifest['version']} en {registry.directory}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compresión del modelo médico con reporte de paridad')
+    parser.add_argument('--model', default='medical_model.joblib')
+    parser.add_argument('--scaler', default='medical_scaler.joblib')
+    parser.add_argument('--samples', type=int, default=200000, help='tamaño de la muestra sintética')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--report', default=None, help='ruta para guardar el reporte JSON')
+    parser.add_argument('--deploy', default=None, help='nombre del candidato a desplegar')
+    parser.add_argument('--min-agreement', type=float, default=0.995,
+                        help='acuerdo mínimo exigido para desplegar (fuera de la zona ambigua)')
+    args = parser.parse_args()
+
+    from medical_feedback import ModelRegistry
+
+    registry = ModelRegistry(os.environ.get('MEDICAL_MODEL_STORE', 'model_store'))
+    model, scaler, source = load_source(registry, args.model, args.scaler)
+    print(f"🌲 Modelo original: {len(model.estimators_)} árboles, {serialized_size(model) / 1024:.1f} KB")
+
+    X_scaled = scaler.transform(synthetic_feature_sample(args.samples))
+    # Muestra independiente para el reporte (evita medir sobre datos de destilación)
+    X_eval = scaler.transform(synthetic_feature_sample(args.samples, seed=7))
+    single_rows = [X_eval[i:i + 1] for i in range(200)]
+
+    candidates = {'original': model}
+    candidates.update(build_candidates(model, X_scaled))
+
+    report = []
+    for name, candidate in candidates.items():
+        row = benchmark(name, candidate, model, X_eval, single_rows, args.repeats)
+        report.append(row)
+
+    print(f"\n{'candidato':<24}{'KB':>9}{'1 fila ms':>11}{'batch ms':>10}{'acuerdo':>10}{'claros':>10}{'MAE prob':>10}")
+    print("-" * 84)
+    for row in sorted(report, key=lambda r: r['size_bytes']):
+        print(f"{row['candidate']:<24}{row['size_bytes'] / 1024:>9.1f}{row['latency_single_ms']:>11.3f}"
+              f"{row['latency_batch_ms']:>10.1f}{row['decision_agreement'] * 100:>9.2f}%"
+              f"{row['decision_agreement_confident'] * 100:>9.2f}%{row['proba_mae']:>10.4f}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'samples': args.samples, 'candidates': report}, f, indent=2)
+        print(f"\n📄 Reporte guardado en {args.report}")
+
+    if args.deploy:
+        if args.deploy not in candidates:
+            print(f"❌ Candidato desconocido: {args.deploy}")
+            sys.exit(1)
+        row = next(r for r in report if r['candidate'] == args.deploy)
+        if row['decision_agreement_confident'] < args.min_agreement:
+            print(f"❌ {args.deploy} no alcanza el acuerdo mínimo "
+                  f"({row['decision_agreement_confident']:.4f} < {args.min_agreement})")
+            sys.exit(1)
+        deploy(registry, candidates[args.deploy], scaler, args.deploy, source, row)
+
+
+if __name__ == "__main__":
+    # Importar por nombre de módulo para que LookupTableModel se serialice como
+    # comprimir_modelo.LookupTableModel (y no __main__) y app_web pueda cargarlo
+    from comprimir_modelo import main as _main
+    _main()
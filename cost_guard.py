@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+💸 CONTROL DE COSTO DE CONSULTAS BIGQUERY
+execute_query ejecutaba cualquier cosa: el LIMIT que agrega no reduce los
+bytes escaneados, y un script "sin límites" puede leer particiones enteras.
+Antes de cada job, el guardia:
+
+- estima los bytes con un dry-run (gratis) y corta con BudgetExceededError
+  si superan el límite por consulta o lo que queda del presupuesto de la
+  sesión;
+- pone maximum_bytes_billed en el job: si la estimación falla o se queda
+  corta, BigQuery rechaza el job en lugar de facturarlo;
+- acumula lo facturado por etiqueta (analizador.etapa, el nombre de la
+  plantilla en query_templates; "adhoc" para el resto).
+
+Los aciertos de la caché local (query_cache) no pasan por el guardia.
+
+Variables de entorno (acepta 500MB, 100GB, 1TB o bytes; 0 = sin límite):
+    BIGQUERY_MAX_BYTES_PER_QUERY    límite por consulta (100GB por defecto)
+    BIGQUERY_MAX_BYTES_PER_SESSION  límite del proceso (1TB por defecto)
+    BIGQUERY_DRY_RUN=0              sin dry-run previo (solo maximum_bytes_billed)
+"""
+
+import os
+import re
+import copy
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from google.cloud import bigquery
+except ImportError:
+    bigquery = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES_PER_QUERY = '100GB'
+DEFAULT_MAX_BYTES_PER_SESSION = '1TB'
+DEFAULT_LABEL = 'adhoc'
+
+_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'PB': 1024 ** 5}
+# "Query exceeded limit for bytes billed: 1000. 10485760 or higher required."
+_BYTES_LIMIT_ERROR = re.compile(r'exceeded limit for bytes billed: \d+\. (\d+) or higher required', re.IGNORECASE)
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGTP]?B?)\s*$', re.IGNORECASE)
+
+
+def parse_bytes(value: Any) -> Optional[int]:
+    """'100GB' / '1.5TB' / 1048576 -> bytes; None, '' o 0 -> sin límite (None)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) or None
+    match = _SIZE.match(str(value))
+    if not match:
+        raise ValueError(f"Tamaño inválido: {value!r} (usar p. ej. 500MB, 100GB, 1TB)")
+    number, unit = match.groups()
+    unit = unit.upper()
+    if unit and not unit.endswith('B'):
+        unit += 'B'
+    return int(float(number) * _UNITS[unit]) or None
+
+
+def format_bytes(value: Optional[int]) -> str:
+    if value is None:
+        return 'sin límite'
+    for unit in ('TB', 'GB', 'MB', 'KB'):
+        if value >= _UNITS[unit]:
+            return f"{value / _UNITS[unit]:.2f} {unit}"
+    return f"{value} B"
+
+
+class BudgetExceededError(RuntimeError):
+    """La consulta superaría el presupuesto de bytes: no se ejecutó"""
+
+    def __init__(self, label: str, estimated_bytes: Optional[int], limit_bytes: int, scope: str):
+        """
+        Args:
+            scope: 'consulta' (limit_bytes: límite por consulta) o 'sesión'
+                   (limit_bytes: lo que queda del presupuesto)
+        """
+        self.label = label
+        self.estimated_bytes = estimated_bytes
+        self.limit_bytes = limit_bytes
+        self.scope = scope
+        variable = 'BIGQUERY_MAX_BYTES_PER_QUERY' if scope == 'consulta' else 'BIGQUERY_MAX_BYTES_PER_SESSION'
+        if scope == 'consulta':
+            detail = (f"la consulta escanearía {format_bytes(estimated_bytes)} y el límite por consulta "
+                      f"es {format_bytes(limit_bytes)}")
+        elif estimated_bytes is None or not limit_bytes:
+            detail = "el presupuesto de la sesión está agotado"
+        else:
+            detail = (f"la consulta escanearía {format_bytes(estimated_bytes)} y quedan "
+                      f"{format_bytes(limit_bytes)} del presupuesto de la sesión")
+        super().__init__(f"💸 Presupuesto de BigQuery excedido [{label}]: {detail}. Acotar la consulta "
+                         f"(filtro de fechas sobre la partición, menos columnas) o ajustar {variable}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"label": self.label, "estimated_bytes": self.estimated_bytes,
+                "limit_bytes": self.limit_bytes, "scope": self.scope}
+
+
+class CostGuard:
+    """Presupuesto de bytes por consulta y por sesión, con dry-run previo"""
+
+    def __init__(self, max_bytes_per_query: Any = None, max_bytes_per_session: Any = None,
+                 dry_run: Optional[bool] = None):
+        """
+        Args:
+            max_bytes_per_query: límite por consulta (BIGQUERY_MAX_BYTES_PER_QUERY)
+            max_bytes_per_session: límite del proceso (BIGQUERY_MAX_BYTES_PER_SESSION)
+            dry_run: estimar antes de ejecutar (BIGQUERY_DRY_RUN, activado)
+        """
+        if max_bytes_per_query is None:
+            max_bytes_per_query = os.environ.get('BIGQUERY_MAX_BYTES_PER_QUERY', DEFAULT_MAX_BYTES_PER_QUERY)
+        if max_bytes_per_session is None:
+            max_bytes_per_session = os.environ.get('BIGQUERY_MAX_BYTES_PER_SESSION', DEFAULT_MAX_BYTES_PER_SESSION)
+        if dry_run is None:
+            dry_run = os.environ.get('BIGQUERY_DRY_RUN', '1') != '0'
+        self.max_bytes_per_query = parse_bytes(max_bytes_per_query)
+        self.max_bytes_per_session = parse_bytes(max_bytes_per_session)
+        self.dry_run = dry_run
+        self.billed = 0
+        # Estimaciones de los jobs en curso: cuentan contra la sesión hasta
+        # que se conoce lo facturado, así las consultas concurrentes no se pasan
+        self.reserved = 0
+        self.spend: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[int]:
+        """Bytes que quedan del presupuesto de la sesión (None: sin límite)"""
+        if self.max_bytes_per_session is None:
+            return None
+        return max(0, self.max_bytes_per_session - self.billed - self.reserved)
+
+    def _label_spend(self, label: str) -> Dict[str, int]:
+        return self.spend.setdefault(label, {"queries": 0, "dry_runs": 0, "blocked": 0,
+                                             "bytes_estimated": 0, "bytes_processed": 0, "bytes_billed": 0})
+
+    def estimate(self, client: Any, query: str, job_config: Any = None) -> int:
+        """Bytes que procesaría la consulta, según un dry-run (no factura)"""
+        parameters = list(getattr(job_config, 'query_parameters', None) or [])
+        if bigquery is not None:
+            dry_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False,
+                                                 query_parameters=parameters)
+        else:
+            dry_config = SimpleNamespace(dry_run=True, use_query_cache=False, query_parameters=parameters)
+        return client.query(query, job_config=dry_config).total_bytes_processed or 0
+
+    def check(self, client: Any, query: str, job_config: Any = None,
+              label: str = DEFAULT_LABEL) -> Tuple[Any, int]:
+        """
+        Controla la consulta contra el presupuesto antes de ejecutarla
+
+        Returns:
+            (job_config con maximum_bytes_billed, bytes reservados); pasar los
+            reservados a record() cuando el job termine
+
+        Raises:
+            BudgetExceededError: la consulta superaría algún límite
+        """
+        estimated = self.estimate(client, query, job_config) if self.dry_run else None
+        with self._lock:
+            spend = self._label_spend(label)
+            spend["dry_runs"] += int(estimated is not None)
+            spend["bytes_estimated"] += estimated or 0
+            remaining = self.remaining()
+            error = None
+            if estimated is not None and self.max_bytes_per_query is not None \
+                    and estimated > self.max_bytes_per_query:
+                error = BudgetExceededError(label, estimated, self.max_bytes_per_query, 'consulta')
+            elif remaining is not None and (remaining == 0 or (estimated or 0) > remaining):
+                error = BudgetExceededError(label, estimated, remaining, 'sesión')
+            if error is not None:
+                spend["blocked"] += 1
+                raise error
+            reserved = estimated or 0
+            self.reserved += reserved
+
+        limits = [limit for limit in (self.max_bytes_per_query, remaining) if limit is not None]
+        return self.with_maximum_bytes_billed(job_config, min(limits) if limits else None), reserved
+
+    @staticmethod
+    def with_maximum_bytes_billed(job_config: Any, maximum: Optional[int]) -> Any:
+        """Copia de job_config con maximum_bytes_billed (el menor si ya traía uno)"""
+        if maximum is None:
+            return job_config
+        if job_config is None:
+            if bigquery is not None:
+                return bigquery.QueryJobConfig(maximum_bytes_billed=maximum)
+            return SimpleNamespace(maximum_bytes_billed=maximum)
+        job_config = copy.deepcopy(job_config)
+        current = getattr(job_config, 'maximum_bytes_billed', None)
+        job_config.maximum_bytes_billed = min(maximum, current) if current else maximum
+        return job_config
+
+    def limit_error(self, error: Exception, label: str, job_config: Any) -> Optional[BudgetExceededError]:
+        """
+        BudgetExceededError si BigQuery rechazó el job por maximum_bytes_billed
+        (el dry-run informa bytes procesados; la facturación tiene mínimos
+        por tabla y puede superar la estimación)
+        """
+        maximum = getattr(job_config, 'maximum_bytes_billed', None)
+        match = _BYTES_LIMIT_ERROR.search(str(error))
+        if not maximum or not match:
+            return None
+        with self._lock:
+            self._label_spend(label)["blocked"] += 1
+        return BudgetExceededError(label, int(match.group(1)), int(maximum), 'consulta')
+
+    def record(self, label: str, query_job: Any = None, reserved: int = 0):
+        """Libera la reserva y suma lo que el job procesó y facturó"""
+        processed = getattr(query_job, 'total_bytes_processed', None) or 0
+        billed = getattr(query_job, 'total_bytes_billed', None) or 0
+        with self._lock:
+            before = self.billed
+            self.reserved -= reserved
+            self.billed += billed
+            spend = self._label_spend(label)
+            spend["queries"] += int(query_job is not None)
+            spend["bytes_processed"] += processed
+            spend["bytes_billed"] += billed
+        if not self.max_bytes_per_session:
+            return
+        # Aviso una sola vez: al cruzar el 80% del presupuesto de sesión
+        threshold = 0.8 * self.max_bytes_per_session
+        if before <= threshold < before + billed:
+            logger.warning("Presupuesto de sesión al %.0f%% (%s de %s)",
+                           100 * (before + billed) / self.max_bytes_per_session,
+                           format_bytes(before + billed), format_bytes(self.max_bytes_per_session))
+
+    def spend_by_analyzer(self) -> Dict[str, Dict[str, int]]:
+        """Gasto agregado por analizador (prefijo de la etiqueta antes del primer punto)"""
+        report: Dict[str, Dict[str, int]] = {}
+        for label, spend in self.spend.items():
+            totals = report.setdefault(label.split('.')[0], dict.fromkeys(spend, 0))
+            for key, value in spend.items():
+                totals[key] += value
+        return report
+
+
+_default_guard: Optional[CostGuard] = None
+_default_lock = threading.Lock()
+
+
+def default_guard() -> CostGuard:
+    """Guardia compartido del proceso (el presupuesto de sesión es uno solo)"""
+    global _default_guard
+    with _default_lock:
+        if _default_guard is None:
+            _default_guard = CostGuard()
+        return _default_guard
+
+
+def print_spend(guard: Optional[CostGuard] = None):
+    """Gasto por analizador y etapa para el final de un análisis"""
+    guard = guard or default_guard()
+    if not guard.spend:
+        return
+    print("\n💸 GASTO BIGQUERY POR ETAPA")
+    print(f"   {'etapa':<42} {'jobs':>5} {'bloq.':>6} {'MB estim.':>10} {'MB fact.':>10}")
+    for label, spend in sorted(guard.spend.items()):
+        print(f"   {label:<42} {spend['queries']:>5} {spend['blocked']:>6} "
+              f"{spend['bytes_estimated'] / 1024 ** 2:>10.1f} {spend['bytes_billed'] / 1024 ** 2:>10.1f}")
+    analyzers = guard.spend_by_analyzer()
+    if len(analyzers) > 1:
+        for analyzer, spend in sorted(analyzers.items()):
+            print(f"   {'Σ ' + analyzer:<42} {spend['queries']:>5} {spend['blocked']:>6} "
+                  f"{spend['bytes_estimated'] / 1024 ** 2:>10.1f} {spend['bytes_billed'] / 1024 ** 2:>10.1f}")
+    print(f"   Sesión: {format_bytes(guard.billed)} facturados de {format_bytes(guard.max_bytes_per_session)}")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+🧪 GENERADOR DE DATOS SINTÉTICOS DE FRAUDE (stand-in de meli-bi-data)
+Crea una base DuckDB con las tablas que consultan los analizadores y scripts
+de métricas, con los mismos datasets, nombres de columna y tipos, para correr
+todo offline con DuckDBStandInClient (BIGQUERY_BACKEND=duckdb).
+
+Todo se genera dentro de DuckDB con range() y hashes determinísticos (misma
+semilla -> mismos datos), así que escala de 1M a 100M filas sin pasar por
+Python. Las tablas son coherentes entre sí: ato_bq y resumen_operaciones
+apuntan a pagos existentes de BT_MP_PAY_PAYMENTS, las infracciones y
+consultas ATO caen sobre el mismo grupo de usuarios, etc.
+
+Uso:
+    python datos_sinteticos.py --database standin.duckdb --rows 1000000
+    BIGQUERY_BACKEND=duckdb python analizador_oficial_cuenta_hacker.py <user_id>
+"""
+
+import os
+import time
+import argparse
+import datetime
+
+# Filas de cada tabla por fila de BT_MP_PAY_PAYMENTS (--rows); USUARIOS es
+# relativo a las filas y el resto de las tablas de usuarios, a USUARIOS
+PAGOS_POR_USUARIO = 50
+PROPORCIONES = {
+    'BT_MP_ACC_MOVEMENTS': 1.0,
+    'BT_SCO_ORIGIN_REPORT': 0.5,
+    'BT_MP_PAYOUTS': 0.2,
+    'BT_MP_WITHDRAWALS': 0.2,
+    'ato_bq': 0.05,
+    'resumen_operaciones': 0.05,
+}
+PROPORCIONES_USUARIOS = {
+    'LK_CUS_CUSTOMERS_DATA': 1.0,
+    'base_ato_escalabilidad_final': 0.25,
+    'BT_RES_RESTRICTIONS_INFRACTIONS_NW': 0.1,
+    'CONSULTAS_ATO': 0.05,
+}
+DATASETS = {
+    'WHOWNER': ['LK_CUS_CUSTOMERS_DATA', 'BT_RES_RESTRICTIONS_INFRACTIONS_NW', 'BT_MP_PAY_PAYMENTS',
+                'BT_MP_ACC_MOVEMENTS', 'BT_MP_PAYOUTS', 'BT_MP_WITHDRAWALS', 'BT_SCO_ORIGIN_REPORT'],
+    'SBOX_PFFINTECHATO': ['ato_bq', 'resumen_operaciones', 'base_ato_escalabilidad_final', 'CONSULTAS_ATO'],
+}
+# Un usuario de cada GRUPO_HACKER pertenece al grupo con infracciones y casos ATO
+GRUPO_HACKER = 10
+
+SITIOS = "['MLA', 'MLA', 'MLB', 'MLB', 'MLB', 'MLM', 'MLM', 'MLC', 'MCO', 'MLU']"
+MARCAS = ("['big_sellers', 'comerciales', 'key_users', 'referidos', 'protected_user', 'partners', "
+          "'vendors', 'usuarios cbt', 'tiendas oficiales', 'cuentas con salario en MP', "
+          "'cliente_regular', 'cliente_regular', 'cliente_nuevo', 'cliente_nuevo']")
+
+
+def _macros(seed, users, payments, start, span_seconds):
+    """Macros de generación: todo valor sale de hash(índice, sal, semilla)"""
+    return f"""
+    CREATE OR REPLACE TEMP MACRO rnd(i, salt) AS (hash(i, salt, {seed}) % 1000000007) / 1000000007.0;
+    CREATE OR REPLACE TEMP MACRO pick(i, salt, options) AS
+        options[1 + CAST(floor(rnd(i, salt) * len(options)) AS BIGINT)];
+    CREATE OR REPLACE TEMP MACRO usuario(k) AS 100000000 + k;
+    CREATE OR REPLACE TEMP MACRO usuario_al_azar(i, salt) AS usuario(CAST(floor(rnd(i, salt) * {users}) AS BIGINT));
+    CREATE OR REPLACE TEMP MACRO usuario_hacker(i, salt) AS
+        usuario({GRUPO_HACKER} * CAST(floor(rnd(i, salt) * {users // GRUPO_HACKER}) AS BIGINT));
+    CREATE OR REPLACE TEMP MACRO sitio(user_id) AS pick(user_id, 'sitio', {SITIOS});
+    CREATE OR REPLACE TEMP MACRO momento(i, salt) AS
+        TIMESTAMP '{start}' + to_seconds(CAST(rnd(i, salt) * {span_seconds} AS BIGINT));
+    CREATE OR REPLACE TEMP MACRO monto(i, salt) AS CAST(round(pow(rnd(i, salt), 3) * 5000 + 1, 2) AS DECIMAL(38, 9));
+    -- Atributos de un pago j, reutilizados por ato_bq y resumen_operaciones
+    CREATE OR REPLACE TEMP MACRO pago_id(j) AS 10000000000 + j;
+    CREATE OR REPLACE TEMP MACRO pago_vendedor(j) AS usuario_al_azar(j, 'vendedor');
+    CREATE OR REPLACE TEMP MACRO pago_fecha(j) AS momento(j, 'fecha_pago');
+    CREATE OR REPLACE TEMP MACRO pago_monto(j) AS monto(j, 'monto_pago');
+    CREATE OR REPLACE TEMP MACRO pago_al_azar(i, salt) AS CAST(floor(rnd(i, salt) * {payments}) AS BIGINT);
+    """
+
+
+TABLAS = {
+    'LK_CUS_CUSTOMERS_DATA': """
+        SELECT usuario(i) AS CUS_CUST_ID,
+               CAST(TIMESTAMP '{start}' - to_days(CAST(rnd(i, 'alta') * 2500 AS BIGINT)) AS DATE) AS CUS_RU_SINCE_DT,
+               sitio(usuario(i)) AS SIT_SITE_ID
+        FROM range({n}) t(i)""",
+
+    'BT_RES_RESTRICTIONS_INFRACTIONS_NW': """
+        SELECT 500000000 + i AS SENTENCE_ID,
+               usuario_hacker(i, 'infractor') AS USER_ID,
+               pick(i, 'tipo', ['CUENTA_DE_HACKER', 'CUENTA_DE_HACKER', 'CUENTA_DE_HACKER',
+                                'FRAUDE_PAGOS', 'IDENTIDAD_FALSA']) AS INFRACTION_TYPE,
+               CAST(momento(i, 'sentencia') AS DATE) AS SENTENCE_DATE,
+               pick(i, 'color', ['ROJA', 'ROJA', 'AMARILLA', 'VERDE']) AS COLOR_DE_TARJETA,
+               sitio(usuario_hacker(i, 'infractor')) AS SIT_SITE_ID,
+               pick(i, 'estado', ['ACTIVE', 'ACTIVE', 'ACTIVE', 'ROLLBACKED', 'REINSTATED', 'EXPIRED'])
+                   AS SENTENCE_LAST_STATUS
+        FROM range({n}) t(i)""",
+
+    'BT_MP_PAY_PAYMENTS': """
+        SELECT PAY_PAYMENT_ID, CUS_CUST_ID_SEL, PAY_CUST_ID, SIT_SITE_ID,
+               CAST(PAY_CREATION_DATE AS DATE) AS pay_move_date,
+               PAY_CREATION_DATE,
+               PAY_CREATION_DATE + to_seconds(CAST(rnd(j, 'aprobacion') * 3600 AS BIGINT)) AS PAY_APPROVED_DATE,
+               pay_status_id, PAY_OPERATION_TYPE_ID, PAY_PM_TYPE_ID,
+               -- TPV es volumen entrante: los egresos nunca suman
+               CASE WHEN PAY_OPERATION_TYPE_ID IN ('money_out', 'withdrawal', 'cashout') THEN 0
+                    WHEN rnd(j, 'tpv') < 0.9 THEN 1 ELSE 0 END AS tpv_flag,
+               PAY_PM_TYPE_ID AS PAY_PAYMENT_METHOD_TYPE,
+               CASE WHEN PAY_OPERATION_TYPE_ID IN ('money_out', 'withdrawal', 'cashout')
+                    THEN -pago_monto(j) ELSE pago_monto(j) END AS PAY_TRANSACTION_DOL_AMT,
+               CAST(round(pago_monto(j) * 1.05, 2) AS DECIMAL(38, 9)) AS PAY_TOTAL_PAID_DOL_AMT
+        FROM (
+            SELECT i AS j,
+                   pago_id(i) AS PAY_PAYMENT_ID,
+                   pago_vendedor(i) AS CUS_CUST_ID_SEL,
+                   usuario_al_azar(i, 'comprador') AS PAY_CUST_ID,
+                   sitio(pago_vendedor(i)) AS SIT_SITE_ID,
+                   pago_fecha(i) AS PAY_CREATION_DATE,
+                   pick(i, 'estado', ['approved', 'approved', 'approved', 'approved', 'approved',
+                                      'approved', 'approved', 'rejected', 'pending', 'refunded'])
+                       AS pay_status_id,
+                   pick(i, 'operacion', ['regular_payment', 'regular_payment', 'regular_payment',
+                                         'account_fund', 'money_transfer', 'money_in', 'money_out',
+                                         'withdrawal', 'cashout', 'money_exchange']) AS PAY_OPERATION_TYPE_ID,
+                   pick(i, 'medio', ['account_money', 'account_money', 'credit_card', 'debit_card',
+                                     'ticket', 'bank_transfer']) AS PAY_PM_TYPE_ID
+            FROM range({n}) t(i)
+        )""",
+
+    # Mismos movimientos con las dos familias de columnas que usan los scripts (ACC_* y MOV_*)
+    'BT_MP_ACC_MOVEMENTS': """
+        SELECT ACC_ID, ACC_CUST_ID, ACC_CREATED_DATE, ACC_TOTAL_AMOUNT, ACC_OPERATION_TYPE,
+               ACC_STATUS, ACC_CURRENCY_ID,
+               ACC_ID AS MOV_ID, ACC_CUST_ID AS CUS_CUST_ID_SEL, ACC_CREATED_DATE AS MOV_CREATED_DATETIME,
+               abs(ACC_TOTAL_AMOUNT) AS MOV_DOL_AMOUNT,
+               CASE WHEN ACC_TOTAL_AMOUNT > 0 THEN 'IN' ELSE 'OUT' END AS MOV_TYPE
+        FROM (
+            SELECT 20000000000 + i AS ACC_ID,
+                   usuario_al_azar(i, 'titular') AS ACC_CUST_ID,
+                   momento(i, 'movimiento') AS ACC_CREATED_DATE,
+                   pick(i, 'operacion', ['DEPOSIT', 'TRANSFER_IN', 'CREDIT', 'FUND',
+                                         'TRANSFER_OUT', 'WITHDRAWAL', 'PAYMENT']) AS ACC_OPERATION_TYPE,
+                   CASE WHEN pick(i, 'operacion', ['DEPOSIT', 'TRANSFER_IN', 'CREDIT', 'FUND',
+                                                   'TRANSFER_OUT', 'WITHDRAWAL', 'PAYMENT'])
+                             IN ('TRANSFER_OUT', 'WITHDRAWAL', 'PAYMENT')
+                        THEN -monto(i, 'monto_movimiento') ELSE monto(i, 'monto_movimiento') END AS ACC_TOTAL_AMOUNT,
+                   pick(i, 'estado', ['APPROVED', 'APPROVED', 'APPROVED', 'APPROVED', 'REJECTED']) AS ACC_STATUS,
+                   pick(i, 'moneda', ['ARS', 'BRL', 'MXN', 'USD']) AS ACC_CURRENCY_ID
+            FROM range({n}) t(i)
+        )""",
+
+    'BT_MP_PAYOUTS': """
+        SELECT 30000000000 + i AS PAYOUT_ID,
+               usuario_al_azar(i, 'payout') AS PAYOUT_CUST_ID,
+               momento(i, 'fecha_payout') AS PAYOUT_DATE_CREATED,
+               monto(i, 'monto_payout') AS PAYOUT_AMT,
+               pick(i, 'tipo', ['bank_transfer', 'cvu', 'pix', 'spei']) AS PAYOUT_TYPE,
+               pick(i, 'estado', ['APPROVED', 'APPROVED', 'APPROVED', 'APPROVED', 'REJECTED']) AS PAYOUT_STATUS
+        FROM range({n}) t(i)""",
+
+    'BT_MP_WITHDRAWALS': """
+        SELECT 40000000000 + i AS WDR_ID,
+               usuario_al_azar(i, 'retiro') AS WDR_CUST_ID,
+               momento(i, 'fecha_retiro') AS WDR_DATE_CREATED,
+               monto(i, 'monto_retiro') AS WDR_AMT,
+               pick(i, 'tipo', ['bank_account', 'atm', 'cash_point']) AS WDR_TYPE,
+               pick(i, 'estado', ['approved', 'approved', 'approved', 'approved', 'rejected']) AS WDR_STATUS
+        FROM range({n}) t(i)""",
+
+    'BT_SCO_ORIGIN_REPORT': """
+        SELECT pago_id(j) AS PAY_PAYMENT_ID,
+               pago_vendedor(j) AS CUS_CUST_ID_SEL,
+               CAST(pago_fecha(j) AS DATE) AS PAY_CREATED_DT,
+               CASE WHEN rnd(i, 'signo') < 0.3 THEN -pago_monto(j) ELSE pago_monto(j) END AS PAY_TRANSACTION_DOL_AMT,
+               pick(i, 'operacion', ['regular_payment', 'money_transfer', 'money_out', 'account_fund'])
+                   AS PAY_OPERATION_TYPE_ID,
+               pick(i, 'estado', ['approved', 'approved', 'approved', 'rejected']) AS PAY_STATUS_ID
+        FROM (SELECT i, pago_al_azar(i, 'scoring') AS j FROM range({n}) t(i))""",
+
+    # Operaciones marcadas como ATO/DTO: cada fila apunta a un pago existente
+    'ato_bq': """
+        SELECT pago_id(j) AS operation_id,
+               CAST(pago_vendedor(j) AS VARCHAR) AS GCA_CUST_ID,
+               CAST(abs(pago_monto(j)) AS DOUBLE) AS op_amt,
+               pago_fecha(j) AS op_date,
+               pick(i, 'status', ['A', 'A', 'A', 'A', 'A', 'A', 'R']) AS status_id,
+               CASE WHEN rnd(i, 'contramarca') < 0.1 THEN 1 ELSE 0 END AS contramarca,
+               pick(i, 'flujo', ['MP', 'MP', 'MT', 'PO', 'PI', 'MF']) AS flow_type
+        FROM (SELECT i, pago_al_azar(i, 'ato') AS j FROM range({n}) t(i))""",
+
+    # Misma selección de pagos que ato_bq (misma sal), con la contraparte
+    'resumen_operaciones': """
+        SELECT pago_id(j) AS id_operacion,
+               CASE WHEN rnd(i, 'no_pago') < 0.05 THEN 'No es pago'
+                    ELSE CAST(pago_vendedor(j) AS VARCHAR) END AS id_contraparte,
+               pago_fecha(j) AS fecha_operacion,
+               CAST(abs(pago_monto(j)) AS DOUBLE) AS monto
+        FROM (SELECT i, pago_al_azar(i, 'ato') AS j FROM range({n}) t(i))""",
+
+    'base_ato_escalabilidad_final': """
+        SELECT usuario(4 * i + CAST(floor(rnd(i, 'usuario') * 4) AS BIGINT)) AS user_id,
+               CASE WHEN rnd(i, 'sin_marcas') < 0.3 THEN NULL
+                    WHEN rnd(i, 'dos_marcas') < 0.3 THEN pick(i, 'marca1', {marcas}) || ', ' || pick(i, 'marca2', {marcas})
+                    ELSE pick(i, 'marca1', {marcas}) END AS marcas
+        FROM range({n}) t(i)""",
+
+    'CONSULTAS_ATO': """
+        SELECT 700000000 + i AS case_id,
+               CAST(usuario_hacker(i, 'consulta') AS VARCHAR) AS GCA_CUST_ID,
+               usuario_hacker(i, 'consulta') AS user_id,
+               pick(i, 'subtipo', ['cuenta_de_hacker', 'cuenta_de_hacker', 'cuenta_de_hacker',
+                                   'desconocimiento', 'robo_cookies']) AS subtype1,
+               momento(i, 'apertura') AS fecha_apertura_caso,
+               momento(i, 'apertura') + to_seconds(CAST(pow(rnd(i, 'duracion'), 2) * 30 * 86400 AS BIGINT))
+                   AS fecha_cierre_caso
+        FROM range({n}) t(i)""",
+}
+
+# Columna por la que se ordena cada tabla (como el clustering de BigQuery)
+CLUSTERING = {
+    'LK_CUS_CUSTOMERS_DATA': 'CUS_CUST_ID',
+    'BT_RES_RESTRICTIONS_INFRACTIONS_NW': 'USER_ID',
+    'BT_MP_PAY_PAYMENTS': 'CUS_CUST_ID_SEL',
+    'BT_MP_ACC_MOVEMENTS': 'ACC_CUST_ID',
+    'BT_MP_PAYOUTS': 'PAYOUT_CUST_ID',
+    'BT_MP_WITHDRAWALS': 'WDR_CUST_ID',
+    'BT_SCO_ORIGIN_REPORT': 'CUS_CUST_ID_SEL',
+    'ato_bq': 'GCA_CUST_ID',
+    'resumen_operaciones': 'id_contraparte',
+    'base_ato_escalabilidad_final': 'user_id',
+    'CONSULTAS_ATO': 'GCA_CUST_ID',
+}
+
+
+def table_sizes(rows):
+    """Filas de cada tabla para --rows pagos"""
+    users = max(1000, rows // PAGOS_POR_USUARIO)
+    sizes = {'BT_MP_PAY_PAYMENTS': rows}
+    sizes.update({name: max(1, int(rows * ratio)) for name, ratio in PROPORCIONES.items()})
+    sizes.update({name: max(1, int(users * ratio)) for name, ratio in PROPORCIONES_USUARIOS.items()})
+    return users, sizes
+
+
+def generate(database, rows=1_000_000, seed=7, start='2024-01-01', end=None, cluster=True,
+             tables=None, parquet_dir=None):
+    """Genera (o regenera) las tablas en database; devuelve {tabla: filas}"""
+    import duckdb
+
+    end = end or datetime.date.today().isoformat()
+    span_seconds = int((datetime.date.fromisoformat(end) - datetime.date.fromisoformat(start)).total_seconds())
+    if span_seconds <= 0:
+        raise ValueError(f"Rango de fechas vacío: {start} -> {end}")
+    users, sizes = table_sizes(rows)
+
+    connection = duckdb.connect(database)
+    connection.execute(_macros(seed, users, rows, start, span_seconds))
+    generated = {}
+    for dataset, names in DATASETS.items():
+        connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset}"')
+        for name in names:
+            if tables and name not in tables:
+                continue
+            started = time.time()
+            select = TABLAS[name].format(n=sizes[name], start=start, marcas=MARCAS)
+            order = f' ORDER BY "{CLUSTERING[name]}"' if cluster else ''
+            connection.execute(f'CREATE OR REPLACE TABLE "{dataset}"."{name}" AS SELECT * FROM ({select}){order}')
+            generated[name] = sizes[name]
+            print(f"   ✅ {dataset}.{name}: {sizes[name]:,} filas ({time.time() - started:.1f}s)")
+    if parquet_dir:
+        os.makedirs(parquet_dir, exist_ok=True)
+        connection.execute(f"EXPORT DATABASE '{parquet_dir}' (FORMAT PARQUET)")
+        print(f"   📦 Exportado a Parquet en {parquet_dir}")
+    connection.close()
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera tablas sintéticas de fraude en DuckDB (stand-in de BigQuery)')
+    parser.add_argument('--database', default=os.environ.get('BIGQUERY_STANDIN_DB', 'standin.duckdb'))
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help='filas de BT_MP_PAY_PAYMENTS; el resto de las tablas escala en proporción')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--start', default='2024-01-01', help='primera fecha de los datos')
+    parser.add_argument('--end', default=None, help='última fecha (por defecto hoy)')
+    parser.add_argument('--no-cluster', action='store_true', help='no ordenar cada tabla por usuario')
+    parser.add_argument('--tables', nargs='*', help='regenerar solo estas tablas')
+    parser.add_argument('--parquet-dir', help='exportar además las tablas a Parquet')
+    args = parser.parse_args()
+
+    users, _ = table_sizes(args.rows)
+    print(f"🧪 Generando datos sintéticos en {args.database}")
+    print(f"   {args.rows:,} pagos, {users:,} usuarios, semilla {args.seed}")
+    started = time.time()
+    generated = generate(args.database, args.rows, args.seed, args.start, args.end,
+                         cluster=not args.no_cluster, tables=args.tables, parquet_dir=args.parquet_dir)
+    print(f"🎉 {sum(generated.values()):,} filas en {len(generated)} tablas ({time.time() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
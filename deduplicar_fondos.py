@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+🗂️ DEDUPLICACIÓN Y CLUSTERING DE FONDOS SOBRE UN CORPUS
+Agrupa las imágenes de un directorio o archivo (.zip / .tar) que fueron
+tomadas en el mismo lugar, sin comparar todos los pares:
+
+  1. Firma de fondo de 64 bits por imagen (miniatura EXIF si existe), con un
+     pool de procesos y checkpoint JSONL reanudable
+  2. Candidatos por multi-index hashing: la firma se parte en bloques y dos
+     imágenes a distancia de Hamming <= r coinciden en algún bloque a
+     distancia <= r // bloques (se enumeran solo esos vecinos)
+  3. Refinamiento de cada candidato con las métricas completas de
+     FastImageComparator (también checkpointeado)
+  4. Componentes conexas (union-find) a CSV o Parquet
+
+La memoria queda acotada: solo se guardan firmas (8 bytes por imagen) y el
+índice de bloques; las imágenes se decodifican en los workers de a lotes.
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import tarfile
+import zipfile
+import argparse
+import itertools
+import multiprocessing
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+from PIL import Image
+
+from exif_thumbnail import screening_image
+from image_kernels import kernels
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff', '.gif')
+SIGNATURE_BITS = 64
+# Separador entre archivo contenedor y miembro en el identificador de cada imagen
+ARCHIVE_SEPARATOR = '::'
+
+
+# ==================== LECTURA DEL CORPUS ====================
+
+class CorpusReader:
+    """Recorre un directorio, .zip o .tar y abre cada imagen por identificador"""
+
+    def __init__(self, root):
+        self.root = root
+        self._archive = None
+
+    def _kind(self):
+        if os.path.isdir(self.root):
+            return 'dir'
+        if zipfile.is_zipfile(self.root):
+            return 'zip'
+        if tarfile.is_tarfile(self.root):
+            return 'tar'
+        raise ValueError(f"Corpus no soportado: {self.root}")
+
+    def iter_sources(self):
+        """Identificadores de las imágenes en orden estable"""
+        kind = self._kind()
+        if kind == 'dir':
+            for directory, subdirs, files in os.walk(self.root):
+                subdirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.relpath(os.path.join(directory, name), self.root)
+        elif kind == 'zip':
+            with zipfile.ZipFile(self.root) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield info.filename
+        else:
+            with tarfile.open(self.root) as archive:
+                for member in archive:
+                    if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield member.name
+
+    def open(self, source):
+        """Stream en memoria con el contenido de la imagen"""
+        if os.path.isdir(self.root):
+            with open(os.path.join(self.root, source), 'rb') as f:
+                return io.BytesIO(f.read())
+
+        # El archivo contenedor se abre una vez por proceso
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.root) if zipfile.is_zipfile(self.root) else tarfile.open(self.root)
+        if isinstance(self._archive, zipfile.ZipFile):
+            return io.BytesIO(self._archive.read(source))
+        return io.BytesIO(self._archive.extractfile(source).read())
+
+
+# ==================== FIRMAS (WORKERS) ====================
+
+_worker = {}
+
+
+def _draft_loader(file_stream):
+    """Decodificación reducida (draft JPEG): la firma solo usa 20x20 píxeles"""
+    image = Image.open(file_stream)
+    image.draft('RGB', (160, 160))
+    return image.convert('RGB')
+
+
+def background_signature(image):
+    """
+    Firma de fondo de 64 bits: los mismos bits de esquinas/bordes que
+    _compare_background_hash (20x20, lejos del centro), muestreados de forma
+    pareja sobre todo el anillo en lugar de solo las primeras filas
+    """
+    gray = np.asarray(image.convert('L').resize((20, 20), Image.Resampling.LANCZOS))
+    bits = kernels.background_hash(gray, corner_size=6, center_distance=6, max_bits=20 * 20)
+    picked = np.linspace(0, len(bits) - 1, SIGNATURE_BITS).round().astype(int)
+    return int(''.join(bits[i] for i in picked), 2)
+
+
+def _init_signature_worker(root):
+    _worker['reader'] = CorpusReader(root)
+
+
+def _signature_task(source):
+    try:
+        image, via, _ = screening_image(_worker['reader'].open(source), _draft_loader)
+        return {'source': source, 'signature': f"{background_signature(image):016x}", 'via': via}
+    except Exception as e:
+        return {'source': source, 'error': str(e)}
+
+
+def _init_refine_worker(root, image_cache_size):
+    # Importación diferida: solo los workers de refinamiento la necesitan
+    from fast_comparator import FastImageComparator
+
+    _worker['reader'] = CorpusReader(root)
+    _worker['comparator'] = FastImageComparator()
+    _worker['images'] = OrderedDict()
+    _worker['image_cache_size'] = image_cache_size
+
+
+def _refine_image(source):
+    """Imagen normalizada a 600 px con una LRU chica por worker"""
+    images = _worker['images']
+    if source in images:
+        images.move_to_end(source)
+        return images[source]
+    image = _worker['comparator'].load_image(_worker['reader'].open(source))
+    images[source] = image
+    if len(images) > _worker['image_cache_size']:
+        images.popitem(last=False)
+    return image
+
+
+def _refine_task(pair):
+    source1, source2, distance = pair
+    try:
+        image1, image2 = _refine_image(source1), _refine_image(source2)
+        if image1 is None or image2 is None:
+            return source1, source2, distance, None
+        results = _worker['comparator'].compare_images_fast(image1, image2)
+        return source1, source2, distance, float(results['overall_similarity'])
+    except Exception:
+        return source1, source2, distance, None
+
+
+# ==================== CHECKPOINTS ====================
+
+def read_checkpoint(path):
+    """Registros JSONL ya procesados (ignora una última línea truncada)"""
+    records = []
+    if not path or not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def extract_signatures(root, checkpoint, workers, batch_size):
+    """Firmas de todo el corpus, reanudando desde el checkpoint"""
+    records = read_checkpoint(checkpoint)
+    done = {record['source'] for record in records}
+    pending = (source for source in CorpusReader(root).iter_sources() if source not in done)
+    if done:
+        print(f"♻️ Reanudando: {len(done)} firmas en el checkpoint")
+
+    start = time.time()
+    processed = 0
+    with open(checkpoint, 'a', encoding='utf-8') as out, \
+            multiprocessing.Pool(workers, _init_signature_worker, (root,)) as pool:
+        # Lotes acotados: Pool.imap consumiría el generador completo
+        for batch in _batches(pending, batch_size):
+            for record in pool.imap(_signature_task, batch, chunksize=16):
+                out.write(json.dumps(record) + '\n')
+                records.append(record)
+            out.flush()
+            processed += len(batch)
+            rate = processed / max(time.time() - start, 1e-9)
+            print(f"🔑 Firmas: {len(records)} ({rate:.0f} img/s)")
+
+    sources = [r['source'] for r in records if 'signature' in r]
+    signatures = np.array([int(r['signature'], 16) for r in records if 'signature' in r], dtype=np.uint64)
+    errors = sum(1 for r in records if 'error' in r)
+    thumbnails = sum(1 for r in records if r.get('via') == 'exif_thumbnail')
+    print(f"✅ {len(sources)} firmas ({thumbnails} desde miniatura EXIF), {errors} errores")
+    return sources, signatures
+
+
+# ==================== CANDIDATOS (MULTI-INDEX HASHING) ====================
+
+def _split(signatures, blocks):
+    """Bloques contiguos de bits de cada firma: (bloques, n) y ancho de cada bloque"""
+    widths = [SIGNATURE_BITS // blocks + (1 if b < SIGNATURE_BITS % blocks else 0) for b in range(blocks)]
+    parts = []
+    shift = SIGNATURE_BITS
+    for width in widths:
+        shift -= width
+        parts.append(((signatures >> np.uint64(shift)) & np.uint64((1 << width) - 1)).astype(np.int64))
+    return np.array(parts), widths
+
+
+def _neighbors(value, width, radius):
+    """Valores de un bloque a distancia de Hamming <= radius"""
+    yield value
+    for distance in range(1, radius + 1):
+        for bits in itertools.combinations(range(width), distance):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            yield flipped
+
+
+def candidate_pairs(signatures, radius, blocks, max_bucket):
+    """
+    Pares (i, j, distancia) con Hamming <= radius, sin enumerar los N² pares
+
+    Con `blocks` bloques, dos firmas a distancia <= radius tienen al menos un
+    bloque a distancia <= radius // blocks (palomar). Los buckets con más de
+    max_bucket firmas (fondos lisos, blancos) se saltean para acotar el costo.
+    """
+    parts, widths = _split(signatures, blocks)
+    block_radius = radius // blocks
+    index = [defaultdict(list) for _ in range(blocks)]
+    for block in range(blocks):
+        for i, value in enumerate(parts[block].tolist()):
+            index[block][value].append(i)
+
+    skipped = 0
+    for i in range(len(signatures)):
+        seen = set()
+        for block in range(blocks):
+            for value in _neighbors(int(parts[block, i]), widths[block], block_radius):
+                bucket = index[block].get(value)
+                if not bucket:
+                    continue
+                if len(bucket) > max_bucket:
+                    skipped += 1
+                    continue
+                for j in bucket:
+                    if j > i and j not in seen:
+                        seen.add(j)
+                        distance = bin(int(signatures[i]) ^ int(signatures[j])).count('1')
+                        if distance <= radius:
+                            yield i, j, distance
+    if skipped:
+        print(f"⚠️ {skipped} búsquedas en buckets saturados (> {max_bucket}) salteadas")
+
+
+# ==================== REFINAMIENTO Y CLUSTERS ====================
+
+def refine_pairs(root, sources, pairs, checkpoint, workers, batch_size, image_cache_size):
+    """Similitud completa de fondo por candidato; devuelve {(i, j): similitud}"""
+    position = {source: i for i, source in enumerate(sources)}
+    similarities = {}
+    for record in read_checkpoint(checkpoint):
+        if record['a'] in position and record['b'] in position and record['similarity'] is not None:
+            similarities[(position[record['a']], position[record['b']])] = record['similarity']
+    if similarities:
+        print(f"♻️ Reanudando: {len(similarities)} pares ya refinados")
+
+    pending = ((sources[i], sources[j], d) for i, j, d in pairs if (i, j) not in similarities)
+    start = time.time()
+    compared = 0
+    with open(checkpoint, 'a', encoding='utf-8') as out, \
+            multiprocessing.Pool(workers, _init_refine_worker, (root, image_cache_size)) as pool:
+        for batch in _batches(pending, batch_size):
+            # Ordenado por la primera imagen para aprovechar la LRU de cada worker
+            batch.sort()
+            for source1, source2, distance, similarity in pool.imap(_refine_task, batch, chunksize=8):
+                out.write(json.dumps({'a': source1, 'b': source2, 'hamming': distance,
+                                      'similarity': similarity}) + '\n')
+                if similarity is not None:
+                    similarities[(position[source1], position[source2])] = similarity
+            out.flush()
+            compared += len(batch)
+            print(f"🔬 Pares refinados: {compared} ({compared / max(time.time() - start, 1e-9):.1f} pares/s)")
+    return similarities
+
+
+def connected_clusters(count, edges):
+    """Union-find sobre las aristas; devuelve el representante de cada nodo"""
+    parent = list(range(count))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for i, j in edges:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return [find(node) for node in range(count)]
+
+
+def write_clusters(path, sources, signatures, roots, include_singletons, batch_rows=10000):
+    """Escribe source, cluster_id, cluster_size, signature (CSV o Parquet)"""
+    sizes = defaultdict(int)
+    for root in roots:
+        sizes[root] += 1
+    # IDs de cluster estables: mayores primero
+    order = sorted(sizes, key=lambda root: (-sizes[root], root))
+    cluster_ids = {root: cluster_id for cluster_id, root in enumerate(order)}
+
+    rows = (
+        (sources[i], cluster_ids[root], sizes[root], f"{int(signatures[i]):016x}")
+        for i, root in sorted(enumerate(roots), key=lambda item: (cluster_ids[item[1]], item[0]))
+        if include_singletons or sizes[root] > 1
+    )
+    columns = ['source', 'cluster_id', 'cluster_size', 'signature']
+
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("❌ Para escribir Parquet hace falta pyarrow (pip install pyarrow)")
+            sys.exit(1)
+        schema = pa.schema([('source', pa.string()), ('cluster_id', pa.int64()),
+                            ('cluster_size', pa.int64()), ('signature', pa.string())])
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in _batches(rows, batch_rows):
+                writer.write_table(pa.Table.from_pydict(dict(zip(columns, map(list, zip(*batch)))), schema=schema))
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+
+    clusters = sum(1 for root in order if sizes[root] > 1)
+    clustered = sum(sizes[root] for root in order if sizes[root] > 1)
+    return clusters, clustered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clusters de imágenes tomadas con el mismo fondo')
+    parser.add_argument('corpus', help='directorio, .zip o .tar con las imágenes')
+    parser.add_argument('--output', default='clusters_fondos.csv', help='.csv o .parquet')
+    parser.add_argument('--checkpoint', default=None,
+                        help='prefijo de los checkpoints (por defecto <output>.firmas/.pares.jsonl)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--radius', type=int, default=8, help='distancia de Hamming máxima entre firmas')
+    parser.add_argument('--blocks', type=int, default=4, help='bloques del índice multi-index')
+    parser.add_argument('--threshold', type=float, default=0.60,
+                        help='similitud de fondo mínima para unir dos imágenes (0.60 = "similares")')
+    parser.add_argument('--max-bucket', type=int, default=5000, help='tamaño máximo de bucket a recorrer')
+    parser.add_argument('--batch-size', type=int, default=1024, help='tareas por lote enviado al pool')
+    parser.add_argument('--image-cache', type=int, default=16, help='imágenes en la LRU de cada worker')
+    parser.add_argument('--include-singletons', action='store_true', help='incluir imágenes sin pareja')
+    args = parser.parse_args()
+
+    prefix = args.checkpoint or os.path.splitext(args.output)[0]
+    start = time.time()
+
+    sources, signatures = extract_signatures(args.corpus, prefix + '.firmas.jsonl', args.workers, args.batch_size)
+    if not sources:
+        print("❌ No se encontraron imágenes legibles")
+        sys.exit(1)
+
+    pairs = candidate_pairs(signatures, args.radius, args.blocks, args.max_bucket)
+    similarities = refine_pairs(args.corpus, sources, pairs, prefix + '.pares.jsonl',
+                                args.workers, args.batch_size, args.image_cache)
+    total_pairs = len(sources) * (len(sources) - 1) // 2
+    print(f"🎯 {len(similarities)} candidatos refinados de {total_pairs} pares posibles")
+
+    edges = [pair for pair, similarity in similarities.items() if similarity >= args.threshold]
+    roots = connected_clusters(len(sources), edges)
+    clusters, clustered = write_clusters(args.output, sources, signatures, roots, args.include_singletons)
+
+    print(f"🗂️ {clusters} clusters con {clustered} imágenes -> {args.output}")
+    print(f"⏱️ Total: {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Screening rápido con la miniatura EXIF embebida
+Los JPEG de celular traen una miniatura de ~160x120 en el IFD1 del EXIF; los
+hashes de fondo solo necesitan ~20x20 píxeles, así que se calculan desde la
+miniatura sin decodificar la imagen principal. Si la miniatura falta, está
+girada respecto de la imagen o no coincide con ella, se decodifica completa
+"""
+
+import io
+import logging
+
+import numpy as np
+from PIL import Image, ExifTags
+
+from image_kernels import kernels
+
+logger = logging.getLogger(__name__)
+
+# Tags del IFD1 con la ubicación de la miniatura JPEG
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+# Tolerancias de consistencia miniatura / imagen principal
+ASPECT_TOLERANCE = 0.05
+VERIFY_MAX_MEAN_DIFF = 12.0
+
+
+def read_exif_thumbnail(file_stream):
+    """
+    Miniatura EXIF sin decodificar la imagen principal
+
+    Returns:
+        (miniatura RGB o None, (ancho, alto) de la imagen principal, motivo)
+    """
+    position = file_stream.tell()
+    try:
+        with Image.open(file_stream) as image:
+            main_size = image.size
+            if image.format != 'JPEG':
+                return None, main_size, 'no_jpeg'
+
+            raw_exif = image.info.get('exif')
+            if not raw_exif:
+                return None, main_size, 'sin_exif'
+
+            ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+            offset = ifd1.get(JPEG_INTERCHANGE_FORMAT)
+            length = ifd1.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+            if not offset or not length:
+                return None, main_size, 'sin_miniatura'
+
+        # Los offsets del EXIF son relativos al header TIFF (después de "Exif\0\0")
+        tiff_start = 6 if raw_exif.startswith(b'Exif\x00\x00') else 0
+        data = raw_exif[tiff_start + offset:tiff_start + offset + length]
+        if len(data) != length:
+            return None, main_size, 'miniatura_truncada'
+
+        thumbnail = Image.open(io.BytesIO(data))
+        thumbnail = thumbnail.convert('RGB')
+        return thumbnail, main_size, 'ok'
+
+    except Exception as e:
+        logger.debug(f"Miniatura EXIF no disponible: {e}")
+        return None, None, 'error'
+    finally:
+        file_stream.seek(position)
+
+
+def _crop_letterbox(thumbnail, threshold=16):
+    """Quita las bandas negras que algunas cámaras agregan para llevar a 4:3"""
+    gray = np.asarray(thumbnail.convert('L'))
+    rows = np.flatnonzero(gray.max(axis=1) > threshold)
+    cols = np.flatnonzero(gray.max(axis=0) > threshold)
+    if rows.size == 0 or cols.size == 0:
+        return thumbnail
+    return thumbnail.crop((int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1))
+
+
+def _aspect_matches(size_a, size_b):
+    ratio_a = size_a[0] / max(1, size_a[1])
+    ratio_b = size_b[0] / max(1, size_b[1])
+    return abs(ratio_a - ratio_b) / ratio_b <= ASPECT_TOLERANCE
+
+
+def _matches_main_image(file_stream, thumbnail):
+    """Compara contra la imagen principal decodificada a 1/8 (solo coeficientes DC)"""
+    position = file_stream.tell()
+    try:
+        with Image.open(file_stream) as image:
+            image.draft('L', (max(1, image.size[0] // 8), max(1, image.size[1] // 8)))
+            main_small = np.asarray(image.convert('L').resize((16, 16), Image.Resampling.BILINEAR), dtype=np.float64)
+    finally:
+        file_stream.seek(position)
+    thumb_small = np.asarray(thumbnail.convert('L').resize((16, 16), Image.Resampling.BILINEAR), dtype=np.float64)
+    return float(np.mean(np.abs(main_small - thumb_small))) <= VERIFY_MAX_MEAN_DIFF
+
+
+def screening_image(file_stream, full_loader, verify=False):
+    """
+    Imagen chica para el screening por hashes
+
+    Args:
+        file_stream: stream de la imagen (se restaura la posición)
+        full_loader: callable(stream) -> imagen PIL para la decodificación completa
+        verify: además compara la miniatura contra la imagen a 1/8 de resolución
+
+    Returns:
+        (imagen PIL RGB o None, origen: 'exif_thumbnail' | 'full_decode', motivo)
+    """
+    thumbnail, main_size, reason = read_exif_thumbnail(file_stream)
+
+    if thumbnail is not None and not _aspect_matches(thumbnail.size, main_size):
+        thumbnail = _crop_letterbox(thumbnail)
+        if not _aspect_matches(thumbnail.size, main_size):
+            thumbnail, reason = None, 'orientacion_distinta'
+
+    if thumbnail is not None and verify and not _matches_main_image(file_stream, thumbnail):
+        thumbnail, reason = None, 'no_coincide'
+
+    if thumbnail is not None:
+        return thumbnail, 'exif_thumbnail', reason
+
+    return full_loader(file_stream), 'full_decode', reason
+
+
+def _packed_average_hash(image, size):
+    """Average hash size x size (como quick_hash/enhanced_hash) empaquetado en hex"""
+    pixels = np.asarray(image.resize((size, size), Image.Resampling.LANCZOS).convert('L'), dtype=np.float64)
+    bits = (pixels > pixels.mean()).ravel()
+    return np.packbits(bits).tobytes().hex()
+
+
+def screening_hashes(image):
+    """Hashes de screening de una imagen (miniatura o decodificación completa)"""
+    gray = image.convert('L').resize((20, 20), Image.Resampling.LANCZOS)
+    return {
+        # Mismo hash de esquinas que FastImageComparator._compare_background_hash
+        'background_hash': kernels.background_hash(np.asarray(gray), corner_size=6,
+                                                   center_distance=6, max_bits=32),
+        # Average hash 8x8 (app_rapido) y 16x16 (app_optimizado)
+        'average_hash_8': _packed_average_hash(image, 8),
+        'average_hash_16': _packed_average_hash(image, 16),
+    }
+
+
+def hex_hash_similarity(hash1, hash2):
+    """Fracción de bits iguales entre dos hashes empaquetados en hex"""
+    bits1 = np.unpackbits(np.frombuffer(bytes.fromhex(hash1), dtype=np.uint8))
+    bits2 = np.unpackbits(np.frombuffer(bytes.fromhex(hash2), dtype=np.uint8))
+    return float(np.mean(bits1 == bits2))
+
+
+def compare_screening_hashes(hashes1, hashes2):
+    """Similitudes por hash con los mismos criterios que los comparadores"""
+    hash1, hash2 = hashes1['background_hash'], hashes2['background_hash']
+    if len(hash1) == len(hash2) and len(hash1) > 10:
+        background = sum(h1 == h2 for h1, h2 in zip(hash1, hash2)) / len(hash1)
+        # Penalty si la similitud es solo mediana (posible coincidencia)
+        if 0.4 < background < 0.8:
+            background *= 0.7
+    else:
+        background = 0.0
+
+    return {
+        'background_hash': background,
+        'average_hash_8': hex_hash_similarity(hashes1['average_hash_8'], hashes2['average_hash_8']),
+        'average_hash_16': hex_hash_similarity(hashes1['average_hash_16'], hashes2['average_hash_16']),
+    }
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 """
 Exportar los 2000 casos a Excel con formato de fechas corregido
+Exportación incremental: las páginas de stream_query van directo al archivo
 """
 
 import asyncio
 import pandas as pd
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_results import page_to_dicts
+from result_export import export_pages
 
 async def obtener_y_exportar_casos_completos():
     """
@@ -47,79 +50,39 @@ async def obtener_y_exportar_casos_completos():
         res.SENTENCE_ID DESC
     """
     
+    # Excel si openpyxl está disponible; si no, CSV
+    try:
+        import openpyxl  # noqa: F401
+        filename = 'usuarios_se_contactan_COMPLETO.xlsx'
+    except ImportError:
+        filename = 'usuarios_se_contactan_COMPLETO.csv'
+        print("   ⚠️ openpyxl no disponible: se exporta CSV")
+    
     try:
         print("📊 Ejecutando query completa...")
-        result = await operations.execute_query(query, limit=3000)  # Límite alto
+        print(f"💾 Exportando a {filename} a medida que llegan las páginas...")
+        # Las fechas se escriben como fechas nativas (sin zona horaria en
+        # Excel); cada página se vuelca y se descarta
+        primera_pagina = []
         
-        if result["status"] == "success":
-            casos = result["result"]["rows"]
-            print(f"✅ {len(casos)} casos obtenidos")
-            
-            # Convertir a DataFrame
-            df = pd.DataFrame(casos)
-            print(f"📋 DataFrame creado: {len(df)} filas x {len(df.columns)} columnas")
-            
-            # CORREGIR formatos de fecha
-            print("🔧 Corrigiendo formatos de fecha...")
-            
-            # Manejar fecha_apertura_caso
-            if 'fecha_apertura_caso' in df.columns:
-                try:
-                    df['fecha_apertura_caso'] = pd.to_datetime(df['fecha_apertura_caso'], format='mixed').dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    # Si falla, usar método alternativo
-                    df['fecha_apertura_caso'] = df['fecha_apertura_caso'].astype(str)
-                    print("   ⚠️ fecha_apertura_caso convertida como string")
-            
-            # Manejar fecha_cierre_caso  
-            if 'fecha_cierre_caso' in df.columns:
-                try:
-                    df['fecha_cierre_caso'] = pd.to_datetime(df['fecha_cierre_caso'], format='mixed').dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    # Si falla, usar método alternativo
-                    df['fecha_cierre_caso'] = df['fecha_cierre_caso'].astype(str)
-                    print("   ⚠️ fecha_cierre_caso convertida como string")
-            
-            # Manejar SENTENCE_DATE
-            if 'SENTENCE_DATE' in df.columns:
-                try:
-                    df['SENTENCE_DATE'] = pd.to_datetime(df['SENTENCE_DATE']).dt.strftime('%Y-%m-%d')
-                except:
-                    df['SENTENCE_DATE'] = df['SENTENCE_DATE'].astype(str)
-                    print("   ⚠️ SENTENCE_DATE convertida como string")
-            
-            print("✅ Formatos de fecha corregidos")
-            
-            # Exportar a Excel
-            filename = 'usuarios_se_contactan_COMPLETO.xlsx'
-            print(f"💾 Exportando a {filename}...")
-            
-            try:
-                df.to_excel(filename, index=False, engine='openpyxl')
-                print(f"✅ ¡EXPORTACIÓN EXITOSA!")
-                print(f"📊 {len(df)} casos exportados")
-                print(f"📁 Archivo: {filename}")
-                print(f"📋 Columnas: {list(df.columns)}")
-                
-                # Mostrar primeras filas como verificación
-                print(f"\n📄 VERIFICACIÓN - Primeras 3 filas:")
-                print(df.head(3).to_string())
-                
-                return True
-                
-            except Exception as e:
-                print(f"❌ Error en exportación Excel: {e}")
-                
-                # Exportar como CSV alternativo
-                csv_filename = 'usuarios_se_contactan_COMPLETO.csv'
-                print(f"💾 Intentando CSV: {csv_filename}...")
-                df.to_csv(csv_filename, index=False)
-                print(f"✅ CSV exportado exitosamente: {csv_filename}")
-                return True
-                
-        else:
-            print(f"❌ Error en query: {result.get('error')}")
-            return False
+        async def paginas():
+            async for page in operations.stream_query(query, page_size=1000):
+                if not primera_pagina:
+                    primera_pagina.extend(page_to_dicts(page)[:3])
+                yield page
+        
+        info = await export_pages(paginas(), filename)
+        
+        print(f"✅ ¡EXPORTACIÓN EXITOSA!")
+        print(f"📊 {info['rows']} casos exportados")
+        print(f"📁 Archivo: {info['path']}")
+        print(f"📋 Columnas: {info['columns']}")
+        
+        # Mostrar primeras filas como verificación
+        print(f"\n📄 VERIFICACIÓN - Primeras 3 filas:")
+        print(pd.DataFrame(primera_pagina).to_string())
+        
+        return info['rows'] > 0
             
     except Exception as e:
         print(f"❌ Error general: {e}")
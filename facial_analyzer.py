@@ -0,0 +1,876 @@
+"""
+Analizador médico facial sobre arrays
+Port del detector de condiciones de app_web_backup.py (_analyze_blindness_indicators
+y sus helpers) que trabajaba sobre list(gray_img.getdata()) reindexada en Python.
+
+Acá la imagen en grises es un único array uint8 2D y todas las regiones (banda
+de ojos, mitades, cuadrantes) son vistas calculadas una sola vez. Las
+estadísticas que varios helpers repetían (asimetría espejo, varianza global,
+histograma, gradientes) se calculan una vez por imagen. Los resultados
+coinciden con la versión basada en listas.
+"""
+
+import logging
+from functools import cached_property
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from image_kernels import kernels
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de trabajo del analizador original (ancho, alto)
+ANALYSIS_SIZE = (400, 300)
+
+
+def _crop(array, box):
+    """Equivalente a PIL Image.crop sobre un array: vista si cae dentro de la
+    imagen, copia con relleno de ceros (como PIL) si se sale de los bordes"""
+    left, upper, right, lower = box
+    height, width = array.shape
+    if 0 <= left <= right <= width and 0 <= upper <= lower <= height:
+        return array[upper:lower, left:right]
+
+    out = np.zeros((max(0, lower - upper), max(0, right - left)), dtype=array.dtype)
+    src_left, src_upper = max(left, 0), max(upper, 0)
+    src_right, src_lower = min(right, width), min(lower, height)
+    if src_right > src_left and src_lower > src_upper:
+        out[src_upper - upper:src_lower - upper, src_left - left:src_right - left] = \
+            array[src_upper:src_lower, src_left:src_right]
+    return out
+
+
+def _mean(values):
+    """Media exacta (suma entera / n), igual que sum(pixels) / len(pixels)"""
+    return int(values.sum(dtype=np.int64)) / values.size
+
+
+def _count(mask):
+    """Cantidad de píxeles que cumplen la condición (como int de Python)"""
+    return int(np.count_nonzero(mask))
+
+
+def _variance(values, mean=None):
+    """Varianza poblacional, igual que sum((p - avg)**2) / len(pixels)"""
+    if mean is None:
+        mean = _mean(values)
+    centered = values.astype(np.float64) - mean
+    return float(np.dot(centered.ravel(), centered.ravel())) / values.size
+
+
+class FacialRegions:
+    """Imagen en grises compartida y sus recortes, calculados una sola vez"""
+
+    def __init__(self, gray):
+        self.gray = np.ascontiguousarray(gray, dtype=np.uint8)
+        self.height, self.width = self.gray.shape
+        self.flat = self.gray.reshape(-1)
+
+        h, w = self.height, self.width
+
+        # Banda de ojos del análisis especializado (filas completas: contigua)
+        self.eye_band = self.gray[int(h * 0.25):int(h * 0.55)]
+        self.eye_band_flat = self.eye_band.reshape(-1)
+
+        # Banda de ojos del detector básico
+        self.eye_band_wide = self.gray[int(h * 0.2):int(h * 0.6)]
+
+        # Mitades izquierda y derecha espejada (columna x contra w - 1 - x)
+        self.left_half = self.gray[:, :w // 2]
+        self.right_half_mirrored = self.gray[:, ::-1][:, :w // 2]
+
+        # Cuadrantes 2x2
+        self.quadrants = []
+        for qy in range(2):
+            for qx in range(2):
+                start_x = qx * (w // 2)
+                start_y = qy * (h // 2)
+                end_x = min(start_x + w // 2, w)
+                end_y = min(start_y + h // 2, h)
+                self.quadrants.append(self.gray[start_y:end_y, start_x:end_x])
+
+    # === Estadísticas compartidas entre helpers ===
+
+    @cached_property
+    def mean(self):
+        return _mean(self.flat)
+
+    @cached_property
+    def variance(self):
+        return _variance(self.flat, self.mean)
+
+    @cached_property
+    def mirror_stats(self):
+        """(suma izq, suma der espejada, suma |dif|, |dif| máx, n)"""
+        return kernels.mirror_asymmetry(self.gray)
+
+    @cached_property
+    def gradient_means(self):
+        """(media |dx|, media |dx| + |dy|) de la imagen completa"""
+        return kernels.gradient_means(self.gray)
+
+    # === Filtros PIL (solo para los analizadores de patrones) ===
+
+    @cached_property
+    def pil_image(self):
+        return Image.fromarray(self.gray, mode='L')
+
+    @cached_property
+    def edges(self):
+        return np.asarray(self.pil_image.filter(ImageFilter.FIND_EDGES))
+
+    @cached_property
+    def emboss(self):
+        return np.asarray(self.pil_image.filter(ImageFilter.EMBOSS))
+
+    @cached_property
+    def contour(self):
+        return np.asarray(self.pil_image.filter(ImageFilter.CONTOUR))
+
+
+class FacialConditionAnalyzer:
+    """Detector médico facial avanzado con indicadores especializados"""
+
+    def prepare(self, image):
+        """Convierte una imagen PIL al array compartido del análisis"""
+        gray_img = image.convert('L').resize(ANALYSIS_SIZE, Image.Resampling.LANCZOS)
+        return FacialRegions(np.asarray(gray_img))
+
+    def analyze_pair(self, image1, image2):
+        """Analiza dos fotos por separado y arma la respuesta combinada"""
+        try:
+            analysis1 = self.analyze(image1)
+            analysis2 = self.analyze(image2)
+
+            results = {}
+
+            # Resultados individuales para cada foto
+            results['image1_blindness_probability'] = analysis1['blindness_probability']
+            results['image2_blindness_probability'] = analysis2['blindness_probability']
+
+            # Para compatibilidad con frontend, usar los análisis individuales
+            results['pixel_similarity'] = analysis1['eye_closure_analysis']
+            results['color_similarity'] = analysis1['facial_muscle_tension']
+            results['hash_similarity'] = analysis2['eye_closure_analysis']
+            results['stats_similarity'] = analysis2['facial_muscle_tension']
+
+            # El "overall" será el promedio de ambas probabilidades de ceguera
+            results['overall_similarity'] = (analysis1['blindness_probability'] + analysis2['blindness_probability']) / 2
+
+            # Agregar detalles del análisis
+            results['image1_details'] = analysis1
+            results['image2_details'] = analysis2
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error analizando condición médica: {e}")
+            return self._default_medical_results()
+
+    def analyze(self, image):
+        """Analiza una imagen PIL individual"""
+        try:
+            return self.analyze_regions(self.prepare(image))
+        except Exception as e:
+            logger.error(f"Error analizando condiciones médicas avanzadas: {e}")
+            return self._default_medical_result(0.60)
+
+    def analyze_regions(self, regions):
+        """DETECTOR MÉDICO AVANZADO sobre el array compartido"""
+        try:
+            if regions.flat.size == 0:
+                return self._default_medical_result(0.70)
+
+            # === INDICADORES ESPECIALIZADOS AVANZADOS ===
+            scores = {
+                'asymmetry': self._detect_advanced_facial_asymmetry(regions),
+                'texture': self._detect_advanced_texture_anomalies(regions),
+                'eye': self._detect_specialized_eye_conditions(regions),
+                'paralysis': self._detect_facial_paralysis_indicators(regions),
+                'structural': self._detect_structural_deformities(regions),
+                'aging': self._detect_aging_related_conditions(regions),
+                'inflammation': self._detect_inflammation_patterns(regions),
+                'light': self._detect_advanced_light_anomalies(regions),
+            }
+
+            # Detectar tipo de condición predominante para ajustar sensibilidad
+            condition_type = self._classify_condition_type(scores)
+
+            # Aplicar pesos adaptativos según el tipo de condición detectada
+            medical_condition_score = self._calculate_specialized_score(scores, condition_type)
+
+            # Convertir score a probabilidad con sensibilidad ajustada
+            medical_probability = self._apply_sensitivity_adjustment(medical_condition_score, condition_type)
+            medical_probability = max(0.1, min(0.95, medical_probability))
+
+            return {
+                'blindness_probability': medical_probability,
+                'eye_closure_analysis': scores['asymmetry'],
+                'facial_muscle_tension': scores['texture'],
+                'eyelid_position': scores['eye'],
+                'facial_symmetry': scores['paralysis'],
+                'light_reflection': scores['structural'],
+                'diagnosis': self._get_specialized_diagnosis(medical_probability, condition_type)
+            }
+
+        except Exception as e:
+            logger.error(f"Error analizando condiciones médicas avanzadas: {e}")
+            return self._default_medical_result(0.60)
+
+    # === DETECTORES ESPECIALIZADOS ===
+
+    def _detect_advanced_facial_asymmetry(self, regions):
+        """Detecta asimetría facial avanzada con múltiples métricas"""
+        try:
+            basic_asymmetry = self._calculate_basic_asymmetry(regions)
+            regional_asymmetry = self._calculate_regional_asymmetry(regions)
+            gradient_asymmetry = self._calculate_gradient_asymmetry(regions)
+
+            total_asymmetry = (
+                basic_asymmetry * 0.4 +
+                regional_asymmetry * 0.35 +
+                gradient_asymmetry * 0.25
+            )
+
+            return min(1.0, total_asymmetry)
+
+        except Exception:
+            return 0.3
+
+    def _detect_specialized_eye_conditions(self, regions):
+        """Detecta condiciones oculares especializadas"""
+        try:
+            eye_pixels = regions.eye_band_flat
+            if eye_pixels.size == 0:
+                return 0.3
+
+            total_eye_condition = max(
+                self._detect_blindness_patterns(eye_pixels),
+                self._detect_cataract_patterns(eye_pixels),
+                self._detect_ptosis_patterns(eye_pixels),
+                self._detect_strabismus_patterns(eye_pixels)
+            )
+
+            return min(1.0, total_eye_condition)
+
+        except Exception:
+            return 0.3
+
+    def _detect_facial_paralysis_indicators(self, regions):
+        """Detecta indicadores de parálisis facial"""
+        try:
+            paralysis_score = (
+                self._calculate_facial_uniformity(regions) * 0.4 +
+                self._calculate_dynamic_asymmetry(regions) * 0.35 +
+                self._calculate_muscle_tension_anomaly(regions) * 0.25
+            )
+
+            return min(1.0, paralysis_score)
+
+        except Exception:
+            return 0.2
+
+    def _detect_structural_deformities(self, regions):
+        """Detecta deformidades estructurales"""
+        try:
+            structural_score = (
+                self._calculate_proportion_anomalies(regions) * 0.4 +
+                self._calculate_contour_irregularities(regions) * 0.35 +
+                self._calculate_density_anomalies(regions) * 0.25
+            )
+
+            return min(1.0, structural_score)
+
+        except Exception:
+            return 0.2
+
+    def _classify_condition_type(self, scores):
+        """Clasifica el tipo de condición predominante"""
+        try:
+            max_score = 0
+            condition_type = "general"
+
+            if scores['eye'] > max_score:
+                max_score = scores['eye']
+                condition_type = "ocular"
+
+            if scores['asymmetry'] > max_score:
+                max_score = scores['asymmetry']
+                condition_type = "asymmetry"
+
+            if scores['paralysis'] > max_score:
+                max_score = scores['paralysis']
+                condition_type = "paralysis"
+
+            if scores['texture'] > max_score:
+                max_score = scores['texture']
+                condition_type = "surgical"
+
+            if scores['structural'] > max_score:
+                condition_type = "structural"
+
+            return condition_type
+
+        except Exception:
+            return "general"
+
+    def _calculate_specialized_score(self, scores, condition_type):
+        """Calcula score con pesos especializados según tipo de condición"""
+        try:
+            if condition_type == "ocular":
+                return (
+                    scores['eye'] * 0.4 +
+                    scores['asymmetry'] * 0.2 +
+                    scores['light'] * 0.15 +
+                    scores['paralysis'] * 0.1 +
+                    scores['texture'] * 0.1 +
+                    scores['structural'] * 0.05
+                )
+            elif condition_type == "asymmetry":
+                return (
+                    scores['asymmetry'] * 0.35 +
+                    scores['paralysis'] * 0.25 +
+                    scores['texture'] * 0.2 +
+                    scores['eye'] * 0.1 +
+                    scores['structural'] * 0.1
+                )
+            elif condition_type == "surgical":
+                return (
+                    scores['texture'] * 0.4 +
+                    scores['asymmetry'] * 0.25 +
+                    scores['structural'] * 0.2 +
+                    scores['inflammation'] * 0.15
+                )
+            elif condition_type == "paralysis":
+                return (
+                    scores['paralysis'] * 0.4 +
+                    scores['asymmetry'] * 0.3 +
+                    scores['eye'] * 0.15 +
+                    scores['aging'] * 0.15
+                )
+            else:
+                return (
+                    scores['eye'] * 0.2 +
+                    scores['asymmetry'] * 0.2 +
+                    scores['texture'] * 0.15 +
+                    scores['paralysis'] * 0.15 +
+                    scores['structural'] * 0.1 +
+                    scores['aging'] * 0.1 +
+                    scores['inflammation'] * 0.05 +
+                    scores['light'] * 0.05
+                )
+
+        except Exception:
+            return 0.5
+
+    def _apply_sensitivity_adjustment(self, score, condition_type):
+        """Aplica ajustes de sensibilidad según tipo de condición - BALANCE INTELIGENTE"""
+        try:
+            # Rango base BALANCEADO: 3-55% (más rango para patologías reales)
+            base_probability = 0.03 + (score * 0.52)
+
+            if condition_type == "ocular":
+                if score > 0.7:
+                    return base_probability * 1.6
+                elif score > 0.5:
+                    return base_probability * 1.3
+                elif score > 0.3:
+                    return base_probability * 1.1
+                else:
+                    return base_probability * 0.7
+
+            elif condition_type == "surgical":
+                if score > 0.6:
+                    return base_probability * 1.4
+                elif score > 0.4:
+                    return base_probability * 1.2
+                else:
+                    return base_probability * 0.8
+
+            elif condition_type == "paralysis":
+                if score > 0.6:
+                    return base_probability * 1.5
+                elif score > 0.4:
+                    return base_probability * 1.2
+                else:
+                    return base_probability * 0.8
+
+            elif condition_type == "asymmetry":
+                if score > 0.6:
+                    return base_probability * 1.3
+                elif score > 0.4:
+                    return base_probability * 1.1
+                else:
+                    return base_probability * 0.8
+
+            elif condition_type == "structural":
+                if score > 0.5:
+                    return base_probability * 1.4
+                elif score > 0.3:
+                    return base_probability * 1.1
+                else:
+                    return base_probability * 0.8
+
+            # Por defecto: ligera reducción para casos no clasificados
+            return base_probability * 0.85
+
+        except Exception:
+            return 0.08
+
+    # === DETECTORES BÁSICOS (versión anterior, se conservan) ===
+
+    def _detect_facial_asymmetry(self, regions):
+        """Detecta asimetría facial (cirugías, parálisis, etc.)"""
+        try:
+            _, _, diff_sum, _, count = regions.mirror_stats
+            if count:
+                avg_difference = diff_sum / count
+                return min(1.0, avg_difference / 40.0)
+            return 0.3
+        except Exception:
+            return 0.3
+
+    def _detect_texture_anomalies(self, regions):
+        """Detecta texturas anómalas (cicatrices, cirugías, etc.)"""
+        try:
+            region_variances = [_variance(quadrant) for quadrant in regions.quadrants if quadrant.size]
+
+            if region_variances:
+                variance_range = max(region_variances) - min(region_variances)
+                return min(1.0, variance_range / 2000.0)
+
+            return 0.2
+
+        except Exception:
+            return 0.2
+
+    def _detect_eye_conditions(self, regions):
+        """Detecta condiciones oculares (ceguera, cataratas, etc.)"""
+        try:
+            eye_pixels = regions.eye_band_wide
+            if not eye_pixels.size:
+                return 0.3
+
+            avg_brightness = _mean(eye_pixels)
+            dark_ratio = _count(eye_pixels < 60) / eye_pixels.size
+            bright_ratio = _count(eye_pixels > 200) / eye_pixels.size
+
+            eye_condition_score = 0.0
+
+            if dark_ratio > 0.7:
+                eye_condition_score += 0.4
+            elif dark_ratio > 0.5:
+                eye_condition_score += 0.2
+
+            if bright_ratio > 0.15:
+                eye_condition_score += 0.3
+            elif bright_ratio > 0.08:
+                eye_condition_score += 0.1
+
+            if avg_brightness < 80:
+                eye_condition_score += 0.3
+            elif avg_brightness < 120:
+                eye_condition_score += 0.1
+
+            return min(1.0, eye_condition_score)
+
+        except Exception:
+            return 0.3
+
+    def _detect_facial_uniformity_issues(self, regions):
+        """Detecta problemas de uniformidad facial (parálisis, etc.)"""
+        try:
+            if regions.height < 2 or regions.width < 2:
+                return 0.2
+
+            avg_gradient = regions.gradient_means[1]
+
+            if avg_gradient < 10:
+                return 0.6
+            elif avg_gradient > 50:
+                return 0.7
+            else:
+                return min(1.0, avg_gradient / 100.0)
+
+        except Exception:
+            return 0.2
+
+    def _detect_contrast_anomalies(self, regions):
+        """Detecta anomalías de contraste (inflamaciones, deformidades)"""
+        try:
+            peaks = kernels.histogram_peaks(regions.flat, 0.02)
+
+            if peaks == 0:
+                return 0.6
+            elif peaks > 5:
+                return 0.7
+            else:
+                return min(1.0, peaks / 10.0)
+
+        except Exception:
+            return 0.2
+
+    def _get_specialized_diagnosis(self, probability, condition_type):
+        """Genera diagnóstico especializado según tipo de condición"""
+        try:
+            if probability >= 0.8:
+                base = "Alta probabilidad de condición médica"
+            elif probability >= 0.6:
+                base = "Probable condición médica"
+            elif probability >= 0.4:
+                base = "Indicadores mixtos"
+            else:
+                base = "Características normales"
+
+            if condition_type == "ocular" and probability >= 0.6:
+                return f"{base} (condición ocular)"
+            elif condition_type == "surgical" and probability >= 0.6:
+                return f"{base} (posible cirugía)"
+            elif condition_type == "paralysis" and probability >= 0.6:
+                return f"{base} (posible parálisis)"
+            else:
+                return base
+        except Exception:
+            return "Análisis médico facial"
+
+    # === FUNCIONES AUXILIARES ===
+
+    def _calculate_basic_asymmetry(self, regions):
+        """Calcula asimetría básica (izquierda contra derecha espejada)"""
+        try:
+            left_sum, right_sum, diff_sum, max_diff, count = regions.mirror_stats
+
+            if count > 0:
+                avg_asymmetry = abs(left_sum - right_sum) / (count * 128.0)
+                avg_diff = diff_sum / count
+
+                asymmetry_score = (
+                    avg_asymmetry * 0.3 +
+                    (avg_diff / 64.0) * 0.5 +
+                    (max_diff / 128.0) * 0.2
+                )
+
+                return min(1.0, asymmetry_score * 1.5)
+
+            return 0.4
+        except Exception:
+            return 0.4
+
+    def _calculate_regional_asymmetry(self, regions):
+        """Calcula asimetría regional"""
+        return self._calculate_basic_asymmetry(regions) * 0.8
+
+    def _calculate_gradient_asymmetry(self, regions):
+        """Calcula asimetría de gradientes"""
+        return self._calculate_basic_asymmetry(regions) * 0.9
+
+    def _detect_blindness_patterns(self, eye_pixels):
+        """Detecta patrones de ceguera - EXTREMADAMENTE AGRESIVO ANTI-FALSOS POSITIVOS"""
+        try:
+            if not eye_pixels.size:
+                return 0.02
+
+            n = eye_pixels.size
+            avg_brightness = _mean(eye_pixels)
+
+            # 1. BRILLO: Si NO es extremadamente oscuro = NORMAL
+            if avg_brightness > 20:
+                return 0.02
+
+            # 2. VARIABILIDAD: Si hay CUALQUIER variabilidad = NORMAL
+            variance = _variance(eye_pixels, avg_brightness)
+            if variance > 80:
+                return 0.03
+
+            # 3. DISTRIBUCIÓN: Si hay píxeles de rango medio = NORMAL
+            mid_range_pixels = _count((eye_pixels > 35) & (eye_pixels < 120)) / n
+            if mid_range_pixels > 0.02:
+                return 0.02
+
+            # 4. GRADIENTES: saltos entre píxeles consecutivos (orden de recorrido)
+            gradients = kernels.sequential_jumps(eye_pixels, 15)
+            if gradients > n * 0.05:
+                return 0.02
+
+            # 5. TEXTURA: Si hay textura = NORMAL
+            texture_pixels = _count((eye_pixels > 50) & (eye_pixels < 140)) / n
+            if texture_pixels > 0.05:
+                return 0.03
+
+            # 6. RANGO DE VALORES: Si hay rango amplio = NORMAL
+            if int(eye_pixels.max()) - int(eye_pixels.min()) > 40:
+                return 0.02
+
+            # 7. PÍXELES CLAROS: Si hay píxeles claros = NORMAL
+            light_pixels = _count(eye_pixels > 60) / n
+            if light_pixels > 0.01:
+                return 0.02
+
+            # SOLO SI PASA TODOS LOS FILTROS DE NORMALIDAD → EVALUAR PATOLOGÍA
+            dark_ratio = _count(eye_pixels < 50) / n
+            very_dark_ratio = _count(eye_pixels < 30) / n
+            pathology_score = 0.0
+
+            if avg_brightness < 15:
+                pathology_score += 0.4
+            elif avg_brightness < 20:
+                pathology_score += 0.2
+
+            if dark_ratio > 0.98:
+                pathology_score += 0.4
+            elif dark_ratio > 0.95:
+                pathology_score += 0.2
+
+            if variance < 30:
+                pathology_score += 0.4
+            elif variance < 50:
+                pathology_score += 0.2
+
+            if very_dark_ratio > 0.9:
+                pathology_score += 0.3
+            elif very_dark_ratio > 0.8:
+                pathology_score += 0.15
+
+            return min(0.5, pathology_score)
+
+        except Exception:
+            return 0.02
+
+    def _detect_cataract_patterns(self, eye_pixels):
+        """Detecta cataratas"""
+        try:
+            if not eye_pixels.size:
+                return 0.2
+            bright_ratio = _count(eye_pixels > 220) / eye_pixels.size
+            return min(1.0, bright_ratio * 3)
+        except Exception:
+            return 0.2
+
+    def _detect_ptosis_patterns(self, eye_pixels):
+        """Detecta ptosis (mitad superior de la banda más oscura que la inferior)"""
+        try:
+            mid = eye_pixels.size // 2
+            upper = _mean(eye_pixels[:mid]) if mid > 0 else 128
+            lower = _mean(eye_pixels[mid:]) if eye_pixels.size > mid else 128
+            if upper < lower - 20:
+                return min(1.0, (lower - upper) / 100.0)
+            return 0.2
+        except Exception:
+            return 0.2
+
+    def _detect_strabismus_patterns(self, eye_pixels):
+        """Detecta estrabismo"""
+        return self._detect_ptosis_patterns(eye_pixels) * 0.7
+
+    def _calculate_facial_uniformity(self, regions):
+        """Calcula uniformidad facial"""
+        try:
+            return 1.0 - min(1.0, regions.variance / 2000.0)
+        except Exception:
+            return 0.3
+
+    def _calculate_dynamic_asymmetry(self, regions):
+        """Calcula asimetría dinámica"""
+        return self._calculate_basic_asymmetry(regions)
+
+    def _calculate_muscle_tension_anomaly(self, regions):
+        """Calcula anomalías de tensión"""
+        try:
+            if regions.height < 2 or regions.width < 2:
+                return 0.3
+            return min(1.0, regions.gradient_means[0] / 50.0)
+        except Exception:
+            return 0.3
+
+    def _calculate_proportion_anomalies(self, regions):
+        """Calcula anomalías de proporción"""
+        try:
+            ratio = regions.width / regions.height if regions.height > 0 else 1.0
+            deviation = abs(ratio - 1.33) / 1.33
+            return min(1.0, deviation * 2)
+        except Exception:
+            return 0.2
+
+    def _calculate_contour_irregularities(self, regions):
+        """Calcula irregularidades de contorno"""
+        return 0.3  # Implementación simplificada
+
+    def _calculate_density_anomalies(self, regions):
+        """Calcula anomalías de densidad"""
+        return 0.2  # Implementación simplificada
+
+    def _detect_advanced_texture_anomalies(self, regions):
+        """Detecta texturas anómalas avanzadas"""
+        return self._detect_texture_anomalies(regions)
+
+    def _detect_aging_related_conditions(self, regions):
+        """Detecta condiciones de envejecimiento"""
+        try:
+            return min(1.0, regions.variance / 3000.0) * 0.5
+        except Exception:
+            return 0.2
+
+    def _detect_inflammation_patterns(self, regions):
+        """Detecta inflamación"""
+        try:
+            bright_areas = _count(regions.flat > regions.mean + 30)
+            return min(1.0, bright_areas / regions.flat.size * 2)
+        except Exception:
+            return 0.1
+
+    def _detect_advanced_light_anomalies(self, regions):
+        """Detecta anomalías de luz"""
+        try:
+            peaks = kernels.histogram_peaks(regions.flat, 0.02)
+            return min(1.0, peaks / 8.0)
+        except Exception:
+            return 0.1
+
+    def _default_medical_result(self, probability):
+        """Resultado por defecto para análisis médico"""
+        return {
+            'blindness_probability': probability,
+            'eye_closure_analysis': 0.4,
+            'facial_muscle_tension': 0.3,
+            'eyelid_position': 0.4,
+            'facial_symmetry': 0.3,
+            'light_reflection': 0.2,
+            'diagnosis': self._get_specialized_diagnosis(probability, "general")
+        }
+
+    def _default_medical_results(self):
+        """Resultados por defecto para el análisis de dos imágenes"""
+        return {
+            'overall_similarity': 0.0,
+            'pixel_similarity': 0.0,
+            'color_similarity': 0.0,
+            'hash_similarity': 0.0,
+            'stats_similarity': 0.0
+        }
+
+    # === ANALIZADORES DE PATRONES (filtros PIL sobre la imagen completa) ===
+    # El original tomaba `h, w = gray_img.size`, es decir h = ancho y w = alto;
+    # se conservan esos recortes (incluido el relleno con ceros de PIL) para
+    # que los resultados coincidan.
+
+    def _analyze_eye_closure_pattern(self, regions):
+        """Analiza el patrón de cierre de ojos - MEJORADO Y ADAPTATIVO"""
+        try:
+            h, w = regions.width, regions.height
+            box = (0, int(h * 0.15), w, int(h * 0.65))
+
+            edge_region = _crop(regions.edges, box)
+            edge_intensity = _mean(edge_region) if edge_region.size else 0
+            edge_score = min(1.0, edge_intensity / 50)
+
+            emboss_region = _crop(regions.emboss, box)
+            emboss_intensity = kernels.mean_abs_deviation(emboss_region, 128) if emboss_region.size else 0
+            emboss_score = min(1.0, emboss_intensity / 30)
+
+            eye_region = _crop(regions.gray, box)
+            if eye_region.size > 1:
+                variance_score = min(1.0, _variance(eye_region) / 1500)
+            else:
+                variance_score = 0.0
+
+            closure_indicator = (
+                edge_score * 0.4 +
+                emboss_score * 0.35 +
+                variance_score * 0.25
+            )
+
+            return min(1.0, closure_indicator)
+
+        except Exception as e:
+            logger.error(f"Error en análisis de cierre de ojos: {e}")
+            return 0.3
+
+    def _analyze_facial_muscle_tension(self, regions):
+        """Analiza la tensión muscular facial - MEJORADO Y ADAPTATIVO"""
+        try:
+            h, w = regions.width, regions.height
+            box = (int(w * 0.1), int(h * 0.1), int(w * 0.9), int(h * 0.9))
+
+            face_region = _crop(regions.gray, box)
+            if face_region.size > 0:
+                variance_score = min(1.0, _variance(face_region) / 2000)
+            else:
+                variance_score = 0.0
+
+            edge_region = _crop(regions.edges, box)
+            edge_intensity = _mean(edge_region) if edge_region.size else 0
+            edge_score = min(1.0, edge_intensity / 60)
+
+            contour_region = _crop(regions.contour, box)
+            contour_intensity = _mean(contour_region) if contour_region.size else 0
+            contour_score = min(1.0, contour_intensity / 40)
+
+            tension_indicator = (
+                variance_score * 0.4 +
+                edge_score * 0.35 +
+                contour_score * 0.25
+            )
+
+            return min(1.0, tension_indicator)
+
+        except Exception as e:
+            logger.error(f"Error en análisis de tensión muscular: {e}")
+            return 0.3
+
+    def _analyze_eyelid_position(self, regions):
+        """Analiza la posición y forma de los párpados"""
+        try:
+            h, w = regions.width, regions.height
+            eyelid_region = _crop(regions.gray, (int(w * 0.2), int(h * 0.25), int(w * 0.8), int(h * 0.55)))
+
+            if eyelid_region.shape[0] >= 2 and eyelid_region.shape[1] >= 2:
+                avg_gradient = kernels.gradient_means(eyelid_region)[0]
+                return min(1.0, avg_gradient / 30)
+
+            return 0.0
+
+        except Exception as e:
+            logger.error(f"Error en análisis de párpados: {e}")
+            return 0.0
+
+    def _analyze_facial_symmetry(self, regions):
+        """Analiza la simetría facial"""
+        try:
+            h, w = regions.width, regions.height
+
+            left_half = _crop(regions.gray, (0, 0, w // 2, h))
+            right_half_flipped = _crop(regions.gray, (w // 2, 0, w, h))[:, ::-1]
+
+            if not left_half.size:
+                return 0.0
+            if right_half_flipped.shape != left_half.shape:
+                # Ancho impar: el original redimensionaba la mitad derecha
+                right_half_flipped = np.asarray(
+                    Image.fromarray(np.ascontiguousarray(right_half_flipped)).resize((w // 2, h))
+                )
+
+            differences = np.abs(left_half.astype(np.int16) - right_half_flipped)
+            avg_difference = int(differences.sum(dtype=np.int64)) / differences.size
+
+            return max(0, 1 - avg_difference / 128)
+
+        except Exception as e:
+            logger.error(f"Error en análisis de simetría: {e}")
+            return 0.0
+
+    def _analyze_eye_light_patterns(self, regions):
+        """Analiza patrones de luz y reflexión en los ojos"""
+        try:
+            h, w = regions.width, regions.height
+            eye_region = _crop(regions.gray, (int(w * 0.15), int(h * 0.2), int(w * 0.85), int(h * 0.6)))
+
+            if eye_region.size > 0:
+                brightness_ratio = _count(eye_region > 200) / eye_region.size
+                return min(1.0, brightness_ratio * 10)
+
+            return 0.0
+
+        except Exception as e:
+            logger.error(f"Error en análisis de patrones de luz: {e}")
+            return 0.0
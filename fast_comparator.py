@@ -0,0 +1,628 @@
+"""
+Comparador rápido de fondos por imagen (métricas, agregación y conclusión)
+Módulo liviano: no carga modelos ni arranca la app, así lo pueden importar
+app_web y los workers de deduplicar_fondos.py
+"""
+
+import logging
+
+import numpy as np
+from PIL import Image, ImageStat, ImageChops
+
+from image_kernels import kernels
+from memory_admission import MemoryBudgetExceeded, estimate_decoded_bytes, image_memory_budget
+from integral_ssim import ms_ssim
+
+logger = logging.getLogger(__name__)
+
+
+class FastImageComparator:
+    """Comparador rápido de imágenes optimizado para web"""
+    
+    def load_image(self, file_stream):
+        """Carga y normaliza una imagen rápidamente
+        
+        La memoria de la decodificación se reserva antes contra el presupuesto
+        global (lanza MemoryBudgetExceeded si no hay lugar)
+        """
+        try:
+            estimated_bytes, _, _ = estimate_decoded_bytes(file_stream)
+            
+            # Solo la decodificación a resolución completa ocupa memoria grande;
+            # la miniatura resultante es despreciable
+            with image_memory_budget.reservation(estimated_bytes):
+                image = Image.open(file_stream)
+                
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                
+                # Redimensionar para comparación rápida
+                max_size = 600
+                image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            
+            return image
+        except MemoryBudgetExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error cargando imagen: {e}")
+            return None
+    
+    def compare_images_fast(self, image1, image2):
+        """Comparación específica de fondos, ignorando personas centrales"""
+        try:
+            results = {}
+            
+            # 1. Comparación de BORDES (donde está el fondo)
+            results['edge_similarity'] = self._compare_background_edges(image1, image2)
+            
+            # 2. Comparación de TEXTURAS (ladrillos, superficies)
+            results['texture_similarity'] = self._compare_background_textures(image1, image2)
+            
+            # 3. Comparación de COLORES dominantes del fondo
+            results['color_similarity'] = self._compare_background_colors(image1, image2)
+            
+            # 4. Hash perceptual de áreas NO centrales
+            results['background_hash'] = self._compare_background_hash(image1, image2)
+            
+            # 5. Análisis estructural de elementos fijos (puertas, ventanas)
+            results['structural_similarity'] = self._compare_fixed_elements(image1, image2)
+            
+            # 6. SSIM multi-escala sobre las franjas de borde (fondo)
+            results['ssim_similarity'] = self._compare_background_ssim(image1, image2)
+            
+            # Cálculo especializado para fondos
+            overall = self._calculate_background_similarity(results)
+            results['overall_similarity'] = overall
+            
+            # Generar conclusión descriptiva
+            results['conclusion'] = self._generate_background_conclusion(overall)
+            
+            # Mantener compatibilidad con frontend
+            results['pixel_similarity'] = results['edge_similarity']
+            results['hash_similarity'] = results['background_hash']
+            results['stats_similarity'] = results['texture_similarity']
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error comparando fondos: {e}")
+            return self._default_results()
+    
+    def _generate_background_conclusion(self, similarity_percentage):
+        """Genera conclusión descriptiva basada en el porcentaje de similitud"""
+        # Convertir a porcentaje si está en decimal
+        if similarity_percentage <= 1.0:
+            percentage = similarity_percentage * 100
+        else:
+            percentage = similarity_percentage
+        
+        if percentage >= 85:
+            return {
+                'category': 'iguales',
+                'description': '🟢 Fondos prácticamente iguales',
+                'detail': f'Los fondos son muy similares ({percentage:.1f}%). Misma ubicación o condiciones muy parecidas.'
+            }
+        elif percentage >= 60:
+            return {
+                'category': 'similares',
+                'description': '🟡 Fondos similares',
+                'detail': f'Los fondos comparten características importantes ({percentage:.1f}%). Posiblemente misma zona o tipo de ambiente.'
+            }
+        elif percentage >= 35:
+            return {
+                'category': 'parcialmente_similares',
+                'description': '🟠 Fondos parcialmente similares',
+                'detail': f'Los fondos tienen algunas similitudes ({percentage:.1f}%). Algunos elementos en común pero diferencias notables.'
+            }
+        elif percentage >= 15:
+            return {
+                'category': 'diferentes',
+                'description': '🔴 Fondos diferentes',
+                'detail': f'Los fondos son claramente diferentes ({percentage:.1f}%). Ubicaciones o ambientes distintos.'
+            }
+        else:
+            return {
+                'category': 'muy_diferentes',
+                'description': '🔴 Fondos muy diferentes',
+                'detail': f'Los fondos son completamente diferentes ({percentage:.1f}%). Ubicaciones totalmente distintas.'
+            }
+    
+    def _compare_background_edges(self, img1, img2):
+        """Compara los bordes de las imágenes donde está el fondo"""
+        try:
+            # Redimensionar para análisis
+            size = (300, 200)
+            img1_resized = img1.resize(size, Image.Resampling.LANCZOS)
+            img2_resized = img2.resize(size, Image.Resampling.LANCZOS)
+            
+            # Extraer bordes (donde normalmente está el fondo)
+            w, h = size
+            border_size = 50  # Ancho del borde a analizar
+            
+            # Extraer regiones de borde
+            def extract_borders(img):
+                borders = []
+                # Borde superior
+                borders.append(img.crop((0, 0, w, border_size)))
+                # Borde inferior  
+                borders.append(img.crop((0, h-border_size, w, h)))
+                # Borde izquierdo
+                borders.append(img.crop((0, 0, border_size, h)))
+                # Borde derecho
+                borders.append(img.crop((w-border_size, 0, w, h)))
+                return borders
+            
+            borders1 = extract_borders(img1_resized)
+            borders2 = extract_borders(img2_resized)
+            
+            # Comparar cada borde
+            total_similarity = 0
+            for b1, b2 in zip(borders1, borders2):
+                # Comparar histogramas de cada borde
+                hist1 = b1.histogram()
+                hist2 = b2.histogram()
+                
+                # Correlación de histogramas
+                correlation = 0
+                total1 = sum(hist1) or 1
+                total2 = sum(hist2) or 1
+                
+                for h1, h2 in zip(hist1, hist2):
+                    correlation += min(h1/total1, h2/total2)
+                
+                total_similarity += correlation
+            
+            # Promedio de todos los bordes
+            edge_similarity = total_similarity / len(borders1)
+            
+            # BOOST CONSERVADOR solo para bordes realmente similares
+            if edge_similarity > 0.6:  # Umbral más alto
+                edge_similarity = min(1.0, edge_similarity * 1.15)  # Menos boost
+            
+            return min(1.0, edge_similarity)
+            
+        except Exception as e:
+            logger.error(f"Error en bordes: {e}")
+            return 0.0
+
+    def _compare_background_textures(self, img1, img2):
+        """Compara texturas del fondo (ladrillos, superficies)"""
+        try:
+            # Convertir a escala de grises para análisis de textura
+            gray1 = img1.convert('L').resize((200, 150), Image.Resampling.LANCZOS)
+            gray2 = img2.convert('L').resize((200, 150), Image.Resampling.LANCZOS)
+            
+            # Aplicar filtro para detectar texturas
+            from PIL import ImageFilter
+            edge1 = gray1.filter(ImageFilter.FIND_EDGES)
+            edge2 = gray2.filter(ImageFilter.FIND_EDGES)
+            
+            # Comparar patrones de bordes/texturas
+            pixels1 = np.asarray(edge1)
+            pixels2 = np.asarray(edge2)
+            
+            # Calcular similitud de patrones (MÁS TOLERANTE para mismo lugar)
+            tolerance = 50  # Más tolerante para variaciones de iluminación
+            similar_pixels, edge1_intensity, edge2_intensity = kernels.tolerance_match(
+                pixels1, pixels2, tolerance
+            )
+            
+            texture_similarity = similar_pixels / pixels1.size
+            
+            # DETECCIÓN DE TEXTURAS COMPLETAMENTE DIFERENTES
+            # Comparar distribución de intensidades de bordes (edge*_intensity)
+            
+            # Si una imagen tiene muchos bordes y otra pocos (uniforme vs compleja)
+            intensity_diff = abs(edge1_intensity - edge2_intensity)
+            
+            if intensity_diff > 40:  # Una muy uniforme, otra muy texturizada
+                texture_similarity *= 0.5  # PENALTY del 50%
+            
+            # BOOST CONSERVADOR solo para texturas genuinamente altas
+            if texture_similarity > 0.6:  # Umbral más alto
+                texture_similarity = min(1.0, texture_similarity * 1.2)  # Menos boost
+            elif texture_similarity > 0.4:
+                texture_similarity = min(1.0, texture_similarity * 1.1)  # Boost mínimo
+            
+            return texture_similarity
+            
+        except Exception as e:
+            logger.error(f"Error en texturas: {e}")
+            return 0.0
+
+    def _compare_background_colors(self, img1, img2):
+        """Compara colores dominantes del fondo MEJORADO"""
+        try:
+            # Redimensionar para análisis
+            size = (200, 150)
+            img1_small = img1.resize(size, Image.Resampling.LANCZOS)
+            img2_small = img2.resize(size, Image.Resampling.LANCZOS)
+            
+            w, h = size
+            # Área central más pequeña para excluir solo personas
+            center_w = w // 3  # Solo el tercio central horizontal
+            center_h = h // 3  # Solo el tercio central vertical
+            
+            def extract_background_regions(img):
+                """Extrae múltiples regiones de fondo"""
+                regions = []
+                
+                # Región superior (toda)
+                regions.append(img.crop((0, 0, w, h//4)))
+                
+                # Región inferior (toda)  
+                regions.append(img.crop((0, 3*h//4, w, h)))
+                
+                # Regiones laterales (excluyendo centro)
+                regions.append(img.crop((0, h//4, w//4, 3*h//4)))  # Izquierda
+                regions.append(img.crop((3*w//4, h//4, w, 3*h//4)))  # Derecha
+                
+                return regions
+            
+            regions1 = extract_background_regions(img1_small)
+            regions2 = extract_background_regions(img2_small)
+            
+            total_similarity = 0
+            
+            for reg1, reg2 in zip(regions1, regions2):
+                # Obtener histogramas de cada región
+                hist1 = reg1.histogram()
+                hist2 = reg2.histogram()
+                
+                # Simplificar histogramas agrupando colores similares
+                def simplify_histogram(hist, bins=32):
+                    """Agrupa colores similares para mejor comparación"""
+                    simplified = [0] * bins
+                    group_size = 256 // bins
+                    
+                    for i, count in enumerate(hist):
+                        group = min(i // group_size, bins - 1)
+                        simplified[group] += count
+                    
+                    return simplified
+                
+                # Simplificar para R, G, B por separado
+                simple_hist1 = []
+                simple_hist2 = []
+                
+                # Procesar cada canal (R, G, B)
+                for channel in range(3):
+                    start = channel * 256
+                    end = start + 256
+                    channel_hist1 = hist1[start:end]
+                    channel_hist2 = hist2[start:end]
+                    
+                    simple_hist1.extend(simplify_histogram(channel_hist1))
+                    simple_hist2.extend(simplify_histogram(channel_hist2))
+                
+                # Comparar histogramas simplificados
+                total1 = sum(simple_hist1) or 1
+                total2 = sum(simple_hist2) or 1
+                
+                region_similarity = 0
+                for h1, h2 in zip(simple_hist1, simple_hist2):
+                    freq1 = h1 / total1
+                    freq2 = h2 / total2
+                    region_similarity += min(freq1, freq2)
+                
+                total_similarity += region_similarity
+            
+            # Promedio de todas las regiones
+            final_similarity = total_similarity / len(regions1)
+            
+            # DETECCIÓN DE FONDOS COMPLETAMENTE DIFERENTES
+            # Verificar si son fondos muy diferentes (ej: azul vs bokeh dorado)
+            
+            # Analizar varianza de colores en cada región
+            region_variances = []
+            for reg1, reg2 in zip(regions1, regions2):
+                # Convertir a arrays para análisis estadístico
+                pixels1 = list(reg1.getdata())
+                pixels2 = list(reg2.getdata())
+                
+                # Calcular varianza de cada región
+                if pixels1 and pixels2:
+                    # Promedio de varianza RGB de cada región
+                    var1 = sum(abs(p[0] - p[1]) + abs(p[1] - p[2]) + abs(p[0] - p[2]) for p in pixels1) / len(pixels1)
+                    var2 = sum(abs(p[0] - p[1]) + abs(p[1] - p[2]) + abs(p[0] - p[2]) for p in pixels2) / len(pixels2)
+                    region_variances.append(abs(var1 - var2))
+            
+            avg_variance_diff = sum(region_variances) / len(region_variances) if region_variances else 0
+            
+            # Si una imagen es muy uniforme y otra muy variada (azul vs bokeh)
+            if avg_variance_diff > 30:  # Umbral para fondos muy diferentes
+                final_similarity *= 0.4  # PENALTY SEVERA del 60%
+            
+            # Si la similitud es muy baja, no aplicar boost
+            if final_similarity < 0.4:
+                # NO aplicar boost para fondos diferentes
+                return final_similarity
+            else:
+                # Solo aplicar boost moderado para fondos genuinamente similares
+                final_similarity = min(1.0, final_similarity * 1.1)  # Menos boost
+            
+            return final_similarity
+            
+        except Exception as e:
+            logger.error(f"Error en colores de fondo: {e}")
+            return 0.0
+
+    def _compare_background_hash(self, img1, img2):
+        """Hash perceptual ESTRICTO enfocado SOLO en áreas de fondo"""
+        try:
+            # Crear máscaras que excluyan MÁS del centro
+            size = (20, 20)  # Más resolución para mejor precisión
+            gray1 = img1.convert('L').resize(size, Image.Resampling.LANCZOS)
+            gray2 = img2.convert('L').resize(size, Image.Resampling.LANCZOS)
+            
+            def strict_background_hash(img):
+                # Solo ESQUINAS EXTREMAS lejos del centro (kernel compilado)
+                corner_size = 6  # Más área central excluida
+                return kernels.background_hash(np.asarray(img), corner_size=corner_size,
+                                               center_distance=6, max_bits=32)
+            
+            hash1 = strict_background_hash(gray1)
+            hash2 = strict_background_hash(gray2)
+            
+            # Comparar hashes con más estrictez
+            if len(hash1) == len(hash2) and len(hash1) > 10:
+                matches = sum(h1 == h2 for h1, h2 in zip(hash1, hash2))
+                similarity = matches / len(hash1)
+                
+                # Penalty si la similitud es solo mediana (posible coincidencia)
+                if 0.4 < similarity < 0.8:
+                    similarity *= 0.7  # Reducir similitudes mediocres
+                    
+            else:
+                similarity = 0.0
+            
+            return similarity
+            
+        except Exception as e:
+            logger.error(f"Error en hash de fondo: {e}")
+            return 0.0
+
+    def _compare_fixed_elements(self, img1, img2):
+        """Detecta elementos fijos como puertas, ventanas, estructuras (MEJORADO)"""
+        try:
+            # Usar detección de bordes para encontrar elementos estructurales
+            from PIL import ImageFilter
+            
+            gray1 = img1.convert('L').resize((150, 100), Image.Resampling.LANCZOS)
+            gray2 = img2.convert('L').resize((150, 100), Image.Resampling.LANCZOS)
+            
+            # Aplicar múltiples filtros para mejor detección
+            edges1 = gray1.filter(ImageFilter.FIND_EDGES)
+            edges2 = gray2.filter(ImageFilter.FIND_EDGES)
+            
+            # También detectar contornos más suaves
+            contour1 = gray1.filter(ImageFilter.CONTOUR)
+            contour2 = gray2.filter(ImageFilter.CONTOUR)
+            
+            # Combinar detecciones
+            combined1 = ImageChops.add(edges1, contour1)
+            combined2 = ImageChops.add(edges2, contour2)
+            
+            # Comparar patrones estructurales con más tolerancia
+            diff = ImageChops.difference(combined1, combined2)
+            from PIL import ImageStat
+            stat = ImageStat.Stat(diff)
+            mean_diff = stat.mean[0]
+            
+            # Convertir a similitud (MÁS TOLERANTE)
+            similarity = max(0, 1 - mean_diff / 160)  # Antes era /128, ahora más tolerante
+            
+            # BOOST para elementos estructurales detectados
+            if similarity > 0.4:  # Si hay cierta similitud estructural
+                similarity = min(1.0, similarity * 1.4)  # +40% boost para elementos únicos
+            
+            return similarity
+            
+        except Exception as e:
+            logger.error(f"Error en elementos fijos: {e}")
+            return 0.0
+
+    def _compare_background_ssim(self, img1, img2):
+        """MS-SSIM por ventanas (tablas integrales) restringido a los bordes"""
+        try:
+            # Mismo tamaño de trabajo que la comparación de bordes
+            size = (300, 200)
+            gray1 = np.asarray(img1.convert('L').resize(size, Image.Resampling.BILINEAR))
+            gray2 = np.asarray(img2.convert('L').resize(size, Image.Resampling.BILINEAR))
+            
+            # Franja de 50 px sobre 200 de alto: la misma zona que extract_borders
+            similarity = ms_ssim(gray1, gray2, window=7, scales=3, border_fraction=0.25)
+            return max(0.0, min(1.0, similarity))
+            
+        except Exception as e:
+            logger.error(f"Error en SSIM de fondo: {e}")
+            return 0.0
+
+    def _calculate_background_similarity(self, results):
+        """Calcula similitud ULTRA-ESTRICTA - Fondos diferentes deben dar <30%"""
+        try:
+            # Obtener métricas individuales
+            edge_score = results.get('edge_similarity', 0)
+            color_score = results.get('color_similarity', 0) 
+            texture_score = results.get('texture_similarity', 0)
+            structural_score = results.get('structural_similarity', 0)
+            hash_score = results.get('background_hash', 0)
+            
+            # El SSIM de bordes complementa a los elementos fijos como medida estructural
+            if 'ssim_similarity' in results:
+                structural_score = (structural_score + results['ssim_similarity']) / 2
+            
+            # DETECCIÓN DE FONDOS COMPLETAMENTE DIFERENTES
+            # Si CUALQUIER métrica principal es muy baja, es sospechoso
+            main_scores = [edge_score, color_score, texture_score]
+            very_low_scores = sum(1 for score in main_scores if score < 0.4)
+            
+            # DETECCIÓN INTELIGENTE: ¿Fondos diferentes VS mismo lugar?
+            if very_low_scores >= 1:  # Si CUALQUIER métrica principal es muy baja
+                
+                # VERIFICACIÓN ANTI-FALSOS POSITIVOS ULTRA-AGRESIVA
+                # Detectar fondos obviamente diferentes (azul vs bokeh)
+                definitely_different = False
+                
+                # 1. Si colores bajos + texturas bajas = fondos diferentes (más permisivo)
+                if color_score < 0.4 and texture_score < 0.4:  # Antes <0.3
+                    definitely_different = True
+                
+                # 2. Si bordes bajos + colores bajos = arquitectura diferente (más permisivo)
+                if edge_score < 0.4 and color_score < 0.4:  # Antes <0.3
+                    definitely_different = True
+                
+                # 3. Si TODAS las métricas son mediocres (más permisivo)
+                if all(score < 0.55 for score in [edge_score, color_score, texture_score, structural_score]):  # Antes <0.5
+                    definitely_different = True
+                
+                # 4. NUEVA: Si promedio general es bajo (fondos diferentes)
+                avg_all = (edge_score + color_score + texture_score + structural_score) / 4
+                if avg_all < 0.45:  # Promedio bajo = fondos diferentes
+                    definitely_different = True
+                
+                # 5. NUEVA: Si solo 1 métrica es decente y el resto bajas
+                decent_metrics = sum(1 for score in [edge_score, color_score, texture_score, structural_score] if score > 0.5)
+                if decent_metrics <= 1:  # Solo 1 o ninguna métrica decente
+                    definitely_different = True
+                
+                # 6. NUEVA: Si texturas + bordes muy bajos (no hay elementos únicos)
+                if texture_score < 0.4 and edge_score < 0.4:
+                    definitely_different = True
+                
+                # Si es definitivamente diferente, aplicar penalty máximo
+                if definitely_different:
+                    overall = (edge_score * 0.4 + color_score * 0.4 + 
+                              texture_score * 0.15 + structural_score * 0.05)
+                    overall *= 0.3  # PENALTY MÁS SEVERA del 70% (antes 50%)
+                    return min(overall, 0.2)  # MÁXIMO 20% para fondos obviamente diferentes (antes 25%)
+                
+                # VERIFICAR si es MISMO LUGAR con elementos únicos (REBALANCEADO)
+                same_place_indicators = 0
+                
+                # 1. Elementos fijos únicos = ladrillos + puerta (más permisivo)
+                if texture_score > 0.45 and structural_score > 0.45:  # Antes >0.5
+                    same_place_indicators += 2  # Elementos fijos únicos detectados
+                
+                # 2. Arquitectura similar (más permisivo)
+                if edge_score > 0.35 and color_score > 0.35:  # Antes >0.4
+                    same_place_indicators += 1  # Arquitectura similar
+                
+                # 3. Elemento único claro (puerta, ventana) - más permisivo
+                if structural_score > 0.5:  # Antes >0.6
+                    same_place_indicators += 1  # Elemento fijo detectado
+                
+                # 4. Superficie única clara (ladrillos) - más permisivo  
+                if texture_score > 0.5:  # Antes >0.6
+                    same_place_indicators += 1  # Superficie característica
+                
+                # 5. NUEVO: Combinación decente de bordes + texturas
+                if edge_score > 0.4 and texture_score > 0.4:
+                    same_place_indicators += 1  # Estructura + superficie detectada
+                
+                # 6. NUEVO: Si 3+ métricas son decentes (lugar con variaciones)
+                decent_scores = sum(1 for score in [edge_score, color_score, texture_score, structural_score] if score > 0.4)
+                if decent_scores >= 3:
+                    same_place_indicators += 1  # Múltiples características detectadas
+                
+                # DECISIÓN INTELIGENTE (BONIFICACIONES MEJORADAS)
+                if same_place_indicators >= 5:  # MISMO LUGAR muy claro (5+ indicadores)
+                    # Es mismo lugar con evidencia muy fuerte
+                    overall = (edge_score * 0.35 + color_score * 0.35 + 
+                              texture_score * 0.20 + structural_score * 0.10)
+                    
+                    # BONUS AGRESIVO para evidencia muy fuerte
+                    overall = min(1.0, overall * 1.5)  # +50% bonus para casos muy claros
+                    return overall
+                
+                elif same_place_indicators >= 4:  # MISMO LUGAR probable
+                    # Mismo lugar con evidencia fuerte
+                    overall = (edge_score * 0.35 + color_score * 0.35 + 
+                              texture_score * 0.20 + structural_score * 0.10)
+                    
+                    # BONUS FUERTE para evidencia fuerte
+                    overall = min(1.0, overall * 1.35)  # +35% bonus (antes 30%)
+                    return overall
+                
+                elif same_place_indicators >= 3:  # MISMO LUGAR posible
+                    # Mismo lugar con evidencia decente
+                    overall = (edge_score * 0.35 + color_score * 0.35 + 
+                              texture_score * 0.20 + structural_score * 0.10)
+                    
+                    # Bonus moderado mejorado
+                    overall = min(1.0, overall * 1.25)  # +25% bonus (antes 15%)
+                    return min(overall, 0.95)  # Máximo 95% (antes 90%)
+                
+                elif same_place_indicators >= 2:  # Posible mismo lugar
+                    # Cálculo conservador  
+                    overall = (edge_score * 0.4 + color_score * 0.4 + 
+                              texture_score * 0.15 + structural_score * 0.05)
+                    
+                    # Bonus mínimo mejorado
+                    overall = min(1.0, overall * 1.1)  # +10% bonus (antes 5%)
+                    return min(overall, 0.7)  # Máximo 70% (antes 60%)
+                
+                else:  # FONDOS DIFERENTES confirmado
+                    # Usar cálculo ultra-conservador
+                    overall = (edge_score * 0.4 + color_score * 0.4 + 
+                              texture_score * 0.15 + structural_score * 0.05)
+                    
+                    # PENALTY AGRESIVA para fondos diferentes
+                    if very_low_scores >= 2:  # Si 2+ métricas son muy bajas
+                        overall *= 0.6  # PENALTY del 40%
+                    elif very_low_scores >= 1:  # Si 1+ métrica es muy baja
+                        overall *= 0.75  # PENALTY del 25%
+                    
+                    # LÍMITE MÁXIMO para fondos diferentes
+                    return min(overall, 0.4)  # MÁXIMO 40% para fondos diferentes
+            
+            # CÁLCULO NORMAL solo para fondos genuinamente similares
+            weights = {
+                'edge_similarity': 0.35,      # Estructura más importante
+                'color_similarity': 0.35,     # Colores críticos  
+                'texture_similarity': 0.20,   # Texturas
+                'structural_similarity': 0.07, # Elementos fijos
+                'background_hash': 0.03       # Patrones (muy poco peso)
+            }
+            
+            overall = 0
+            for metric, weight in weights.items():
+                if metric == 'structural_similarity':
+                    overall += structural_score * weight
+                elif metric in results:
+                    overall += results[metric] * weight
+            
+            # Bonificaciones SOLO para casos EXCEPCIONALES
+            exceptional_metrics = sum(1 for score in main_scores if score > 0.8)
+            
+            if exceptional_metrics >= 3:  # Todas las métricas principales > 80%
+                overall = min(1.0, overall * 1.15)  # +15% solo en casos excepcionales
+            elif exceptional_metrics >= 2:  # 2+ métricas > 80%
+                overall = min(1.0, overall * 1.05)  # +5% muy conservador
+            
+            # LÍMITES FINALES según promedio
+            avg_main = sum(main_scores) / len(main_scores)
+            
+            if avg_main < 0.45:  # Promedio bajo
+                overall = min(overall, 0.3)  # Máximo 30%
+            elif avg_main < 0.55:  # Promedio medio-bajo
+                overall = min(overall, 0.5)  # Máximo 50%
+            elif avg_main < 0.65:  # Promedio medio
+                overall = min(overall, 0.7)  # Máximo 70%
+            
+            return overall
+            
+        except Exception as e:
+            logger.error(f"Error calculando similitud: {e}")
+            return 0.0
+
+    def _default_results(self):
+        """Resultados por defecto"""
+        return {
+            'pixel_similarity': 0.0,
+            'color_similarity': 0.0,
+            'stats_similarity': 0.0,
+            'structural_similarity': 0.0,
+            'hash_similarity': 0.0,
+            'overall_similarity': 0.0
+        }
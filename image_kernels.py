@@ -0,0 +1,450 @@
+"""
+Kernels de bajo nivel para características de imagen a nivel de píxel
+Backend intercambiable: Numba (JIT compilado) o NumPy puro como respaldo
+
+Selección por despliegue con la variable de entorno IMAGE_KERNEL_BACKEND:
+    auto  (por defecto) - Numba si está instalado, si no NumPy
+    numba               - exige Numba (falla al importar si no está)
+    numpy               - siempre NumPy
+"""
+
+import os
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+# ==================== BACKEND NUMPY ====================
+
+def _background_mask(height, width, corner_size, center_distance):
+    """Máscara de píxeles de fondo usada por el hash de bordes"""
+    ys, xs = np.mgrid[0:height, 0:width]
+    in_border = ((xs < corner_size) | (xs >= width - corner_size) |
+                 (ys < corner_size) | (ys >= height - corner_size))
+    far_from_center = (np.abs(xs - width // 2) + np.abs(ys - height // 2)) > center_distance
+    return in_border & far_from_center
+
+
+def _np_background_hash_bits(gray, corner_size, center_distance):
+    values = gray[_background_mask(gray.shape[0], gray.shape[1], corner_size, center_distance)].astype(np.float64)
+    if values.size < 10:
+        return np.zeros(0, dtype=np.uint8)
+    avg = values.sum() / values.size
+    std_dev = (np.sum((values - avg) ** 2) / values.size) ** 0.5
+    threshold = avg + std_dev / 2 if std_dev > 10 else avg
+    return (values > threshold).astype(np.uint8)
+
+
+def _np_tolerance_match(a, b, tolerance):
+    a = a.astype(np.int16)
+    b = b.astype(np.int16)
+    similar = int(np.count_nonzero(np.abs(a - b) < tolerance))
+    return similar, float(a.mean()), float(b.mean())
+
+
+def _np_block_contrasts(gray, block):
+    h, w = gray.shape
+    n_rows = len(range(0, h - block, block))
+    n_cols = len(range(0, w - block, block))
+    if n_rows == 0 or n_cols == 0:
+        return np.zeros(0, dtype=np.float64)
+    blocks = gray[:n_rows * block, :n_cols * block].reshape(n_rows, block, n_cols, block)
+    contrasts = blocks.max(axis=(1, 3)).astype(np.int16) - blocks.min(axis=(1, 3))
+    return contrasts.ravel().astype(np.float64)
+
+
+def _np_mirror_asymmetry(gray):
+    h, w = gray.shape
+    half = w // 2
+    left = gray[:, :half].astype(np.int64)
+    right = gray[:, ::-1][:, :half].astype(np.int64)
+    diff = np.abs(left - right)
+    max_diff = int(diff.max()) if diff.size else 0
+    return int(left.sum()), int(right.sum()), int(diff.sum()), max_diff, int(diff.size)
+
+
+def _np_gradient_means(gray):
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        return 0.0, 0.0
+    g = gray.astype(np.int16)
+    current = g[:-1, :-1]
+    horizontal = np.abs(current - g[:-1, 1:])
+    vertical = np.abs(current - g[1:, :-1])
+    return float(horizontal.mean()), float((horizontal + vertical).mean())
+
+
+def _np_sequential_jumps(values, threshold):
+    v = values.astype(np.int16)
+    return int(np.count_nonzero(np.abs(np.diff(v)) > threshold))
+
+
+def _np_mean_abs_deviation(values, center):
+    if values.size == 0:
+        return 0.0
+    return float(np.abs(values.astype(np.float64) - center).mean())
+
+
+def _np_histogram_peaks(values, min_fraction):
+    histogram = np.bincount(values.ravel(), minlength=256)
+    middle = histogram[1:255]
+    peaks = ((middle > histogram[:254]) & (middle > histogram[2:]) &
+             (middle > values.size * min_fraction))
+    return int(np.count_nonzero(peaks))
+
+
+def _np_ssim_window_stats(x, y, window, band_y, band_x, c1, c2):
+    """
+    (suma de cs, suma de SSIM, ventanas) sobre las ventanas cuyo centro cae
+    en la franja de borde; momentos exactos con tablas integrales enteras
+    """
+    h, w = x.shape
+    x = x.astype(np.int64)
+    y = y.astype(np.int64)
+    planes = np.stack([x, y, x * x, y * y, x * y])
+    table = np.zeros((5, h + 1, w + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(planes, axis=1), axis=2, out=table[:, 1:, 1:])
+    sums = (table[:, window:, window:] - table[:, :-window, window:]
+            - table[:, window:, :-window] + table[:, :-window, :-window])
+
+    rows = np.arange(h - window + 1) + window // 2
+    cols = np.arange(w - window + 1) + window // 2
+    in_rows = (rows < band_y) | (rows >= h - band_y)
+    in_cols = (cols < band_x) | (cols >= w - band_x)
+    sum_x, sum_y, sum_xx, sum_yy, sum_xy = sums[:, in_rows[:, None] | in_cols[None, :]]
+
+    n = window * window
+    c1n = c1 * n * n
+    c2n = c2 * n * (n - 1)
+    luminance = (2 * sum_x * sum_y + c1n) / (sum_x * sum_x + sum_y * sum_y + c1n)
+    contrast_structure = ((2 * (n * sum_xy - sum_x * sum_y) + c2n) /
+                          ((n * sum_xx - sum_x * sum_x) + (n * sum_yy - sum_y * sum_y) + c2n))
+    return float(contrast_structure.sum()), float((luminance * contrast_structure).sum()), int(sum_x.size)
+
+
+# ==================== BACKEND NUMBA ====================
+
+if NUMBA_AVAILABLE:
+    _jit = numba.njit(cache=True, nogil=True)
+
+    @_jit
+    def _nb_background_hash_bits(gray, corner_size, center_distance):
+        h, w = gray.shape
+        values = np.empty(h * w, dtype=np.float64)
+        n = 0
+        for y in range(h):
+            for x in range(w):
+                if x < corner_size or x >= w - corner_size or y < corner_size or y >= h - corner_size:
+                    if abs(x - w // 2) + abs(y - h // 2) > center_distance:
+                        values[n] = gray[y, x]
+                        n += 1
+        if n < 10:
+            return np.zeros(0, dtype=np.uint8)
+        total = 0.0
+        for i in range(n):
+            total += values[i]
+        avg = total / n
+        squares = 0.0
+        for i in range(n):
+            squares += (values[i] - avg) ** 2
+        std_dev = (squares / n) ** 0.5
+        threshold = avg + std_dev / 2 if std_dev > 10 else avg
+        bits = np.empty(n, dtype=np.uint8)
+        for i in range(n):
+            bits[i] = 1 if values[i] > threshold else 0
+        return bits
+
+    @_jit
+    def _nb_tolerance_match(a, b, tolerance):
+        a_flat = a.ravel()
+        b_flat = b.ravel()
+        similar = 0
+        sum_a = 0
+        sum_b = 0
+        for i in range(a_flat.size):
+            pa = np.int32(a_flat[i])
+            pb = np.int32(b_flat[i])
+            if abs(pa - pb) < tolerance:
+                similar += 1
+            sum_a += pa
+            sum_b += pb
+        n = max(a_flat.size, 1)
+        return similar, sum_a / n, sum_b / n
+
+    @_jit
+    def _nb_block_contrasts(gray, block):
+        h, w = gray.shape
+        # Igual que len(range(0, h - block, block))
+        n_rows = max(0, (h - 1) // block)
+        n_cols = max(0, (w - 1) // block)
+        contrasts = np.empty(n_rows * n_cols, dtype=np.float64)
+        k = 0
+        for bi in range(n_rows):
+            for bj in range(n_cols):
+                lo = 255
+                hi = 0
+                for y in range(bi * block, bi * block + block):
+                    for x in range(bj * block, bj * block + block):
+                        v = gray[y, x]
+                        if v < lo:
+                            lo = v
+                        if v > hi:
+                            hi = v
+                contrasts[k] = hi - lo
+                k += 1
+        return contrasts
+
+    @_jit
+    def _nb_mirror_asymmetry(gray):
+        h, w = gray.shape
+        half = w // 2
+        left_sum = 0
+        right_sum = 0
+        diff_sum = 0
+        max_diff = 0
+        for y in range(h):
+            for x in range(half):
+                left = np.int64(gray[y, x])
+                right = np.int64(gray[y, w - 1 - x])
+                left_sum += left
+                right_sum += right
+                d = abs(left - right)
+                diff_sum += d
+                if d > max_diff:
+                    max_diff = d
+        return left_sum, right_sum, diff_sum, max_diff, h * half
+
+    @_jit
+    def _nb_gradient_means(gray):
+        h, w = gray.shape
+        if h < 2 or w < 2:
+            return 0.0, 0.0
+        horizontal = 0
+        both = 0
+        for y in range(h - 1):
+            for x in range(w - 1):
+                current = np.int32(gray[y, x])
+                dh = abs(current - np.int32(gray[y, x + 1]))
+                dv = abs(current - np.int32(gray[y + 1, x]))
+                horizontal += dh
+                both += dh + dv
+        n = (h - 1) * (w - 1)
+        return horizontal / n, both / n
+
+    @_jit
+    def _nb_sequential_jumps(values, threshold):
+        flat = values.ravel()
+        jumps = 0
+        for i in range(1, flat.size):
+            if abs(np.int32(flat[i]) - np.int32(flat[i - 1])) > threshold:
+                jumps += 1
+        return jumps
+
+    @_jit
+    def _nb_mean_abs_deviation(values, center):
+        flat = values.ravel()
+        if flat.size == 0:
+            return 0.0
+        total = 0.0
+        for i in range(flat.size):
+            total += abs(flat[i] - center)
+        return total / flat.size
+
+    @_jit
+    def _nb_histogram_peaks(values, min_fraction):
+        flat = values.ravel()
+        histogram = np.zeros(256, dtype=np.int64)
+        for i in range(flat.size):
+            histogram[flat[i]] += 1
+        limit = flat.size * min_fraction
+        peaks = 0
+        for i in range(1, 255):
+            if histogram[i] > histogram[i - 1] and histogram[i] > histogram[i + 1] and histogram[i] > limit:
+                peaks += 1
+        return peaks
+
+
+    @_jit
+    def _nb_ssim_window_stats(x, y, window, band_y, band_x, c1, c2):
+        h, w = x.shape
+        sx = np.zeros((h + 1, w + 1), dtype=np.int64)
+        sy = np.zeros((h + 1, w + 1), dtype=np.int64)
+        sxx = np.zeros((h + 1, w + 1), dtype=np.int64)
+        syy = np.zeros((h + 1, w + 1), dtype=np.int64)
+        sxy = np.zeros((h + 1, w + 1), dtype=np.int64)
+        for i in range(h):
+            rx = 0
+            ry = 0
+            rxx = 0
+            ryy = 0
+            rxy = 0
+            for j in range(w):
+                a = np.int64(x[i, j])
+                b = np.int64(y[i, j])
+                rx += a
+                ry += b
+                rxx += a * a
+                ryy += b * b
+                rxy += a * b
+                sx[i + 1, j + 1] = sx[i, j + 1] + rx
+                sy[i + 1, j + 1] = sy[i, j + 1] + ry
+                sxx[i + 1, j + 1] = sxx[i, j + 1] + rxx
+                syy[i + 1, j + 1] = syy[i, j + 1] + ryy
+                sxy[i + 1, j + 1] = sxy[i, j + 1] + rxy
+
+        n = window * window
+        c1n = c1 * n * n
+        c2n = c2 * n * (n - 1)
+        half = window // 2
+        cs_total = 0.0
+        ssim_total = 0.0
+        count = 0
+        for i in range(h - window + 1):
+            row_in = i + half < band_y or i + half >= h - band_y
+            i2 = i + window
+            for j in range(w - window + 1):
+                if not (row_in or j + half < band_x or j + half >= w - band_x):
+                    continue
+                j2 = j + window
+                mx = sx[i2, j2] - sx[i, j2] - sx[i2, j] + sx[i, j]
+                my = sy[i2, j2] - sy[i, j2] - sy[i2, j] + sy[i, j]
+                mxx = sxx[i2, j2] - sxx[i, j2] - sxx[i2, j] + sxx[i, j]
+                myy = syy[i2, j2] - syy[i, j2] - syy[i2, j] + syy[i, j]
+                mxy = sxy[i2, j2] - sxy[i, j2] - sxy[i2, j] + sxy[i, j]
+                luminance = (2 * mx * my + c1n) / (mx * mx + my * my + c1n)
+                cs = ((2 * (n * mxy - mx * my) + c2n) /
+                      ((n * mxx - mx * mx) + (n * myy - my * my) + c2n))
+                cs_total += cs
+                ssim_total += luminance * cs
+                count += 1
+        return cs_total, ssim_total, count
+
+# ==================== SELECCIÓN DE BACKEND ====================
+
+class KernelBackend:
+    """Conjunto de kernels de un backend; todos reciben arrays uint8 2D/1D"""
+
+    def __init__(self, name, functions):
+        self.name = name
+        self._functions = functions
+
+    def background_hash(self, gray, corner_size=6, center_distance=6, max_bits=32):
+        """Hash binario de los píxeles de esquinas/bordes lejos del centro"""
+        bits = self._functions['background_hash_bits'](
+            np.ascontiguousarray(gray, dtype=np.uint8), corner_size, center_distance
+        )
+        if bits.size == 0:
+            return "0" * max_bits
+        return (bits[:max_bits] + ord('0')).tobytes().decode('ascii')
+
+    def tolerance_match(self, a, b, tolerance):
+        """(píxeles con |a-b| < tolerancia, media de a, media de b)"""
+        return self._functions['tolerance_match'](
+            np.ascontiguousarray(a, dtype=np.uint8), np.ascontiguousarray(b, dtype=np.uint8), tolerance
+        )
+
+    def block_contrasts(self, gray, block=20):
+        """Contraste (max - min) de cada bloque completo de block x block"""
+        return self._functions['block_contrasts'](np.ascontiguousarray(gray, dtype=np.uint8), block)
+
+    def mirror_asymmetry(self, gray):
+        """(suma izquierda, suma derecha espejada, suma |dif|, |dif| máx, n) de las mitades"""
+        return self._functions['mirror_asymmetry'](np.ascontiguousarray(gray, dtype=np.uint8))
+
+    def gradient_means(self, gray):
+        """(media |dx|, media |dx| + |dy|) sobre las (h-1) x (w-1) posiciones"""
+        return self._functions['gradient_means'](np.ascontiguousarray(gray, dtype=np.uint8))
+
+    def sequential_jumps(self, values, threshold):
+        """Cantidad de saltos |v[i] - v[i-1]| > umbral en orden de recorrido"""
+        return self._functions['sequential_jumps'](np.ascontiguousarray(values, dtype=np.uint8), threshold)
+
+    def mean_abs_deviation(self, values, center):
+        """Media de |v - center|"""
+        return self._functions['mean_abs_deviation'](np.ascontiguousarray(values, dtype=np.uint8), float(center))
+
+    def histogram_peaks(self, values, min_fraction=0.02):
+        """Picos locales del histograma que superan min_fraction del total"""
+        return self._functions['histogram_peaks'](np.ascontiguousarray(values, dtype=np.uint8), min_fraction)
+
+    def ssim_window_stats(self, gray1, gray2, window, band_y, band_x, c1, c2):
+        """
+        (suma de cs, suma de SSIM, ventanas) de las ventanas window x window
+        cuyo centro cae a menos de band_y filas o band_x columnas del borde
+        """
+        return self._functions['ssim_window_stats'](
+            np.ascontiguousarray(gray1, dtype=np.uint8), np.ascontiguousarray(gray2, dtype=np.uint8),
+            window, band_y, band_x, float(c1), float(c2)
+        )
+
+    def warm_up(self):
+        """Ejecuta cada kernel con datos sintéticos para compilar/cargar la cache JIT"""
+        start = time.time()
+        sample = (np.arange(40 * 30, dtype=np.uint32).reshape(30, 40) * 37 % 256).astype(np.uint8)
+        self.background_hash(sample[:20, :20])
+        self.tolerance_match(sample, sample[::-1], 50)
+        self.block_contrasts(sample, 20)
+        self.mirror_asymmetry(sample)
+        self.gradient_means(sample)
+        self.sequential_jumps(sample.ravel(), 15)
+        self.mean_abs_deviation(sample, 128)
+        self.histogram_peaks(sample, 0.02)
+        self.ssim_window_stats(sample, sample[::-1], 7, 8, 10, 6.5, 58.5)
+        return time.time() - start
+
+
+_NUMPY_FUNCTIONS = {
+    'background_hash_bits': _np_background_hash_bits,
+    'tolerance_match': _np_tolerance_match,
+    'block_contrasts': _np_block_contrasts,
+    'mirror_asymmetry': _np_mirror_asymmetry,
+    'gradient_means': _np_gradient_means,
+    'sequential_jumps': _np_sequential_jumps,
+    'mean_abs_deviation': _np_mean_abs_deviation,
+    'histogram_peaks': _np_histogram_peaks,
+    'ssim_window_stats': _np_ssim_window_stats,
+}
+
+if NUMBA_AVAILABLE:
+    _NUMBA_FUNCTIONS = {
+        'background_hash_bits': _nb_background_hash_bits,
+        'tolerance_match': _nb_tolerance_match,
+        'block_contrasts': _nb_block_contrasts,
+        'mirror_asymmetry': _nb_mirror_asymmetry,
+        'gradient_means': _nb_gradient_means,
+        'sequential_jumps': _nb_sequential_jumps,
+        'mean_abs_deviation': _nb_mean_abs_deviation,
+        'histogram_peaks': _nb_histogram_peaks,
+        'ssim_window_stats': _nb_ssim_window_stats,
+    }
+
+
+def load_backend(name=None):
+    """Crea el backend pedido ('auto', 'numba' o 'numpy')"""
+    name = (name or os.environ.get('IMAGE_KERNEL_BACKEND', 'auto')).lower()
+    if name not in ('auto', 'numba', 'numpy'):
+        raise ValueError(f"Backend de kernels desconocido: {name}")
+    if name == 'numba' and not NUMBA_AVAILABLE:
+        raise ImportError("IMAGE_KERNEL_BACKEND=numba pero numba no está instalado")
+    if name in ('auto', 'numba') and NUMBA_AVAILABLE:
+        return KernelBackend('numba', _NUMBA_FUNCTIONS)
+    return KernelBackend('numpy', _NUMPY_FUNCTIONS)
+
+
+kernels = load_backend()
+
+
+def warm_up():
+    """Calienta el backend activo al arrancar (evita compilar en la primera request)"""
+    elapsed = kernels.warm_up()
+    logger.info(f"⚙️ Kernels de imagen: backend {kernels.name} listo en {elapsed:.2f}s")
+    return elapsed
@@ -0,0 +1,85 @@
+"""
+SSIM / MS-SSIM por ventanas con tablas de suma acumulada (summed-area tables)
+Cada ventana cuesta O(1): media, varianza y covarianza salen de cuatro
+lecturas de las tablas integrales (enteras) de x, y, x², y² y x·y. El promedio se
+puede restringir a las ventanas de los bordes, que es donde FastImageComparator
+considera que está el fondo
+"""
+
+import numpy as np
+
+from image_kernels import kernels
+
+# Constantes de estabilidad de Wang et al. para rango dinámico 255
+C1 = (0.01 * 255) ** 2
+C2 = (0.03 * 255) ** 2
+
+# Pesos estándar de MS-SSIM por escala (de la más fina a la más gruesa)
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+def _border_bands(height, width, border_fraction):
+    """Filas / columnas de la franja de borde (None = toda la imagen)"""
+    if border_fraction is None:
+        return height, width
+    return max(1, int(round(height * border_fraction))), max(1, int(round(width * border_fraction)))
+
+
+def _window_means(gray1, gray2, window, border_fraction):
+    """(cs medio, SSIM medio) sobre las ventanas de la franja elegida"""
+    band_y, band_x = _border_bands(gray1.shape[0], gray1.shape[1], border_fraction)
+    cs_total, ssim_total, count = kernels.ssim_window_stats(gray1, gray2, window, band_y, band_x, C1, C2)
+    if count == 0:
+        return 0.0, 0.0
+    return cs_total / count, ssim_total / count
+
+
+def ssim(gray1, gray2, window=7, border_fraction=None):
+    """
+    SSIM medio con ventanas uniformes window x window (mismo resultado que
+    structural_similarity de scikit-image con gaussian_weights=False)
+    """
+    gray1 = np.asarray(gray1, dtype=np.uint8)
+    gray2 = np.asarray(gray2, dtype=np.uint8)
+    if min(gray1.shape) < window:
+        return 0.0
+    return _window_means(gray1, gray2, window, border_fraction)[1]
+
+
+def _downsample(values):
+    """Promedio 2x2 redondeado (recorta una fila/columna impar)"""
+    h, w = values.shape[0] // 2 * 2, values.shape[1] // 2 * 2
+    v = values[:h, :w].astype(np.uint16)
+    return ((v[0::2, 0::2] + v[1::2, 0::2] + v[0::2, 1::2] + v[1::2, 1::2] + 2) // 4).astype(np.uint8)
+
+
+def ms_ssim(gray1, gray2, window=7, scales=3, border_fraction=None):
+    """
+    MS-SSIM con las escalas que entren en la imagen
+
+    Args:
+        border_fraction: si se indica, en cada escala solo se promedian las
+                         ventanas de la franja de borde (fondo)
+    """
+    x = np.asarray(gray1, dtype=np.uint8)
+    y = np.asarray(gray2, dtype=np.uint8)
+
+    values = []
+    last_ssim = 0.0
+    for scale in range(scales):
+        if min(x.shape) < window:
+            break
+        contrast_structure, last_ssim = _window_means(x, y, window, border_fraction)
+        values.append(contrast_structure)
+        if scale < scales - 1:
+            x, y = _downsample(x), _downsample(y)
+
+    if not values:
+        return 0.0
+
+    # En la escala más gruesa entra también la luminancia (SSIM completo)
+    values[-1] = last_ssim
+    weights = np.array(MS_SSIM_WEIGHTS[:len(values)])
+    weights /= weights.sum()
+    clipped = np.clip(values, 0.0, 1.0)
+    return float(np.prod(clipped ** weights))
@@ -15,6 +15,8 @@ import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_cache import print_stats
+from query_results import result_dataframe
 
 # Usuarios objetivo
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -114,7 +116,7 @@ async def buscar_usuarios_en_todas_columnas(columnas_usuario):
             if result["status"] == "success" and result["result"]["rows"]:
                 print(f"   ✅ ¡ENCONTRADOS en {columna}!")
                 
-                resultados_por_columna[columna] = pd.DataFrame(result["result"]["rows"])
+                resultados_por_columna[columna] = result_dataframe(result)
                 
                 for _, row in resultados_por_columna[columna].iterrows():
                     user_id = row[columna]
@@ -208,7 +210,7 @@ async def analizar_operaciones_detalladas(resultados_por_columna):
         result = await operations.execute_query(query_detalle, 50)
         
         if result["status"] == "success" and result["result"]["rows"]:
-            operaciones_df = pd.DataFrame(result["result"]["rows"])
+            operaciones_df = result_dataframe(result)
             
             print(f"✅ {len(operaciones_df)} operaciones ATO confirmadas")
             
@@ -289,7 +291,7 @@ async def analizar_velocidad_retiro_usuario(user_id, ingresos, operations):
         result = await operations.execute_query(query_retiros, 10)
         
         if result["status"] == "success" and result["result"]["rows"]:
-            retiros = pd.DataFrame(result["result"]["rows"])
+            retiros = result_dataframe(result)
             
             if len(retiros) > 0:
                 primer_retiro = retiros.iloc[0]
@@ -349,6 +351,8 @@ async def main():
             print("❌ Usuarios NO encontrados en ningún rol en ato_bq")
             print("💡 Podrían no estar involucrados en operaciones ATO/DTO confirmadas")
         
+        print_stats()
+        
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
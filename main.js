@@ -266,11 +266,15 @@ class BackgroundComparator {
         // Update result card styling
         this.updateResultCardStyling(overallSimilarity);
         
-        // Display processed images
-        if (result.processed_image1) {
+        // Display processed images (URL servida bajo demanda o base64 embebido)
+        if (result.processed_image1_url) {
+            this.displayProcessedImageUrl(result.processed_image1_url, 1);
+        } else if (result.processed_image1) {
             this.displayProcessedImage(result.processed_image1, 1);
         }
-        if (result.processed_image2) {
+        if (result.processed_image2_url) {
+            this.displayProcessedImageUrl(result.processed_image2_url, 2);
+        } else if (result.processed_image2) {
             this.displayProcessedImage(result.processed_image2, 2);
         }
         
@@ -360,6 +364,11 @@ class BackgroundComparator {
         container.innerHTML = `<img src="data:image/jpeg;base64,${imageData}" alt="Fondo procesado ${imageNumber}">`;
     }
 
+    displayProcessedImageUrl(url, imageNumber) {
+        const container = imageNumber === 1 ? this.processedImg1 : this.processedImg2;
+        container.innerHTML = `<img src="${url}" alt="Fondo procesado ${imageNumber}" loading="lazy">`;
+    }
+
     showProcessedImagePlaceholder(imageNumber) {
         const container = imageNumber === 1 ? this.processedImg1 : this.processedImg2;
         container.innerHTML = `
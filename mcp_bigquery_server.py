@@ -9,6 +9,7 @@ import json
 import sys
 import os
 from mcp_bigquery_setup import MCPBigQueryServer, MCPConfig
+from query_results import to_wire
 
 class MCPBigQueryDaemon:
     """Daemon del servidor MCP para BigQuery"""
@@ -91,9 +92,11 @@ class MCPBigQueryDaemon:
             elif tool_name == 'execute_query':
                 query = arguments.get('query')
                 limit = arguments.get('limit', 1000)
+                use_cache = arguments.get('use_cache', True)
                 if not query:
                     return {"error": "query is required"}
-                return await self.server.operations.execute_query(query, limit)
+                # Las filas se materializan como dicts solo para el JSON de salida
+                return to_wire(await self.server.operations.execute_query(query, limit, use_cache))
                 
             else:
                 return {"error": f"Unknown tool: {tool_name}"}
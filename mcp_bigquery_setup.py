@@ -9,10 +9,18 @@ Basado en:
 import json
 import os
 import asyncio
-from typing import Dict, List, Any, Optional
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Any, Optional
 from dataclasses import dataclass
 from pathlib import Path
 
+from bigquery_standin import client_from_env
+from cost_guard import DEFAULT_LABEL, BudgetExceededError, default_guard
+from query_cache import client_scope, default_cache
+from query_results import QueryResult, iter_pages
+
 @dataclass
 class MCPConfig:
     """Configuración del MCP BigQuery"""
@@ -26,16 +34,62 @@ class MCPBigQueryBasicOperations:
     Operaciones básicas del MCP BigQuery - Basado en basic_operations.py
     """
     
-    def __init__(self, project_id: str, location: str = "US"):
+    def __init__(self, project_id: str, location: str = "US",
+                 max_concurrent_queries: Optional[int] = None, client: Any = None,
+                 cache: Any = None, cost_guard: Any = None):
+        """
+        Args:
+            project_id: proyecto de BigQuery
+            location: ubicación de los jobs
+            max_concurrent_queries: jobs en vuelo a la vez por instancia
+                                    (BIGQUERY_MAX_CONCURRENT_QUERIES, 8 por defecto)
+            client: cliente ya construido (stand-in local, tests); si se pasa,
+                    initialize() no crea uno nuevo
+            cache: caché de resultados (query_cache.QueryCache); por defecto
+                   la compartida del proceso
+            cost_guard: presupuesto de bytes (cost_guard.CostGuard); por
+                        defecto el compartido del proceso
+        """
         self.project_id = project_id
         self.location = location
-        self.client = None
+        self.client = client
+        self.cache = cache or default_cache()
+        self.cost_guard = cost_guard or default_guard()
+        self.max_concurrent_queries = max_concurrent_queries or int(
+            os.environ.get('BIGQUERY_MAX_CONCURRENT_QUERIES', 8))
+        # Las llamadas del cliente (HTTP) bloquean: corren en threads propios
+        # para que el event loop siga libre mientras los jobs se ejecutan
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_queries,
+                                            thread_name_prefix="bigquery")
+        self._semaphore = None
+        self._semaphore_loop = None
+        # Paginado de stream_query
+        self.page_size = int(os.environ.get('BIGQUERY_PAGE_SIZE', 10000))
+        self.prefetch_pages = int(os.environ.get('BIGQUERY_PREFETCH_PAGES', 2))
         
+    def _query_slot(self) -> asyncio.Semaphore:
+        """Semáforo de jobs concurrentes del event loop actual"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    async def _run_blocking(self, function, *args, **kwargs):
+        """Ejecuta una llamada bloqueante del cliente fuera del event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+    
+
     async def initialize(self):
         """Inicializar el cliente de BigQuery"""
         try:
-            from google.cloud import bigquery
-            self.client = bigquery.Client(project=self.project_id, location=self.location)
+            if self.client is None:
+                # BIGQUERY_BACKEND=duckdb: stand-in local con datos sintéticos
+                self.client = client_from_env(self.project_id)
+            if self.client is None:
+                from google.cloud import bigquery
+                self.client = bigquery.Client(project=self.project_id, location=self.location)
             return {"status": "success", "message": "MCP BigQuery initialized"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -127,46 +181,198 @@ class MCPBigQueryBasicOperations:
         except Exception as e:
             return {"tool": "get_table_schema", "status": "error", "error": str(e)}
     
-    async def execute_query(self, query: str, limit: int = 1000) -> Dict[str, Any]:
-        """Ejecuta una consulta SQL"""
+    async def execute_query(self, query: str, limit: int = 1000, use_cache: bool = True,
+                            job_config: Any = None, label: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecuta una consulta SQL
+
+        Args:
+            use_cache: buscar y guardar el resultado en la caché local
+                       (query_cache); False fuerza la consulta a BigQuery
+            job_config: QueryJobConfig del job (parámetros @nombre tipados;
+                        ver query_templates)
+            label: analizador.etapa para el gasto acumulado (cost_guard)
+        """
+        label = label or DEFAULT_LABEL
         try:
             # Agregar LIMIT si no existe
             if "LIMIT" not in query.upper():
                 query = f"{query.rstrip(';')} LIMIT {limit}"
             
-            query_job = self.client.query(query)
-            results = query_job.result()
+            scope = client_scope(self.client)
+            use_cache = use_cache and scope is not None
+            parameters = getattr(job_config, 'query_parameters', None)
+            if use_cache:
+                cached = await self._run_blocking(self.cache.get, query, parameters, scope=scope)
+                if cached is not None:
+                    table, entry = cached
+                    return self._query_response(query, QueryResult(table=table), {
+                        "job_id": None,
+                        "cache_hit": True,
+                        "bytes_processed": 0,
+                        "bytes_billed": 0,
+                        "bytes_billed_saved": entry["bytes_billed"],
+                    })
             
-            # Convertir resultados a formato JSON serializable
-            rows = []
-            for row in results:
-                row_dict = {}
-                for key, value in row.items():
-                    # Manejar tipos especiales de BigQuery
-                    if hasattr(value, 'isoformat'):  # datetime objects
-                        row_dict[key] = value.isoformat()
-                    elif hasattr(value, '__iter__') and not isinstance(value, str):  # arrays
-                        row_dict[key] = list(value)
-                    else:
-                        row_dict[key] = value
-                rows.append(row_dict)
+            # El semáforo acota los jobs en vuelo; mientras uno espera, el
+            # event loop atiende al resto (asyncio.gather corre en paralelo)
+            async with self._query_slot():
+                # Dry-run contra el presupuesto y maximum_bytes_billed en el job
+                job_config, reserved = await self._run_blocking(
+                    self.cost_guard.check, self.client, query, job_config, label)
+                query_job = None
+                submitted = self._executor.submit(self.client.query, query, job_config=job_config)
+                try:
+                    query_job = await asyncio.wrap_future(submitted)
+                    # La descarga espera el job con long-polling del lado del
+                    # servidor (jobs.getQueryResults); ocupa uno de los threads del pool
+                    data = await self._run_blocking(QueryResult.from_job, query_job)
+                except asyncio.CancelledError:
+                    # Etapa descartada (stage_scheduler): cancelar también el
+                    # job, que si no sigue corriendo (y facturando) en BigQuery
+                    self._cancel_when_submitted(submitted)
+                    raise
+                except Exception as e:
+                    # Rechazado por maximum_bytes_billed: mismo error que el dry-run
+                    budget_error = self.cost_guard.limit_error(e, label, job_config)
+                    if budget_error is None:
+                        raise
+                    raise budget_error from e
+                finally:
+                    self.cost_guard.record(label, query_job, reserved)
             
-            return {
-                "tool": "execute_query",
-                "status": "success",
-                "result": {
-                    "query": query,
-                    "total_rows": len(rows),
-                    "rows": rows,
-                    "job_info": {
-                        "job_id": query_job.job_id,
-                        "bytes_processed": query_job.total_bytes_processed,
-                        "bytes_billed": query_job.total_bytes_billed
-                    }
-                }
-            }
+            if use_cache and data.table is not None:
+                await self._run_blocking(self.cache.put, query, data.table, parameters, scope=scope,
+                                         bytes_processed=query_job.total_bytes_processed,
+                                         bytes_billed=query_job.total_bytes_billed)
+            return self._query_response(query, data, {
+                "job_id": query_job.job_id,
+                "cache_hit": False,
+                # Resultado servido por la caché propia de BigQuery (no factura)
+                "warehouse_cache_hit": bool(getattr(query_job, 'cache_hit', False)),
+                "bytes_processed": query_job.total_bytes_processed,
+                "bytes_billed": query_job.total_bytes_billed
+            })
+        except BudgetExceededError as e:
+            return {"tool": "execute_query", "status": "error", "error": str(e), "budget_exceeded": e.to_dict()}
         except Exception as e:
             return {"tool": "execute_query", "status": "error", "error": str(e)}
+    
+    def _cancel_when_submitted(self, submitted):
+        """
+        Cancela el job de un client.query() enviado al pool: ya mismo si
+        devolvió el job, o apenas lo devuelva si todavía está en curso (si
+        no había arrancado, el future se cancela y el job nunca se crea)
+        """
+        def cancel(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            query_job = future.result()
+            if hasattr(query_job, 'cancel'):
+                try:
+                    self._executor.submit(query_job.cancel)
+                except RuntimeError:
+                    # Pool cerrado: se cancela en este mismo thread
+                    query_job.cancel()
+
+        submitted.add_done_callback(cancel)
+
+    @staticmethod
+    def _query_response(query: str, data: QueryResult, job_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "tool": "execute_query",
+            "status": "success",
+            "result": {
+                "query": query,
+                "total_rows": data.num_rows,
+                # Dicts por fila construidos recién al accederlos; "data"
+                # da el resultado columnar (to_pandas / to_arrow)
+                "rows": data.rows,
+                "data": data,
+                "job_info": job_info
+            }
+        }
+    
+    async def stream_query(self, query: str, page_size: Optional[int] = None,
+                           prefetch: Optional[int] = None, arrow: bool = True,
+                           limit: Optional[int] = None, label: Optional[str] = None) -> AsyncIterator[Any]:
+        """
+        Ejecuta una consulta y entrega el resultado página a página
+
+        A diferencia de execute_query no agrega LIMIT ni arma el resultado
+        completo: un thread del pool descarga las páginas y las deja en una
+        cola acotada, así que en memoria hay a lo sumo prefetch + 1 páginas.
+        Si el consumidor es más lento, la descarga se frena; si deja de
+        iterar, la descarga se corta.
+
+        Args:
+            page_size: filas por página (BIGQUERY_PAGE_SIZE, 10000 por defecto)
+            prefetch: páginas descargadas por adelantado
+                      (BIGQUERY_PREFETCH_PAGES, 2 por defecto)
+            arrow: páginas como pyarrow.RecordBatch; False da listas de dicts
+            limit: LIMIT opcional agregado a la consulta
+            label: etiqueta del gasto acumulado (cost_guard)
+
+        Yields:
+            Páginas (RecordBatch o lista de dicts); ver query_results.page_to_dicts
+
+        Raises:
+            BudgetExceededError: la consulta supera el presupuesto de bytes
+        """
+        label = label or DEFAULT_LABEL
+        page_size = page_size or self.page_size
+        prefetch = prefetch or self.prefetch_pages
+        if limit is not None and "LIMIT" not in query.upper():
+            query = f"{query.rstrip(';')} LIMIT {limit}"
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=prefetch)
+        cancelled = threading.Event()
+        finished = object()
+
+        def produce(query_job):
+            # Corre en el pool: put() bloquea el thread cuando la cola está llena
+            outcome = finished
+            try:
+                for page in iter_pages(query_job, page_size, arrow):
+                    if cancelled.is_set():
+                        return
+                    asyncio.run_coroutine_threadsafe(queue.put(page), loop).result()
+            except Exception as e:
+                outcome = e
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(outcome), loop).result()
+
+        async with self._query_slot():
+            job_config, reserved = await self._run_blocking(self.cost_guard.check, self.client, query, None, label)
+            query_job = None
+            submitted = self._executor.submit(self.client.query, query, job_config=job_config)
+            try:
+                try:
+                    query_job = await asyncio.wrap_future(submitted)
+                except asyncio.CancelledError:
+                    self._cancel_when_submitted(submitted)
+                    raise
+                producer = loop.run_in_executor(self._executor, produce, query_job)
+                try:
+                    while True:
+                        page = await queue.get()
+                        if page is finished:
+                            break
+                        if isinstance(page, Exception):
+                            raise page
+                        yield page
+                finally:
+                    # Consumidor que corta antes: destrabar al productor y esperarlo
+                    cancelled.set()
+                    while not producer.done():
+                        try:
+                            queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            await asyncio.sleep(0.01)
+                    await producer
+            finally:
+                self.cost_guard.record(label, query_job, reserved)
 
 class MCPBigQueryServer:
     """
@@ -219,7 +425,8 @@ class MCPBigQueryServer:
                     "description": "Ejecuta una consulta SQL en BigQuery",
                     "parameters": {
                         "query": {"type": "string", "required": True},
-                        "limit": {"type": "integer", "default": 1000}
+                        "limit": {"type": "integer", "default": 1000},
+                        "use_cache": {"type": "boolean", "default": True}
                     }
                 }
             ]
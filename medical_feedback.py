@@ -0,0 +1,311 @@
+"""
+Feedback y reentrenamiento incremental del modelo médico
+Guarda vectores de características etiquetados (nunca imágenes), reentrena en
+segundo plano y publica nuevas versiones del modelo de forma atómica
+"""
+
+import os
+import copy
+import json
+import time
+import fcntl
+import logging
+import threading
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Versión asignada al modelo base (medical_model.joblib del repositorio)
+BASE_MODEL_VERSION = 'base'
+
+
+class FeedbackStore:
+    """Almacén append-only de feedback: una línea JSON por etiqueta"""
+
+    def __init__(self, path: str = 'medical_feedback.jsonl'):
+        self.path = path
+
+    def append(self, features, label: int, source: Optional[str] = None) -> None:
+        """Agrega un vector de características con su etiqueta"""
+        record = {
+            'ts': round(time.time(), 3),
+            'features': [float(v) for v in np.asarray(features).ravel()],
+            'label': int(label),
+            'source': source,
+        }
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        # Una única escritura con O_APPEND es atómica entre procesos
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def load(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Devuelve (X, y) con todo el feedback registrado"""
+        features, labels = [], []
+        if not os.path.exists(self.path):
+            return np.empty((0, 0)), np.empty((0,), dtype=int)
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Línea parcial (escritura interrumpida): se ignora
+                    continue
+                features.append(record['features'])
+                labels.append(record['label'])
+
+        if not features:
+            return np.empty((0, 0)), np.empty((0,), dtype=int)
+        return np.array(features, dtype=float), np.array(labels, dtype=int)
+
+    def count(self) -> int:
+        """Cantidad de etiquetas registradas"""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'rb') as f:
+            return sum(1 for _ in f)
+
+
+class ModelRegistry:
+    """Versiones del modelo en disco con un manifiesto que apunta a la vigente"""
+
+    def __init__(self, directory: str = 'model_store'):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Lee el manifiesto vigente (None si aún no hay versiones)"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def manifest_mtime(self) -> float:
+        """mtime del manifiesto, usado para detectar versiones nuevas"""
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return 0.0
+
+    def load(self, manifest: Dict[str, Any]):
+        """Carga (modelo, scaler) de la versión indicada por el manifiesto"""
+        model = joblib.load(os.path.join(self.directory, manifest['model']))
+        scaler = joblib.load(os.path.join(self.directory, manifest['scaler']))
+        return model, scaler
+
+    def publish(self, model, scaler, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Guarda una versión nueva y la activa reemplazando el manifiesto"""
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.read_manifest() or {}
+        number = int(previous.get('number', 0)) + 1
+        version = f"v{number}"
+
+        manifest = dict(metadata)
+        manifest.update({
+            'version': version,
+            'number': number,
+            'model': f"medical_model_{version}.joblib",
+            'scaler': f"medical_scaler_{version}.joblib",
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+
+        # Primero los artefactos, después el manifiesto: un lector nunca ve
+        # un manifiesto que apunte a archivos incompletos
+        joblib.dump(model, os.path.join(self.directory, manifest['model']))
+        joblib.dump(scaler, os.path.join(self.directory, manifest['scaler']))
+
+        tmp_path = self.manifest_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        return manifest
+
+
+class BackgroundRetrainer:
+    """Reentrena el modelo en un hilo aparte sin bloquear las requests"""
+
+    def __init__(self, comparator, store: FeedbackStore, registry: ModelRegistry,
+                 min_new_labels: int = 20, interval_seconds: int = 3600,
+                 holdout_fraction: float = 0.2, tolerance: float = 0.02,
+                 warm_start_trees: int = 0):
+        """
+        Args:
+            comparator: MedicalImageComparator (datos semilla y modelo vigente)
+            min_new_labels: etiquetas nuevas que disparan un reentrenamiento inmediato
+            interval_seconds: reentrenamiento periódico si hay cualquier etiqueta nueva
+            holdout_fraction: fracción del feedback reservada para validación
+            tolerance: caída de accuracy tolerada frente al modelo vigente
+            warm_start_trees: si > 0, agrega árboles al modelo vigente en vez de reentrenar
+        """
+        self.comparator = comparator
+        self.store = store
+        self.registry = registry
+        self.min_new_labels = min_new_labels
+        self.interval_seconds = interval_seconds
+        self.holdout_fraction = holdout_fraction
+        self.tolerance = tolerance
+        self.warm_start_trees = warm_start_trees
+        self.lock_path = os.path.join(registry.directory, '.retrain.lock')
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_run = time.time()
+        self._last_attempt_count = -1
+
+    def start(self) -> None:
+        """Arranca el hilo de reentrenamiento (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='medical-retrainer', daemon=True)
+        self._thread.start()
+        logger.info("🔁 Reentrenamiento en segundo plano activo")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self) -> None:
+        """Avisa que llegó feedback nuevo"""
+        if self._pending_labels() >= self.min_new_labels:
+            self._wakeup.set()
+
+    def _pending_labels(self) -> int:
+        manifest = self.registry.read_manifest() or {}
+        return self.store.count() - int(manifest.get('trained_on', 0))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=min(60, self.interval_seconds))
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+
+            pending = self._pending_labels()
+            due = time.time() - self._last_run >= self.interval_seconds
+            # Un modelo descartado no se reintenta hasta que llegue feedback nuevo
+            if self.store.count() == self._last_attempt_count:
+                continue
+            if pending >= self.min_new_labels or (due and pending > 0):
+                self._last_run = time.time()
+                try:
+                    self.retrain_once()
+                except Exception as e:
+                    logger.error(f"Error reentrenando modelo: {e}")
+
+    def retrain_once(self) -> Optional[Dict[str, Any]]:
+        """Reentrena, valida contra el holdout y publica si no empeora"""
+        os.makedirs(self.registry.directory, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            try:
+                # Un solo worker reentrena a la vez
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("🔒 Otro worker está reentrenando, se omite")
+                return None
+            try:
+                return self._retrain_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _retrain_locked(self) -> Optional[Dict[str, Any]]:
+        feedback_X, feedback_y = self.store.load()
+        trained_on = len(feedback_y)
+        self._last_attempt_count = trained_on
+        if trained_on == 0:
+            return None
+
+        seed_X, seed_y = self.comparator._initial_training_data()
+        train_X, train_y, holdout_X, holdout_y = self._split(feedback_X, feedback_y, seed_X, seed_y)
+
+        current_model, current_scaler, current_version = self.comparator.current_model()
+
+        warm_start = self.warm_start_trees > 0 and hasattr(current_model, 'n_estimators')
+        if warm_start:
+            # Warm-start: se conserva el scaler y se agregan árboles nuevos
+            scaler = current_scaler
+            model = copy.deepcopy(current_model)
+            model.set_params(warm_start=True,
+                             n_estimators=current_model.n_estimators + self.warm_start_trees)
+        else:
+            scaler = StandardScaler()
+            scaler.fit(train_X)
+            model = self.comparator._build_model()
+        model.fit(scaler.transform(train_X), train_y)
+
+        new_accuracy = self._accuracy(model, scaler, holdout_X, holdout_y)
+        current_accuracy = self._accuracy(current_model, current_scaler, holdout_X, holdout_y)
+
+        if current_accuracy is not None and new_accuracy < current_accuracy - self.tolerance:
+            logger.info(f"⛔ Modelo descartado: holdout {new_accuracy:.3f} < vigente {current_accuracy:.3f}")
+            return None
+
+        manifest = self.registry.publish(model, scaler, {
+            'trained_on': trained_on,
+            'train_samples': int(len(train_y)),
+            'holdout_samples': int(len(holdout_y)),
+            'holdout_accuracy': round(new_accuracy, 4),
+            'previous_version': current_version,
+            'previous_holdout_accuracy': None if current_accuracy is None else round(current_accuracy, 4),
+            'mode': 'warm_start' if warm_start else 'full',
+        })
+        logger.info(f"🚀 Modelo {manifest['version']} publicado (holdout {new_accuracy:.3f}, {trained_on} etiquetas)")
+
+        # El worker que reentrenó adopta la versión de inmediato; el resto
+        # la detecta por el mtime del manifiesto
+        self.comparator.refresh_model()
+        return manifest
+
+    def _split(self, feedback_X, feedback_y, seed_X, seed_y):
+        """
+        Separa holdout del feedback; con poco feedback para estratificar se
+        reserva una parte de la semilla, que queda fuera del entrenamiento
+        """
+        classes, counts = np.unique(feedback_y, return_counts=True)
+        holdout_size = int(len(feedback_y) * self.holdout_fraction)
+
+        if len(classes) == 2 and counts.min() >= 2 and holdout_size >= 2:
+            fb_train_X, holdout_X, fb_train_y, holdout_y = train_test_split(
+                feedback_X, feedback_y, test_size=self.holdout_fraction,
+                stratify=feedback_y, random_state=42
+            )
+            train_X = np.vstack([seed_X, fb_train_X])
+            train_y = np.concatenate([seed_y, fb_train_y])
+            return train_X, train_y, holdout_X, holdout_y
+
+        seed_train_X, holdout_X, seed_train_y, holdout_y = train_test_split(
+            seed_X, seed_y, test_size=self.holdout_fraction, stratify=seed_y, random_state=42
+        )
+        train_X = np.vstack([seed_train_X, feedback_X])
+        train_y = np.concatenate([seed_train_y, feedback_y])
+        return train_X, train_y, holdout_X, holdout_y
+
+    @staticmethod
+    def _accuracy(model, scaler, X, y) -> Optional[float]:
+        if model is None or len(y) == 0:
+            return None
+        try:
+            predictions = model.predict(scaler.transform(X))
+        except Exception:
+            return None
+        return float(np.mean(predictions == y))
+
+
+def retraining_settings() -> Dict[str, Any]:
+    """Configuración del reentrenamiento desde variables de entorno"""
+    return {
+        'min_new_labels': int(os.environ.get('MEDICAL_RETRAIN_MIN_LABELS', 20)),
+        'interval_seconds': int(os.environ.get('MEDICAL_RETRAIN_INTERVAL', 3600)),
+        'holdout_fraction': float(os.environ.get('MEDICAL_RETRAIN_HOLDOUT', 0.2)),
+        'warm_start_trees': int(os.environ.get('MEDICAL_RETRAIN_WARM_TREES', 0)),
+    }
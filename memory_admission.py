@@ -0,0 +1,150 @@
+"""
+Control de admisión por memoria para la decodificación de imágenes
+Estima la memoria decodificada a partir del header (dimensiones × modo) y la
+reserva contra un presupuesto global de bytes antes de decodificar; si no hay
+lugar, la request espera un rato y después se rechaza
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudgetExceeded(Exception):
+    """No hay presupuesto de memoria para decodificar la imagen"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@lru_cache(maxsize=None)
+def _bytes_per_pixel(mode):
+    """Bytes por píxel del modo PIL (RGB=3, RGBA=4, L=1, I;16=2, ...)"""
+    try:
+        return len(Image.new(mode, (1, 1)).tobytes())
+    except Exception:
+        return 4
+
+
+def estimate_decoded_bytes(file_stream, rgb_copies=1):
+    """
+    Memoria que ocupará la imagen al decodificarla, leyendo solo el header
+
+    Args:
+        file_stream: stream posicionado al inicio de la imagen (se restaura)
+        rgb_copies: copias RGB adicionales que hará quien la carga
+                    (convert('RGB'), np.array, ...)
+
+    Returns:
+        (bytes estimados, (ancho, alto), modo)
+    """
+    position = file_stream.tell()
+    try:
+        with Image.open(file_stream) as image:
+            width, height = image.size
+            mode = image.mode
+    finally:
+        file_stream.seek(position)
+
+    pixels = width * height
+    estimated = pixels * _bytes_per_pixel(mode)
+    if mode != 'RGB':
+        # convert('RGB') mantiene ambas copias vivas un momento
+        estimated += pixels * 3
+    estimated += pixels * 3 * max(0, rgb_copies - 1)
+    return estimated, (width, height), mode
+
+
+class MemoryBudget:
+    """Presupuesto global de bytes reservados para imágenes decodificadas"""
+
+    def __init__(self, max_bytes, wait_seconds=5.0):
+        """
+        Args:
+            max_bytes: bytes totales que pueden estar reservados a la vez
+            wait_seconds: cuánto espera una reserva en cola antes de rechazarse
+        """
+        self.max_bytes = max_bytes
+        self.wait_seconds = wait_seconds
+        self._condition = threading.Condition()
+        self.reserved_bytes = 0
+        self.peak_reserved_bytes = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        """Configuración desde IMAGE_MEMORY_BUDGET_MB / IMAGE_MEMORY_WAIT_SECONDS"""
+        return cls(
+            max_bytes=int(float(os.environ.get('IMAGE_MEMORY_BUDGET_MB', 256)) * 1024 * 1024),
+            wait_seconds=float(os.environ.get('IMAGE_MEMORY_WAIT_SECONDS', 5)),
+        )
+
+    def reserve(self, nbytes, timeout=None):
+        """Reserva bytes; espera en cola si no hay lugar y rechaza al vencer el plazo"""
+        if nbytes > self.max_bytes:
+            with self._condition:
+                self.rejected += 1
+            raise MemoryBudgetExceeded(
+                f"Imagen demasiado grande: requiere {nbytes / 1024 / 1024:.0f} MB "
+                f"(presupuesto {self.max_bytes / 1024 / 1024:.0f} MB)", retry_after=0
+            )
+
+        timeout = self.wait_seconds if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self.reserved_bytes + nbytes > self.max_bytes:
+                self.queued += 1
+                logger.info(f"⏳ Imagen en cola: {nbytes / 1024 / 1024:.1f} MB, "
+                            f"reservados {self.reserved_bytes / 1024 / 1024:.1f} MB")
+            while self.reserved_bytes + nbytes > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise MemoryBudgetExceeded(
+                        "Servidor ocupado decodificando otras imágenes, reintentar en unos segundos",
+                        retry_after=max(1, int(round(self.wait_seconds)))
+                    )
+                self._condition.wait(remaining)
+
+            self.reserved_bytes += nbytes
+            self.peak_reserved_bytes = max(self.peak_reserved_bytes, self.reserved_bytes)
+            self.admitted += 1
+
+    def release(self, nbytes):
+        with self._condition:
+            self.reserved_bytes = max(0, self.reserved_bytes - nbytes)
+            self._condition.notify_all()
+
+    @contextmanager
+    def reservation(self, nbytes, timeout=None):
+        """Reserva mientras dura el bloque with"""
+        self.reserve(nbytes, timeout)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'budget_bytes': self.max_bytes,
+                'reserved_bytes': self.reserved_bytes,
+                'peak_reserved_bytes': self.peak_reserved_bytes,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+            }
+
+
+# Presupuesto compartido por todos los threads del proceso
+image_memory_budget = MemoryBudget.from_env()
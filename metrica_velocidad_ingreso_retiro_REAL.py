@@ -15,6 +15,7 @@ import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_results import result_dataframe
 
 # Usuarios objetivo
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -66,7 +67,7 @@ async def buscar_ingresos_acc_movements():
     result = await operations.execute_query(query_ingresos, 100)
     
     if result["status"] == "success" and result["result"]["rows"]:
-        ingresos_df = pd.DataFrame(result["result"]["rows"])
+        ingresos_df = result_dataframe(result)
         
         print(f"🎯 ¡INGRESOS ENCONTRADOS! {len(ingresos_df)} movimientos")
         
@@ -14,6 +14,7 @@ import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_results import result_dataframe
 
 # Usuarios objetivo
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -55,7 +56,7 @@ async def obtener_fechas_infracciones_corregida():
     if result["status"] == "success" and result["result"]["rows"]:
         print(f"✅ {len(result['result']['rows'])} infracciones encontradas:")
         
-        infracciones_df = pd.DataFrame(result["result"]["rows"])
+        infracciones_df = result_dataframe(result)
         
         for _, row in infracciones_df.iterrows():
             user_id = row['USER_ID']
@@ -129,7 +130,7 @@ async def analizar_movimientos_corregido(infracciones_df):
         result = await operations.execute_query(query_movimientos, 100)
         
         if result["status"] == "success" and result["result"]["rows"]:
-            movimientos = pd.DataFrame(result["result"]["rows"])
+            movimientos = result_dataframe(result)
             
             print(f"   ✅ {len(movimientos)} movimientos encontrados (90 días pre-infracción)")
             
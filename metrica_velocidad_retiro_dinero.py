@@ -17,6 +17,7 @@ import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from query_results import result_dataframe
 
 # Usuarios específicos a analizar
 USUARIOS_OBJETIVO = [1348718991, 468290404, 375845668]
@@ -60,7 +61,7 @@ async def obtener_fechas_infracciones():
     if result["status"] == "success" and result["result"]["rows"]:
         print(f"✅ {len(result['result']['rows'])} infracciones encontradas:")
         
-        infracciones_df = pd.DataFrame(result["result"]["rows"])
+        infracciones_df = result_dataframe(result)
         
         # Mostrar resumen
         for _, row in infracciones_df.iterrows():
@@ -168,7 +169,7 @@ async def analizar_movimientos_dinero(infracciones_df):
         mov_result = await operations.execute_query(query_movimientos, 100)
         
         if mov_result["status"] == "success" and mov_result["result"]["rows"]:
-            movimientos = pd.DataFrame(mov_result["result"]["rows"])
+            movimientos = result_dataframe(mov_result)
             
             print(f"   💰 {len(movimientos)} movimientos encontrados en 30 días previos")
             
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+💾 CACHÉ LOCAL DE RESULTADOS DE CONSULTAS BIGQUERY
+Los analizadores y scripts de investigación repiten las mismas consultas
+sobre los mismos usuarios, y cada corrida vuelve a facturar el escaneo. Esta
+caché guarda el resultado (Parquet) bajo una clave de SQL normalizado +
+parámetros, con un índice SQLite que lleva vencimientos, tamaño y uso.
+
+- Clave: texto canónico de bigquery_dialect.normalize_sql (sin comentarios
+  ni diferencias de espacios) + parámetros serializados.
+- TTL por tabla: el de la consulta es el menor entre las tablas que lee
+  (BIGQUERY_CACHE_TTLS="SBOX_PFFINTECHATO=3600,BT_MP_PAY_PAYMENTS=43200").
+- Tamaño acotado: pasado BIGQUERY_CACHE_MAX_BYTES se descartan las entradas
+  usadas hace más tiempo.
+- Bypass: use_cache=False por llamada o BIGQUERY_CACHE=0 para todo.
+
+Uso:
+    python query_cache.py stats     # tasa de aciertos y bytes ahorrados
+    python query_cache.py purge     # borra entradas vencidas
+    python query_cache.py clear     # vacía la caché
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import argparse
+import threading
+import contextlib
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from bigquery_dialect import normalize_sql, referenced_tables
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'bigquery_resultados')
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Vencimientos por dataset o tabla (segundos). Las tablas de WHOWNER se
+# cargan una vez por día; las de sandbox las reescriben los analistas en
+# cualquier momento y los metadatos cambian con cada tabla nueva.
+TABLE_TTLS = {
+    'WHOWNER': 12 * 3600,
+    'SBOX_PFFINTECHATO': 3600,
+    'INFORMATION_SCHEMA': 600,
+}
+# BigQuery tampoco cachea consultas con funciones no determinísticas
+_NON_DETERMINISTIC = re.compile(r'\b(RAND|GENERATE_UUID|SESSION_USER)\s*\(', re.IGNORECASE)
+_READ_ONLY = re.compile(r'^\(*\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    sql TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    num_rows INTEGER NOT NULL,
+    bytes_processed INTEGER NOT NULL,
+    bytes_billed INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _parse_ttls(value: str) -> Dict[str, int]:
+    """'SBOX_PFFINTECHATO=3600,ato_bq=600' -> {'SBOX_PFFINTECHATO': 3600, 'ato_bq': 600}"""
+    ttls = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, seconds = item.split('=', 1)
+            ttls[name.strip()] = int(seconds)
+    return ttls
+
+
+def _parameter_repr(parameter: Any) -> Any:
+    # ScalarQueryParameter / ArrayQueryParameter de google-cloud-bigquery
+    if hasattr(parameter, 'to_api_repr'):
+        return parameter.to_api_repr()
+    return str(parameter)
+
+
+def client_scope(client: Any) -> Optional[str]:
+    """
+    Ámbito de los resultados de un cliente: la misma consulta contra otro
+    proyecto o contra el stand-in local es otra entrada. None = no cachear.
+    """
+    return getattr(client, 'cache_scope', f"bigquery:{getattr(client, 'project', '')}")
+
+
+class QueryCache:
+    """Índice SQLite + un Parquet por resultado; seguro entre threads y procesos"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None,
+                 default_ttl: Optional[int] = None, table_ttls: Optional[Dict[str, int]] = None,
+                 enabled: Optional[bool] = None):
+        self.directory = directory or os.environ.get('BIGQUERY_CACHE_DIR', DEFAULT_DIRECTORY)
+        self.max_bytes = max_bytes or int(os.environ.get('BIGQUERY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.default_ttl = default_ttl or int(os.environ.get('BIGQUERY_CACHE_TTL', DEFAULT_TTL))
+        self.table_ttls = dict(TABLE_TTLS)
+        self.table_ttls.update(_parse_ttls(os.environ.get('BIGQUERY_CACHE_TTLS', '')))
+        self.table_ttls.update(table_ttls or {})
+        if enabled is None:
+            enabled = os.environ.get('BIGQUERY_CACHE', '1') != '0'
+        # Sin pyarrow no hay Parquet: la caché queda apagada
+        self.enabled = enabled and pa is not None
+        self.session = {"hits": 0, "misses": 0, "bytes_billed_saved": 0}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    # ------------------------------------------------------------------ índice
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), timeout=30)
+        if not self._ready:
+            connection.executescript(_SCHEMA)
+            self._ready = True
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Conexión al índice con commit al salir (cerrada siempre)"""
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    yield connection
+            finally:
+                connection.close()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def _remove(self, connection: sqlite3.Connection, key: str):
+        connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _count(self, connection: sqlite3.Connection, **increments: int):
+        for name, value in increments.items():
+            connection.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, value))
+
+    # ------------------------------------------------------------------ claves
+    def key(self, sql: str, params: Any = None, scope: str = '') -> str:
+        """Hash del ámbito, el SQL normalizado y los parámetros"""
+        text = f"{scope}\n{normalize_sql(sql)}"
+        if params:
+            text += '\n' + json.dumps(params, sort_keys=True, default=_parameter_repr)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, sql: str) -> Optional[int]:
+        """Segundos de vida del resultado; None si la consulta no se cachea"""
+        normalized = normalize_sql(sql)
+        if not _READ_ONLY.match(normalized) or _NON_DETERMINISTIC.search(normalized):
+            return None
+        ttls = []
+        for dataset, table in referenced_tables(normalized):
+            names = (f"{dataset}.{table}", table, dataset)
+            ttls.append(next((self.table_ttls[name] for name in names if name in self.table_ttls),
+                             self.default_ttl))
+        if 'INFORMATION_SCHEMA' in normalized.upper():
+            ttls.append(self.table_ttls.get('INFORMATION_SCHEMA', self.default_ttl))
+        return min(ttls) if ttls else self.default_ttl
+
+    # ------------------------------------------------------------------ lectura y escritura
+    def get(self, sql: str, params: Any = None, scope: str = '') -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """
+        Resultado cacheado de la consulta
+
+        Returns:
+            (pyarrow.Table, metadatos) o None si no hay entrada vigente. Los
+            metadatos traen bytes_processed / bytes_billed del job original.
+        """
+        if not self.enabled or self.ttl_for(sql) is None:
+            return None
+        key = self.key(sql, params, scope)
+        now = time.time()
+        try:
+            with self._transaction() as connection:
+                entry = connection.execute(
+                    "SELECT expires_at, created_at, bytes_processed, bytes_billed, num_rows "
+                    "FROM entries WHERE key = ?", (key,)).fetchone()
+                table = None
+                if entry and entry[0] > now:
+                    try:
+                        table = pq.read_table(self._path(key))
+                    except Exception as e:
+                        logger.warning(f"Entrada de caché ilegible ({key[:12]}): {e}")
+                if table is None:
+                    if entry:
+                        self._remove(connection, key)
+                    self.session["misses"] += 1
+                    self._count(connection, misses=1)
+                    return None
+
+                connection.execute("UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                                   (now, key))
+                self.session["hits"] += 1
+                self.session["bytes_billed_saved"] += entry[3]
+                self._count(connection, hits=1, bytes_billed_saved=entry[3])
+        except sqlite3.Error as e:
+            logger.warning(f"Caché de consultas no disponible: {e}")
+            return None
+        return table, {
+            "key": key,
+            "created_at": entry[1],
+            "bytes_processed": entry[2],
+            "bytes_billed": entry[3],
+            "num_rows": entry[4],
+        }
+
+    def put(self, sql: str, table: Any, params: Any = None, scope: str = '',
+            bytes_processed: Optional[int] = None, bytes_billed: Optional[int] = None) -> bool:
+        """Guarda el resultado (pyarrow.Table); devuelve False si no corresponde cachearlo"""
+        ttl = self.ttl_for(sql) if self.enabled else None
+        if ttl is None or table is None:
+            return False
+        key = self.key(sql, params, scope)
+        path = self._path(key)
+        now = time.time()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Escritura atómica: un lector concurrente ve el archivo viejo o el nuevo
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            pq.write_table(table, temporary)
+            os.replace(temporary, path)
+            size = os.path.getsize(path)
+            with self._transaction() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, sql, created_at, expires_at, last_access, "
+                    "size_bytes, num_rows, bytes_processed, bytes_billed, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, normalize_sql(sql), now, now + ttl, now, size, table.num_rows,
+                     bytes_processed or 0, bytes_billed or 0))
+                self._evict(connection)
+        except (OSError, sqlite3.Error, pa.ArrowException) as e:
+            logger.warning(f"No se pudo guardar el resultado en caché: {e}")
+            return False
+        return True
+
+    def _evict(self, connection: sqlite3.Connection):
+        """Borra vencidas y, si se pasa de max_bytes, las de uso más antiguo"""
+        now = time.time()
+        for (key,) in connection.execute("SELECT key FROM entries WHERE expires_at <= ?", (now,)).fetchall():
+            self._remove(connection, key)
+        total = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute(
+                "SELECT key, size_bytes FROM entries ORDER BY last_access").fetchall():
+            self._remove(connection, key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # ------------------------------------------------------------------ mantenimiento
+    def purge(self) -> int:
+        """Borra las entradas vencidas; devuelve cuántas quedan"""
+        with self._transaction() as connection:
+            self._evict(connection)
+            return connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self):
+        """Vacía la caché (los contadores acumulados se conservan)"""
+        with self._transaction() as connection:
+            for (key,) in connection.execute("SELECT key FROM entries").fetchall():
+                self._remove(connection, key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos, tasa y bytes facturados ahorrados (sesión y acumulado)"""
+        def with_rate(counters):
+            lookups = counters["hits"] + counters["misses"]
+            return dict(counters, hit_rate=counters["hits"] / lookups if lookups else 0.0)
+
+        stats = {"enabled": self.enabled, "directory": self.directory,
+                 "session": with_rate(dict(self.session))}
+        if not os.path.exists(os.path.join(self.directory, 'index.sqlite')):
+            return stats
+        with self._transaction() as connection:
+            counters = dict(connection.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()
+        stats["total"] = with_rate({name: counters.get(name, 0)
+                                    for name in ("hits", "misses", "bytes_billed_saved")})
+        stats["entries"] = entries
+        stats["size_bytes"] = size
+        return stats
+
+
+_default_cache = None
+
+
+def default_cache() -> QueryCache:
+    """Caché compartida del proceso (configurada por variables de entorno)"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = QueryCache()
+    return _default_cache
+
+
+def print_stats(cache: Optional[QueryCache] = None):
+    """Resumen de la caché para el final de un análisis"""
+    stats = (cache or default_cache()).stats()
+    if not stats["enabled"]:
+        print("💾 Caché de consultas desactivada")
+        return
+    for label, counters in (("Sesión", stats["session"]), ("Acumulado", stats.get("total"))):
+        if counters:
+            print(f"💾 {label}: {counters['hits']} aciertos / {counters['misses']} fallos "
+                  f"({counters['hit_rate']:.1%}), {counters['bytes_billed_saved'] / 1024 ** 3:.2f} GB "
+                  f"facturados ahorrados")
+    if "entries" in stats:
+        print(f"📁 {stats['entries']} resultados, {stats['size_bytes'] / 1024 ** 2:.1f} MB en {stats['directory']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caché local de resultados de BigQuery")
+    parser.add_argument('action', choices=['stats', 'purge', 'clear'], nargs='?', default='stats')
+    args = parser.parse_args()
+
+    cache = default_cache()
+    if args.action == 'purge':
+        print(f"🧹 {cache.purge()} entradas vigentes")
+    elif args.action == 'clear':
+        cache.clear()
+        print("🗑️ Caché vaciada")
+    print_stats(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Resultados de consultas BigQuery en formato columnar (Arrow)
+El resultado se descarga como record batches de Arrow (Storage Read API si
+google-cloud-bigquery-storage está instalado, REST si no) y se mantiene así:
+la conversión a pandas no copia (columnas ArrowDtype) y los dicts por fila
+solo se construyen si alguien los pide (formato JSON del MCP, código que
+recorre result["result"]["rows"]).
+"""
+
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def rows_to_dicts(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Filas de BigQuery (Row) a dicts JSON serializables, celda por celda"""
+    converted = []
+    for row in rows:
+        row_dict = {}
+        for key, value in row.items():
+            # Manejar tipos especiales de BigQuery
+            if hasattr(value, 'isoformat'):  # datetime objects
+                row_dict[key] = value.isoformat()
+            elif isinstance(value, dict):  # structs
+                row_dict[key] = value
+            elif hasattr(value, '__iter__') and not isinstance(value, str):  # arrays
+                row_dict[key] = list(value)
+            else:
+                row_dict[key] = value
+        converted.append(row_dict)
+    return converted
+
+
+def _is_temporal(arrow_type) -> bool:
+    return (pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type)
+            or pa.types.is_time(arrow_type))
+
+
+class LazyRows(Sequence):
+    """Vista de filas como dicts que se materializa en el primer acceso"""
+
+    def __init__(self, result: 'QueryResult'):
+        self._result = result
+        self._rows = None
+
+    def _materialize(self) -> List[Dict[str, Any]]:
+        if self._rows is None:
+            self._rows = self._result.to_dicts()
+        return self._rows
+
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+    def __len__(self) -> int:
+        # La cantidad sale del resultado sin construir los dicts
+        if self._rows is None:
+            return self._result.num_rows
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __repr__(self) -> str:
+        return f"LazyRows({len(self)} filas, materializadas={self._rows is not None})"
+
+
+class QueryResult:
+    """Resultado de una consulta respaldado por una tabla Arrow (o filas si no hay pyarrow)"""
+
+    def __init__(self, table: Any = None, rows: Optional[List[Dict[str, Any]]] = None):
+        self.table = table
+        self._dict_rows = rows
+        self.rows = LazyRows(self)
+
+    @classmethod
+    def from_job(cls, query_job) -> 'QueryResult':
+        """Descarga el resultado de un job terminado (bloqueante)"""
+        if pa is not None and hasattr(query_job, 'to_arrow'):
+            # Con google-cloud-bigquery-storage usa la Storage Read API (streams
+            # paralelos en Arrow); sin ella, la API REST de páginas
+            return cls(table=query_job.to_arrow(create_bqstorage_client=True))
+        return cls(rows=rows_to_dicts(query_job.result()))
+
+    @property
+    def num_rows(self) -> int:
+        if self.table is not None:
+            return self.table.num_rows
+        return len(self._dict_rows)
+
+    @property
+    def column_names(self) -> List[str]:
+        if self.table is not None:
+            return list(self.table.column_names)
+        return list(self._dict_rows[0]) if self._dict_rows else []
+
+    def to_arrow(self):
+        if self.table is None:
+            if pa is None:
+                raise ImportError("pyarrow no está instalado")
+            return pa.Table.from_pylist(self._dict_rows)
+        return self.table
+
+    def to_batches(self, max_chunksize: Optional[int] = None):
+        """Record batches del resultado (sin copiar)"""
+        return self.to_arrow().to_batches(max_chunksize=max_chunksize)
+
+    def to_pandas(self, arrow_dtypes: bool = True):
+        """
+        DataFrame del resultado
+
+        Args:
+            arrow_dtypes: columnas pd.ArrowDtype que comparten los buffers de
+                          Arrow (sin copia); False convierte a dtypes NumPy
+        """
+        import pandas as pd
+
+        if self.table is None:
+            return pd.DataFrame(self._dict_rows)
+        if arrow_dtypes:
+            return self.table.to_pandas(types_mapper=pd.ArrowDtype)
+        return self.table.to_pandas(split_blocks=True)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Filas como dicts JSON serializables (mismo formato que rows_to_dicts)"""
+        if self.table is None:
+            return self._dict_rows
+
+        rows = self.table.to_pylist()
+        # Los tipos se conocen por el esquema: solo se convierten las columnas
+        # temporales, sin inspeccionar cada celda
+        temporal = [field.name for field in self.table.schema if _is_temporal(field.type)]
+        if temporal:
+            for row in rows:
+                for name in temporal:
+                    value = row[name]
+                    if value is not None:
+                        row[name] = value.isoformat()
+        return rows
+
+
+def iter_pages(query_job, page_size: int, arrow: bool = True) -> Iterator[Any]:
+    """
+    Páginas del resultado de un job terminado (bloqueante, una a la vez)
+
+    Con pyarrow cada página es un RecordBatch de hasta page_size filas; sin
+    pyarrow (o con arrow=False) una lista de dicts como rows_to_dicts. Solo
+    hay en memoria la página actual: la siguiente se pide a la API REST
+    (jobs.getQueryResults con maxResults=page_size) al consumirla.
+    """
+    rows = query_job.result(page_size=page_size)
+    if arrow and pa is not None and hasattr(rows, 'to_arrow_iterable'):
+        for batch in rows.to_arrow_iterable():
+            # El servidor puede devolver páginas más grandes que las pedidas
+            for offset in range(0, batch.num_rows, page_size):
+                yield batch.slice(offset, page_size)
+        return
+
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) >= page_size:
+            yield rows_to_dicts(page)
+            page = []
+    if page:
+        yield rows_to_dicts(page)
+
+
+def page_num_rows(page: Any) -> int:
+    """Filas de una página de iter_pages (RecordBatch o lista de dicts)"""
+    return page.num_rows if hasattr(page, 'num_rows') else len(page)
+
+
+def page_to_dicts(page: Any) -> List[Dict[str, Any]]:
+    """Filas de una página como dicts (los valores temporales quedan como datetime)"""
+    return page.to_pylist() if hasattr(page, 'to_pylist') else page
+
+
+def result_dataframe(response: Dict[str, Any], arrow_dtypes: bool = True):
+    """DataFrame de una respuesta de execute_query sin pasar por dicts por fila"""
+    import pandas as pd
+
+    data = response["result"].get("data")
+    if data is not None:
+        return data.to_pandas(arrow_dtypes=arrow_dtypes)
+    return pd.DataFrame(list(response["result"]["rows"]))
+
+
+def to_wire(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Respuesta de execute_query lista para json.dumps (formato MCP)"""
+    result = response.get("result")
+    if not isinstance(result, dict) or "data" not in result:
+        return response
+    wire_result = {key: value for key, value in result.items() if key != "data"}
+    wire_result["rows"] = list(result["rows"])
+    return dict(response, result=wire_result)
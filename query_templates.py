@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+📐 REGISTRO DE PLANTILLAS DE CONSULTA PARAMETRIZADAS
+Cada etapa de los analizadores es una plantilla con nombre: SQL fijo con
+parámetros @nombre tipados (ScalarQueryParameter / ArrayQueryParameter) que
+viajan en el job_config. El texto de la consulta es el mismo para todos los
+usuarios, así que BigQuery y la caché local (query_cache) reconocen la
+consulta, y ningún valor se interpola en el SQL.
+
+Uso:
+    TRANSACCIONES = register_template(
+        'oficial.transacciones_ato_dto',
+        "SELECT ... WHERE USER_ID = @user_id",
+        {'user_id': 'INT64'})
+    result = await run_template(operations, TRANSACCIONES, limit=5, user_id=123)
+    print_template_stats()
+"""
+
+import time
+import datetime
+import decimal
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from google.cloud import bigquery
+except ImportError:
+    bigquery = None
+
+from cost_guard import BudgetExceededError
+
+
+def _to_date(value: Any) -> Optional[datetime.date]:
+    if value is None or (isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    # Las filas de execute_query traen las fechas como texto ISO
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _to_datetime(value: Any) -> Optional[datetime.datetime]:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+_COERCE: Dict[str, Callable[[Any], Any]] = {
+    'INT64': int,
+    'FLOAT64': float,
+    'NUMERIC': lambda value: decimal.Decimal(str(value)),
+    'BIGNUMERIC': lambda value: decimal.Decimal(str(value)),
+    'STRING': str,
+    'BOOL': bool,
+    'DATE': _to_date,
+    'DATETIME': _to_datetime,
+    'TIMESTAMP': _to_datetime,
+}
+
+
+def _array_type(parameter_type: str) -> Optional[str]:
+    """'ARRAY<INT64>' -> 'INT64'; None si no es un arreglo"""
+    if parameter_type.upper().startswith('ARRAY<') and parameter_type.endswith('>'):
+        return parameter_type[6:-1].strip().upper()
+    return None
+
+
+@dataclass
+class TemplateStats:
+    """Uso de una plantilla en este proceso"""
+    executions: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    warehouse_cache_hits: int = 0
+    bytes_billed: int = 0
+    bytes_billed_saved: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.cache_hits + self.warehouse_cache_hits) / self.executions if self.executions else 0.0
+
+
+@dataclass
+class QueryTemplate:
+    """SQL con parámetros @nombre y el tipo BigQuery de cada uno (INT64, DATE, ARRAY<INT64>...)"""
+    name: str
+    sql: str
+    parameters: Dict[str, str] = field(default_factory=dict)
+    description: str = ''
+    stats: TemplateStats = field(default_factory=TemplateStats)
+
+    def query_parameters(self, **values: Any) -> list:
+        """Parámetros tipados para job_config.query_parameters"""
+        if bigquery is None:
+            raise ImportError("google-cloud-bigquery no está instalado (requerido para parámetros tipados)")
+        missing = set(self.parameters) - set(values)
+        unknown = set(values) - set(self.parameters)
+        if missing or unknown:
+            raise ValueError(f"Plantilla {self.name}: faltan {sorted(missing)}, sobran {sorted(unknown)}")
+
+        parameters = []
+        for name, parameter_type in self.parameters.items():
+            value = values[name]
+            element_type = _array_type(parameter_type)
+            try:
+                if element_type:
+                    coerce = _COERCE[element_type]
+                    parameters.append(bigquery.ArrayQueryParameter(
+                        name, element_type, [coerce(item) for item in value]))
+                else:
+                    coerce = _COERCE[parameter_type.upper()]
+                    parameters.append(bigquery.ScalarQueryParameter(
+                        name, parameter_type.upper(), None if value is None else coerce(value)))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Plantilla {self.name}: parámetro {name} ({parameter_type}) inválido: {e}")
+        return parameters
+
+    def job_config(self, **values: Any):
+        """QueryJobConfig con los parámetros de la plantilla"""
+        return bigquery.QueryJobConfig(query_parameters=self.query_parameters(**values))
+
+
+TEMPLATES: Dict[str, QueryTemplate] = {}
+
+
+def register_template(name: str, sql: str, parameters: Optional[Dict[str, str]] = None,
+                      description: str = '') -> QueryTemplate:
+    """Registra (o reemplaza) una plantilla y la devuelve"""
+    template = QueryTemplate(name, sql, dict(parameters or {}), description)
+    TEMPLATES[name] = template
+    return template
+
+
+def get_template(name: str) -> QueryTemplate:
+    if name not in TEMPLATES:
+        raise KeyError(f"Plantilla desconocida: {name} (registradas: {', '.join(sorted(TEMPLATES)) or 'ninguna'})")
+    return TEMPLATES[name]
+
+
+async def run_template(operations: Any, template: Any, limit: int = 1000, use_cache: bool = True,
+                       **values: Any) -> Dict[str, Any]:
+    """
+    Ejecuta una plantilla (objeto o nombre registrado) con
+    MCPBigQueryBasicOperations.execute_query; el gasto se acumula bajo el
+    nombre de la plantilla (cost_guard)
+
+    Returns:
+        La respuesta de execute_query con "template": nombre de la plantilla
+
+    Raises:
+        BudgetExceededError: la consulta superaría el presupuesto de bytes;
+                             el análisis se corta en vez de seguir con una
+                             etapa vacía
+    """
+    if not isinstance(template, QueryTemplate):
+        template = get_template(template)
+    job_config = template.job_config(**values)
+    start = time.perf_counter()
+    response = await operations.execute_query(template.sql, limit, use_cache, job_config=job_config,
+                                              label=template.name)
+
+    stats = template.stats
+    stats.executions += 1
+    stats.elapsed_ms += (time.perf_counter() - start) * 1000
+    if response.get("status") != "success":
+        stats.errors += 1
+        if response.get("budget_exceeded"):
+            raise BudgetExceededError(**response["budget_exceeded"])
+    else:
+        job_info = response["result"]["job_info"]
+        stats.cache_hits += int(bool(job_info.get("cache_hit")))
+        stats.warehouse_cache_hits += int(bool(job_info.get("warehouse_cache_hit")))
+        stats.bytes_billed += job_info.get("bytes_billed") or 0
+        stats.bytes_billed_saved += job_info.get("bytes_billed_saved") or 0
+    response["template"] = template.name
+    return response
+
+
+def template_stats() -> Dict[str, Dict[str, Any]]:
+    """Estadísticas por plantilla ejecutada (aciertos de caché local y de BigQuery)"""
+    report = {}
+    for name, template in TEMPLATES.items():
+        stats = template.stats
+        if stats.executions:
+            report[name] = {
+                "executions": stats.executions,
+                "errors": stats.errors,
+                "cache_hits": stats.cache_hits,
+                "warehouse_cache_hits": stats.warehouse_cache_hits,
+                "hit_rate": stats.hit_rate,
+                "bytes_billed": stats.bytes_billed,
+                "bytes_billed_saved": stats.bytes_billed_saved,
+                "avg_ms": stats.elapsed_ms / stats.executions,
+            }
+    return report
+
+
+def print_template_stats():
+    """Tabla de uso por plantilla para el final de un análisis"""
+    report = template_stats()
+    if not report:
+        return
+    print("\n📐 PLANTILLAS DE CONSULTA")
+    print(f"   {'plantilla':<42} {'ejec':>5} {'caché':>6} {'BQ':>4} {'aciertos':>9} "
+          f"{'MB fact.':>9} {'MB ahorr.':>10} {'ms prom.':>9}")
+    for name, stats in sorted(report.items()):
+        print(f"   {name:<42} {stats['executions']:>5} {stats['cache_hits']:>6} "
+              f"{stats['warehouse_cache_hits']:>4} {stats['hit_rate']:>9.0%} "
+              f"{stats['bytes_billed'] / 1024 ** 2:>9.1f} {stats['bytes_billed_saved'] / 1024 ** 2:>10.1f} "
+              f"{stats['avg_ms']:>9.1f}")
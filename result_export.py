@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Exportación incremental de resultados de consultas (CSV, Parquet, Excel)
+Los writers reciben las páginas de MCPBigQueryBasicOperations.stream_query
+una a una y las vuelcan al archivo, sin armar nunca el resultado completo:
+la memoria queda acotada por el tamaño de página, no por el de la consulta.
+"""
+
+import csv
+import datetime
+import os
+from typing import Any, AsyncIterable, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from query_results import page_num_rows, page_to_dicts
+
+# Filas por hoja de Excel (1.048.576 menos el encabezado)
+EXCEL_MAX_ROWS = 1048575
+
+
+class PageWriter:
+    """
+    Base de los writers: write(page) por cada página y close() al final.
+    Se escribe a un temporal junto al destino que reemplaza al archivo recién
+    al cerrar sin error: si la consulta falla a mitad de camino, la
+    exportación anterior queda intacta.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.rows_written = 0
+        self.columns: Optional[List[str]] = None
+
+    def write(self, page: Any):
+        if page_num_rows(page) == 0:
+            return
+        if self.columns is None:
+            self.columns = (list(page.schema.names) if hasattr(page, 'schema')
+                            else list(page[0].keys()))
+        self._write(page)
+        self.rows_written += page_num_rows(page)
+
+    def _write(self, page: Any):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def close(self):
+        """Cierra el temporal y lo publica en path"""
+        self._close()
+        if os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Descarta lo escrito sin tocar path"""
+        try:
+            self._close()
+        except Exception:
+            pass
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CsvPageWriter(PageWriter):
+    """CSV con encabezado; usa el writer de Arrow para páginas RecordBatch"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = None
+        self._arrow_writer = None
+        self._dict_writer = None
+
+    def _write(self, page: Any):
+        if hasattr(page, 'schema'):
+            if self._arrow_writer is None:
+                from pyarrow import csv as pa_csv
+                self._arrow_writer = pa_csv.CSVWriter(self.tmp_path, page.schema)
+            self._arrow_writer.write_batch(page)
+            return
+        if self._dict_writer is None:
+            self._file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+            self._dict_writer = csv.DictWriter(self._file, fieldnames=self.columns)
+            self._dict_writer.writeheader()
+        self._dict_writer.writerows(page)
+
+    def _close(self):
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+class ParquetPageWriter(PageWriter):
+    """Parquet con un row group por página"""
+
+    def __init__(self, path: str, compression: str = 'snappy'):
+        if pa is None:
+            raise ImportError("pyarrow no está instalado (requerido para Parquet)")
+        super().__init__(path)
+        self.compression = compression
+        self._writer = None
+
+    def _write(self, page: Any):
+        import pyarrow.parquet as pq
+
+        if not hasattr(page, 'schema'):
+            # Las páginas siguientes se ajustan al esquema de la primera
+            schema = self._writer.schema if self._writer is not None else None
+            page = pa.RecordBatch.from_pylist(page, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.tmp_path, page.schema, compression=self.compression)
+        self._writer.write_batch(page)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _excel_value(value: Any) -> Any:
+    """Valor aceptado por openpyxl (Excel no guarda zona horaria ni estructuras)"""
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if isinstance(value, (dict, list)):
+        return str(value)
+    return value
+
+
+class ExcelPageWriter(PageWriter):
+    """xlsx en modo write_only de openpyxl: las filas se escriben a disco al agregarlas"""
+
+    def __init__(self, path: str, sheet_name: str = 'Datos'):
+        from openpyxl import Workbook
+
+        super().__init__(path)
+        self.sheet_name = sheet_name
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        self._sheets = 0
+
+    def _new_sheet(self):
+        self._sheets += 1
+        title = self.sheet_name if self._sheets == 1 else f"{self.sheet_name}_{self._sheets}"
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append(self.columns)
+        self._sheet_rows = 0
+
+    def _write(self, page: Any):
+        if self._sheet is None:
+            self._new_sheet()
+        for row in page_to_dicts(page):
+            # Más filas que las que entran en una hoja: se continúa en otra
+            if self._sheet_rows >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.append([_excel_value(row.get(column)) for column in self.columns])
+            self._sheet_rows += 1
+
+    def _close(self):
+        if self._sheet is None:
+            self._workbook.create_sheet(self.sheet_name)
+        self._workbook.save(self.tmp_path)
+
+
+WRITERS = {
+    'csv': CsvPageWriter,
+    'parquet': ParquetPageWriter,
+    'xlsx': ExcelPageWriter,
+}
+
+
+def open_writer(path: str, format: Optional[str] = None) -> PageWriter:
+    """Writer según el formato pedido o la extensión del archivo"""
+    format = (format or os.path.splitext(path)[1].lstrip('.')).lower()
+    if format not in WRITERS:
+        raise ValueError(f"Formato de exportación desconocido: {format} (opciones: {', '.join(WRITERS)})")
+    return WRITERS[format](path)
+
+
+async def export_pages(pages: AsyncIterable[Any], path: str, format: Optional[str] = None) -> Dict[str, Any]:
+    """Vuelca un stream de páginas a un archivo; devuelve filas, columnas y ruta"""
+    with open_writer(path, format) as writer:
+        async for page in pages:
+            writer.write(page)
+    return {"path": path, "rows": writer.rows_written, "columns": writer.columns or []}
@@ -0,0 +1,141 @@
+"""
+Ciclo de vida del servicio: liveness, readiness y warm-up
+El proceso está "vivo" apenas Flask responde, pero solo queda "listo" cuando
+una rutina de warm-up pasó imágenes sintéticas por todos los caminos de
+comparación (imports diferidos, JIT, primeras llamadas a los modelos). Así un
+deploy escalonado no manda tráfico a un worker frío.
+
+Modo configurable con WARM_UP_MODE:
+    lazy  (por defecto) - warm-up en un thread al llegar la primera request al
+                          proceso (típicamente la sonda de readiness)
+    sync                - warm-up bloqueante al importar; con gunicorn --preload
+                          corre una vez en el master y los workers heredan todo
+    off                 - listo de inmediato
+"""
+
+import io
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+from flask import jsonify
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_image(seed=0, size=(600, 450)):
+    """Imagen RGB determinística con fondo texturado y una figura central"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8))
+    image = background.resize((width, height), Image.Resampling.BICUBIC)
+    color = tuple(int(c) for c in rng.integers(0, 256, 3))
+    image.paste(color, (width // 3, height // 4, 2 * width // 3, height))
+    return image
+
+
+def synthetic_jpeg(seed=0, size=(600, 450)):
+    """Stream JPEG de synthetic_image (para los caminos que parten de bytes)"""
+    buffer = io.BytesIO()
+    synthetic_image(seed, size).save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+class ServiceLifecycle:
+    """Estado de warm-up del proceso y endpoints de liveness/readiness"""
+
+    def __init__(self, name, mode=None):
+        self.name = name
+        self.mode = (mode or os.environ.get('WARM_UP_MODE', 'lazy')).lower()
+        if self.mode not in ('lazy', 'sync', 'off'):
+            raise ValueError(f"WARM_UP_MODE desconocido: {self.mode}")
+        self._steps = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self.started_at = time.time()
+        self.state = 'ready' if self.mode == 'off' else 'pending'
+        self.warm_up_seconds = None
+        self.step_results = {}
+
+    def add_step(self, name, function):
+        """Paso de warm-up: función sin argumentos que ejercita un camino"""
+        self._steps.append((name, function))
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def run_warm_up(self):
+        """Corre todos los pasos; un paso que falla deja el servicio listo pero degradado"""
+        self.state = 'warming'
+        start = time.time()
+        for name, function in self._steps:
+            step_start = time.time()
+            try:
+                function()
+                self.step_results[name] = {'seconds': round(time.time() - step_start, 3), 'ok': True}
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up {name} falló: {e}")
+                self.step_results[name] = {'seconds': round(time.time() - step_start, 3), 'ok': False,
+                                           'error': str(e)}
+        self.warm_up_seconds = round(time.time() - start, 3)
+        self.state = 'ready'
+        detail = ', '.join(f"{name} {result['seconds']:.2f}s" for name, result in self.step_results.items())
+        logger.info(f"🔥 {self.name} listo: warm-up en {self.warm_up_seconds:.2f}s ({detail})")
+
+    def start(self):
+        """Arranca el warm-up de este proceso según el modo (idempotente)"""
+        if self.mode == 'off' or self.ready:
+            return
+        with self._lock:
+            # Después de un fork el estado heredado no tiene thread que lo complete
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        if self.mode == 'sync':
+            self.run_warm_up()
+        else:
+            threading.Thread(target=self.run_warm_up, name=f'warm-up-{self.name}', daemon=True).start()
+
+    def status(self):
+        return {
+            'service': self.name,
+            'status': self.state,
+            'ready': self.ready,
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'warm_up_mode': self.mode,
+            'warm_up_seconds': self.warm_up_seconds,
+            'steps': self.step_results,
+            'degraded': any(not result['ok'] for result in self.step_results.values()),
+        }
+
+    def register(self, app, prefix='/api/health'):
+        """Endpoints <prefix>/live y <prefix>/ready; el warm-up lazy arranca con la primera request"""
+
+        @app.before_request
+        def _start_warm_up():
+            if not self.ready:
+                self.start()
+
+        @app.route(f'{prefix}/live', endpoint=f'{self.name}_liveness')
+        def liveness():
+            """El proceso responde (no implica que esté caliente)"""
+            return jsonify({'status': 'alive', 'pid': os.getpid(),
+                            'uptime_seconds': round(time.time() - self.started_at, 1)})
+
+        @app.route(f'{prefix}/ready', endpoint=f'{self.name}_readiness')
+        def readiness():
+            """200 solo después del warm-up; 503 con Retry-After mientras tanto"""
+            response = jsonify(self.status())
+            if not self.ready:
+                response.status_code = 503
+                response.headers['Retry-After'] = '1'
+            return response
+
+        if self.mode == 'sync':
+            self.start()
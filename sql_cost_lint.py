@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+"""
+🔎 LINTER DE COSTO PARA LOS ARCHIVOS .sql DEL REPOSITORIO
+Lee cada archivo sin ejecutarlo y marca lo que encarece el escaneo en
+BigQuery:
+
+- particion_sin_filtro: tabla particionada leída sin predicado sobre su
+  columna de fecha (escanea todas las particiones)
+- particion_sin_poda: hay filtro de fecha pero BigQuery no puede podar
+  (EXTRACT / FORMAT_DATE sobre la columna, o comparación contra una columna
+  de otra tabla del JOIN)
+- select_asterisco: SELECT * / alias.* (lee todas las columnas)
+- join_cast: claves de JOIN envueltas en CAST(... AS STRING), no sargables
+- cross_join: CROSS JOIN, join por coma u ON TRUE
+
+Con --dry-run estima además los bytes de cada archivo con el backend
+configurado (BIGQUERY_BACKEND=duckdb usa el stand-in local). El reporte se
+ordena por puntaje o por bytes para atacar primero las consultas más caras.
+
+Uso:
+    python sql_cost_lint.py
+    python sql_cost_lint.py "alarma_*.sql" --dry-run --sort bytes
+    python sql_cost_lint.py --format csv > costos_sql.csv
+"""
+
+import os
+import re
+import csv
+import sys
+import glob
+import json
+import bisect
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bigquery_dialect import normalize_sql, table_path
+from bigquery_standin import client_from_env
+from cost_guard import default_guard, format_bytes
+
+logger = logging.getLogger(__name__)
+
+# Columnas de partición por tabla: regex sobre 'DATASET.TABLA' (sin distinguir
+# mayúsculas) -> columnas; None = cualquier columna con nombre de fecha.
+# Se usa la primera regla que coincide.
+PARTICIONES: List[Tuple[str, Optional[Tuple[str, ...]]]] = [
+    (r'WHOWNER\.BT_MP_PAY_PAYMENTS', ('PAY_CREATED_DT', 'PAY_MOVE_DATE')),
+    (r'WHOWNER\.BT_RES_RESTRICTIONS_INFRACTIONS_NW', ('SENTENCE_DATE',)),
+    (r'WHOWNER\.BT_MP_PAYOUTS', ('PYT_CREATED_DT',)),
+    (r'WHOWNER\.BT_MP_WITHDRAWALS', ('WIT_CREATED_DT',)),
+    (r'WHOWNER\.BT_ACTION_MR', ('ACTION_DATE', 'DATE_CREATED')),
+    (r'WHOWNER\.BT_SCO_ORIGIN_REPORT', ('PAY_CREATED_DT', 'CREATION_DATE')),
+    (r'WHOWNER\.BT_FRD_GENERAL_CASES_MANUALREW_EXP', ('GCA_DATE_CREATED',)),
+    (r'WHOWNER\.BT_MP_SCORING_TO_CUST', ('CREATED_DATE', 'SCO_CREATION_DATE')),
+    (r'WHOWNER\.BT_CCARD_PURCHASE', ('CCARD_PURCH_OP_DT',)),
+    (r'scoring\w*\.\w+', None),
+    (r'WHOWNER\.BT_\w+', None),
+]
+
+PESOS = {
+    'particion_sin_filtro': 10,
+    'cross_join': 8,
+    'particion_sin_poda': 6,
+    'join_cast': 4,
+    'select_asterisco': 3,
+}
+# SELECT * sobre una CTE o subconsulta: BigQuery solo lee lo que la fuente lee
+PESO_ASTERISCO_DERIVADO = 1
+
+ORDENES = ('puntaje', 'bytes', 'hallazgos', 'archivo')
+
+_TABLA = r'(`[^`]+`|[A-Za-z_][\w-]*(?:\.[\w-]+){1,2})'
+_REFERENCIA = re.compile(r'\b(?:FROM|JOIN|USING)\s+' + _TABLA, re.IGNORECASE)
+_REFERENCIA_COMA = re.compile(r',\s*(`[^`]+`)')
+_ALIAS = re.compile(r'\s+(?:AS\s+)?([A-Za-z_]\w*)', re.IGNORECASE)
+_SUBCONSULTA = re.compile(r'\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+_OPERACION_CONJUNTOS = re.compile(r'\b(?:UNION\s+(?:ALL|DISTINCT)|INTERSECT\s+DISTINCT|EXCEPT\s+DISTINCT)\b',
+                                  re.IGNORECASE)
+_CLAUSULA = re.compile(r'\b(WHERE|ON|HAVING|QUALIFY)\b', re.IGNORECASE)
+_FIN_CLAUSULA = re.compile(
+    r'\b(?:WHERE|ON|HAVING|QUALIFY|GROUP\s+BY|ORDER\s+BY|LIMIT|WINDOW|JOIN|LEFT(?!\s*\()|RIGHT(?!\s*\()|'
+    r'FULL|INNER|CROSS|SELECT)\b', re.IGNORECASE)
+_FIN_FROM = re.compile(r'\b(?:WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|QUALIFY|LIMIT|WINDOW|SELECT)\b', re.IGNORECASE)
+_CONECTOR = re.compile(r'\b(?:AND|OR)\b', re.IGNORECASE)
+_COLUMNA_CALIFICADA = re.compile(r'\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b(?!\s*\()')
+_COLUMNA_FECHA = r'\w*(?:_DT|_DTTM|_DATE|_DATETIME|_TIMESTAMP)|DATE_\w+|FECHA\w*|LAST_UPDATED'
+_SIN_COLUMNA = {'CURRENT_DATE', 'CURRENT_DATETIME'}
+# Funciones que impiden la poda de particiones si envuelven la columna
+_FUNCIONES_SIN_PODA = {'EXTRACT', 'FORMAT_DATE', 'FORMAT_DATETIME', 'FORMAT_TIMESTAMP'}
+_SELECT = re.compile(r'\bSELECT\b', re.IGNORECASE)
+_FROM = re.compile(r'\bFROM\b', re.IGNORECASE)
+_ASTERISCO = re.compile(r'(?:^|,)\s*(?:(?:DISTINCT|ALL)\s+)?(?:([A-Za-z_]\w*)\.)?\*', re.IGNORECASE)
+_JOIN_CAST = re.compile(
+    r'(?:SAFE_)?CAST\s*\([^()]*\bAS\s+(\w+)\s*\)\s*=|=\s*(?:SAFE_)?CAST\s*\([^()]*\bAS\s+(\w+)\s*\)',
+    re.IGNORECASE)
+_CROSS_JOIN = re.compile(r'\bCROSS\s+JOIN\s+(?!UNNEST\b)', re.IGNORECASE)
+_ON_TRUE = re.compile(r'\bON\s+(?:TRUE|1\s*=\s*1)\b(?!\s*AND\b)', re.IGNORECASE)
+_FUNCION_FROM = re.compile(r'\(\s*\w+\s+$')
+_PALABRAS_CLAVE = {
+    'WHERE', 'ON', 'USING', 'LEFT', 'RIGHT', 'FULL', 'INNER', 'OUTER', 'CROSS', 'JOIN', 'GROUP', 'ORDER',
+    'HAVING', 'QUALIFY', 'LIMIT', 'WINDOW', 'UNION', 'INTERSECT', 'EXCEPT', 'SELECT', 'FROM', 'AS',
+    'WITH', 'SET', 'WHEN', 'THEN', 'AND', 'OR', 'TABLESAMPLE', 'FOR',
+}
+
+
+@dataclass
+class Hallazgo:
+    """Un problema de costo en una línea del archivo"""
+    regla: str
+    linea: int
+    detalle: str
+    peso: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"regla": self.regla, "linea": self.linea, "detalle": self.detalle, "peso": self.peso}
+
+
+@dataclass
+class ReporteArchivo:
+    """Hallazgos y bytes estimados de un archivo .sql"""
+    archivo: str
+    sentencias: int = 0
+    tablas: List[str] = field(default_factory=list)
+    hallazgos: List[Hallazgo] = field(default_factory=list)
+    bytes_estimados: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def puntaje(self) -> int:
+        return sum(hallazgo.peso for hallazgo in self.hallazgos)
+
+    def conteo(self) -> Dict[str, int]:
+        conteo = dict.fromkeys(PESOS, 0)
+        for hallazgo in self.hallazgos:
+            conteo[hallazgo.regla] += 1
+        return conteo
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "archivo": self.archivo,
+            "sentencias": self.sentencias,
+            "tablas": self.tablas,
+            "puntaje": self.puntaje,
+            "conteo": self.conteo(),
+            "bytes_estimados": self.bytes_estimados,
+            "error": self.error,
+            "hallazgos": [hallazgo.to_dict() for hallazgo in self.hallazgos],
+        }
+
+
+@dataclass
+class _Tabla:
+    nombre: str
+    dataset: str
+    tabla: str
+    alias: Optional[str]
+    posicion: int
+
+    def nombres(self) -> set:
+        """Calificadores con los que la consulta puede referirse a la tabla"""
+        nombres = {self.tabla.lower()}
+        if self.alias:
+            nombres.add(self.alias.lower())
+        return nombres
+
+
+def _enmascarar(sql: str) -> str:
+    """
+    Comentarios y contenido de literales -> espacios, con las mismas
+    posiciones y saltos de línea (los nombres entre backticks quedan)
+    """
+    out = list(sql)
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if sql.startswith('--', i) or char == '#':
+            end = sql.find('\n', i)
+            start, end = i, len(sql) if end < 0 else end
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            start, end = i, len(sql) if end < 0 else end + 2
+        elif char in "'\"":
+            end = i + 1
+            while end < len(sql) and sql[end] != char:
+                end += 2 if sql[end] == '\\' else 1
+            # Las comillas quedan: '2024-01-01' -> '          '
+            start, end = i + 1, min(end, len(sql))
+            for j in range(start, end):
+                if out[j] != '\n':
+                    out[j] = ' '
+            i = end + 1
+            continue
+        elif char == '`':
+            end = sql.find('`', i + 1)
+            i = len(sql) if end < 0 else end + 1
+            continue
+        else:
+            i += 1
+            continue
+        for j in range(start, end):
+            if out[j] != '\n':
+                out[j] = ' '
+        i = end
+    return ''.join(out)
+
+
+def _parejas(texto: str) -> Dict[int, int]:
+    """Posición de cada '(' -> su ')' (los paréntesis sin cerrar se ignoran)"""
+    pila, parejas = [], {}
+    for i, char in enumerate(texto):
+        if char == '(':
+            pila.append(i)
+        elif char == ')' and pila:
+            parejas[pila.pop()] = i
+    return parejas
+
+
+def _blanquear(texto: str, inicio: int, fin: int, subconsultas: Dict[int, int]) -> str:
+    """texto[inicio:fin] con las subconsultas anidadas en blanco"""
+    out = list(texto[inicio:fin])
+    i = inicio
+    while i < fin:
+        if i in subconsultas:
+            cierre = min(subconsultas[i] + 1, fin)
+            for j in range(i, cierre):
+                if out[j - inicio] != '\n':
+                    out[j - inicio] = ' '
+            i = cierre
+        else:
+            i += 1
+    return ''.join(out)
+
+
+def _funciones_abiertas(texto: str, posicion: int) -> List[str]:
+    """Funciones cuyo paréntesis sigue abierto en texto[posicion]"""
+    pila = []
+    for i in range(posicion):
+        if texto[i] == '(':
+            pila.append(i)
+        elif texto[i] == ')' and pila:
+            pila.pop()
+    funciones = []
+    for apertura in pila:
+        nombre = re.search(r'(\w+)\s*$', texto[:apertura])
+        if nombre:
+            funciones.append(nombre.group(1).upper())
+    return funciones
+
+
+def _atomo(segmento: str, posicion: int) -> str:
+    """Comparación que contiene segmento[posicion] (entre AND / OR; respeta BETWEEN ... AND)"""
+    inicio = 0
+    for match in _CONECTOR.finditer(segmento, 0, posicion):
+        inicio = match.end()
+    fin, entre = len(segmento), False
+    for match in _CONECTOR.finditer(segmento, posicion):
+        if (match.group(0).upper() == 'AND' and not entre
+                and re.search(r'\bBETWEEN\b', segmento[inicio:match.start()], re.IGNORECASE)):
+            entre = True
+            continue
+        fin = match.start()
+        break
+    return segmento[inicio:fin]
+
+
+def columnas_particion(dataset: str, tabla: str,
+                       particiones: Optional[Sequence[Tuple[str, Optional[Tuple[str, ...]]]]] = None):
+    """
+    (particionada, columnas) de una tabla según las reglas; columnas None =
+    cualquier columna con nombre de fecha
+    """
+    for patron, columnas in (PARTICIONES if particiones is None else particiones):
+        if re.fullmatch(patron, f"{dataset}.{tabla}", re.IGNORECASE):
+            return True, columnas
+    return False, None
+
+
+class _Analisis:
+    """Recorre un archivo: sentencias -> niveles de consulta -> ramas de UNION"""
+
+    def __init__(self, sql: str, particiones=None):
+        self.sql = sql
+        self.texto = _enmascarar(sql)
+        self.particiones = particiones
+        self.parejas = _parejas(self.texto)
+        self.lineas = [0] + [i + 1 for i, char in enumerate(self.texto) if char == '\n']
+        self.hallazgos: List[Hallazgo] = []
+        self.tablas: set = set()
+        self.sentencias: List[Tuple[int, int]] = []
+
+    def linea(self, posicion: int) -> int:
+        return bisect.bisect_right(self.lineas, posicion)
+
+    def agregar(self, regla: str, posicion: int, detalle: str, peso: Optional[int] = None):
+        hallazgo = Hallazgo(regla, self.linea(posicion), detalle, PESOS[regla] if peso is None else peso)
+        if hallazgo not in self.hallazgos:
+            self.hallazgos.append(hallazgo)
+
+    def ejecutar(self):
+        inicio = 0
+        for match in list(re.finditer(';', self.texto)) + [None]:
+            fin = match.start() if match else len(self.texto)
+            if self.texto[inicio:fin].strip():
+                self.sentencias.append((inicio, fin))
+                self._sentencia(inicio, fin)
+            inicio = fin + 1
+        self.hallazgos.sort(key=lambda hallazgo: (hallazgo.linea, -hallazgo.peso))
+        return self
+
+    def _sentencia(self, inicio: int, fin: int):
+        subconsultas = {apertura: cierre for apertura, cierre in self.parejas.items()
+                        if inicio <= apertura < fin and _SUBCONSULTA.match(self.texto, apertura + 1)}
+        niveles = [(inicio, fin)] + [(apertura + 1, cierre) for apertura, cierre in subconsultas.items()]
+        for nivel_inicio, nivel_fin in niveles:
+            anidadas = {apertura: cierre for apertura, cierre in subconsultas.items()
+                        if nivel_inicio <= apertura < nivel_fin}
+            nivel = _blanquear(self.texto, nivel_inicio, nivel_fin, anidadas)
+            rama_inicio = 0
+            for match in list(_OPERACION_CONJUNTOS.finditer(nivel)) + [None]:
+                rama_fin = match.start() if match else len(nivel)
+                self._rama(nivel[:rama_fin], rama_inicio, nivel_inicio)
+                rama_inicio = match.end() if match else rama_fin
+
+    def _rama(self, nivel: str, inicio: int, base: int):
+        """Una consulta SELECT sin subconsultas (nivel[inicio:] en blanco lo ajeno)"""
+        rama = ' ' * inicio + nivel[inicio:]
+        tablas = self._referencias(rama, base)
+        predicados = [(match.group(1).upper(), match.end(),
+                       (_FIN_CLAUSULA.search(rama, match.end()) or re.search('$', rama)).start())
+                      for match in _CLAUSULA.finditer(rama)]
+        for tabla in tablas:
+            self._particion(tabla, rama, predicados, base)
+        self._asteriscos(rama, tablas, base)
+        self._joins(rama, predicados, base)
+
+    def _referencias(self, rama: str, base: int) -> List[_Tabla]:
+        tablas = []
+        for match in list(_REFERENCIA.finditer(rama)) + list(_REFERENCIA_COMA.finditer(rama)):
+            # EXTRACT(DAY FROM col) no es una tabla
+            if match.group(0)[:4].upper() == 'FROM' and _FUNCION_FROM.search(rama[:match.start()]):
+                continue
+            nombre = match.group(1).strip('`')
+            dataset, tabla = table_path(nombre)
+            if not dataset:
+                continue
+            alias = _ALIAS.match(rama, match.end())
+            alias = alias.group(1) if alias and alias.group(1).upper() not in _PALABRAS_CLAVE else None
+            tablas.append(_Tabla(nombre, dataset, tabla, alias, base + match.start(1)))
+            self.tablas.add(f"{dataset}.{tabla}")
+        return tablas
+
+    def _particion(self, tabla: _Tabla, rama: str, predicados, base: int):
+        particionada, columnas = columnas_particion(tabla.dataset, tabla.tabla, self.particiones)
+        if not particionada:
+            return
+        patron = '|'.join(re.escape(columna) for columna in columnas) if columnas else _COLUMNA_FECHA
+        mencion = re.compile(r'(?:\b([A-Za-z_]\w*)\.)?\b(' + patron + r')\b(?!\s*\()', re.IGNORECASE)
+        motivos = []
+        for _, inicio, fin in predicados:
+            segmento = rama[inicio:fin]
+            for match in mencion.finditer(segmento):
+                if match.group(2).upper() in _SIN_COLUMNA:
+                    continue
+                if match.group(1) and match.group(1).lower() not in tabla.nombres():
+                    continue
+                funciones = _FUNCIONES_SIN_PODA.intersection(_funciones_abiertas(segmento, match.start()))
+                if funciones:
+                    motivos.append(f"{match.group(2)} dentro de {sorted(funciones)[0]}")
+                    continue
+                otras = [f"{calificador}.{columna}"
+                         for calificador, columna in _COLUMNA_CALIFICADA.findall(_atomo(segmento, match.start()))
+                         if calificador.lower() not in tabla.nombres()]
+                if otras:
+                    motivos.append(f"{match.group(2)} comparada contra {otras[0]} (valor no constante)")
+                    continue
+                return
+        descripcion = ', '.join(columnas) if columnas else 'una columna de fecha'
+        if motivos:
+            self.agregar('particion_sin_poda', tabla.posicion,
+                         f"{tabla.dataset}.{tabla.tabla}: filtro de partición sin poda ({motivos[0]})")
+        else:
+            self.agregar('particion_sin_filtro', tabla.posicion,
+                         f"{tabla.dataset}.{tabla.tabla} sin filtro sobre {descripcion}: "
+                         f"escanea todas las particiones")
+
+    def _asteriscos(self, rama: str, tablas: List[_Tabla], base: int):
+        for select in _SELECT.finditer(rama):
+            desde = _FROM.search(rama, select.end())
+            lista = rama[select.end():desde.start() if desde else len(rama)]
+            for match in _ASTERISCO.finditer(lista):
+                calificador = match.group(1)
+                if calificador:
+                    fuentes = [tabla for tabla in tablas if calificador.lower() in tabla.nombres()]
+                else:
+                    fuentes = tablas
+                posicion = base + select.end() + match.start()
+                asterisco = f"{calificador}.*" if calificador else '*'
+                if fuentes:
+                    self.agregar('select_asterisco', posicion,
+                                 f"SELECT {asterisco} sobre {fuentes[0].dataset}.{fuentes[0].tabla}: "
+                                 f"lee todas las columnas")
+                else:
+                    self.agregar('select_asterisco', posicion,
+                                 f"SELECT {asterisco} sobre una CTE o subconsulta", PESO_ASTERISCO_DERIVADO)
+
+    def _joins(self, rama: str, predicados, base: int):
+        for clausula, inicio, fin in predicados:
+            if clausula != 'ON':
+                continue
+            tipos = {tipo.upper() for match in _JOIN_CAST.finditer(rama, inicio, fin)
+                     for tipo in match.groups() if tipo}
+            if tipos:
+                self.agregar('join_cast', base + inicio,
+                             f"JOIN con CAST(... AS {'/'.join(sorted(tipos))}) en la clave: no sargable, "
+                             f"descarta el clustering (unificar el tipo de las columnas)")
+        for match in _CROSS_JOIN.finditer(rama):
+            self.agregar('cross_join', base + match.start(), "CROSS JOIN: producto cartesiano")
+        for match in _ON_TRUE.finditer(rama):
+            self.agregar('cross_join', base + match.start(), "JOIN ... ON TRUE: producto cartesiano")
+        for desde in _FROM.finditer(rama):
+            if _FUNCION_FROM.search(rama[:desde.start()]):
+                continue
+            fin = _FIN_FROM.search(rama, desde.end())
+            self._joins_por_coma(rama, desde.end(), fin.start() if fin else len(rama), base)
+
+    def _joins_por_coma(self, rama: str, inicio: int, fin: int, base: int):
+        profundidad, elemento = 0, inicio
+        for i in range(inicio, fin + 1):
+            char = rama[i] if i < fin else ','
+            if char == '(':
+                profundidad += 1
+            elif char == ')':
+                profundidad -= 1
+            elif char == ',' and profundidad == 0:
+                if elemento > inicio:
+                    texto = rama[elemento:i].strip()
+                    # ', UNNEST(...)' y ', alias.arreglo' desanidan arreglos: no son cross joins
+                    if not re.match(r'UNNEST\b|[A-Za-z_]\w*\.[A-Za-z_]\w*(?:\s|$)', texto, re.IGNORECASE):
+                        self.agregar('cross_join', base + elemento,
+                                     f"join por coma ({texto.split()[0] if texto else 'subconsulta'}): "
+                                     f"producto cartesiano sin condición")
+                elemento = i + 1
+
+
+def analizar_sql(sql: str, archivo: str = '<sql>', particiones=None) -> ReporteArchivo:
+    """Hallazgos de costo de un texto SQL (una o varias sentencias)"""
+    analisis = _Analisis(sql, particiones).ejecutar()
+    return ReporteArchivo(archivo, len(analisis.sentencias), sorted(analisis.tablas), analisis.hallazgos)
+
+
+def analizar_archivo(ruta: str, particiones=None) -> ReporteArchivo:
+    with open(ruta, encoding='utf-8', errors='replace') as f:
+        return analizar_sql(f.read(), os.path.basename(ruta), particiones)
+
+
+def sentencias_sql(sql: str) -> List[str]:
+    """Sentencias del archivo en texto canónico (sin comentarios), listas para un dry-run"""
+    texto = _enmascarar(sql)
+    sentencias, inicio = [], 0
+    for match in list(re.finditer(';', texto)) + [None]:
+        fin = match.start() if match else len(texto)
+        sentencia = normalize_sql(sql[inicio:fin])
+        if sentencia:
+            sentencias.append(sentencia)
+        inicio = fin + 1
+    return sentencias
+
+
+def estimar_bytes(reporte: ReporteArchivo, sql: str, client: Any, guard: Any = None) -> ReporteArchivo:
+    """
+    Suma los bytes del dry-run de cada sentencia (no factura); el primer
+    error queda en reporte.error y el resto de las sentencias se estima igual
+    """
+    guard = guard or default_guard()
+    total = 0
+    for sentencia in sentencias_sql(sql):
+        try:
+            total += guard.estimate(client, sentencia)
+        except Exception as e:
+            logger.debug("Dry-run fallido en %s: %s", reporte.archivo, e)
+            if reporte.error is None:
+                reporte.error = str(e).splitlines()[0][:200] if str(e) else type(e).__name__
+    reporte.bytes_estimados = total
+    return reporte
+
+
+def crear_cliente(project_id: Optional[str] = None):
+    """Cliente para el dry-run: stand-in si BIGQUERY_BACKEND=duckdb, si no BigQuery"""
+    project_id = project_id or os.getenv('GOOGLE_CLOUD_PROJECT') or 'meli-bi-data'
+    client = client_from_env(project_id)
+    if client is None:
+        from google.cloud import bigquery
+        client = bigquery.Client(project=project_id)
+    return client
+
+
+def ordenar(reportes: List[ReporteArchivo], criterio: str = 'puntaje') -> List[ReporteArchivo]:
+    if criterio == 'archivo':
+        return sorted(reportes, key=lambda reporte: reporte.archivo.lower())
+    claves = {
+        'puntaje': lambda reporte: (reporte.puntaje, reporte.bytes_estimados or 0),
+        'bytes': lambda reporte: (reporte.bytes_estimados or -1, reporte.puntaje),
+        'hallazgos': lambda reporte: (len(reporte.hallazgos), reporte.puntaje),
+    }
+    return sorted(reportes, key=claves[criterio], reverse=True)
+
+
+_COLUMNAS_RESUMEN = [('particion_sin_filtro', 'sin filtro'), ('particion_sin_poda', 'sin poda'),
+                     ('select_asterisco', 'SELECT *'), ('join_cast', 'JOIN CAST'), ('cross_join', 'cross')]
+
+
+def imprimir_reporte(reportes: List[ReporteArchivo], detalle: bool = True):
+    """Tabla por archivo y, debajo, los hallazgos línea por línea"""
+    print(f"\n🔎 COSTO ESTÁTICO DE {len(reportes)} ARCHIVOS SQL")
+    encabezado = ' '.join(f"{titulo:>10}" for _, titulo in _COLUMNAS_RESUMEN)
+    print(f"   {'archivo':<58} {encabezado} {'puntaje':>8} {'bytes estim.':>13}")
+    for reporte in reportes:
+        conteo = reporte.conteo()
+        columnas = ' '.join(f"{conteo[regla]:>10}" for regla, _ in _COLUMNAS_RESUMEN)
+        bytes_estimados = '-' if reporte.bytes_estimados is None else format_bytes(reporte.bytes_estimados)
+        if reporte.error:
+            bytes_estimados += ' ⚠️'
+        print(f"   {reporte.archivo[:58]:<58} {columnas} {reporte.puntaje:>8} {bytes_estimados:>13}")
+
+    total = sum(reporte.puntaje for reporte in reportes)
+    print(f"   Total: {sum(len(reporte.hallazgos) for reporte in reportes)} hallazgos, puntaje {total}")
+    if any(reporte.bytes_estimados is not None for reporte in reportes):
+        print(f"   Bytes estimados (dry-run): "
+              f"{format_bytes(sum(reporte.bytes_estimados or 0 for reporte in reportes))}")
+
+    if not detalle:
+        return
+    for reporte in reportes:
+        if not reporte.hallazgos and not reporte.error:
+            continue
+        print(f"\n📄 {reporte.archivo}")
+        for hallazgo in reporte.hallazgos:
+            print(f"   L{hallazgo.linea:<5} {hallazgo.regla:<21} {hallazgo.detalle}")
+        if reporte.error:
+            print(f"   ⚠️  dry-run: {reporte.error}")
+
+
+def escribir_csv(reportes: List[ReporteArchivo], salida=None):
+    writer = csv.writer(salida or sys.stdout)
+    writer.writerow(['archivo', 'sentencias', 'tablas', *PESOS, 'puntaje', 'bytes_estimados', 'error'])
+    for reporte in reportes:
+        conteo = reporte.conteo()
+        writer.writerow([reporte.archivo, reporte.sentencias, len(reporte.tablas),
+                         *(conteo[regla] for regla in PESOS), reporte.puntaje,
+                         '' if reporte.bytes_estimados is None else reporte.bytes_estimados,
+                         reporte.error or ''])
+
+
+def _regla_particion(valor: str) -> Tuple[str, Tuple[str, ...]]:
+    """'DATASET.TABLA=COL1,COL2' -> regla de PARTICIONES"""
+    if '=' not in valor:
+        raise argparse.ArgumentTypeError(f"Formato esperado DATASET.TABLA=COLUMNA[,COLUMNA]: {valor}")
+    tabla, columnas = valor.split('=', 1)
+    return re.escape(tabla.strip()).replace(r'\*', r'\w*'), tuple(
+        columna.strip() for columna in columnas.split(',') if columna.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Linter de costo para los archivos .sql (BigQuery)')
+    parser.add_argument('archivos', nargs='*', default=['*.sql'], help='archivos o patrones (por defecto *.sql)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='estimar bytes con un dry-run (BIGQUERY_BACKEND=duckdb usa el stand-in)')
+    parser.add_argument('--project', default=None, help='proyecto para el dry-run (GOOGLE_CLOUD_PROJECT)')
+    parser.add_argument('--sort', choices=ORDENES, default=None,
+                        help='orden del reporte (por defecto bytes con --dry-run, si no puntaje)')
+    parser.add_argument('--format', choices=('texto', 'csv', 'json'), default='texto')
+    parser.add_argument('--top', type=int, default=0, help='mostrar solo los N primeros archivos')
+    parser.add_argument('--resumen', action='store_true', help='solo la tabla, sin hallazgos por línea')
+    parser.add_argument('--particion', action='append', type=_regla_particion, default=[],
+                        metavar='DATASET.TABLA=COL',
+                        help='columna de partición adicional (se puede repetir; admite * en el nombre)')
+    args = parser.parse_args()
+
+    rutas = []
+    for patron in args.archivos:
+        rutas.extend(sorted(glob.glob(patron)) or ([patron] if os.path.exists(patron) else []))
+    if not rutas:
+        print(f"❌ No hay archivos .sql para {', '.join(args.archivos)}")
+        sys.exit(1)
+
+    particiones = args.particion + PARTICIONES
+    client = crear_cliente(args.project) if args.dry_run else None
+    reportes = []
+    for ruta in dict.fromkeys(rutas):
+        try:
+            with open(ruta, encoding='utf-8', errors='replace') as f:
+                sql = f.read()
+            reporte = analizar_sql(sql, os.path.basename(ruta), particiones)
+            if client is not None:
+                estimar_bytes(reporte, sql, client)
+            reportes.append(reporte)
+        except Exception as e:
+            print(f"❌ Error analizando {ruta}: {e}")
+
+    reportes = ordenar(reportes, args.sort or ('bytes' if args.dry_run else 'puntaje'))
+    if args.top:
+        reportes = reportes[:args.top]
+    if args.format == 'csv':
+        escribir_csv(reportes)
+    elif args.format == 'json':
+        print(json.dumps([reporte.to_dict() for reporte in reportes], indent=2, ensure_ascii=False))
+    else:
+        imprimir_reporte(reportes, detalle=not args.resumen)
+
+
+if __name__ == "__main__":
+    main()
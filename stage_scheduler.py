@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+⚡ PLANIFICADOR DE ETAPAS CONCURRENTES PARA LOS ANALIZADORES
+Las verificaciones de un usuario (marcas, cruces, velocidad, desconocimiento,
+subgrafo y saltos a fraude del MCP) son independientes entre sí, pero los
+flujos las esperaban una detrás de otra. Con el planificador se lanzan todas
+juntas, el flujo lee los resultados en el orden del esquema oficial y, al
+salir del bloque (decisión tomada), las que siguen pendientes se cancelan:
+la latencia por usuario queda en la del camino crítico.
+
+- Dependencias: depends_on=('a', 'b') espera esas etapas y les pasa su
+  resultado como argumento con el nombre de la etapa.
+- Salida ordenada: lo que imprime cada etapa se guarda y se vuelca cuando el
+  flujo pide su resultado, así el reporte sale igual que en secuencial; lo
+  de las etapas canceladas se descarta.
+- ANALYZER_CONCURRENT_STAGES=0 vuelve a la ejecución secuencial: cada etapa
+  corre recién cuando se pide su resultado.
+
+Uso:
+    async with StageScheduler() as etapas:
+        etapas.add('marcas', self._verificar_marcas_relevantes, user_id)
+        etapas.add('cruces', self._verificar_cruces_riesgo, user_id)
+        if not (await etapas.result('marcas'))['tiene_marcas']:
+            return ...  # 'cruces' se cancela al salir
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import inspect
+import logging
+import contextvars
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Buffer de salida de la etapa que corre en la tarea (o thread) actual
+_stage_output: contextvars.ContextVar = contextvars.ContextVar('stage_output', default=None)
+_installed = 0
+
+
+class _StageStdout:
+    """sys.stdout mientras hay planificadores activos: cada etapa escribe en su buffer"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def write(self, text):
+        output = _stage_output.get()
+        return (output if output is not None else self.target).write(text)
+
+    def flush(self):
+        self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+def _install_stdout():
+    global _installed
+    if _installed == 0:
+        sys.stdout = _StageStdout(sys.stdout)
+    _installed += 1
+
+
+def _uninstall_stdout():
+    global _installed
+    _installed -= 1
+    if _installed == 0 and isinstance(sys.stdout, _StageStdout):
+        sys.stdout = sys.stdout.target
+
+
+def concurrent_stages_enabled() -> bool:
+    return os.environ.get('ANALYZER_CONCURRENT_STAGES', '1') != '0'
+
+
+class _Stage:
+    def __init__(self, name: str, function: Callable, args: tuple, kwargs: dict, depends_on: tuple):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.depends_on = depends_on
+        self.task: Optional[asyncio.Task] = None
+        self.output = io.StringIO()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+
+class StageScheduler:
+    """Etapas de un análisis como tareas asyncio con dependencias y cancelación"""
+
+    def __init__(self, concurrent: Optional[bool] = None):
+        """
+        Args:
+            concurrent: lanzar las etapas al agregarlas; por defecto
+                        ANALYZER_CONCURRENT_STAGES (activado)
+        """
+        self.concurrent = concurrent_stages_enabled() if concurrent is None else concurrent
+        self._stages: Dict[str, _Stage] = {}
+        self._started = time.perf_counter()
+
+    async def __aenter__(self) -> 'StageScheduler':
+        _install_stdout()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await self.cancel_pending()
+        finally:
+            _uninstall_stdout()
+        return False
+
+    def add(self, name: str, function: Callable, *args: Any, depends_on: Iterable[str] = (),
+            **kwargs: Any) -> 'StageScheduler':
+        """
+        Registra una etapa: función async, o sincrónica (corre en un thread,
+        p. ej. las llamadas HTTP del cliente MCP)
+        """
+        if name in self._stages:
+            raise ValueError(f"Etapa duplicada: {name}")
+        depends_on = tuple(depends_on)
+        unknown = [dependency for dependency in depends_on if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Etapa {name}: dependencias no registradas {unknown}")
+        stage = _Stage(name, function, args, kwargs, depends_on)
+        self._stages[name] = stage
+        if self.concurrent:
+            self._launch(stage)
+        return self
+
+    def _launch(self, stage: _Stage):
+        if stage.task is None:
+            stage.task = asyncio.ensure_future(self._run(stage))
+
+    async def _run(self, stage: _Stage) -> Any:
+        # La tarea tiene su propia copia del contexto: el buffer es solo suyo
+        # (y recibe también lo que imprimieron sus dependencias)
+        _stage_output.set(stage.output)
+        kwargs = dict(stage.kwargs)
+        for dependency in stage.depends_on:
+            kwargs[dependency] = await self.result(dependency)
+        stage.started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(stage.function):
+                return await stage.function(*stage.args, **kwargs)
+            return await asyncio.to_thread(stage.function, *stage.args, **kwargs)
+        finally:
+            stage.finished = time.perf_counter()
+
+    async def result(self, name: str) -> Any:
+        """Espera una etapa (la lanza si todavía no corrió) y vuelca lo que imprimió"""
+        stage = self._stages[name]
+        self._launch(stage)
+        try:
+            return await stage.task
+        finally:
+            output, stage.output = stage.output.getvalue(), io.StringIO()
+            if output:
+                sys.stdout.write(output)
+
+    async def cancel_pending(self):
+        """Cancela las etapas que siguen en curso (la decisión ya está tomada)"""
+        pending = [stage for stage in self._stages.values() if stage.task is not None and not stage.task.done()]
+        for stage in pending:
+            stage.task.cancel()
+        if pending:
+            await asyncio.gather(*(stage.task for stage in pending), return_exceptions=True)
+            logger.debug("Etapas canceladas: %s", ', '.join(stage.name for stage in pending))
+        # Etapas terminadas con error cuyo resultado nadie pidió
+        for stage in self._stages.values():
+            if stage.task is not None and stage.task.done() and not stage.task.cancelled():
+                stage.task.exception()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Estado y tiempos (ms desde el inicio del planificador) de cada etapa"""
+        report = {}
+        for name, stage in self._stages.items():
+            if stage.task is None:
+                status = 'no_ejecutada'
+            elif stage.task.cancelled():
+                status = 'cancelada'
+            elif not stage.task.done():
+                status = 'en_curso'
+            else:
+                status = 'error' if stage.task.exception() else 'ok'
+            report[name] = {
+                'status': status,
+                'start_ms': None if stage.started is None else (stage.started - self._started) * 1000,
+                'elapsed_ms': (None if stage.started is None or stage.finished is None
+                               else (stage.finished - stage.started) * 1000),
+            }
+        return report
@@ -1,3 +1,5 @@
 #!/bin/bash
 echo "🚀 Iniciando Comparador de Imágenes Web en puerto $PORT..."
+# Con --preload el warm-up corre una vez en el master y los workers nacen listos
+export WARM_UP_MODE=${WARM_UP_MODE:-sync}
 exec gunicorn --bind 0.0.0.0:$PORT app_web:app --workers 1 --timeout 60 --preload 
\ No newline at end of file
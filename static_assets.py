@@ -0,0 +1,220 @@
+"""
+Entrega de la interfaz web precomprimida y cacheable
+Construye una sola vez (al arrancar) los assets de la UI con hash de contenido,
+variantes gzip/brotli y ETag fuerte, y comprime las respuestas JSON según
+Accept-Encoding
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from flask import Response, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Preferencia del servidor cuando el cliente acepta varias codificaciones
+ENCODING_PREFERENCE = ('br', 'gzip', 'identity')
+
+# Un año: los assets con hash en el nombre nunca cambian
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# La página principal mantiene su URL: se revalida siempre con el ETag
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Extensiones de la UI que se precomprimen al arrancar
+FRONTEND_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json')
+
+
+class StaticAsset:
+    """Contenido fijo con sus variantes comprimidas y su ETag"""
+
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+
+        self.encodings = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            # Solo vale la pena si efectivamente achica
+            if len(data) < len(body):
+                self.encodings[encoding] = data
+
+    @classmethod
+    def from_text(cls, text: str, content_type: str = 'text/html; charset=utf-8'):
+        return cls(text.encode('utf-8'), content_type)
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, 'rb') as f:
+            body = f.read()
+        return cls(body, guess_content_type(path))
+
+    def etag(self, encoding: str = 'identity') -> str:
+        """ETag fuerte: cada codificación es una representación distinta"""
+        if encoding == 'identity':
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def matches(self, if_none_match) -> bool:
+        """True si el cliente ya tiene alguna de las representaciones"""
+        if not if_none_match:
+            return False
+        if if_none_match.star_tag:
+            return True
+        return any(if_none_match.contains(self.etag(encoding).strip('"'))
+                   for encoding in self.encodings)
+
+    def hashed_name(self, filename: str) -> str:
+        """main.js -> main.<hash>.js"""
+        root, extension = os.path.splitext(filename)
+        return f"{root}.{self.digest[:10]}{extension}"
+
+
+def guess_content_type(path: str) -> str:
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Elige la codificación según Accept-Encoding (con valores q)"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in pieces[1:]:
+            key, _, value = parameter.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    for encoding in ENCODING_PREFERENCE:
+        if encoding == 'identity' or encoding not in available:
+            continue
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return 'identity'
+
+
+def asset_response(asset: StaticAsset, immutable: bool = False) -> Response:
+    """Respuesta con la variante negociada, ETag y 304 si el cliente ya la tiene"""
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), asset.encodings)
+    headers = {
+        'ETag': asset.etag(encoding),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding',
+    }
+
+    if asset.matches(request.if_none_match):
+        return Response(status=304, headers=headers)
+
+    response = Response(asset.encodings[encoding], headers=headers)
+    response.headers['Content-Type'] = asset.content_type
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class FrontendAssets:
+    """Assets de la UI construidos una vez al arrancar
+
+    La página de entrada (main.html) se reescribe para apuntar a los nombres
+    con hash (main.<hash>.css, main.<hash>.js), que se sirven como immutable.
+    """
+
+    def __init__(self, directory: str = '.', entry: str = 'main.html', fallback_html: str = None):
+        self.directory = directory
+        self.page = None
+        self.hashed = {}    # nombre con hash -> asset (immutable)
+        self.plain = {}     # nombre original -> asset (revalidación por ETag)
+        self._build(entry, fallback_html)
+
+    def _build(self, entry, fallback_html):
+        entry_path = os.path.join(self.directory, entry)
+        if not os.path.exists(entry_path):
+            if fallback_html is not None:
+                self.page = StaticAsset.from_text(fallback_html)
+            return
+
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        # Assets locales referenciados desde la página (href/src relativos)
+        for reference in sorted(set(re.findall(r'(?:href|src)="([^":?#]+)"', html))):
+            path = os.path.join(self.directory, reference)
+            if not reference.endswith(FRONTEND_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            asset = StaticAsset.from_file(path)
+            hashed_name = asset.hashed_name(reference)
+            self.plain[reference] = asset
+            self.hashed[hashed_name] = asset
+            html = html.replace(f'"{reference}"', f'"{hashed_name}"')
+
+        self.page = StaticAsset.from_text(html)
+        self.plain[entry] = self.page
+
+        total = sum(len(a.body) for a in self.plain.values())
+        compressed = sum(min(len(v) for v in a.encodings.values()) for a in self.plain.values())
+        logger.info(f"📦 UI precomprimida: {len(self.plain)} archivos, {total} → {compressed} bytes"
+                    f"{'' if brotli else ' (sin brotli)'}")
+
+    def page_response(self):
+        return asset_response(self.page)
+
+    def serve(self, filename: str):
+        """Sirve un asset de la UI; el resto cae a send_from_directory"""
+        if filename in self.hashed:
+            return asset_response(self.hashed[filename], immutable=True)
+        if filename in self.plain:
+            return asset_response(self.plain[filename])
+        return send_from_directory(self.directory, filename)
+
+
+def enable_response_compression(app, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+    """Comprime las respuestas JSON de la app según Accept-Encoding"""
+
+    @app.after_request
+    def compress_json_response(response):
+        if (response.mimetype != 'application/json'
+                or response.direct_passthrough
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        available = ('br', 'gzip') if brotli is not None else ('gzip',)
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), available)
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=brotli_quality))
+        elif encoding == 'gzip':
+            response.set_data(gzip.compress(data, compresslevel=gzip_level))
+        else:
+            return response
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return compress_json_response
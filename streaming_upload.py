@@ -0,0 +1,133 @@
+"""
+Ingesta de uploads multipart en memoria, sin pasar por disco
+Cada parte de archivo se escribe en un buffer acotado que calcula su hash al
+vuelo y verifica la firma de imagen con los primeros bytes, cortando la
+lectura apenas una parte excede los límites o no es una imagen
+"""
+
+import io
+import os
+import hashlib
+import logging
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+logger = logging.getLogger(__name__)
+
+# Bytes necesarios para reconocer cualquiera de las firmas
+SIGNATURE_BYTES = 12
+
+
+def is_image_signature(header):
+    """True si los primeros bytes corresponden a un formato que PIL decodifica"""
+    return (
+        header.startswith(b'\xff\xd8\xff')                        # JPEG
+        or header.startswith(b'\x89PNG\r\n\x1a\n')                # PNG
+        or header[:6] in (b'GIF87a', b'GIF89a')                   # GIF
+        or (header[:4] == b'RIFF' and header[8:12] == b'WEBP')    # WEBP
+        or header.startswith(b'BM')                               # BMP
+        or header[:4] in (b'II*\x00', b'MM\x00*')                 # TIFF
+    )
+
+
+def is_video_signature(header):
+    """Firmas de contenedores de video (MP4/MOV, WebM/MKV, AVI)"""
+    return (
+        header[4:8] == b'ftyp'
+        or header.startswith(b'\x1a\x45\xdf\xa3')
+        or (header[:4] == b'RIFF' and header[8:12] == b'AVI ')
+    )
+
+
+def is_media_signature(header):
+    return is_image_signature(header) or is_video_signature(header)
+
+
+class UploadPartTooLarge(RequestEntityTooLarge):
+    description = 'El archivo supera el tamaño máximo permitido'
+
+
+class UploadNotImage(UnsupportedMediaType):
+    description = 'El archivo subido no es una imagen soportada'
+
+
+class HashingUploadBuffer(io.BytesIO):
+    """Buffer en memoria de una parte del multipart con límite y hash al vuelo"""
+
+    def __init__(self, max_bytes, on_write=None, signature_check=is_image_signature, filename=None):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.filename = filename
+        self._on_write = on_write
+        self._signature_check = signature_check
+        self._hasher = hashlib.sha256()
+        self._header = b''
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            logger.warning(f"⛔ Upload cortado: {self.filename} supera {self.max_bytes} bytes")
+            raise UploadPartTooLarge()
+        if self._on_write is not None:
+            self._on_write(len(data))
+
+        if self._signature_check is not None and len(self._header) < SIGNATURE_BYTES:
+            self._header += bytes(data[:SIGNATURE_BYTES - len(self._header)])
+            if len(self._header) >= SIGNATURE_BYTES and not self._signature_check(self._header):
+                logger.warning(f"⛔ Upload cortado: {self.filename} no es una imagen")
+                raise UploadNotImage()
+
+        self._hasher.update(data)
+        return super().write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Werkzeug rebobina el buffer al terminar la parte: si llegaron menos
+        # bytes que los de la firma nunca se verificaron, y ningún formato
+        # soportado entra en tan poco (una parte vacía queda para la ruta)
+        if self._signature_check is not None and 0 < len(self._header) < SIGNATURE_BYTES:
+            logger.warning(f"⛔ Upload rechazado: {self.filename} tiene solo {len(self._header)} bytes")
+            raise UploadNotImage()
+        return super().seek(offset, whence)
+
+    def hexdigest(self):
+        """sha256 del contenido completo (clave para cachés)"""
+        return self._hasher.hexdigest()
+
+
+class StreamingUploadRequest(Request):
+    """Request de Flask cuyas partes de archivo van a HashingUploadBuffer
+
+    Límites configurables con UPLOAD_MAX_PART_MB y UPLOAD_MAX_TOTAL_MB.
+    Las subclases pueden habilitar videos en rutas puntuales con video_paths.
+    """
+
+    max_part_bytes = int(float(os.environ.get('UPLOAD_MAX_PART_MB', 20)) * 1024 * 1024)
+    max_total_bytes = int(float(os.environ.get('UPLOAD_MAX_TOTAL_MB', 40)) * 1024 * 1024)
+    signature_check = staticmethod(is_image_signature)
+    # Rutas que además aceptan contenedores de video
+    video_paths = frozenset()
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length > self.max_total_bytes:
+            raise RequestEntityTooLarge()
+        if content_length is not None and content_length > self.max_part_bytes:
+            raise UploadPartTooLarge()
+        signature_check = is_media_signature if self.path in self.video_paths else self.signature_check
+        return HashingUploadBuffer(self.max_part_bytes, on_write=self._count_upload_bytes,
+                                   signature_check=signature_check, filename=filename)
+
+    def _count_upload_bytes(self, nbytes):
+        # Sin Content-Length (chunked) el total solo se conoce leyendo
+        self.upload_bytes = getattr(self, 'upload_bytes', 0) + nbytes
+        if self.upload_bytes > self.max_total_bytes:
+            raise RequestEntityTooLarge()
+
+
+def upload_digest(file_storage):
+    """Hash de contenido de un archivo subido (None si no pasó por el buffer)"""
+    stream = getattr(file_storage, 'stream', None)
+    if isinstance(stream, HashingUploadBuffer):
+        return stream.hexdigest()
+    return None
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Prueba del presupuesto de bytes (cost_guard) contra el stand-in con latencia
+No necesita credenciales ni la base DuckDB
+"""
+
+import asyncio
+
+from cost_guard import CostGuard
+from mcp_bigquery_setup import MCPBigQueryBasicOperations
+from bigquery_standin import LatencyStandInClient
+
+MB = 1024 ** 2
+
+
+async def _ejecutar(guard, consultas=3):
+    client = LatencyStandInClient(latency=0.01, bytes_per_query=10 * MB)
+    operations = MCPBigQueryBasicOperations("standin", client=client, cost_guard=guard)
+    await operations.initialize()
+    return [await operations.execute_query(f"SELECT {i} AS value", use_cache=False, label='prueba.consulta')
+            for i in range(consultas)]
+
+
+def test_sesion_sin_limite():
+    """BIGQUERY_MAX_BYTES_PER_SESSION=0: las consultas corren y el gasto se acumula"""
+    print("🧪 Presupuesto de sesión sin límite...")
+    guard = CostGuard(max_bytes_per_query=0, max_bytes_per_session=0, dry_run=True)
+    results = asyncio.run(_ejecutar(guard))
+    assert all(result["status"] == "success" for result in results), results
+    assert guard.remaining() is None
+    assert guard.billed == 30 * MB, guard.billed
+    assert guard.spend['prueba.consulta']['queries'] == 3, guard.spend
+    print("✅ 3 consultas ejecutadas y registradas sin límite de sesión")
+    return True
+
+
+def test_sesion_con_limite():
+    """Con 25MB de sesión la tercera consulta (10MB) ya no entra"""
+    print("🧪 Presupuesto de sesión de 25MB...")
+    guard = CostGuard(max_bytes_per_query=0, max_bytes_per_session='25MB', dry_run=True)
+    results = asyncio.run(_ejecutar(guard))
+    assert [result["status"] for result in results] == ["success", "success", "error"], results
+    assert results[2]["budget_exceeded"]["scope"] == 'sesión', results[2]
+    assert guard.billed == 20 * MB, guard.billed
+    print("✅ La consulta que excede la sesión se bloquea sin ejecutarse")
+    return True
+
+
+if __name__ == "__main__":
+    test_sesion_sin_limite()
+    test_sesion_con_limite()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Prueba del timeline de video con frames de duración despareja
+Genera un GIF en memoria: no necesita archivos ni OpenCV
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from fast_comparator import FastImageComparator
+from video_comparison import AnimatedImageSource, VideoBackgroundComparator
+
+# Escena A: un frame de 10 s; escena B: 20 frames de 0.1 s
+DURACIONES_MS = [10000] + [100] * 20
+
+
+def _gif():
+    """Gradiente hacia la derecha (escena A) y hacia la izquierda (escena B)"""
+    gradiente = np.tile(np.linspace(0, 255, 160, dtype=np.uint8), (120, 1))
+    frames = []
+    for i in range(len(DURACIONES_MS)):
+        pixels = np.stack([gradiente if i == 0 else gradiente[:, ::-1]] * 3, axis=2).copy()
+        # Variación mínima por frame: PIL fusiona frames idénticos consecutivos
+        pixels[0, 0] = i
+        frames.append(Image.fromarray(pixels))
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:],
+                   duration=DURACIONES_MS, loop=0)
+    buffer.seek(0)
+    return buffer
+
+
+def test_duraciones_despareja():
+    """end_time cubre el último frame y el promedio se pondera en segundos"""
+    print("🧪 Timeline de un GIF con frames de duración despareja...")
+    source = AnimatedImageSource(_gif())
+    # Las duraciones se leen a medida que se alcanzan los frames
+    assert len(source._start_times) == 2, source._start_times
+
+    result = VideoBackgroundComparator(FastImageComparator()).compare(source)
+    timeline = result['timeline']
+    assert len(timeline) == 2, timeline
+    assert (timeline[0]['start_time'], timeline[0]['end_time']) == (0.0, 10.0), timeline[0]
+    assert (timeline[1]['start_frame'], timeline[1]['start_time']) == (1, 10.0), timeline[1]
+    assert timeline[1]['end_frame'] == 20 and timeline[1]['end_time'] == 12.0, timeline[1]
+
+    esperado = (10.0 * timeline[0]['similarity'] + 2.0 * timeline[1]['similarity']) / 12.0
+    assert abs(result['overall_similarity'] - esperado) < 1e-9, (result['overall_similarity'], esperado)
+    source.close()
+    print(f"✅ Segmentos de 10 s y 2 s, similitud ponderada {result['overall_similarity']:.3f}")
+    return True
+
+
+if __name__ == "__main__":
+    test_duraciones_despareja()
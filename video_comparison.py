@@ -0,0 +1,340 @@
+"""
+Comparación de fondos sobre videos e imágenes animadas
+Decodifica los frames de a uno (nunca todos en memoria), detecta cambios de
+escena con un hash empaquetado de 64 bits y corre las métricas de fondo de
+FastImageComparator solo sobre un frame representativo por segmento,
+cortando temprano cuando el veredicto se estabiliza
+"""
+
+import os
+import logging
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from streaming_upload import is_video_signature
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+# Extensiones que se decodifican con OpenCV (el resto con PIL)
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.webm', '.mkv', '.avi')
+
+
+def packed_hash(image):
+    """dHash de 64 bits empaquetado en un int (diferencias horizontales 9x8)"""
+    small = np.asarray(image.convert('L').resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(hash1, hash2):
+    return bin(hash1 ^ hash2).count('1')
+
+
+class AnimatedImageSource:
+    """Frames de GIF/WebP/APNG/TIFF multi-frame vía PIL (seek de a uno)"""
+
+    def __init__(self, file_stream):
+        self.image = Image.open(file_stream)
+        self.frame_size = self.image.size
+        self.frame_count = getattr(self.image, 'n_frames', 1)
+        # Cada frame tiene su propia duración: los tiempos se acumulan a medida
+        # que se alcanzan los frames (GIFs con pausas o ritmo variable), sin
+        # recorrer el archivo entero antes de empezar a muestrear.
+        # _start_times[i] es el segundo en que empieza el frame i
+        self._start_times = [0.0]
+        self._record_duration()
+
+    def _record_duration(self):
+        """Suma la duración del frame actual si es el último alcanzado"""
+        if self.image.tell() == len(self._start_times) - 1:
+            duration_ms = self.image.info.get('duration') or 100
+            self._start_times.append(self._start_times[-1] + duration_ms / 1000.0)
+
+    def _reach(self, index):
+        """Recorre los frames todavía no vistos hasta `index` (inclusive)"""
+        while len(self._start_times) <= index + 1 and len(self._start_times) <= self.frame_count:
+            self.image.seek(len(self._start_times) - 1)
+            self._record_duration()
+
+    @property
+    def fps(self):
+        """fps promedio de los frames alcanzados, para traducir los intervalos de sondeo a frames"""
+        return (len(self._start_times) - 1) / self._start_times[-1]
+
+    def frame_time(self, index):
+        """Segundo en que empieza el frame `index` (frame_count = duración total)"""
+        index = min(index, self.frame_count)
+        self._reach(index - 1)
+        return self._start_times[index]
+
+    def read(self, index):
+        """Frame `index` como imagen RGB (None al terminar)"""
+        if index >= self.frame_count:
+            return None
+        self._reach(index)
+        self.image.seek(index)
+        return self.image.convert('RGB')
+
+    def close(self):
+        self.image.close()
+
+
+class VideoCaptureSource:
+    """Frames de video con OpenCV; los frames salteados solo se hacen grab()"""
+
+    def __init__(self, file_stream, suffix='.mp4'):
+        if cv2 is None:
+            raise RuntimeError("OpenCV no está instalado: no se pueden decodificar videos")
+
+        # VideoCapture necesita una ruta: se vuelca el stream a un temporal
+        self._tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        file_stream.seek(0)
+        while True:
+            chunk = file_stream.read(1024 * 1024)
+            if not chunk:
+                break
+            self._tmp.write(chunk)
+        self._tmp.close()
+
+        self.capture = cv2.VideoCapture(self._tmp.name)
+        if not self.capture.isOpened():
+            self.close()
+            raise ValueError("No se pudo abrir el video")
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.frame_size = (int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self._position = 0
+
+    def frame_time(self, index):
+        """Segundo en que empieza el frame `index` (frame_count = duración total)"""
+        return index / self.fps
+
+    def read(self, index):
+        """
+        Frame `index` como imagen RGB (None al terminar). Hacia adelante solo
+        hace grab(); hacia atrás (bisección de un corte) reposiciona con un seek
+        """
+        if index < self._position:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self._position = index
+        while self._position < index:
+            if not self.capture.grab():
+                return None
+            self._position += 1
+        ok, frame = self.capture.read()
+        if not ok:
+            return None
+        self._position += 1
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def close(self):
+        if getattr(self, 'capture', None) is not None:
+            self.capture.release()
+        try:
+            os.remove(self._tmp.name)
+        except OSError:
+            pass
+
+
+def open_frame_source(file_stream, filename=''):
+    """Elige el decodificador según la extensión o la firma del contenido"""
+    position = file_stream.tell()
+    header = file_stream.read(12)
+    file_stream.seek(position)
+
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in VIDEO_EXTENSIONS or is_video_signature(header):
+        return VideoCaptureSource(file_stream, suffix=extension or '.mp4')
+    return AnimatedImageSource(file_stream)
+
+
+class VideoBackgroundComparator:
+    """Timeline de similitud de fondo por segmento de un video/animación"""
+
+    def __init__(self, comparator, change_threshold=10, base_stride_seconds=0.5,
+                 max_stride_seconds=4.0, stable_window=3, stable_spread=0.05,
+                 min_segments=3, max_frames=None):
+        """
+        Args:
+            comparator: FastImageComparator con las métricas de fondo
+            change_threshold: bits de diferencia del hash que abren un segmento nuevo
+            base_stride_seconds: separación inicial entre frames sondeados
+            max_stride_seconds: separación máxima cuando la escena no cambia
+            stable_window: segmentos consecutivos que deben coincidir para cortar
+            stable_spread: rango máximo de similitud dentro de esa ventana
+            min_segments: segmentos mínimos comparados antes de poder cortar
+            max_frames: tope de frames a recorrer (None = todo el archivo)
+        """
+        self.comparator = comparator
+        self.change_threshold = change_threshold
+        self.base_stride_seconds = base_stride_seconds
+        self.max_stride_seconds = max_stride_seconds
+        self.stable_window = stable_window
+        self.stable_spread = stable_spread
+        self.min_segments = min_segments
+        self.max_frames = max_frames
+
+    def _normalize(self, frame):
+        """Mismo tamaño de trabajo que FastImageComparator.load_image"""
+        frame.thumbnail((600, 600), Image.Resampling.LANCZOS)
+        return frame
+
+    def compare(self, source, reference=None):
+        """
+        Recorre el video y compara cada segmento contra la referencia
+
+        Args:
+            source: AnimatedImageSource o VideoCaptureSource
+            reference: imagen PIL de referencia; sin ella se compara contra
+                       el primer segmento (consistencia del fondo en el video)
+        """
+        limit = self.max_frames or source.frame_count or None
+
+        timeline = []
+        frames_decoded = 0
+        early_stopped = False
+        segment_hash = None
+        previous_index = None
+        stride = 1
+        index = 0
+
+        while limit is None or index < limit:
+            frame = source.read(index)
+            if frame is None:
+                break
+            frames_decoded += 1
+            frame_hash = packed_hash(frame)
+            # En animaciones el fps se conoce mejor a medida que se avanza
+            base_stride, max_stride = self._strides(source)
+
+            if segment_hash is not None and hamming(frame_hash, segment_hash) <= self.change_threshold:
+                # Misma escena: se extiende el segmento y se espacian los sondeos
+                self._extend(timeline[-1], index, source)
+                stride = min(max_stride, stride * 2)
+            else:
+                # Escena nueva: el frame sondeado es el representativo del segmento.
+                # El corte cae entre el sondeo anterior y este: se ubica por
+                # bisección y el segmento previo termina justo antes
+                start = index
+                if timeline:
+                    start, decoded = self._find_cut(source, segment_hash, previous_index, index)
+                    frames_decoded += decoded
+                    self._extend(timeline[-1], start - 1, source)
+                frame = self._normalize(frame)
+                if reference is None:
+                    reference = frame
+                similarity = self.comparator.compare_images_fast(reference, frame)
+                overall = float(similarity.get('overall_similarity', 0.0))
+                timeline.append({
+                    'segment': len(timeline),
+                    'start_frame': start,
+                    'end_frame': index,
+                    'start_time': round(source.frame_time(start), 3),
+                    'end_time': round(source.frame_time(index + 1), 3),
+                    'representative_frame': index,
+                    'hash': f"{frame_hash:016x}",
+                    'similarity': overall,
+                    'category': self.comparator._generate_background_conclusion(overall)['category'],
+                })
+                segment_hash = frame_hash
+                stride = base_stride
+
+                if self._is_stable(timeline):
+                    early_stopped = True
+                    break
+
+            previous_index = index
+            index += stride
+            # El último frame siempre se sondea: cierra el último segmento en el
+            # final real y detecta una escena que empiece después del último sondeo
+            if limit is not None and previous_index < limit - 1 < index:
+                index = limit - 1
+
+        return self._summary(timeline, frames_decoded, early_stopped, source)
+
+    def _strides(self, source):
+        """Separación inicial y máxima entre sondeos, en frames"""
+        fps = source.fps if source.fps > 0 else 25.0
+        base_stride = max(1, int(round(self.base_stride_seconds * fps)))
+        max_stride = max(base_stride, int(round(self.max_stride_seconds * fps)))
+        return base_stride, max_stride
+
+    def _find_cut(self, source, segment_hash, low, high):
+        """
+        Primer frame de la escena nueva entre `low` (misma escena) y `high`
+        (escena nueva); devuelve (frame, frames decodificados)
+        """
+        decoded = 0
+        while high - low > 1:
+            middle = (low + high) // 2
+            frame = source.read(middle)
+            if frame is None:
+                break
+            decoded += 1
+            if hamming(packed_hash(frame), segment_hash) <= self.change_threshold:
+                low = middle
+            else:
+                high = middle
+        return high, decoded
+
+    @staticmethod
+    def _extend(segment, index, source):
+        # El segmento termina cuando termina su último frame
+        segment['end_frame'] = index
+        segment['end_time'] = round(source.frame_time(index + 1), 3)
+
+    def _is_stable(self, timeline):
+        """Veredicto estable: últimos segmentos con la misma categoría y poca dispersión"""
+        if len(timeline) < max(self.min_segments, self.stable_window):
+            return False
+        window = timeline[-self.stable_window:]
+        similarities = [segment['similarity'] for segment in window]
+        same_category = len({segment['category'] for segment in window}) == 1
+        return same_category and max(similarities) - min(similarities) <= self.stable_spread
+
+    def _summary(self, timeline, frames_decoded, early_stopped, source):
+        if not timeline:
+            return {
+                'timeline': [],
+                'overall_similarity': 0.0,
+                'frames_decoded': frames_decoded,
+                'segments_compared': 0,
+                'early_stopped': False,
+            }
+
+        # Promedio ponderado por la duración en segundos de cada segmento
+        weights = [source.frame_time(segment['end_frame'] + 1) - source.frame_time(segment['start_frame'])
+                   for segment in timeline]
+        if sum(weights) <= 0:
+            weights = [segment['end_frame'] - segment['start_frame'] + 1 for segment in timeline]
+        overall = sum(w * s['similarity'] for w, s in zip(weights, timeline)) / sum(weights)
+
+        return {
+            'timeline': timeline,
+            'overall_similarity': overall,
+            'min_similarity': min(segment['similarity'] for segment in timeline),
+            'conclusion': self.comparator._generate_background_conclusion(overall),
+            'frames_total': source.frame_count,
+            'frames_decoded': frames_decoded,
+            'segments_compared': len(timeline),
+            'early_stopped': early_stopped,
+        }
+
+
+def video_comparison_settings():
+    """Configuración del muestreo desde variables de entorno"""
+    max_frames = int(os.environ.get('VIDEO_MAX_FRAMES', 0))
+    return {
+        'change_threshold': int(os.environ.get('VIDEO_CHANGE_THRESHOLD', 10)),
+        'base_stride_seconds': float(os.environ.get('VIDEO_BASE_STRIDE_SECONDS', 0.5)),
+        'max_stride_seconds': float(os.environ.get('VIDEO_MAX_STRIDE_SECONDS', 4.0)),
+        'max_frames': max_frames or None,
+    }